@@ -0,0 +1,326 @@
+"""
+Local stand-in for the job boards scraped by the pipeline. Serves the
+kariyer.net `/search` and `/job` api endpoints and the myjob.mu results and
+job pages from a generated corpus, with configurable latency and error rate.
+
+Run `python -m benchmarks.job_board --port 8000` to start it on its own.
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from src.utils.constants import (DATABASES, LANGUAGES, LIBRARIES,
+                                 PUBLIC_SALARY_RANGES, TOOLS, WEB_FRAMEWORKS)
+
+TITLES = ['Software Developer', 'Backend Engineer', 'Frontend Developer',
+          'Full Stack Developer', 'Data Engineer', 'DevOps Engineer',
+          'Mobile Developer', 'QA Engineer', 'Data Scientist', 'System Administrator']
+LEVELS = ['', 'Junior ', 'Senior ', 'Lead ']
+TR_LOCATIONS = ['İstanbul(Avr.)', 'İstanbul(Asya)', 'Ankara', 'İzmir', 'Bursa', 'Kocaeli']
+MU_LOCATIONS = ['Port Louis', 'Ebene', 'Plaines Wilhems', 'Moka', 'Pamplemousses']
+# ? constants are built from sets, sorted so that a seed always gives the same corpus
+MU_SALARIES = sorted(PUBLIC_SALARY_RANGES) + ['Negotiable']
+TR_MONTHS = ['Ocak', 'Şubat', 'Mart', 'Nisan', 'Mayıs', 'Haziran', 'Temmuz',
+             'Ağustos', 'Eylül', 'Ekim', 'Kasım', 'Aralık']
+SKILLS = sorted(set(LANGUAGES + LIBRARIES + WEB_FRAMEWORKS + DATABASES + TOOLS))
+
+# jobs per page of myjob.mu results
+MYJOBMU_PAGE_SIZE = 40
+
+
+class LatencyModel:
+    """
+    Distribution of the time taken to answer a request, given as
+    `fixed:SECONDS`, `uniform:LOW,HIGH` or `lognormal:MEDIAN,SIGMA`.
+    """
+
+    def __init__(self, spec: str = 'fixed:0', seed: int = 0) -> None:
+        kind, _, params = spec.partition(':')
+        self.kind: str = kind
+        self.params: list[float] = [float(p) for p in params.split(',') if p]
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self.lock:
+            if self.kind == 'fixed':
+                return self.params[0] if self.params else 0.0
+            if self.kind == 'uniform':
+                return self.random.uniform(*self.params)
+            median, sigma = self.params
+            return median * self.random.lognormvariate(0, sigma)
+
+
+class Corpus:
+    """
+    Generated jobs of both websites, newest first. Job descriptions mention
+    a few technologies so that analysis has realistic work to do.
+    """
+
+    def __init__(self, size: int, seed: int = 0,
+                 newest: datetime = datetime(2024, 3, 1),
+                 jobs_per_day: int = 20) -> None:
+        rng = random.Random(seed)
+        self.kariyernet: list[dict] = []
+        self.myjobmu: list[dict] = []
+        for i in range(size):
+            posted = newest - timedelta(days=i // jobs_per_day)
+            closing = posted + timedelta(days=30)
+            title = rng.choice(LEVELS) + rng.choice(TITLES)
+            details = ('We are looking for a developer with experience in ' +
+                       ', '.join(rng.sample(SKILLS, rng.randint(3, 8))) + '.')
+            self.kariyernet.append({
+                'id': 100000 + size - i,
+                'title': title,
+                'postingDate': posted.strftime('%Y-%m-%dT09:00:00'),
+                'closingDate': f'{closing.day} {TR_MONTHS[closing.month - 1]} {closing.year}',
+                'locationText': rng.choice(TR_LOCATIONS),
+                'companyName': f'Company {rng.randint(1, size // 10 + 1)}',
+                'confidential': rng.random() < 0.1,
+                'qualifications': details,
+                'departments': [['55', '78'], ['55'], ['78']][i % 3]})
+            self.myjobmu.append({
+                'id': 500000 + size - i,
+                'title': title,
+                'posted': posted,
+                'closing': closing,
+                'location': rng.choice(MU_LOCATIONS),
+                'company': None if rng.random() < 0.1 else f'Company {rng.randint(1, 50)}',
+                'salary': rng.choice(MU_SALARIES),
+                'details': details,
+                'employment_type': rng.choice(['Permanent', 'Contract'])})
+        self.kariyernet_by_id = {job['id']: job for job in self.kariyernet}
+        self.myjobmu_by_id = {job['id']: job for job in self.myjobmu}
+
+
+class JobBoardServer:
+    """
+    HTTP server answering like kariyer.net and myjob.mu. Runs in a
+    background thread and records the time taken by each request.
+    """
+
+    def __init__(self, corpus: Corpus, latency: Optional[LatencyModel] = None,
+                 error_rate: float = 0.0, host: str = '127.0.0.1',
+                 port: int = 0, seed: int = 0) -> None:
+        """
+        Args:
+            corpus (Corpus): Jobs served
+            latency (LatencyModel, optional): Delay added to each response
+            error_rate (float): Fraction of requests answered with a 503
+            host (str): Interface to listen on
+            port (int): Port to listen on. 0 picks a free port.
+        """
+        self.corpus: Corpus = corpus
+        self.latency: LatencyModel = latency or LatencyModel()
+        self.error_rate: float = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        # endpoint -> list of response times in seconds
+        self.timings: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> JobBoardServer:
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.timings = {}
+            self.errors = {}
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Returns the number of requests, errors and latency percentiles (in
+        milliseconds) of each endpoint.
+        """
+        with self.lock:
+            timings = {k: sorted(v) for k, v in self.timings.items()}
+            errors = dict(self.errors)
+        return {endpoint: {'requests': len(values),
+                           'errors': errors.get(endpoint, 0),
+                           'latency_ms': {f'p{q}': round(percentile(values, q) * 1000, 2)
+                                          for q in (50, 90, 99)}}
+                for endpoint, values in timings.items()}
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        start = time.perf_counter()
+        url = urlparse(request.path)
+        endpoint = self.endpoint(method, url.path)
+
+        time.sleep(self.latency.sample())
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            status, content_type, body = 503, 'text/plain', b'unavailable'
+        else:
+            status, content_type, body = self.respond(request, endpoint, url)
+
+        request.send_response(status)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+        with self.lock:
+            self.timings.setdefault(endpoint, []).append(time.perf_counter() - start)
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    @staticmethod
+    def endpoint(method: str, path: str) -> str:
+        if method == 'POST' and path == '/search':
+            return 'kariyernet/search'
+        if path == '/job':
+            return 'kariyernet/job'
+        if path.endswith('ShowResults.aspx'):
+            return 'myjobmu/results'
+        if path.startswith('/Jobs/'):
+            return 'myjobmu/job'
+        return 'unknown'
+
+    def respond(self, request: BaseHTTPRequestHandler, endpoint: str, url) -> tuple:
+        if endpoint == 'kariyernet/search':
+            length = int(request.headers.get('Content-Length', 0))
+            return self.kariyernet_search(json.loads(request.rfile.read(length)))
+        if endpoint == 'kariyernet/job':
+            return self.kariyernet_job(parse_qs(url.query).get('jobId', ['0'])[0])
+        if endpoint == 'myjobmu/results':
+            return self.myjobmu_results(int(parse_qs(url.query).get('Page', ['1'])[0]))
+        if endpoint == 'myjobmu/job':
+            return self.myjobmu_job(url.path)
+        return 404, 'text/plain', b'not found'
+
+    def kariyernet_search(self, body: dict) -> tuple:
+        departments = set(body.get('departments') or ['55', '78'])
+        listed = [job for job in self.corpus.kariyernet
+                  if departments & set(job['departments'])]
+        size = body.get('size', 50)
+        start = (body.get('currentPage', 1) - 1) * size
+        items = [{'id': job['id'], 'title': job['title'],
+                  'postingDate': job['postingDate'],
+                  'locationText': job['locationText'],
+                  'companyName': job['companyName']}
+                 for job in listed[start:start + size]]
+        payload = {'data': {'totalJobCount': len(listed), 'jobs': {'items': items}}}
+        return 200, 'application/json', json.dumps(payload).encode()
+
+    def kariyernet_job(self, job_id: str) -> tuple:
+        job = self.corpus.kariyernet_by_id.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            return 404, 'application/json', b'{"data": null}'
+        payload = {'data': {
+            'jobGeneralInformation': {
+                'title': job['title'],
+                'confidential': job['confidential'],
+                'postingDate': job['postingDate'][:10],
+                'closingDate': job['closingDate'],
+                'locationText': job['locationText'],
+                'qualifications': job['qualifications'],
+                'language': 'tr'},
+            'jobCompanyInformation': {'companyName': job['companyName']}}}
+        return 200, 'application/json', json.dumps(payload).encode()
+
+    def myjobmu_results(self, page: int) -> tuple:
+        jobs = self.corpus.myjobmu
+        last_page = max(1, -(-len(jobs) // MYJOBMU_PAGE_SIZE))
+        start = (page - 1) * MYJOBMU_PAGE_SIZE
+        modules = []
+        for job in jobs[start:start + MYJOBMU_PAGE_SIZE]:
+            company = (f'<a itemprop="hiringOrganization" href="/c">{html.escape(job["company"])}</a>'
+                       if job['company'] else '')
+            modules.append(
+                '<div class="module job-result">'
+                f'<div class="job-result-title"><h2>{html.escape(job["title"])}</h2></div>'
+                f'{company}<ul>'
+                f'<li class="updated-time">Added {job["posted"]:%d/%m/%Y}</li>'
+                f'<li class="closed-time">Closing {job["closing"]:%d/%m/%Y}</li>'
+                f'<li itemprop="jobLocation">{job["location"]}</li>'
+                f'<li itemprop="baseSalary">{job["salary"]}</li></ul>'
+                f'<a class="show-more" href="/Jobs/job-{job["id"]}.aspx">Show more</a>'
+                '</div>')
+        pages = ''.join(f'<li>{i}</li>' for i in range(1, last_page + 1))
+        body = (f'<html><body>{"".join(modules)}'
+                f'<ul id="pagination">{pages}<li>Next</li></ul></body></html>')
+        return 200, 'text/html', body.encode()
+
+    def myjobmu_job(self, path: str) -> tuple:
+        job_id = path.rsplit('-', 1)[-1].replace('.aspx', '')
+        job = self.corpus.myjobmu_by_id.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            return 404, 'text/html', b'<html></html>'
+        body = ('<html><body>'
+                f'<ul><li class="employment-type">{job["employment_type"]}</li></ul>'
+                f'<div class="job-details"><p>{html.escape(job["details"])}</p></div>'
+                '</body></html>')
+        return 200, 'text/html', body.encode()
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Returns the `q`th percentile of sorted `values`, or 0 if empty.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Local stand-in job board server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--jobs', type=int, default=1000,
+                        help='number of jobs per website')
+    parser.add_argument('--latency', type=str, default='fixed:0',
+                        help='fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--error_rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+    server = JobBoardServer(Corpus(args.jobs, args.seed),
+                            LatencyModel(args.latency, args.seed),
+                            args.error_rate, port=args.port, seed=args.seed).start()
+    print(f'Serving {args.jobs} jobs per website on {server.url}')
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark of the pipeline: scrape, spool, upload, analyse and
+sync statistics, against the local stand-in job board and an in-memory
+database. Each run uses a fresh spool and database and is executed in its
+own process, so that its peak memory is measured on its own.
+
+    python -m benchmarks.pipeline --jobs 2000 --workers 1 2 4 8 \
+        --latency lognormal:0.05,0.5 --error_rate 0.01 --backfill
+
+prints a JSON report with the throughput, server latency percentiles and
+peak memory of each number of workers.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from benchmarks.job_board import Corpus, JobBoardServer, LatencyModel
+
+# websites which can be served by the stand-in job board. myjob.mu is
+# scraped with Chrome, which must then be installed.
+BENCHMARK_WEBSITES = ['kariyernet', 'myjobmu']
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory of the current process, in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ? ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_main(main_args: list[str]) -> dict:
+    """
+    Runs the pipeline once in the current process, with `main_args` as
+    command line arguments. The environment must point the scrapers to the
+    stand-in job board and select the offline database.
+
+    Returns:
+        dict: Jobs in database, wall time in seconds and peak memory in MB
+    """
+    from src import main as entrypoint
+    from src.classes.database import open_database
+
+    argv = sys.argv
+    sys.argv = ['main.py', *main_args]
+    try:
+        start = time.perf_counter()
+        entrypoint.main()
+        seconds = time.perf_counter() - start
+    finally:
+        sys.argv = argv
+
+    jobs = len(list(open_database(forMainDB=True).job_collection_ref.stream()))
+    return {'jobs': jobs, 'seconds': round(seconds, 3), 'peak_rss_mb': peak_rss_mb()}
+
+
+def main_args_for(websites: list[str], workers: int, spool_path: str,
+                  backfill: bool = False, defer_details: bool = False,
+                  archive_path: Optional[str] = None) -> list[str]:
+    """
+    Returns the command line arguments of `src.main` for a run with
+    `workers` parallel workers.
+    """
+    main_args = ['scrape', '--website', *websites, '--spool', spool_path,
+                 '--workers', str(workers), '--detail_workers', str(workers)]
+    if backfill:
+        main_args.append('--backfill')
+    if defer_details:
+        main_args.append('--defer_details')
+    if archive_path:
+        main_args.extend(['--archive', archive_path])
+    return main_args
+
+
+def benchmark(server: JobBoardServer, websites: list[str], workers: int,
+              backfill: bool = False, defer_details: bool = False,
+              archive: bool = False, max_rate: float = 1000.0,
+              verbose: bool = False) -> dict:
+    """
+    Runs the pipeline in a child process against `server` and measures it.
+
+    Returns:
+        dict: Measurements of the run
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ,
+               'FIRESTORE_OFFLINE': '1',
+               'KARIYERNET_API_URL': server.url,
+               'MYJOBMU_URL': server.url + '/',
+               'RATE_LIMIT_MAX_RATE': str(max_rate),
+               'RATE_LIMIT_MAX_CONCURRENCY': str(max(workers, 1) * 2)}
+        main_args = main_args_for(
+            websites, workers, os.path.join(directory, 'spool.sqlite3'),
+            backfill, defer_details,
+            os.path.join(directory, 'archive') if archive else None)
+        result_path = os.path.join(directory, 'result.json')
+        output = None if verbose else subprocess.DEVNULL
+
+        server.reset_stats()
+        subprocess.run([sys.executable, '-m', 'benchmarks.pipeline',
+                        '--child', result_path, '--', *main_args],
+                       env=env, stdout=output, stderr=output, check=True)
+        with open(result_path, encoding='utf-8') as file:
+            result = json.load(file)
+
+    minutes = result['seconds'] / 60
+    return {'workers': workers,
+            'jobs': result['jobs'],
+            'seconds': result['seconds'],
+            'jobs_per_minute': round(result['jobs'] / minutes, 1) if minutes else None,
+            'peak_rss_mb': result['peak_rss_mb'],
+            'endpoints': server.stats()}
+
+
+def get_args():
+    """
+    Returns command line arguments.
+
+    :returns
+        args (argparse.Namespace): command line arguments
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the pipeline against a local stand-in job board')
+    parser.add_argument('--website', type=str, nargs='+', default=['kariyernet'],
+                        choices=BENCHMARK_WEBSITES, help='websites scraped')
+    parser.add_argument('--jobs', type=int, default=1000,
+                        help='number of jobs served per website')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='numbers of parallel workers benchmarked')
+    parser.add_argument('--latency', type=str, default='fixed:0.02',
+                        help='latency of job board: fixed:S, uniform:LOW,HIGH '
+                        'or lognormal:MEDIAN,SIGMA (seconds)')
+    parser.add_argument('--error_rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 503')
+    parser.add_argument('--max_rate', type=float, default=1000.0,
+                        help='maximum requests per second of the rate limiter')
+    parser.add_argument('--backfill', action='store_true',
+                        help='crawl in parallel partitions')
+    parser.add_argument('--defer_details', action='store_true',
+                        help='fetch job details after the listing pages')
+    parser.add_argument('--archive', action='store_true',
+                        help='archive raw responses during the runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str,
+                        help='file where the JSON report is written '
+                        '(default: standard output)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the output of the pipeline')
+    return parser.parse_args()
+
+
+def main():
+    if len(sys.argv) > 3 and sys.argv[1] == '--child' and sys.argv[3] == '--':
+        # run of a single configuration, started by `benchmark`
+        result = run_main(sys.argv[4:])
+        with open(sys.argv[2], 'w', encoding='utf-8') as file:
+            json.dump(result, file)
+        return
+
+    args = get_args()
+    server = JobBoardServer(Corpus(args.jobs, args.seed),
+                            LatencyModel(args.latency, args.seed),
+                            args.error_rate, seed=args.seed).start()
+    try:
+        runs = [benchmark(server, args.website, workers, args.backfill,
+                          args.defer_details, args.archive, args.max_rate,
+                          args.verbose)
+                for workers in args.workers]
+    finally:
+        server.stop()
+
+    report = {'config': {'websites': args.website, 'jobs': args.jobs,
+                         'latency': args.latency, 'error_rate': args.error_rate,
+                         'max_rate': args.max_rate, 'backfill': args.backfill,
+                         'defer_details': args.defer_details,
+                         'archive': args.archive, 'seed': args.seed},
+              'runs': runs}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
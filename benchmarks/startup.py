@@ -0,0 +1,209 @@
+"""
+Benchmark of the startup of each command: the time taken to import the
+modules a command needs before it does anything. Every measurement runs in
+a fresh interpreter with `-X importtime`.
+
+    python -m benchmarks.startup --repeat 5 --output startup.json
+
+prints a JSON report with, for each command, the median wall time of the
+imports, the slowest modules imported and the heavy dependencies loaded.
+With `--baseline startup.json`, commands whose imports grew noticeably are
+reported, and the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from src.main import COMMANDS
+from src.scrappers import SCRAPER_MODULES
+
+# dependencies worth knowing about when they are imported
+HEAVY_MODULES = ('pandas', 'numpy', 'selenium', 'firebase_admin',
+                 'google.cloud.firestore_v1', 'requests', 'zstandard')
+
+# a command regresses when its imports take this much longer than in the
+# baseline, relatively and in seconds
+REGRESSION_THRESHOLD = 0.25
+REGRESSION_MIN_SECONDS = 0.05
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def targets() -> list[str]:
+    """
+    Returns what is measured: `main` (the entry point alone, as for
+    `--help`), every command, and the scraper of every website.
+    """
+    return ['main', *COMMANDS, *(f'scraper:{site}' for site in SCRAPER_MODULES)]
+
+
+def import_code(target: str) -> str:
+    """
+    Returns the code importing what `target` needs.
+    """
+    if target == 'main':
+        return 'import src.main'
+    if target.startswith('scraper:'):
+        site = target.split(':', 1)[1]
+        return f'from src.base_scrapper import get_scraper_class; get_scraper_class({site!r})'
+    if target in COMMANDS:
+        return f'from src.main import load_command; load_command({target!r})'
+    raise ValueError(f"Unknown target {target}")
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """
+    Parses the output of `python -X importtime`.
+
+    Returns:
+        list[dict]: Imported modules, in the order their import ended, with
+        `self` and `cumulative` times in seconds and the `depth` of the
+        import
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # header line
+            continue
+        name = fields[2].rstrip()
+        modules.append({'module': name.strip(),
+                        'self': int(fields[0]) / 1e6,
+                        'cumulative': int(fields[1]) / 1e6,
+                        'depth': (len(name) - len(name.lstrip())) // 2})
+    return modules
+
+
+def run_importtime(code: str) -> subprocess.CompletedProcess:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if result.returncode != 0:
+        raise RuntimeError(f"Running {code!r} failed:\n{result.stderr}")
+    return result
+
+
+def interpreter_modules() -> set[str]:
+    """
+    Returns the modules imported by the interpreter before any code runs,
+    for example by `.pth` files, which are not part of any command.
+    """
+    return {module['module'] for module in parse_importtime(run_importtime('pass').stderr)}
+
+
+def measure_once(target: str) -> dict:
+    """
+    Imports what `target` needs in a fresh interpreter.
+
+    Returns:
+        dict: Wall time of the imports in seconds and imported modules
+    """
+    code = ('import time; start = time.perf_counter(); '
+            f'{import_code(target)}; '
+            'print(time.perf_counter() - start)')
+    result = run_importtime(code)
+    return {'seconds': float(result.stdout.strip().splitlines()[-1]),
+            'modules': parse_importtime(result.stderr)}
+
+
+def measure(target: str, repeat: int = 5, top: int = 5,
+            ignored: frozenset = frozenset()) -> dict:
+    """
+    Measures the startup of `target` `repeat` times.
+
+    Args:
+        ignored (frozenset): Modules left out of the report, such as those
+        of `interpreter_modules`
+
+    Returns:
+        dict: Median and minimum seconds, number of modules imported,
+        heavy modules imported and the `top` slowest top-level imports
+    """
+    runs = [measure_once(target) for _ in range(repeat)]
+    seconds = [run['seconds'] for run in runs]
+    # the module list of the fastest run is the least disturbed by noise
+    modules = [module for module in min(runs, key=lambda run: run['seconds'])['modules']
+               if module['module'] not in ignored]
+    names = {module['module'] for module in modules}
+    slowest = sorted((module for module in modules if module['depth'] == 1),
+                     key=lambda module: module['cumulative'], reverse=True)[:top]
+    return {'seconds': round(statistics.median(seconds), 4),
+            'min_seconds': round(min(seconds), 4),
+            'modules': len(modules),
+            'heavy_modules': [name for name in HEAVY_MODULES if name in names],
+            'slowest': [{'module': module['module'],
+                         'seconds': round(module['cumulative'], 4)}
+                        for module in slowest]}
+
+
+def find_regressions(current: dict, baseline: dict,
+                     threshold: float = REGRESSION_THRESHOLD,
+                     min_seconds: float = REGRESSION_MIN_SECONDS) -> list[dict]:
+    """
+    Compares two reports of this benchmark.
+
+    Returns:
+        list[dict]: Targets whose imports take more than `threshold`
+        (relative) and `min_seconds` longer than in `baseline`, or import a
+        heavy module they did not import
+    """
+    regressions = []
+    for target, result in current['targets'].items():
+        previous = baseline.get('targets', {}).get(target)
+        if previous is None:
+            continue
+        growth = result['seconds'] - previous['seconds']
+        new_heavy = sorted(set(result['heavy_modules']) - set(previous['heavy_modules']))
+        if (growth > min_seconds and growth > threshold * previous['seconds']) or new_heavy:
+            regressions.append({'target': target, 'previous': previous['seconds'],
+                                'current': result['seconds'],
+                                'new_heavy_modules': new_heavy})
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the import time of each command')
+    parser.add_argument('--target', type=str, nargs='+', choices=targets(),
+                        help='targets measured (default: all)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='fresh interpreters started per target')
+    parser.add_argument('--baseline', type=str,
+                        help='previous report to compare with')
+    parser.add_argument('--output', type=str,
+                        help='file where the JSON report is written '
+                        '(default: standard output)')
+    return parser.parse_args()
+
+
+def main() -> Optional[int]:
+    args = get_args()
+    ignored = frozenset(interpreter_modules())
+    report = {'python': sys.version.split()[0], 'repeat': args.repeat,
+              'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'targets': {target: measure(target, args.repeat, ignored=ignored)
+                          for target in args.target or targets()}}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            report['regressions'] = find_regressions(report, json.load(file))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    return 1 if report.get('regressions') else None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
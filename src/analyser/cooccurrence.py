@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import heapq
+from typing import TYPE_CHECKING, Iterable
+
+from src.utils.constants import (CLOUD_PLATFORMS, DATABASES, LANGUAGES, LIBRARIES,
+                                 OPERATING_SYSTEMS, TOOLS, WEB_FRAMEWORKS)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# attributes whose co-occurrences are counted, in a fixed order: the
+# constants are built from sets, whose order changes between runs
+ATTRIBUTES: tuple[str, ...] = tuple(sorted({
+    *CLOUD_PLATFORMS, *DATABASES, *LANGUAGES, *LIBRARIES, *OPERATING_SYSTEMS,
+    *TOOLS, *WEB_FRAMEWORKS}))
+
+
+def presence_matrix(jobs: list[Iterable[str]],
+                    attributes: tuple[str, ...] = ATTRIBUTES) -> np.ndarray:
+    """
+    Returns the presence vectors of a batch of jobs as the rows of a
+    matrix: `matrix[i, j]` is 1 if job `i` mentions `attributes[j]`.
+
+    Args:
+        jobs (list[Iterable[str]]): Attributes mentioned by each job.
+        Attributes not in `attributes` are ignored.
+    """
+    # ? imported here so that commands which do not analyse jobs do not
+    # ? load numpy
+    import numpy as np
+
+    index = {attribute: i for i, attribute in enumerate(attributes)}
+    matrix = np.zeros((len(jobs), len(attributes)), dtype=np.int64)
+    for row, mentioned in enumerate(jobs):
+        columns = [index[attribute] for attribute in mentioned if attribute in index]
+        matrix[row, columns] = 1
+    return matrix
+
+
+def count_cooccurrences(jobs: list[Iterable[str]],
+                        attributes: tuple[str, ...] = ATTRIBUTES) -> dict:
+    """
+    Counts, for each pair of attributes, the jobs of a batch mentioning
+    both: the sum of the outer products of the presence vectors of the
+    jobs. The diagonal counts the jobs mentioning each attribute.
+
+    Returns:
+        dict: Encoded matrix (see `encode_matrix`)
+    """
+    presence = presence_matrix(jobs, attributes)
+    # ? P.T @ P is the sum over jobs of outer(p, p), computed at once
+    return encode_matrix(presence.T @ presence, attributes)
+
+
+def encode_matrix(matrix: np.ndarray, attributes: tuple[str, ...]) -> dict:
+    """
+    Encodes a symmetric count matrix by its upper triangle, without zeros.
+
+    Returns:
+        dict: `attributes` (names of rows and columns), and `rows`, `cols`
+        and `counts` of the non-zero cells with `row <= col`
+    """
+    import numpy as np
+
+    rows, cols = np.nonzero(np.triu(matrix))
+    return {'attributes': list(attributes), 'rows': rows.tolist(),
+            'cols': cols.tolist(), 'counts': matrix[rows, cols].tolist()}
+
+
+def decode_matrix(encoded: dict, attributes: tuple[str, ...]) -> np.ndarray:
+    """
+    Returns the symmetric count matrix of `encoded`, with the rows and
+    columns of `attributes`, which must include those of `encoded`.
+    """
+    import numpy as np
+
+    matrix = np.zeros((len(attributes), len(attributes)), dtype=np.int64)
+    if not encoded:
+        return matrix
+    index = {attribute: i for i, attribute in enumerate(attributes)}
+    positions = [index[attribute] for attribute in encoded['attributes']]
+    for row, col, count in zip(encoded['rows'], encoded['cols'], encoded['counts']):
+        i, j = sorted((positions[row], positions[col]))
+        matrix[i, j] += count
+    return matrix + np.triu(matrix, 1).T
+
+
+def merge_cooccurrences(total: dict, increment: dict) -> dict:
+    """
+    Adds two encoded matrices. Their attributes may differ, for example
+    when a constant was added between two runs.
+
+    Returns:
+        dict: Encoded sum, over the attributes of both
+    """
+    attributes = tuple(sorted({*(total or {}).get('attributes', []),
+                               *(increment or {}).get('attributes', [])}))
+    return encode_matrix(decode_matrix(total, attributes)
+                         + decode_matrix(increment, attributes), attributes)
+
+
+def top_pairs(encoded: dict, k: int = 10) -> list[tuple[str, str, int]]:
+    """
+    Returns the `k` pairs of different attributes most often mentioned
+    together, most frequent first. Ties are ordered by name.
+
+    Returns:
+        list[tuple[str, str, int]]: Attributes, in name order, and count
+    """
+    if not encoded:
+        return []
+    attributes = encoded['attributes']
+    pairs = (tuple(sorted((attributes[row], attributes[col]))) + (count,)
+             for row, col, count in zip(encoded['rows'], encoded['cols'], encoded['counts'])
+             if row != col)
+    return heapq.nsmallest(k, pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))
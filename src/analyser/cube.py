@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+# value of the site or month of a job when it is not known
+UNKNOWN = 'unknown'
+
+# dimensions of a cell of the cube, besides its categories
+DIMENSIONS = ('site', 'month')
+
+# field of a cell counting its jobs
+JOBS_FIELD = 'jobs'
+
+
+def posting_month(date_posted: Any) -> str:
+    """
+    Returns the month a job was posted in, as `YYYY-MM`.
+
+    Args:
+        date_posted (datetime | str | None): Posting date, or its ISO
+        format as stored in JSON files
+
+    Returns:
+        str: Month, or `UNKNOWN`
+    """
+    if isinstance(date_posted, str):
+        try:
+            date_posted = datetime.fromisoformat(date_posted)
+        except ValueError:
+            return UNKNOWN
+    if not isinstance(date_posted, datetime):
+        return UNKNOWN
+    return f'{date_posted.year}-{date_posted.month:02d}'
+
+
+def job_site(job: dict) -> str:
+    """
+    Returns the website a saved job was scraped from: its `site` field, or
+    the host of its url for jobs saved before the field existed
+    (`www.myjob.mu` gives `myjobmu`).
+    """
+    if job.get('site'):
+        return job['site']
+    host = urlparse(job.get('url') or '').hostname or ''
+    host = host.removeprefix('www.').replace('.', '')
+    return host or UNKNOWN
+
+
+def cell_id(site: str, month: str) -> str:
+    # ? ids sort by site, then month, so that a site's cells are adjacent
+    return f'{site}_{month}'
+
+
+def add_to_cube(cube: dict[str, dict], site: str, month: str,
+                counts: dict[str, dict[str, int]]) -> None:
+    """
+    Adds one job to the cell of `site` and `month` of `cube`.
+
+    Args:
+        cube (dict[str, dict]): Cells by id. Each cell has its `site`,
+        `month`, number of `jobs`, and the occurrences of each attribute by
+        category, for example `{'lang_data': {'Python': 1}}`
+        counts (dict[str, dict[str, int]]): Occurrences of the attributes
+        of the job by category. Attributes which do not occur are left out.
+    """
+    cell = cube.setdefault(cell_id(site, month),
+                           {'site': site, 'month': month, JOBS_FIELD: 0})
+    cell[JOBS_FIELD] += 1
+    for category, attributes in counts.items():
+        totals = cell.setdefault(category, {})
+        for attribute, count in attributes.items():
+            if count:
+                totals[attribute] = totals.get(attribute, 0) + count
+
+
+def add_cell(target: dict, cell: dict) -> None:
+    """
+    Adds the jobs and occurrences of `cell` to those of `target`.
+    """
+    target[JOBS_FIELD] = target.get(JOBS_FIELD, 0) + cell.get(JOBS_FIELD, 0)
+    for category, attributes in cell.items():
+        if category in (*DIMENSIONS, JOBS_FIELD):
+            continue
+        totals = target.setdefault(category, {})
+        for attribute, count in attributes.items():
+            totals[attribute] = totals.get(attribute, 0) + count
+
+
+def merge_cubes(total: dict[str, dict], cube: dict[str, dict]) -> dict[str, dict]:
+    """
+    Adds the cells of `cube` to those of `total`, which is returned.
+    """
+    for key, cell in cube.items():
+        merged = total.setdefault(key, {'site': cell['site'], 'month': cell['month']})
+        add_cell(merged, cell)
+    return total
+
+
+def negate_cube(cube: dict[str, dict]) -> dict[str, dict]:
+    """
+    Returns the cells undoing those of `cube`, which is not modified.
+    """
+    negated = {}
+    for key, cell in cube.items():
+        negated[key] = {'site': cell['site'], 'month': cell['month']}
+        for field, value in cell.items():
+            if isinstance(value, dict):
+                negated[key][field] = {attribute: -count for attribute, count in value.items()}
+            elif field not in DIMENSIONS:
+                negated[key][field] = -value
+    return negated
+
+
+def rollup(cells: list[dict], by: tuple[str, ...] = ()) -> dict[tuple, dict]:
+    """
+    Sums cells of the cube over the dimensions not in `by`. For example,
+    `by=('month',)` gives the statistics of each month across sites, and
+    `by=()` the totals of every cell.
+
+    Args:
+        cells (list[dict]): Cells, such as the documents of the
+        `stats_cube` collection
+        by (tuple[str, ...]): Dimensions kept, among `DIMENSIONS`
+
+    Returns:
+        dict[tuple, dict]: Summed cells (without dimensions), by the values
+        of the dimensions kept
+    """
+    for dimension in by:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension {dimension}. Available: "
+                             f"{', '.join(DIMENSIONS)}")
+    groups: dict[tuple, dict] = {}
+    for cell in cells:
+        add_cell(groups.setdefault(tuple(cell[dimension] for dimension in by), {}), cell)
+    return groups
+
+
+def trend(cells: list[dict], category: str, attribute: str,
+          site: Optional[str] = None) -> dict[str, int]:
+    """
+    Returns the number of jobs mentioning `attribute` each month, on `site`
+    or on every site. For example `trend(cells, 'lang_data', 'Python',
+    'kariyernet')`.
+
+    Returns:
+        dict[str, int]: Jobs by month, in month order
+    """
+    by_month = rollup([cell for cell in cells if site is None or cell['site'] == site],
+                      ('month',))
+    return {month: group.get(category, {}).get(attribute, 0)
+            for (month,), group in sorted(by_month.items())}
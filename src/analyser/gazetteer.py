@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# (country, region, city). Regions are the areas of the choropleth maps:
+# districts of Mauritius and provinces of Turkey.
+Place = tuple[str, str, str]
+
+MAURITIUS = 'MU'
+TURKEY = 'TR'
+
+# towns of Mauritius, and other spellings, by district. Each district is
+# also a town of itself.
+MU_TOWNS: dict[str, dict[str, tuple[str, ...]]] = {
+    'Black River': {'Black River': ('Riviere Noire',),
+                    'Tamarin': (), 'Flic en Flac': ()},
+    'Flacq': {'Flacq': (), 'Centre de Flacq': ()},
+    'Grand Port': {'Grand Port': (), 'Mahebourg': ()},
+    'Moka': {'Moka': ()},
+    'Pamplemousses': {'Pamplemousses': (), 'Triolet': ()},
+    # ? myjob.mu writes "Plaine Wilhems"
+    'Plaines Wilhems': {'Plaines Wilhems': ('Plaine Wilhems',),
+                        'Beau Bassin-Rose Hill': ('Rose Hill', 'Beau Bassin'),
+                        'Quatre Bornes': (), 'Curepipe': (),
+                        'Vacoas-Phoenix': ('Vacoas', 'Phoenix')},
+    'Port Louis': {'Port Louis': ()},
+    'Riviere du Rempart': {'Riviere du Rempart': (), 'Goodlands': (),
+                           'Grand Baie': ()},
+    'Rodrigues': {'Rodrigues': ()},
+    'Savanne': {'Savanne': (), 'Souillac': ()},
+}
+
+# the 81 provinces of Turkey, and other spellings
+TR_PROVINCES: dict[str, tuple[str, ...]] = {
+    'Adana': (), 'Adıyaman': (), 'Afyonkarahisar': ('Afyon',), 'Ağrı': (),
+    'Aksaray': (), 'Amasya': (), 'Ankara': (), 'Antalya': (), 'Ardahan': (),
+    'Artvin': (), 'Aydın': (), 'Balıkesir': (), 'Bartın': (), 'Batman': (),
+    'Bayburt': (), 'Bilecik': (), 'Bingöl': (), 'Bitlis': (), 'Bolu': (),
+    'Burdur': (), 'Bursa': (), 'Çanakkale': (), 'Çankırı': (), 'Çorum': (),
+    'Denizli': (), 'Diyarbakır': (), 'Düzce': (), 'Edirne': (), 'Elazığ': (),
+    'Erzincan': (), 'Erzurum': (), 'Eskişehir': (), 'Gaziantep': ('Antep',),
+    'Giresun': (), 'Gümüşhane': (), 'Hakkari': (), 'Hatay': (), 'Iğdır': (),
+    'Isparta': (), 'İstanbul': (), 'İzmir': (), 'Kahramanmaraş': ('Maraş',),
+    'Karabük': (), 'Karaman': (), 'Kars': (), 'Kastamonu': (), 'Kayseri': (),
+    'Kilis': (), 'Kırıkkale': (), 'Kırklareli': (), 'Kırşehir': (),
+    'Kocaeli': (), 'Konya': (), 'Kütahya': (), 'Malatya': (), 'Manisa': (),
+    'Mardin': (), 'Mersin': ('İçel',), 'Muğla': (), 'Muş': (), 'Nevşehir': (),
+    'Niğde': (), 'Ordu': (), 'Osmaniye': (), 'Rize': (), 'Sakarya': (),
+    'Samsun': (), 'Siirt': (), 'Sinop': (), 'Sivas': (), 'Şanlıurfa': ('Urfa',),
+    'Şırnak': (), 'Tekirdağ': (), 'Tokat': (), 'Trabzon': (), 'Tunceli': (),
+    'Uşak': (), 'Van': (), 'Yalova': (), 'Yozgat': (), 'Zonguldak': (),
+}
+
+# districts of the provinces where most jobs are, by province
+TR_DISTRICTS: dict[str, tuple[str, ...]] = {
+    'İstanbul': (
+        'Adalar', 'Arnavutköy', 'Ataşehir', 'Avcılar', 'Bağcılar', 'Bahçelievler',
+        'Bakırköy', 'Başakşehir', 'Bayrampaşa', 'Beşiktaş', 'Beykoz', 'Beylikdüzü',
+        'Beyoğlu', 'Büyükçekmece', 'Çatalca', 'Çekmeköy', 'Esenler', 'Esenyurt',
+        'Eyüpsultan', 'Fatih', 'Gaziosmanpaşa', 'Güngören', 'Kadıköy', 'Kağıthane',
+        'Kartal', 'Küçükçekmece', 'Maltepe', 'Pendik', 'Sancaktepe', 'Sarıyer',
+        'Silivri', 'Sultanbeyli', 'Sultangazi', 'Şile', 'Şişli', 'Tuzla',
+        'Ümraniye', 'Üsküdar', 'Zeytinburnu'),
+    'Ankara': ('Altındağ', 'Çankaya', 'Etimesgut', 'Gölbaşı', 'Keçiören', 'Mamak',
+               'Pursaklar', 'Sincan', 'Yenimahalle'),
+    'İzmir': ('Balçova', 'Bayraklı', 'Bornova', 'Buca', 'Çiğli', 'Gaziemir',
+              'Karabağlar', 'Karşıyaka', 'Konak', 'Narlıdere', 'Urla'),
+    'Kocaeli': ('Çayırova', 'Darıca', 'Dilovası', 'Gebze', 'İzmit', 'Körfez'),
+    'Bursa': ('Nilüfer', 'Osmangazi', 'Yıldırım'),
+    'Antalya': ('Kepez', 'Konyaaltı', 'Muratpaşa'),
+}
+
+# other spellings of districts
+TR_DISTRICT_ALIASES: dict[str, tuple[str, ...]] = {'Eyüpsultan': ('Eyüp',)}
+
+# ? `İ` and `ı` have no accent to strip: `ı` stays `ı`
+DOTLESS_I = str.maketrans({'ı': 'i'})
+
+
+def normalise(name: str) -> tuple[str, ...]:
+    """
+    Returns the words of a place name, without case, accents or
+    punctuation: `İstanbul(Avr.)` gives `('istanbul', 'avr')`.
+    """
+    folded = unicodedata.normalize('NFKD', name.translate(DOTLESS_I).casefold())
+    ascii_name = ''.join(char for char in folded if not unicodedata.combining(char))
+    return tuple(re.findall(r'[a-z0-9]+', ascii_name))
+
+
+def build_index() -> dict[tuple[str, ...], Place]:
+    """
+    Returns the place named by each normalised name or alias.
+    """
+    index: dict[tuple[str, ...], Place] = {}
+    for district, towns in MU_TOWNS.items():
+        for town, aliases in towns.items():
+            for name in (town, *aliases):
+                index[normalise(name)] = (MAURITIUS, district, town)
+    for province, aliases in TR_PROVINCES.items():
+        for name in (province, *aliases):
+            index[normalise(name)] = (TURKEY, province, province)
+    for province, districts in TR_DISTRICTS.items():
+        for district in districts:
+            for name in (district, *TR_DISTRICT_ALIASES.get(district, ())):
+                index[normalise(name)] = (TURKEY, province, district)
+    return index
+
+
+# ? built once: looking up a location only hashes a few word tuples
+GAZETTEER = build_index()
+LONGEST_NAME = max(len(words) for words in GAZETTEER)
+
+
+@lru_cache(maxsize=4096)
+def canonical_places(location: str) -> tuple[Place, ...]:
+    """
+    Returns the places named in a location such as `Plaine Wilhems`,
+    `İstanbul(Avr.)` or `Kadıköy, İstanbul(Asya), Ankara`, in order. The
+    longest name matching at each word is kept, and a province is left
+    out when one of its districts is named.
+
+    ? Memoised: the same few locations are found in most jobs.
+
+    Returns:
+        tuple[Place, ...]: Places found. Empty if the location names no
+        place of the gazetteer, such as `Overseas`.
+    """
+    words = normalise(location)
+    found: list[Place] = []
+    start = 0
+    while start < len(words):
+        for end in range(min(len(words), start + LONGEST_NAME), start, -1):
+            place = GAZETTEER.get(words[start:end])
+            if place is not None:
+                if place not in found:
+                    found.append(place)
+                start = end
+                break
+        else:
+            start += 1
+    named = {(country, region) for country, region, city in found if city != region}
+    return tuple(place for place in found
+                 if place[2] != place[1] or place[:2] not in named)
@@ -1,10 +1,18 @@
+from src.analyser.gazetteer import canonical_places
+
+
 def location_count(location_list: list[str]) -> dict[str, int]:
     """
     Returns a dictionary where keys are locations and values are
     frequency.
 
+    Locations are named after the towns of the gazetteer (see
+    `canonical_places`): `İstanbul(Avr.)` is counted as `İstanbul`, and a
+    location naming several towns counts each of them.
+
     NOTE: Not all locations are district names. Some other possible values
-    of locations are: `Mauritius`, `Rodrigues`, `Overseas`.
+    of locations are: `Mauritius`, `Overseas`. Locations which are not in
+    the gazetteer are counted as they are.
 
     Args:
         location_list (list[str]): List of job locations
@@ -12,19 +20,33 @@ def location_count(location_list: list[str]) -> dict[str, int]:
     Returns:
         dict[str, int]: Dictionary
     """
-    # ? myjob.mu website has a consistent spelling of job locations so
-    # ? there is no need to check cases
     location_count = dict()
     for location in location_list:
         # remove special characters from location
         sanitized_location = location.replace('\r\n', '',).strip()
+        places = canonical_places(sanitized_location)
+        names = [city for _, _, city in places] or [sanitized_location]
         # update count
-        location_count[sanitized_location] = location_count.get(
-            sanitized_location, 0) + 1
-
-    # ? myjob.mu website incorrectly writes "Plaine Wilhems"
-    if "Plaine Wilhems" in location_count:
-        # Rename Plaine Wilhems to Plaines Wilhems
-        location_count['Plaines Wilhems'] = location_count.pop(
-            'Plaine Wilhems')
+        for name in names:
+            location_count[name] = location_count.get(name, 0) + 1
     return location_count
+
+
+def region_count(location_list: list[str]) -> dict[str, int]:
+    """
+    Returns the number of jobs in each region: districts of Mauritius and
+    provinces of Turkey, the areas of the choropleth maps. Jobs whose
+    location names no place of the gazetteer are left out.
+
+    Args:
+        location_list (list[str]): List of job locations
+
+    Returns:
+        dict[str, int]: Jobs by region
+    """
+    region_count = dict()
+    for location in location_list:
+        regions = {region for _, region, _ in canonical_places(location.strip())}
+        for region in regions:
+            region_count[region] = region_count.get(region, 0) + 1
+    return region_count
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import base64
+import math
+import random
+from typing import Optional
+
+import msgpack
+
+# items kept at the top level of a sketch: about 1.5% rank error
+DEFAULT_K = 200
+
+# ratio of the capacities of consecutive levels
+CAPACITY_DECAY = 2 / 3
+
+# quantiles served for each slice
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+# ? compactions keep the items of odd or even positions at random, which
+# ? makes the estimates unbiased
+RANDOM = random.Random()
+
+
+class KLLSketch:
+    """
+    Streaming quantile sketch (Karnin, Lang and Liberty). Items are kept in
+    levels: an item of level `h` stands for `2 ** h` items. When a level is
+    full, it is sorted and every other item is promoted to the next level.
+    Memory is O(k) whatever the number of items, and sketches are merged
+    by concatenating levels.
+    """
+
+    def __init__(self, k: int = DEFAULT_K,
+                 levels: Optional[list[list[float]]] = None) -> None:
+        self.k: int = k
+        self.levels: list[list[float]] = levels or [[]]
+        while self.size >= self.max_size:
+            self.compress()
+
+    @property
+    def size(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    @property
+    def max_size(self) -> int:
+        return sum(self.capacity(height) for height in range(len(self.levels)))
+
+    def capacity(self, height: int) -> int:
+        depth = len(self.levels) - height - 1
+        return int(math.ceil(CAPACITY_DECAY ** depth * self.k)) + 1
+
+    def count(self) -> int:
+        """
+        Returns the number of items added.
+        """
+        return sum(len(level) << height for height, level in enumerate(self.levels))
+
+    def add(self, item: float) -> None:
+        self.levels[0].append(item)
+        if self.size >= self.max_size:
+            self.compress()
+
+    def compress(self) -> None:
+        for height, level in enumerate(self.levels):
+            if len(level) >= self.capacity(height):
+                if height + 1 == len(self.levels):
+                    self.levels.append([])
+                level.sort()
+                # ? with an odd number of items, the last one stays, so that
+                # ? the weights of the sketch still add up
+                kept = level[-1:] if len(level) % 2 else []
+                paired = level[:len(level) - len(kept)]
+                self.levels[height + 1].extend(paired[RANDOM.randint(0, 1)::2])
+                self.levels[height] = kept
+                if self.size < self.max_size:
+                    break
+
+    def merge(self, other: KLLSketch) -> KLLSketch:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for height, level in enumerate(other.levels):
+            self.levels[height].extend(level)
+        while self.size >= self.max_size:
+            self.compress()
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the item whose rank is about `q` times the number of items,
+        or None if the sketch is empty.
+        """
+        weighted = sorted((item, 1 << height)
+                          for height, level in enumerate(self.levels) for item in level)
+        if not weighted:
+            return None
+        target = q * self.count()
+        rank = 0
+        for item, weight in weighted:
+            rank += weight
+            if rank >= target:
+                return item
+        return weighted[-1][0]
+
+    def to_dict(self) -> dict:
+        return {'k': self.k, 'levels': self.levels}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> KLLSketch:
+        return cls(data['k'], data['levels'])
+
+
+def pack_slices(slices: dict[str, KLLSketch]) -> str:
+    """
+    Serializes sketches by slice (location, technology...) with msgpack,
+    base64 encoded so that they can be saved in JSON like other increments.
+    """
+    data = msgpack.packb({name: sketch.to_dict() for name, sketch in slices.items()})
+    return base64.b64encode(data).decode('ascii')
+
+
+def unpack_slices(text: str | bytes) -> dict[str, KLLSketch]:
+    data = base64.b64decode(text) if isinstance(text, str) else text
+    return {name: KLLSketch.from_dict(sketch)
+            for name, sketch in msgpack.unpackb(data).items()}
+
+
+def decode_slices(text: str) -> bytes:
+    return base64.b64decode(text)
+
+
+def merge_slices(total: dict[str, str], increment: dict[str, str]) -> dict[str, str]:
+    """
+    Merges packed slices by document id, such as those of `analyse_jobs`
+    for a batch of jobs into those of previous batches.
+    """
+    for doc_id, text in increment.items():
+        slices = unpack_slices(total[doc_id]) if doc_id in total else {}
+        for name, sketch in unpack_slices(text).items():
+            slices[name] = slices[name].merge(sketch) if name in slices else sketch
+        total[doc_id] = pack_slices(slices)
+    return total
+
+
+def summarise(sketch: KLLSketch, quantiles: tuple[float, ...] = DEFAULT_QUANTILES) -> dict:
+    """
+    Returns the quantiles of a sketch, as `p25`, `p50`..., and its number
+    of items as `count`.
+    """
+    summary = {f'p{round(q * 100)}': sketch.quantile(q) for q in quantiles}
+    summary['count'] = sketch.count()
+    return summary
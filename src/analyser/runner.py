@@ -1,12 +1,16 @@
-from typing import Callable
+from typing import Callable, Optional
 from src.analyser.cloudplatforms import cp_check
+from src.analyser.cooccurrence import count_cooccurrences, merge_cooccurrences
+from src.analyser.cube import add_to_cube, merge_cubes, negate_cube
+from src.analyser.sketches import merge_sketches, negate_sketches, sketch_jobs
 from src.analyser.database import db_check
 from src.analyser.language import language_check
 from src.analyser.libraries import libraries_check
-from src.analyser.location import location_count
+from src.analyser.location import location_count, region_count
 from src.analyser.os import os_check
 from src.analyser.tools import tools_check
-from src.analyser.salary import salary_count
+from src.analyser.quantiles import merge_slices
+from src.analyser.salary import salary_count, salary_slices
 from src.analyser.word_frequency import job_title_words
 from src.analyser.webframework import web_framework_check
 from src.utils.dictionary import merge_dicts, boolean_to_int
@@ -45,54 +49,177 @@ def count_occurences(
     return count
 
 
+# categories counted by checking each job description, with the
+# attributes checked and the checker of each category
+CHECKED_CATEGORIES: dict[str, tuple[list[str], Callable[[str], dict[str, bool]]]] = {
+    'cloud_data_ref': (CLOUD_PLATFORMS, cp_check),
+    'db_data_ref': (DATABASES, db_check),
+    'lang_data_ref': (LANGUAGES, language_check),
+    'lib_data_ref': (LIBRARIES, libraries_check),
+    'os_data_ref': (OPERATING_SYSTEMS, os_check),
+    'tools_data_ref': (TOOLS, tools_check),
+    'web_data_ref': (WEB_FRAMEWORKS, web_framework_check),
+}
+
+# names of increments of `analyse_jobs` which are not added like counts:
+# the cells of the cube, the co-occurrence matrix, the sketches and the
+# salary quantiles
+CUBE = 'cube_collection_ref'
+COOCCURRENCE = 'cooccurrence_data_ref'
+SKETCHES = 'sketches_collection_ref'
+SALARIES = 'salary_quantiles_collection_ref'
+
+
+def analyse_jobs(job_title_list: list[str],
+                 job_desc_list: list[str],
+                 location_list: list[str],
+                 salary_list: list[str],
+                 site_list: Optional[list[str]] = None,
+                 month_list: Optional[list[str]] = None,
+                 company_list: Optional[list[str]] = None) -> dict[str, dict]:
+    """
+    Analyses jobs without saving anything. Each job description is
+    checked once.
+
+    Args:
+        job_title_list (list[str]): Title of each job
+        job_desc_list (list[str]): Description of each job
+        location_list (list[str]): Location of each job
+        salary_list (list[str]): Salary of each job
+        site_list (list[str], optional): Website of each job. With
+        `month_list`, jobs are added to the cells of the cube (see
+        `src.analyser.cube`) and their salaries to quantile sketches by
+        location and technology (see `salary_slices`).
+        month_list (list[str], optional): Posting month of each job
+        company_list (list[str], optional): Company of each job, sketched
+        by cell with titles and locations (see `src.analyser.sketches`)
+
+    Returns:
+        dict[str, dict]: Increment of each statistics document, by name of
+        the `Database` attribute referencing the document. The increment of
+        the co-occurrence matrix is encoded (see `cooccurrence`). If sites
+        and months are given, also the cells of the cube under `CUBE`, of
+        the sketches under `SKETCHES` and the salary quantiles under
+        `SALARIES`.
+    """
+    increments: dict[str, dict] = {'job_title_data_ref': job_title_words(job_title_list)}
+    for name, (attribute_list, _) in CHECKED_CATEGORIES.items():
+        increments[name] = {attribute: 0 for attribute in attribute_list}
+
+    cube: dict[str, dict] = {}
+    mentioned: list[list[str]] = []
+    for i, job_detail in enumerate(job_desc_list):
+        counts = {}
+        for name, (_, attribute_checker) in CHECKED_CATEGORIES.items():
+            counts[name] = boolean_to_int(attribute_checker(job_detail))
+            increments[name] = merge_dicts(increments[name], dict(counts[name]))
+        mentioned.append([attribute for category in counts.values()
+                          for attribute, count in category.items() if count])
+        if site_list is not None and month_list is not None:
+            counts['loc_data_ref'] = location_count(location_list[i:i + 1])
+            counts['loc_region_data_ref'] = region_count(location_list[i:i + 1])
+            add_to_cube(cube, site_list[i], month_list[i],
+                        {cube_category(name): count for name, count in counts.items()})
+
+    increments['loc_data_ref'] = location_count(location_list)
+    increments['loc_region_data_ref'] = region_count(location_list)
+    increments['salary_data_ref'] = salary_count(salary_list)
+    increments[COOCCURRENCE] = count_cooccurrences(mentioned)
+    if site_list is not None and month_list is not None:
+        increments[CUBE] = cube
+        values = {'job_title': job_title_list, 'location': location_list}
+        if company_list is not None:
+            values['company'] = company_list
+        increments[SKETCHES] = sketch_jobs(site_list, month_list, values)
+        increments[SALARIES] = salary_slices(salary_list, site_list,
+                                             location_list, mentioned)
+    return increments
+
+
+def cube_category(name: str) -> str:
+    # ? cells name categories like statistics documents: `lang_data`
+    return name.removesuffix('_ref')
+
+
+def merge_increments(total: dict[str, dict],
+                     increments: dict[str, dict]) -> dict[str, dict]:
+    """
+    Adds the increments returned by `analyse_jobs` for a batch of jobs to
+    those of previous batches.
+    """
+    for name, increment in increments.items():
+        if name == CUBE:
+            total[name] = merge_cubes(total.get(name, {}), increment)
+        elif name == COOCCURRENCE:
+            total[name] = merge_cooccurrences(total.get(name, {}), increment)
+        elif name == SKETCHES:
+            total[name] = merge_sketches(total.get(name, {}), increment)
+        elif name == SALARIES:
+            total[name] = merge_slices(total.get(name, {}), increment)
+        else:
+            total[name] = merge_dicts(total.get(name, {}), increment)
+    return total
+
+
+def negate_increments(increments: dict[str, dict]) -> dict[str, dict]:
+    """
+    Returns the increments undoing those returned by `analyse_jobs`.
+
+    Raises:
+        ValueError: `increments` has salary quantiles, which cannot be
+        subtracted (see `stats_events.revert_run`)
+    """
+    if increments.get(SALARIES):
+        raise ValueError("Salary quantiles cannot be subtracted")
+    negated: dict[str, dict] = {}
+    for name, increment in increments.items():
+        if name == SALARIES:
+            continue
+        if name == CUBE:
+            negated[name] = negate_cube(increment)
+        elif name == COOCCURRENCE:
+            negated[name] = {**increment, 'counts': [-count for count in increment['counts']]}
+        elif name == SKETCHES:
+            negated[name] = negate_sketches(increment)
+        else:
+            negated[name] = {key: -value for key, value in increment.items()}
+    return negated
+
+
+def save_increment(main_db: Database, name: str, increment: dict) -> None:
+    """
+    Adds an increment returned by `analyse_jobs` to the statistics
+    document, or to the cells of the cube, it belongs to.
+    """
+    if name == CUBE:
+        main_db.update_cube(increment)
+    elif name == COOCCURRENCE:
+        main_db.update_cooccurrence(increment)
+    elif name == SKETCHES:
+        main_db.update_sketches(increment)
+    elif name == SALARIES:
+        main_db.update_salary_quantiles(increment)
+    else:
+        main_db.update_stats(increment, getattr(main_db, name))
+
+
+def save_analytics(main_db: Database,
+                   increments: dict[str, dict]) -> None:
+    """
+    Adds increments returned by `analyse_jobs` to the statistics documents.
+    """
+    for name, increment in increments.items():
+        save_increment(main_db, name, increment)
+
+
 def update_analytics(main_db: Database,
                      job_title_list: list[str],
                      job_desc_list: list[str],
                      location_list: list[str],
-                     salary_list: list[str]) -> None:
-
-    # analyse job_title_list
-    increment = job_title_words(job_title_list)
-    main_db.update_stats(
-        increment, main_db.job_title_data_ref)
-
-    # analyse cp
-    increment = count_occurences(job_desc_list, CLOUD_PLATFORMS, cp_check)
-    main_db.update_stats(
-        increment, main_db.cloud_data_ref)
-
-    # analyse database
-    increment = count_occurences(job_desc_list, DATABASES, db_check)
-    main_db.update_stats(increment, main_db.db_data_ref)
-
-    # analyse language
-    increment = count_occurences(job_desc_list, LANGUAGES, language_check)
-    main_db.update_stats(increment,
-                         main_db.lang_data_ref)
-
-    # analyse libraries
-    increment = count_occurences(job_desc_list, LIBRARIES, libraries_check)
-    main_db.update_stats(increment, main_db.lib_data_ref)
-
-    # analyse location
-    increment = location_count(location_list)
-    main_db.update_stats(increment, main_db.loc_data_ref)
-
-    # analyse os
-    increment = count_occurences(job_desc_list, OPERATING_SYSTEMS, os_check)
-    main_db.update_stats(increment, main_db.os_data_ref)
-
-    # analyse salary
-    increment = salary_count(salary_list)
-    main_db.update_stats(
-        increment, main_db.salary_data_ref)
-
-    # analyse tools
-    increment = count_occurences(job_desc_list, TOOLS, tools_check)
-    main_db.update_stats(
-        increment, main_db.tools_data_ref)
-
-    # analyse web frameworks
-    increment = count_occurences(
-        job_desc_list, WEB_FRAMEWORKS, web_framework_check)
-    main_db.update_stats(increment, main_db.web_data_ref)
+                     salary_list: list[str],
+                     site_list: Optional[list[str]] = None,
+                     month_list: Optional[list[str]] = None,
+                     company_list: Optional[list[str]] = None) -> None:
+    save_analytics(main_db, analyse_jobs(job_title_list, job_desc_list,
+                                         location_list, salary_list,
+                                         site_list, month_list, company_list))
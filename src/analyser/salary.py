@@ -1,3 +1,13 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+from src.analyser.location import location_count
+from src.analyser.quantiles import KLLSketch, pack_slices, summarise, unpack_slices
+
+
 def salary_count(salary_list: list[str]) -> dict[str, int]:
     """
     Count the number of times each salary occur in list
@@ -21,3 +31,117 @@ def salary_count(salary_list: list[str]) -> dict[str, int]:
         salary_count[sanitized_location] = salary_count.get(
             sanitized_location, 0) + 1
     return salary_count
+
+
+# currency of salaries which do not name one, by website
+SITE_CURRENCIES = {'myjobmu': 'MUR', 'kariyernet': 'TRY'}
+
+# currency codes, by symbol or abbreviation found in salaries
+CURRENCY_SYMBOLS = {'rs': 'MUR', 'mur': 'MUR', 'tl': 'TRY', 'try': 'TRY', '₺': 'TRY',
+                    '$': 'USD', 'usd': 'USD', '€': 'EUR', 'eur': 'EUR',
+                    '£': 'GBP', 'gbp': 'GBP'}
+
+# salaries which are not amounts
+NO_SALARY = ('unknown', 'negotiable', 'see description', 'competitive')
+
+CURRENCY_PATTERN = re.compile(r'(?<![a-z])(?:rs|mur|tl|try|usd|eur|gbp)(?![a-z])|[₺$€£]')
+AMOUNT_PATTERN = re.compile(r'(\d{1,3}(?:[.,\s]\d{3})+|\d+(?:[.,]\d+)?)\s*(k\b)?')
+
+# (lowest, highest, currency). Open ranges have no lowest or highest value.
+ParsedSalary = tuple[Optional[float], Optional[float], str]
+
+
+def parse_amount(number: str) -> float:
+    # ? `10,000` and `15.000` are thousands, `2.5` is not
+    if re.fullmatch(r'\d{1,3}(?:[.,\s]\d{3})+', number):
+        return float(re.sub(r'[.,\s]', '', number))
+    return float(number.replace(',', '.'))
+
+
+@lru_cache(maxsize=4096)
+def parse_salary(salary: str, default_currency: Optional[str] = None) -> Optional[ParsedSalary]:
+    """
+    Parses a salary such as `10,000 - 20,000`, `Less Than 10,000`,
+    `15.000 TL - 20.000 TL` or `Rs 25k`.
+
+    ? Memoised: the same few salaries are found in most jobs.
+
+    Args:
+        salary (str): Salary of a job
+        default_currency (str, optional): Currency when the salary does not
+        name one, e.g. that of the website (see `SITE_CURRENCIES`)
+
+    Returns:
+        ParsedSalary: Lowest and highest amounts, and currency. None if
+        the salary has no amount or no currency.
+    """
+    text = ' '.join(salary.split()).lower()
+    if not text or text.startswith(NO_SALARY):
+        return None
+
+    symbol = CURRENCY_PATTERN.search(text)
+    currency = CURRENCY_SYMBOLS[symbol.group()] if symbol else default_currency
+    amounts = [parse_amount(number) * (1000 if thousands else 1)
+               for number, thousands in AMOUNT_PATTERN.findall(text)]
+    if currency is None or not amounts:
+        return None
+
+    if text.startswith(('less than', 'up to', 'below')):
+        return None, amounts[0], currency
+    if text.startswith(('more than', 'above', 'over', 'from')) or text.endswith('+'):
+        return amounts[0], None, currency
+    return min(amounts[:2]), max(amounts[:2]), currency
+
+
+def salary_value(parsed: ParsedSalary) -> float:
+    """
+    Returns the amount representing a salary: the middle of its range, or
+    the bound of an open range.
+    """
+    low, high, _ = parsed
+    if low is None or high is None:
+        return low if high is None else high
+    return (low + high) / 2
+
+
+def salary_slices(salary_list: list[str], site_list: list[str],
+                  location_list: list[str], mentioned: list[list[str]]) -> dict[str, str]:
+    """
+    Adds the salary of each job (see `salary_value`) to the quantile
+    sketches of its location and of each technology it mentions, by
+    currency. Jobs without a parsed salary are left out.
+
+    Args:
+        mentioned (list[list[str]]): Attributes mentioned by each job
+
+    Returns:
+        dict[str, str]: Packed slices (see `quantiles.pack_slices`) by
+        document id, such as `location_MUR` or `technology_TRY`
+    """
+    docs: dict[str, dict[str, KLLSketch]] = {}
+    for salary, site, location, attributes in zip(salary_list, site_list,
+                                                  location_list, mentioned):
+        parsed = parse_salary(salary, SITE_CURRENCIES.get(site))
+        if parsed is None:
+            continue
+        value = salary_value(parsed)
+        currency = parsed[2]
+        # ? locations are named like in `location_count`
+        slices = {('location', name): None for name in location_count([location])}
+        slices.update({('technology', attribute): None for attribute in attributes})
+        for kind, name in slices:
+            sketches = docs.setdefault(salary_doc_id(kind, currency), {})
+            sketches.setdefault(name, KLLSketch()).add(value)
+    return {doc_id: pack_slices(sketches) for doc_id, sketches in docs.items()}
+
+
+def salary_doc_id(kind: str, currency: str) -> str:
+    return f'{kind}_{currency}'
+
+
+def salary_quantiles(packed: bytes | str) -> dict[str, dict]:
+    """
+    Returns the p25, p50 and p75 salaries, and number of salaries, of
+    each slice of a document of the salary quantiles collection.
+    """
+    return {name: summarise(sketch) for name, sketch in unpack_slices(packed).items()}
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import math
+from typing import Iterable, Optional
+
+import msgpack
+
+from src.analyser.cube import cell_id
+
+# fields of jobs sketched
+SKETCHED_FIELDS = ('company', 'job_title', 'location')
+
+# values which do not name a company, title or location
+IGNORED_VALUES = {'', 'unknown'}
+
+# 2^11 registers of one byte: 2 KB, and a standard error of 2.3%
+DEFAULT_PRECISION = 11
+
+# 4 rows of 256 counters: estimates exceed true counts by at most 1% of
+# the values added, with a probability of 98%
+DEFAULT_WIDTH = 256
+DEFAULT_DEPTH = 4
+
+# version of the serialized layout
+SKETCH_FORMAT = 1
+
+
+def normalise(value: str) -> str:
+    return ' '.join(value.split()).casefold()
+
+
+def hash_pair(value: str) -> tuple[int, int]:
+    """
+    Returns two independent 64 bit hashes of `value`, stable across runs
+    and machines unlike `hash`.
+    """
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added, in `2 ** precision`
+    bytes whatever that number. Sketches of different runs or sites are
+    merged by keeping the largest register.
+
+    ! Values cannot be removed: adding a value twice does not change the
+    ! sketch, but a value cannot be forgotten either.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION,
+                 registers: Optional[bytes] = None) -> None:
+        self.precision: int = precision
+        self.registers: bytearray = bytearray(registers or bytes(1 << precision))
+
+    def add(self, value: str) -> None:
+        hashed, _ = hash_pair(value)
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        # position of the leftmost 1 bit of the remaining bits
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches of precision {self.precision} "
+                             f"and {other.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # ? few values: counting empty registers is more accurate
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def to_dict(self) -> dict:
+        return {'p': self.precision, 'registers': bytes(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> HyperLogLog:
+        return cls(data['p'], data['registers'])
+
+
+class CountMinSketch:
+    """
+    Estimates how many times each value was added, never below the true
+    count, in `width * depth` counters whatever the number of values.
+    Sketches are merged, or a run subtracted, by adding counters.
+    """
+
+    def __init__(self, width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH,
+                 counters: Optional[list[list[int]]] = None) -> None:
+        self.width: int = width
+        self.depth: int = depth
+        self.counters: list[list[int]] = counters or [[0] * width for _ in range(depth)]
+
+    def columns(self, value: str) -> list[int]:
+        # ? the hashes of each row are derived from two hashes
+        # ? (Kirsch and Mitzenmacher)
+        first, second = hash_pair(value)
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+    def add(self, value: str, count: int = 1) -> None:
+        for row, column in enumerate(self.columns(value)):
+            self.counters[row][column] += count
+
+    def estimate(self, value: str) -> int:
+        return min(self.counters[row][column]
+                   for row, column in enumerate(self.columns(value)))
+
+    def merge(self, other: CountMinSketch) -> CountMinSketch:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge sketches of different sizes")
+        self.counters = [[a + b for a, b in zip(mine, theirs)]
+                         for mine, theirs in zip(self.counters, other.counters)]
+        return self
+
+    def negate(self) -> CountMinSketch:
+        return CountMinSketch(self.width, self.depth,
+                              [[-count for count in row] for row in self.counters])
+
+    def to_dict(self) -> dict:
+        return {'w': self.width, 'd': self.depth, 'counters': self.counters}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> CountMinSketch:
+        return cls(data['w'], data['d'], data['counters'])
+
+
+class FieldSketches:
+    """
+    Sketches of the values of one field of jobs: distinct values and
+    frequency of each value.
+    """
+
+    def __init__(self, distinct: Optional[HyperLogLog] = None,
+                 frequency: Optional[CountMinSketch] = None) -> None:
+        self.distinct: HyperLogLog = distinct or HyperLogLog()
+        self.frequency: CountMinSketch = frequency or CountMinSketch()
+
+    def add(self, value: Optional[str]) -> None:
+        value = normalise(value or '')
+        if value in IGNORED_VALUES:
+            return
+        self.distinct.add(value)
+        self.frequency.add(value)
+
+    def merge(self, other: FieldSketches) -> FieldSketches:
+        self.distinct.merge(other.distinct)
+        self.frequency.merge(other.frequency)
+        return self
+
+    def to_dict(self) -> dict:
+        return {'hll': self.distinct.to_dict(), 'cms': self.frequency.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> FieldSketches:
+        return cls(HyperLogLog.from_dict(data['hll']), CountMinSketch.from_dict(data['cms']))
+
+
+def pack_cell(site: str, month: str, fields: dict[str, FieldSketches]) -> bytes:
+    """
+    Serializes the sketches of a cell (site and month, see `cube`) with
+    msgpack.
+    """
+    return msgpack.packb({'format': SKETCH_FORMAT, 'site': site, 'month': month,
+                          'fields': {name: sketches.to_dict()
+                                     for name, sketches in fields.items()}})
+
+
+def unpack_cell(data: bytes) -> tuple[str, str, dict[str, FieldSketches]]:
+    cell = msgpack.unpackb(data)
+    return cell['site'], cell['month'], {name: FieldSketches.from_dict(sketches)
+                                         for name, sketches in cell['fields'].items()}
+
+
+def sketch_jobs(site_list: list[str], month_list: list[str],
+                values: dict[str, list[str]]) -> dict[str, str]:
+    """
+    Sketches the values of each field of a batch of jobs, by site and
+    month.
+
+    Args:
+        values (dict[str, list[str]]): Value of each job, by field
+
+    Returns:
+        dict[str, str]: Cells by id, packed and base64 encoded so that
+        they can be saved in JSON like other increments
+    """
+    cells: dict[str, tuple[str, str, dict[str, FieldSketches]]] = {}
+    for i, (site, month) in enumerate(zip(site_list, month_list)):
+        _, _, fields = cells.setdefault(cell_id(site, month), (site, month, {}))
+        for name, field_values in values.items():
+            fields.setdefault(name, FieldSketches()).add(field_values[i])
+    return {key: encode_cell(pack_cell(*cell)) for key, cell in cells.items()}
+
+
+def encode_cell(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_cell(text: str) -> bytes:
+    return base64.b64decode(text)
+
+
+def merge_packed(first: Optional[bytes], second: bytes) -> bytes:
+    """
+    Merges two packed cells of the same site and month.
+    """
+    if not first:
+        return second
+    site, month, fields = unpack_cell(first)
+    for name, sketches in unpack_cell(second)[2].items():
+        if name in fields:
+            fields[name].merge(sketches)
+        else:
+            fields[name] = sketches
+    return pack_cell(site, month, fields)
+
+
+def merge_sketches(total: dict[str, str], increment: dict[str, str]) -> dict[str, str]:
+    """
+    Adds the cells returned by `sketch_jobs` for a batch of jobs to those
+    of previous batches.
+    """
+    for key, text in increment.items():
+        previous = total.get(key)
+        total[key] = encode_cell(merge_packed(decode_cell(previous) if previous else None,
+                                              decode_cell(text)))
+    return total
+
+
+def negate_sketches(increment: dict[str, str]) -> dict[str, str]:
+    """
+    Returns cells subtracting the frequencies of `increment`. Distinct
+    counts cannot be subtracted, and are left unchanged.
+    """
+    negated = {}
+    for key, text in increment.items():
+        site, month, fields = unpack_cell(decode_cell(text))
+        negated[key] = encode_cell(pack_cell(site, month, {
+            name: FieldSketches(HyperLogLog(), sketches.frequency.negate())
+            for name, sketches in fields.items()}))
+    return negated
+
+
+def combine(cells: Iterable[bytes], field: str, site: Optional[str] = None,
+            month: Optional[str] = None) -> FieldSketches:
+    """
+    Merges the sketches of `field` of the packed cells of `site` and
+    `month`, or of every site or month when None.
+    """
+    combined = FieldSketches()
+    for data in cells:
+        cell_site, cell_month, fields = unpack_cell(data)
+        if site not in (None, cell_site) or month not in (None, cell_month):
+            continue
+        if field in fields:
+            combined.merge(fields[field])
+    return combined
+
+
+def distinct_count(cells: Iterable[bytes], field: str, site: Optional[str] = None,
+                   month: Optional[str] = None) -> int:
+    """
+    Estimates the number of distinct values of `field`, for example the
+    companies hiring in a month on every site.
+    """
+    return combine(cells, field, site, month).distinct.count()
+
+
+def frequency(cells: Iterable[bytes], field: str, value: str,
+              site: Optional[str] = None, month: Optional[str] = None) -> int:
+    """
+    Estimates the number of jobs whose `field` is `value`.
+    """
+    return combine(cells, field, site, month).frequency.estimate(normalise(value))
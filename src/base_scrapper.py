@@ -1,23 +1,137 @@
+import importlib
 import json
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional
 
 import requests
 from requests import Session, Response
 
+from src.classes.archive import Archive
+from src.hedging import HedgeBudget
 from src.logger import setup_logger
+from src.rate_limiter import RateLimiter, host_options_from_env, parse_retry_after
+from src.resilience import (RETRY_STATUS_CODES, CircuitBreakers,
+                            CircuitOpenError, RequestFailedError, RetryPolicy)
 
 logger = setup_logger()
 
 
+def close_response(future: Future) -> None:
+    """
+    Releases the connection of an abandoned request once it completes.
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def start_thread(function, *args, **kwargs) -> Future:
+    """
+    Calls `function` in a new thread, outside of any pool.
+
+    :return: future of the result of the call
+    """
+    future: Future = Future()
+
+    def target() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+# scraper classes by website name. Filled by BaseScraper subclasses which
+# define `site`.
+SCRAPERS: dict = {}
+
+
+def get_scraper_class(website: str) -> type:
+    """
+    Returns the scraper class registered for `website`.
+
+    The module of a website is imported, which registers its scraper, the
+    first time the website is asked for, so that a run only imports the
+    scrapers (and their dependencies, such as selenium) it uses.
+
+    :raises ValueError: no scraper registered under this name
+    """
+    from src.scrappers import SCRAPER_MODULES
+
+    if website not in SCRAPERS and website in SCRAPER_MODULES:
+        importlib.import_module(SCRAPER_MODULES[website])
+
+    if website not in SCRAPERS:
+        available = sorted(set(SCRAPERS) | set(SCRAPER_MODULES))
+        raise ValueError(f"Unknown website {website}. "
+                         f"Available: {', '.join(available)}")
+    return SCRAPERS[website]
+
+
 class BaseScraper(ABC):
     """
     Abstract base class for all scraper classes.
+
+    Subclasses register themselves under the name given by their `site`
+    attribute. `id_field` is the job field identifying a job on that
+    website.
     """
 
-    def __init__(self, proxy_manager):
+    site: str = ''
+    id_field: str = 'url'
+
+    # when True, the listing pass only saves skeleton jobs and their
+    # details are fetched later by `enrich`. Ignored by scrapers which do
+    # not override `enrich`.
+    defer_details: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.site:
+            SCRAPERS[cls.site] = cls
+
+    def __init__(self, proxy_manager, rate_limiter: Optional[RateLimiter] = None):
         super().__init__()
         self.proxy_manager = proxy_manager
 
+        # every request made through http_get and http_post is paced
+        # by this limiter
+        self.rate_limiter: RateLimiter = rate_limiter or RateLimiter(**host_options_from_env())
+
+        # failed requests are retried according to this policy and hosts
+        # which keep failing are skipped until they recover
+        self.retry_policy: RetryPolicy = RetryPolicy()
+        self.circuit_breakers: CircuitBreakers = CircuitBreakers()
+
+        # hedging of slow GET requests is off unless enable_hedging is called
+        self.hedge_budget: Optional[HedgeBudget] = None
+        self.hedge_percentile: float = 0.9
+        self.hedge_executor: Optional[ThreadPoolExecutor] = None
+
+        # raw responses are only archived when an archive is set
+        self.archive: Optional[Archive] = None
+
+    def enable_hedging(self, ratio: float = 0.05, percentile: float = 0.9, max_workers: int = 8) -> None:
+        """
+        Turns on hedged GET requests: when a response takes longer than the
+        given latency percentile of its host, a duplicate request is sent
+        through another proxy and the first successful response wins.
+
+        :param ratio: maximum fraction of requests which are duplicated
+        :param percentile: latency percentile after which a request is hedged
+        :param max_workers: maximum number of hedges in flight
+        """
+        self.hedge_budget = HedgeBudget(ratio)
+        self.hedge_percentile = percentile
+        self.hedge_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                 thread_name_prefix='hedge')
+
     @abstractmethod
     def scrape(self):
         """
@@ -28,27 +142,267 @@ class BaseScraper(ABC):
         """
         pass
 
-    def http_get(self, session, url, proxied=False):
-        if proxied is True:
-            proxy = self.proxy_manager.get_proxy()
+    def enrich(self, job: dict) -> dict:
+        """
+        Fetches the details of a skeleton job saved by a listing pass.
+        Only scrapers which support `defer_details` override this method.
+
+        :return: The job dictionary with all fields set.
+        """
+        raise NotImplementedError(f"{self.site} does not defer job details")
+
+    def archive_response(self, kind: str, key: str, content: bytes) -> None:
+        """
+        Saves the raw content of a response to the archive, if any, so that
+        it can be parsed again later.
+
+        :param kind: type of response, such as `search` or `job`
+        :param key: identifies what was requested, such as a job id
+        :param content: raw body of response
+        """
+        if self.archive is not None:
+            self.archive.put(self.site, kind, key, content)
+
+    @classmethod
+    def jobs_from_archive(cls, archive, since=None, until=None):
+        """
+        Parses the raw responses saved in `archive` again, without sending
+        any request. Must be overridden by scrapers which archive their
+        responses.
+
+        :return: A list of jobs.
+        """
+        raise NotImplementedError(f"{cls.site} cannot parse archived responses")
+
+    def backfill(self, workers: int = 4):
+        """
+        Crawls the whole website, for example to seed a new database.
+        Scrapers which cannot split their search space into independent
+        partitions crawl it sequentially, ignoring `workers`.
+
+        :return: A list of the scraped jobs.
+        """
+        return self.scrape()
+
+    def send(self, session: Session, method: str, url: str, proxy: Optional[str] = None,
+             hedge: bool = False, **kwargs) -> Response:
+        """
+        Sends a request once the rate limiter allows it and reports the
+        outcome back to the rate limiter.
+
+        :param session:
+        :param method: HTTP method
+        :param url:
+        :param proxy: proxy url. Request is sent directly if None.
+        :param hedge: True for the duplicate of a slow request. Hedges do
+            not wait for a concurrency slot.
+        :return: response
+        """
+        if proxy is not None:
+            kwargs['proxies'] = {"http": proxy, "https": proxy}
+
+        ticket = self.rate_limiter.acquire(url, ignore_concurrency=hedge)
+        start = time.monotonic()
+        status_code = None
+        retry_after = None
+        error = False
+        try:
+            response = session.request(method, url, **kwargs)
+            status_code = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            return response
+        except requests.exceptions.ProxyError:
+            # not a sign of congestion on the host
+            raise
+        except (requests.Timeout, requests.ConnectionError):
+            error = True
+            raise
+        finally:
+            latency = time.monotonic() - start
+            self.rate_limiter.release(url, ticket, latency,
+                                      status_code=status_code, error=error,
+                                      retry_after=retry_after)
+            logger.debug(f"{method} {url} -> {status_code} in {latency:.3f}s, "
+                         f"{self.rate_limiter.current_rate(url):.2f} req/s",
+                         extra={'latency': round(latency, 4)})
+
+    def request(self, session: Session, method: str, url: str, proxied: bool = False,
+                idempotent: bool = True, **kwargs) -> Response:
+        """
+        Sends a request, retrying failures with exponential backoff.
+
+        Each retry goes through a different proxy when `proxied` is True.
+        Timeouts, connection errors and 429/5xx responses are retried
+        only if the request is idempotent. Failures of the proxy itself
+        are always retried straight away since the request never reached
+        the host. Other 4xx responses are never retried.
+
+        :param session:
+        :param method: HTTP method
+        :param url:
+        :param proxied: send request through a proxy
+        :param idempotent: True if sending the request twice is safe
+        :raises RequestFailedError: request failed after all attempts or
+            circuit of host is open
+        :return: successful response
+        """
+        policy = self.retry_policy
+        breaker = self.circuit_breakers.for_host(url)
+        kwargs.setdefault('timeout', policy.timeout)
+        tried_proxies = []
+        error = None
+
+        for attempt in range(policy.max_attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(url, "circuit open")
+
+            proxy = None
+            if proxied:
+                proxy = self.proxy_manager.get_proxy(exclude=tried_proxies)
+                tried_proxies.append(proxy)
+
+            retry_after = 0.0
+            # the request never reached the host if the proxy failed
+            proxy_failed = False
+            start = time.monotonic()
             try:
-                if proxy is not None:
-                    proxies = {"http": proxy, "https": proxy}
-                    response = session.get(url, proxies=proxies)
+                if self.hedge_budget is not None and method == 'GET':
+                    response, proxy, start = self.send_hedged(session, method, url, proxy,
+                                                              tried_proxies, **kwargs)
                 else:
-                    response = session.get(url)
-
-                response.raise_for_status()
-                return response
-            except requests.RequestException as e:
-                if proxied:
-                    logger.error(f"Request failed using proxy {proxy}: {e}")
+                    response = self.send(session, method, url, proxy, **kwargs)
+            except requests.exceptions.ProxyError as e:
+                # a bad proxy says nothing about the health of the host
+                self.report_proxy(proxy, ok=False)
+                proxy_failed = True
+                error = RequestFailedError(url, f"proxy {proxy} failed: {e}")
+            except (requests.Timeout, requests.ConnectionError) as e:
+                self.report_proxy(proxy, ok=False)
+                breaker.record_failure()
+                error = RequestFailedError(url, str(e))
+            else:
+                status_code = response.status_code
+                # 407: proxy rejected our credentials
+                self.report_proxy(proxy, ok=status_code != 407,
+                                  latency=time.monotonic() - start)
+                if status_code == 407:
+                    proxy_failed = True
+                    error = RequestFailedError(url, f"proxy {proxy} rejected request", status_code)
+                elif status_code < 400:
+                    breaker.record_success()
+                    return response
+                elif status_code not in RETRY_STATUS_CODES:
+                    breaker.record_success()
+                    raise RequestFailedError(url, f"HTTP {status_code}", status_code)
                 else:
-                    logger.error(f"Request failed: {e}")
+                    breaker.record_failure()
+                    error = RequestFailedError(url, f"HTTP {status_code}", status_code)
+                    retry_after = parse_retry_after(response.headers.get('Retry-After')) or 0.0
+
+            if not (idempotent or proxy_failed) or attempt == policy.max_attempts - 1:
+                break
+
+            # no need to wait before switching to another proxy
+            delay = 0.0
+            if not proxy_failed:
+                delay = min(policy.max_delay, max(policy.backoff(attempt), retry_after))
+            logger.warning(f"Attempt {attempt + 1} failed for {error}. "
+                           f"Retrying in {delay:.1f}s")
+            policy.sleep(delay)
+
+        raise error
+
+    def send_hedged(self, session: Session, method: str, url: str, proxy: Optional[str],
+                    tried_proxies: list, **kwargs) -> tuple[Response, Optional[str], float]:
+        """
+        Sends a request and, if it is still running after the configured
+        latency percentile of the host, sends a duplicate through another
+        proxy. The first successful response (status below 400) wins.
+
+        The primary request runs in its own thread, so that its latency is
+        not counted while it waits for a worker: only hedges use
+        `hedge_executor`. The losing request cannot be interrupted once it
+        is on the wire, so it is abandoned and its response closed as soon
+        as it arrives.
+
+        :raises: error of the first request if both requests failed
+        :return: winning response, or the response of the first request if
+            neither succeeded, proxy it went through and time at which it
+            was sent
+        """
+        start = time.monotonic()
+        self.hedge_budget.record_request()
+        threshold = self.rate_limiter.for_host(url).latency_percentile(self.hedge_percentile)
+
+        if threshold is None:
+            # not enough samples yet to know what slow means
+            return self.send(session, method, url, proxy, **kwargs), proxy, start
+
+        primary = start_thread(self.send, session, method, url, proxy, **kwargs)
+        done, _ = wait([primary], timeout=threshold)
+        if done or not self.hedge_budget.try_spend():
+            return primary.result(), proxy, start
+
+        hedge_proxy = None
+        if proxy is not None:
+            hedge_proxy = self.proxy_manager.get_proxy(exclude=tried_proxies)
+            tried_proxies.append(hedge_proxy)
+        logger.debug(f"Hedging {url} after {threshold:.2f}s")
+        hedge_start = time.monotonic()
+        hedge = self.hedge_executor.submit(self.send, session, method, url, hedge_proxy,
+                                           hedge=True, **kwargs)
+
+        sent = {primary: (proxy, start), hedge: (hedge_proxy, hedge_start)}
+        pending = set(sent)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code < 400:
+                    for loser in pending:
+                        loser.cancel()
+                        loser.add_done_callback(close_response)
+                    if future is hedge and primary.done():
+                        # ? the failed response of the primary is not returned
+                        close_response(primary)
+                    winner_proxy, winner_start = sent[future]
+                    return future.result(), winner_proxy, winner_start
+                if future is hedge and future.exception() is not None:
+                    self.report_proxy(hedge_proxy, ok=False)
+
+        # neither succeeded: the first request decides what is retried
+        if primary.exception() is None:
+            close_response(hedge)
+            return primary.result(), proxy, start
+        if hedge.exception() is None:
+            return hedge.result(), hedge_proxy, hedge_start
+        return primary.result(), proxy, start
+
+    def report_proxy(self, proxy: Optional[str], ok: bool, latency: float = 0.0) -> None:
+        """
+        Reports the outcome of a request to the proxy manager so that it
+        can favour healthy proxies.
+        """
+        if proxy is None:
+            return
+        if ok:
+            self.proxy_manager.report_success(proxy, latency)
         else:
-            return session.get(url)
+            self.proxy_manager.report_failure(proxy)
 
-    def http_post(self, session: Session, url: str, body: dict, headers: dict, proxied: bool = False) -> Response:
+    def http_get(self, session: Session, url: str, proxied: bool = False) -> Response:
+        """
+        Perform get request
+
+        :param session:
+        :param url:
+        :param proxied:
+        :raises RequestFailedError: request failed after all attempts
+        :return: successful response
+        """
+        return self.request(session, 'GET', url, proxied)
+
+    def http_post(self, session: Session, url: str, body: dict, headers: dict, proxied: bool = False,
+                  idempotent: bool = False) -> Response:
         """
         Perform post request with data
 
@@ -56,25 +410,11 @@ class BaseScraper(ABC):
         :param url:
         :param body:
         :param proxied:
-        :return:
+        :param idempotent: True if the request can safely be retried,
+            for example a search query.
+        :raises RequestFailedError: request failed after all attempts
+        :return: successful response
         """
         body = json.dumps(body)
-        if proxied is True:
-            proxy = self.proxy_manager.get_proxy()
-            try:
-                if proxy is not None:
-                    proxies = {"http": proxy, "https": proxy}
-                    response = session.post(url, data=body, headers=headers, proxies=proxies)
-                else:
-                    response = session.post(url, data=body, headers=headers)
-
-                response.raise_for_status()
-                return response
-            except requests.RequestException as e:
-                if proxied:
-                    logger.error(f"Request failed using proxy {proxy}: {e}")
-                else:
-                    logger.error(f"Request failed: {e}")
-        else:
-            return session.post(url, data=body, headers=headers)
-
+        return self.request(session, 'POST', url, proxied, idempotent,
+                            data=body, headers=headers)
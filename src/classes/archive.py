@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+# ? zstandard is imported when an archive is opened, so that `src.main` can
+# ? import the default below cheaply
+
+# default location of archive, relative to the working directory
+DEFAULT_ARCHIVE_PATH = '.archive'
+
+
+class Archive:
+    """
+    Local archive of the raw responses of job websites, such as the JSON
+    returned by the kariyer.net API or the HTML of myjob.mu pages.
+
+    Responses are content-addressed: each one is identified by the SHA-256
+    of its content and stored only once. Each response is compressed with
+    zstd and appended to a file holding everything archived for a website
+    on the same day, for example `.archive/kariyernet/2024/03/01.zst`.
+    An SQLite index maps each response to its file and offset.
+
+    Jobs can then be parsed again from the archive, for example to extract
+    a new field, without sending a single request.
+    """
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_PATH, level: int = 10) -> None:
+        """
+        Opens the archive, creating it if missing.
+
+        Args:
+            root (str): Directory of archive
+            level (int): zstd compression level
+        """
+        import zstandard
+
+        os.makedirs(root, exist_ok=True)
+        self.root: str = root
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+        # backfill workers archive from several threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'),
+                                    check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                site TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                path TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                fetched_at TEXT NOT NULL)''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS blobs_by_site '
+                              'ON blobs (site, kind, fetched_at)')
+
+    def put(self, site: str, kind: str, key: str, content: bytes,
+            fetched_at: Optional[datetime] = None) -> str:
+        """
+        Archives a response. A response already in the archive is not
+        stored again.
+
+        Args:
+            site (str): Website name
+            kind (str): Type of response, for example `search` for a page of
+            results or `job` for the details of a job
+            key (str): Identifies what was requested, for example a job id
+            content (bytes): Raw body of response
+            fetched_at (datetime, optional): Time of response. Defaults to
+            the current time.
+
+        Returns:
+            str: SHA-256 of content
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+
+        with self.lock:
+            exists = self.conn.execute('SELECT 1 FROM blobs WHERE digest = ?',
+                                       (digest,)).fetchone()
+            if exists:
+                return digest
+
+            path = os.path.join(site, fetched_at.strftime('%Y'),
+                                fetched_at.strftime('%m'),
+                                fetched_at.strftime('%d') + '.zst')
+            full_path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+            # each response is a separate zstd frame, so that it can be
+            # read without decompressing the rest of the file
+            blob = self.compressor.compress(content)
+            with open(full_path, 'ab') as file:
+                offset = file.tell()
+                file.write(blob)
+
+            with self.conn:
+                self.conn.execute(
+                    'INSERT INTO blobs (digest, site, kind, key, path, offset, '
+                    'length, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (digest, site, kind, key, path, offset, len(blob),
+                     fetched_at.isoformat()))
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """
+        Returns the content of an archived response.
+
+        Raises:
+            KeyError: No response has this digest
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT path, offset, length FROM blobs WHERE digest = ?',
+                (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        path, offset, length = row
+        with open(os.path.join(self.root, path), 'rb') as file:
+            file.seek(offset)
+            return self.decompressor.decompress(file.read(length))
+
+    def records(self, site: str, kind: Optional[str] = None,
+                since: Optional[datetime] = None,
+                until: Optional[datetime] = None) -> Iterator[tuple[dict, bytes]]:
+        """
+        Yields the archived responses of `site`, oldest first.
+
+        Args:
+            site (str): Website name
+            kind (str, optional): Only yield responses of this type
+            since (datetime, optional): Only yield responses fetched at or
+            after this time
+            until (datetime, optional): Only yield responses fetched before
+            this time
+
+        Yields:
+            tuple[dict, bytes]: Index entry (`digest`, `kind`, `key`,
+            `fetched_at`) and content of each response
+        """
+        query = ('SELECT digest, kind, key, fetched_at, path, offset, length '
+                 'FROM blobs WHERE site = ?')
+        params: list = [site]
+        if kind is not None:
+            query += ' AND kind = ?'
+            params.append(kind)
+        if since is not None:
+            query += ' AND fetched_at >= ?'
+            params.append(as_utc(since).isoformat())
+        if until is not None:
+            query += ' AND fetched_at < ?'
+            params.append(as_utc(until).isoformat())
+        query += ' ORDER BY fetched_at, path, offset'
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        # files are read sequentially, and each one is opened once
+        file = None
+        current_path = None
+        try:
+            for digest, kind, key, fetched_at, path, offset, length in rows:
+                if path != current_path:
+                    if file is not None:
+                        file.close()
+                    file = open(os.path.join(self.root, path), 'rb')
+                    current_path = path
+                file.seek(offset)
+                record = {'digest': digest, 'kind': kind, 'key': key,
+                          'fetched_at': datetime.fromisoformat(fetched_at)}
+                yield record, self.decompressor.decompress(file.read(length))
+        finally:
+            if file is not None:
+                file.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def as_utc(date: datetime) -> datetime:
+    """
+    Returns `date` in UTC. Dates without a timezone are assumed to be in UTC.
+    """
+    if date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Iterator, Optional
+
+from src.metrics import Metrics
+from src.quota import QuotaBudget
+
+# query methods returning a new query
+QUERY_BUILDERS = {'where', 'order_by', 'limit', 'limit_to_last', 'offset',
+                  'start_after', 'start_at', 'end_before', 'end_at', 'select'}
+
+# documents counted by Firestore as a single read of an aggregation query
+AGGREGATION_ENTRIES_PER_READ = 1000
+
+
+def unwrap(value: Any) -> Any:
+    """
+    Returns the Firestore object behind a counting wrapper, so that it can
+    be passed to the client, for example as a query cursor.
+    """
+    return getattr(value, '_target', value)
+
+
+class CountedClient:
+    """
+    Wraps a Firestore client (or a `MemoryFirestore`) and counts, in
+    `metrics`, the reads, writes, streamed documents and commits issued
+    through it, as Firestore bills them:
+
+    - getting a document is one read, even if it does not exist
+    - a query costs one read per document returned, and at least one
+    - a count aggregation costs one read per 1000 documents counted
+    - each document created, set, updated or deleted is one write
+
+    When a `budget` is given, reads and writes are charged to it before
+    they are sent, so that it can stop or delay them.
+
+    Other attributes are those of the client.
+    """
+
+    def __init__(self, client, metrics: Metrics, database: str = 'main',
+                 budget: Optional[QuotaBudget] = None) -> None:
+        self._target = client
+        self._metrics: Metrics = metrics
+        self._database: str = database
+        self._budget: Optional[QuotaBudget] = budget
+
+    def count(self, operation: str, amount: int = 1,
+              method: Optional[str] = None) -> None:
+        if self._budget is not None and operation in ('reads', 'writes'):
+            self._budget.acquire(operation, amount)
+        self._metrics.count(self._database, operation, amount, method)
+
+    def collection(self, *path: str) -> CountedQuery:
+        return CountedQuery(self._target.collection(*path), self)
+
+    def document(self, *path: str) -> CountedDocument:
+        return CountedDocument(self._target.document(*path), self)
+
+    def batch(self) -> CountedBatch:
+        return CountedBatch(self._target.batch(), self)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+class CountedDocument:
+    def __init__(self, reference, client: CountedClient) -> None:
+        self._target = reference
+        self._client: CountedClient = client
+
+    def get(self, *args, **kwargs):
+        self._client.count('reads')
+        return self._target.get(*args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        self._client.count('writes')
+        return self._target.create(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self._client.count('writes')
+        return self._target.set(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        self._client.count('writes')
+        return self._target.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._client.count('writes')
+        return self._target.delete(*args, **kwargs)
+
+    def collection(self, name: str) -> CountedQuery:
+        return CountedQuery(self._target.collection(name), self._client)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+    def __repr__(self) -> str:
+        return repr(self._target)
+
+
+class CountedSnapshot:
+    """
+    Document snapshot whose `reference` counts the operations issued
+    through it.
+    """
+
+    def __init__(self, snapshot, client: CountedClient) -> None:
+        self._target = snapshot
+        self._client: CountedClient = client
+
+    @property
+    def reference(self) -> CountedDocument:
+        return CountedDocument(self._target.reference, self._client)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+class CountedQuery:
+    """
+    Wraps a collection reference or a query.
+    """
+
+    def __init__(self, query, client: CountedClient) -> None:
+        self._target = query
+        self._client: CountedClient = client
+
+    def document(self, *args) -> CountedDocument:
+        return CountedDocument(self._target.document(*args), self._client)
+
+    def add(self, *args, **kwargs):
+        self._client.count('writes')
+        update_time, reference = self._target.add(*args, **kwargs)
+        return update_time, CountedDocument(reference, self._client)
+
+    def stream(self, *args, **kwargs) -> Iterator[CountedSnapshot]:
+        # ? the method issuing the query is looked up now, because the
+        # ? documents may be consumed after it returned
+        method = self._client._metrics.current_method()
+        return self._stream(method, self._target.stream(*args, **kwargs))
+
+    def _stream(self, method: str, snapshots) -> Iterator[CountedSnapshot]:
+        returned = 0
+        for snapshot in snapshots:
+            returned += 1
+            self._client.count('reads', method=method)
+            self._client.count('stream_docs', method=method)
+            yield CountedSnapshot(snapshot, self._client)
+        if returned == 0:
+            # a query returning nothing is billed as one read
+            self._client.count('reads', method=method)
+
+    def get(self, *args, **kwargs) -> list[CountedSnapshot]:
+        return list(self.stream(*args, **kwargs))
+
+    def list_documents(self, *args, **kwargs) -> list[CountedDocument]:
+        references = list(self._target.list_documents(*args, **kwargs))
+        self._client.count('reads', max(1, len(references)))
+        return [CountedDocument(reference, self._client) for reference in references]
+
+    def count(self, *args, **kwargs) -> CountedAggregation:
+        return CountedAggregation(self._target.count(*args, **kwargs), self._client)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        if name not in QUERY_BUILDERS:
+            return attribute
+
+        def build(*args, **kwargs) -> CountedQuery:
+            args = tuple(unwrap(arg) for arg in args)
+            kwargs = {key: unwrap(value) for key, value in kwargs.items()}
+            return CountedQuery(attribute(*args, **kwargs), self._client)
+        return build
+
+
+class CountedAggregation:
+    def __init__(self, aggregation, client: CountedClient) -> None:
+        self._target = aggregation
+        self._client: CountedClient = client
+
+    def get(self, *args, **kwargs):
+        results = self._target.get(*args, **kwargs)
+        counted = sum(result.value for row in results for result in row)
+        self._client.count('reads', max(1, math.ceil(counted / AGGREGATION_ENTRIES_PER_READ)))
+        return results
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+class CountedBatch:
+    """
+    Write batch whose writes are counted when it is committed.
+    """
+
+    def __init__(self, batch, client: CountedClient) -> None:
+        self._target = batch
+        self._client: CountedClient = client
+        self._pending: int = 0
+
+    def create(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._target.create(unwrap(reference), *args, **kwargs)
+
+    def set(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._target.set(unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._target.update(unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._target.delete(unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        self._client.count('writes', self._pending)
+        self._client.count('commits')
+        self._pending = 0
+        return self._target.commit(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
@@ -1,14 +1,59 @@
 from __future__ import annotations
 
 
-import firebase_admin
-from firebase_admin import firestore
-from firebase_admin import credentials
-import pandas as pd
-from google.cloud.firestore_v1 import FieldFilter
+from calendar import monthrange
+from typing import TYPE_CHECKING
 
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP, FieldFilter, Increment, Query
+
+from src.classes.counted_firestore import CountedClient
+from src.classes.memory_firestore import MemoryFirestore
+from src.metrics import counted, metrics
+from src.quota import QuotaBudget, estimate_full_read
+from src.logger import setup_logger
 from src.utils.dictionary import merge_dicts
+from src.utils.service_key import get_service_account_key
 from datetime import datetime
+import os
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = setup_logger()
+
+# clients of offline databases, by app name, shared by every `Database`
+# opened in the same process
+OFFLINE_CLIENTS: dict = {}
+
+
+def is_offline() -> bool:
+    """
+    Returns True if the `FIRESTORE_OFFLINE` environment variable asks for
+    in-memory databases instead of Firestore.
+    """
+    return os.environ.get('FIRESTORE_OFFLINE', '').lower() in ('1', 'true')
+
+
+def open_database(forMainDB: bool = False) -> Database:
+    """
+    Connects to the main database, containing all jobs, or to the frontend
+    database, containing only statistics.
+
+    When `FIRESTORE_OFFLINE` is set, an in-memory database is used instead,
+    for example to benchmark the pipeline without touching Firestore.
+    The quota budget of the database is read from the environment (see
+    `QuotaBudget.from_env`).
+    """
+    appName = "" if forMainDB else "frontend_db"
+    budget = QuotaBudget.from_env()
+    if is_offline():
+        if appName not in OFFLINE_CLIENTS:
+            OFFLINE_CLIENTS[appName] = MemoryFirestore()
+        return Database(None, appName, client=OFFLINE_CLIENTS[appName],
+                        budget=budget)
+    return Database(get_service_account_key(forMainDB=forMainDB), appName,
+                    budget=budget)
 
 
 class Database:
@@ -16,23 +61,44 @@ class Database:
     Manages the Firestore database
     """
 
-    def __init__(self, service_key: dict, appName: str = ""):
+    def __init__(self, service_key: dict | None, appName: str = "",
+                 client=None, budget: QuotaBudget | None = None):
         """
         Initialises firestore client
 
         Args:
             service_key (dict): Service key of firestore database
-        """
-
-        cred = credentials.Certificate(service_key)
-        app = None
-        if appName == "":
-            app = firebase_admin.initialize_app(cred)  # DEFAULT app
-        else:
-            app = firebase_admin.initialize_app(cred, name=appName)
-
-        print(f'Connected to {app.name}')
-        self.db = firestore.client(app)
+            appName (str, optional): Name of firebase app. Defaults to the
+            DEFAULT app.
+            client (optional): Client used instead of connecting to
+            Firestore, such as a `MemoryFirestore` for offline runs.
+            `service_key` is then ignored.
+            budget (QuotaBudget, optional): Daily budget of reads and writes,
+            enforced before each operation. Usage is saved in the database
+            by `save_quota_usage`, so that runs of the same day share it.
+        """
+        if client is None:
+            # ? firebase_admin is only needed to connect to Firestore, so
+            # ? offline runs never import it
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+
+            cred = credentials.Certificate(service_key)
+            app = None
+            if appName == "":
+                app = firebase_admin.initialize_app(cred)  # DEFAULT app
+            else:
+                app = firebase_admin.initialize_app(cred, name=appName)
+
+            logger.info(f'Connected to {app.name}')
+            client = firestore.client(app)
+
+        # ? every Firestore operation goes through `db`, which counts it.
+        # ? `client` is the client itself, for code which must not be
+        # ? wrapped such as transactions.
+        self.client = client
+        self.budget: QuotaBudget | None = budget
+        self.db = CountedClient(client, metrics, appName or 'main', budget)
 
         # save reference to collection for saving scraped jobs
         self.job_collection_ref = self.db.collection(u'jobs_collection')
@@ -41,6 +107,38 @@ class Database:
         # from job collection
         self.stats_collection_ref = self.db.collection(u'statistics')
 
+        # save reference to collection of the statistics of each site and
+        # posting month (see `src.analyser.cube`)
+        self.cube_collection_ref = self.db.collection(u'stats_cube')
+
+        # save reference to collection of the sketches of companies, job
+        # titles and locations of each site and posting month (see
+        # `src.analyser.sketches`)
+        self.sketches_collection_ref = self.db.collection(u'stats_sketches')
+
+        # save reference to collection of the quantile sketches of salaries
+        # by location and technology (see `src.analyser.salary`)
+        self.salary_quantiles_collection_ref = self.db.collection(u'salary_quantiles')
+
+        # save reference to collection of the increments of statistics of
+        # each run (see `src.stats_events`)
+        self.stats_events_ref = self.db.collection(u'stats_events')
+        # parts of the increments of events too large for one document
+        self.stats_event_chunks_ref = self.db.collection(u'stats_event_chunks')
+
+        # save reference to collection storing the newest job seen on
+        # each website (one document per website)
+        self.crawl_state_ref = self.db.collection(u'crawl_state')
+
+        # usage of the quota budget, read and written without being
+        # counted so that it can always be saved
+        self.quota_usage_ref = self.client.collection(u'crawl_state').document(
+            u'quota_usage')
+        if self.budget is not None:
+            usage = self.quota_usage_ref.get()
+            if usage.exists:
+                self.budget.restore(usage.to_dict())
+
         # initialise references to documents in stats_collection
         self.metadata_ref = self.stats_collection_ref.document(
             u'metadata')  # stores general statistics about jobs collection
@@ -49,6 +147,10 @@ class Database:
         self.lang_data_ref = self.stats_collection_ref.document(u'lang_data')
         self.lib_data_ref = self.stats_collection_ref.document(u'lib_data')
         self.loc_data_ref = self.stats_collection_ref.document(u'loc_data')
+        # jobs by district of Mauritius and province of Turkey (see
+        # `src.analyser.location.region_count`)
+        self.loc_region_data_ref = self.stats_collection_ref.document(
+            u'loc_region_data')
         self.os_data_ref = self.stats_collection_ref.document(u'os_data')
         self.salary_data_ref = self.stats_collection_ref.document(
             u'salary_data')
@@ -56,6 +158,20 @@ class Database:
         self.web_data_ref = self.stats_collection_ref.document(u'web_data')
         self.job_title_data_ref = self.stats_collection_ref.document(
             u'job_title_data')
+        # pairs of technologies mentioned together (see
+        # `src.analyser.cooccurrence`)
+        self.cooccurrence_data_ref = self.stats_collection_ref.document(
+            u'cooccurrence_data')
+        # everything the dashboard shows, in one document (frontend
+        # database only, see `stats_bundle`)
+        self.bundle_ref = self.stats_collection_ref.document(u'bundle')
+
+        # immutable versions of the statistics, and the pointer to the
+        # published version (frontend database only, see `stats_snapshots`)
+        self.snapshots_collection_ref = self.db.collection(u'stats_snapshots')
+        # parts of the snapshots too large for one document
+        self.snapshot_chunks_collection_ref = self.db.collection(u'stats_snapshot_chunks')
+        self.current_snapshot_ref = self.stats_collection_ref.document(u'current')
 
         # create documents if missing from database
         self.create_doc_if_missing(self.job_title_data_ref)
@@ -66,11 +182,13 @@ class Database:
         self.create_doc_if_missing(self.lang_data_ref)
         self.create_doc_if_missing(self.lib_data_ref)
         self.create_doc_if_missing(self.loc_data_ref)
+        self.create_doc_if_missing(self.loc_region_data_ref)
         self.create_doc_if_missing(self.os_data_ref)
         self.create_doc_if_missing(self.salary_data_ref)
         self.create_doc_if_missing(self.tools_data_ref)
         self.create_doc_if_missing(self.web_data_ref)
 
+    @counted
     def get_dataframe(self) -> pd.DataFrame:
         """
         Fetches the entire database from firestore and returns it as
@@ -82,10 +200,41 @@ class Database:
         Returns:
             pd.DataFrame: All scraped jobs
         """
+        if self.budget is not None:
+            # abort before reading every job if the budget cannot cover it
+            self.budget.check(estimate_full_read(self, 'get_dataframe'))
+        import pandas as pd
+
         jobs = self.export_collection(self.job_collection_ref)
         jobs_dict = list(map(lambda x: x.to_dict(), jobs))
         return pd.DataFrame(jobs_dict)
 
+    @counted
+    def get_jobs_page(self, limit: int = 500, start_after: str | None = None,
+                      fields: list[str] | None = None) -> list:
+        """
+        Returns a page of jobs, in document id order. Reading the next page
+        from the id of the last job of the previous one reads each job
+        once, without holding the whole collection in memory.
+
+        Args:
+            limit (int): Maximum number of jobs returned
+            start_after (str, optional): Id of the last job of the previous
+            page. The first page is returned if None.
+            fields (list[str], optional): Fields read. Every field if None.
+
+        Returns:
+            list: Document snapshots of the jobs. Fewer than `limit` on the
+            last page.
+        """
+        query = self.job_collection_ref.order_by('__name__')
+        if fields:
+            query = query.select(fields)
+        if start_after is not None:
+            query = query.start_after({'__name__': start_after})
+        return list(query.limit(limit).stream())
+
+    @counted
     def get_recent_urls(self, LIMIT: int = 500) -> list[str]:
         """
         Returns a list of the urls of recently scraped jobs. This function
@@ -100,22 +249,66 @@ class Database:
         Returns:
             list[str]: A list urls
         """
+        return self.get_recent_values('url', LIMIT)
+
+    @counted
+    def get_recent_values(self, field: str, LIMIT: int = 500) -> list:
+        """
+        Returns the value of `field` (for example `url` or `ad_id`) for
+        recently scraped jobs. Jobs missing the field, or where it is
+        empty, are left out.
+
+        - Keep 5 < `LIMIT` < 1000 to avoid exceeding read quotas.
+
+        Args:
+            field (str): Name of job field
+            LIMIT(int, optional): Maximum number of jobs read.
+            Defaults to 500.
+
+        Returns:
+            list: A list of values
+        """
         # get the most recent scraped jobs
         jobs = (self.job_collection_ref
 
                 .order_by("timestamp",
-                          direction=firestore.Query.DESCENDING)  # type: ignore
+                          direction=Query.DESCENDING)  # type: ignore
                 .limit(LIMIT)
                 .stream())
 
-        # convert to a list of dictionaries
-        jobs_list = list(map(lambda x: x.to_dict(), jobs))
+        # return only the requested field
+        values = [job.to_dict().get(field) for job in jobs]
+        return [value for value in values if value]
+
+    @counted
+    def get_watermark(self, website: str) -> dict:
+        """
+        Returns the crawl watermark of a website: the posting date and id
+        of the newest job scraped from it.
 
-        # return only the urls
-        if len(jobs_list) > 0:
-            return pd.DataFrame(jobs_list)['url'].values.tolist()
-        return []
+        Args:
+            website (str): Website name
+
+        Returns:
+            dict: Watermark with keys `newest_date` and `newest_id`. Empty if
+            the website was never scraped.
+        """
+        doc = self.crawl_state_ref.document(website).get()
+        return doc.to_dict() if doc.exists else {}
 
+    @counted
+    def set_watermark(self, website: str, watermark: dict) -> None:
+        """
+        Saves the crawl watermark of a website.
+
+        Args:
+            website (str): Website name
+            watermark (dict): Watermark with keys `newest_date` and
+            `newest_id`
+        """
+        self.crawl_state_ref.document(website).set(watermark)
+
+    @counted
     def add_job(self, jobDictionary: dict) -> None:
         """
         Add job to database.
@@ -123,11 +316,34 @@ class Database:
         Args:
             jobDictionary(dictionary): A dictionary with the following keys:
             `job_title`, `date_posted`, `closing_date`, `url`, `location`,
-            `employment_type`, `company`, `salary`, `job_details`, `timestamp`
+            `employment_type`, `company`, `salary`, `job_details`, `timestamp`.
+            `timestamp` is set to the server time if missing.
         """
+        if 'timestamp' not in jobDictionary:
+            jobDictionary = {**jobDictionary,
+                             'timestamp': SERVER_TIMESTAMP}
         update_time, job_ref = self.job_collection_ref.add(jobDictionary)
         # print(f'Added document with id {job_ref.id} at: {update_time}')
 
+    @counted
+    def update_job(self, field: str, value, jobDictionary: dict) -> None:
+        """
+        Overwrites the fields of the job whose `field` equals `value`, for
+        example to add the details of a job first saved from a listing page.
+
+        Args:
+            field (str): Name of field identifying the job, such as `ad_id`
+            value: Value of `field`
+            jobDictionary (dict): Fields to update
+        """
+        jobs = (self.job_collection_ref
+                .where(filter=FieldFilter(field_path=field, op_string='==', value=value))
+                .limit(1)
+                .stream())
+        for job in jobs:
+            job.reference.update(jobDictionary)
+
+    @counted
     def duplicates_exist(self) -> bool:
         """
         Uses `url` as primary key and checks for duplicate jobs in database.
@@ -141,6 +357,9 @@ class Database:
         """
         # https://stackoverflow.com/a/14657511/17627866
         df = self.get_dataframe()
+        if df.empty:
+            print('No duplicate jobs found.')
+            return False
         ids = df["url"]
         df = df[ids.isin(ids[ids.duplicated()])].sort_values("url")
         if (len(df) > 0):
@@ -149,6 +368,7 @@ class Database:
         print('No duplicate jobs found.')
         return False
 
+    @counted
     def get_size(self) -> int:
         """
         Returns the number of jobs in database.
@@ -158,6 +378,7 @@ class Database:
         """
         return int(self.metadata_ref.get().to_dict()['size'])
 
+    @counted
     def get_last_update_date(self):
         """
         Returns timestamp of the most recent job scraped
@@ -175,24 +396,72 @@ class Database:
         first_doc = list(docs)[0]
         return first_doc.to_dict()['timestamp']
 
+    @counted
     def get_job_count_in(self, year: int, month: int) -> int:
         """
-
+        Returns the number of jobs scraped during a month.
         """
         # set start date to the first day of the current month
         start_date = datetime(year, month, 1)
 
         # set end date to the last day of the current month
-        end_date = start_date + pd.offsets.MonthEnd(1)
+        end_date = datetime(year, month, monthrange(year, month)[1])
 
-        # get all jobs within this range of dates
-        query = (self.job_collection_ref
-                 .where(filter=FieldFilter(field_path='timestamp', op_string='>=', value=start_date))
-                 .where(filter=FieldFilter(field_path='timestamp', op_string='<=', value=end_date)))
+        return self.count_jobs(start_date, end_date)
 
-        # return number of docs found
-        return len(list(query.stream()))
+    @counted
+    def count_jobs(self, start: datetime | None = None,
+                   end: datetime | None = None) -> int:
+        """
+        Counts the jobs scraped between `start` and `end` (inclusive) with
+        an aggregation query, which costs one read per 1000 jobs instead of
+        one read per job.
+
+        Args:
+            start (datetime, optional): Earliest timestamp. No limit if None.
+            end (datetime, optional): Latest timestamp. No limit if None.
+
+        Returns:
+            int: Number of jobs
+        """
+        query = self.job_collection_ref
+        if start is not None:
+            query = query.where(filter=FieldFilter(field_path='timestamp',
+                                                   op_string='>=', value=start))
+        if end is not None:
+            query = query.where(filter=FieldFilter(field_path='timestamp',
+                                                   op_string='<=', value=end))
+        return int(query.count().get()[0][0].value)
+
+    @counted
+    def count_stats_docs(self) -> int:
+        """
+        Returns the number of documents in the statistics collection.
+        """
+        return int(self.stats_collection_ref.count().get()[0][0].value)
 
+    @counted
+    def count_cube_docs(self) -> int:
+        """
+        Returns the number of cells in the cube collection.
+        """
+        return int(self.cube_collection_ref.count().get()[0][0].value)
+
+    @counted
+    def count_stats_events(self) -> int:
+        """
+        Returns the number of events in the statistics events collection.
+        """
+        return int(self.stats_events_ref.count().get()[0][0].value)
+
+    def save_quota_usage(self) -> None:
+        """
+        Saves the usage of the quota budget, for the next runs of the day.
+        """
+        if self.budget is not None:
+            self.quota_usage_ref.set(self.budget.usage())
+
+    @counted
     def update_job_count_trend(self) -> dict[str, int]:
         start_year = datetime.now().year  # current year
         start_month = datetime.now().month  # current month
@@ -223,6 +492,7 @@ class Database:
                      "job_trend_by_month", job_counter)
         return job_counter
 
+    @counted
     def update_metadata(self, new_db_size: int):
         """
         Updates metadata for job collection.
@@ -241,6 +511,7 @@ class Database:
              'size': new_db_size
              })
 
+    @counted
     def recalculate_size_counter(self) -> None:
         """
         Initialises  the counter which keeps tracks of the
@@ -265,6 +536,7 @@ class Database:
             new_dict[self.db.field_path(key)] = dict[key]
         return new_dict
 
+    @counted
     def update_stats(self, incrementDict: dict,
                      document_ref) -> None:
         """
@@ -297,6 +569,167 @@ class Database:
         # save changes
         document_ref.update(resultDict)
 
+    @counted
+    def add_stats_event(self, run_id: str, event: dict, chunks: list[bytes] = ()) -> None:
+        """
+        Saves the event of a run, then the chunks of its increments. Fails
+        if the run already has one.
+
+        Args:
+            chunks (list[bytes]): Parts of the increments of the event, when
+            they do not fit in its document (see `stats_events`)
+        """
+        self.stats_events_ref.document(run_id).create(event)
+        batch = self.db.batch()
+        for index, data in enumerate(chunks):
+            batch.set(self.stats_event_chunks_ref.document(f'{run_id}_{index:04d}'),
+                      {'run_id': run_id, 'index': index, 'data': data})
+            # ? a batch is sent as one request of at most 10 MiB
+            if (index + 1) % 8 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        batch.commit()
+
+    @counted
+    def get_stats_event(self, run_id: str) -> dict | None:
+        event = self.stats_events_ref.document(run_id).get()
+        return event.to_dict() if event.exists else None
+
+    @counted
+    def get_stats_event_chunks(self, run_id: str, count: int) -> list[bytes]:
+        return [self.stats_event_chunks_ref.document(f'{run_id}_{index:04d}').get().get('data')
+                for index in range(count)]
+
+    @counted
+    def set_stats_event_status(self, run_id: str, status: str,
+                               fields: dict | None = None) -> None:
+        """
+        Changes the status of the event of a run, and `fields` if given.
+        """
+        self.stats_events_ref.document(run_id).update(
+            {**(fields or {}), 'status': status, 'updated_at': SERVER_TIMESTAMP})
+
+    @counted
+    def get_stats_events(self, fields: list[str] | None = None) -> list[dict]:
+        """
+        Returns the events of runs, oldest first.
+
+        Args:
+            fields (list[str], optional): Fields read. Every field if None.
+        """
+        query = self.stats_events_ref.order_by('created_at')
+        if fields is not None:
+            query = query.select(fields)
+        return [event.to_dict() for event in query.stream()]
+
+    @counted
+    def delete_stats_events(self, run_ids: list[str],
+                            chunks: dict[str, int] | None = None) -> None:
+        """
+        Deletes the events of runs, and their chunks.
+
+        Args:
+            chunks (dict[str, int], optional): Number of chunks of the
+            events which have some
+        """
+        references = []
+        for run_id in run_ids:
+            references.append(self.stats_events_ref.document(run_id))
+            references.extend(self.stats_event_chunks_ref.document(f'{run_id}_{index:04d}')
+                              for index in range((chunks or {}).get(run_id, 0)))
+        batch = self.db.batch()
+        for count, reference in enumerate(references, start=1):
+            batch.delete(reference)
+            # ? a batch holds at most 500 writes
+            if count % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        batch.commit()
+
+    @counted
+    def update_cooccurrence(self, increment: dict) -> None:
+        """
+        Adds an encoded co-occurrence matrix returned by `analyse_jobs` to
+        the one in the statistics collection.
+        """
+        from src.analyser.cooccurrence import merge_cooccurrences
+
+        current = self.cooccurrence_data_ref.get()
+        total = merge_cooccurrences(current.to_dict() if current.exists else {}, increment)
+        if current.exists and total == current.to_dict():
+            return
+        self.cooccurrence_data_ref.set(total)
+
+    @counted
+    def update_sketches(self, sketches: dict[str, str]) -> None:
+        """
+        Merges cells returned by `analyse_jobs` into the sketches
+        collection. Each cell is read, then written.
+
+        Args:
+            sketches (dict[str, str]): Packed cells by document id, base64
+            encoded
+        """
+        from src.analyser.sketches import decode_cell, merge_packed, unpack_cell
+
+        for doc_id, text in sketches.items():
+            document_ref = self.sketches_collection_ref.document(doc_id)
+            current = document_ref.get()
+            packed = merge_packed(current.get('sketches') if current.exists else None,
+                                  decode_cell(text))
+            site, month, _ = unpack_cell(packed)
+            document_ref.set({'site': site, 'month': month, 'sketches': packed})
+
+    @counted
+    def update_salary_quantiles(self, slices: dict[str, str]) -> None:
+        """
+        Merges salary quantile sketches returned by `analyse_jobs` into the
+        salary quantiles collection. Each document is read, then written.
+
+        Args:
+            slices (dict[str, str]): Packed slices by document id, such as
+            `location_MUR`
+        """
+        from src.analyser.quantiles import decode_slices, merge_slices
+
+        for doc_id, text in slices.items():
+            document_ref = self.salary_quantiles_collection_ref.document(doc_id)
+            current = document_ref.get()
+            total = {doc_id: current.get('sketches')} if current.exists else {}
+            merged = merge_slices(total, {doc_id: text})[doc_id]
+            kind, currency = doc_id.rsplit('_', 1)
+            document_ref.set({'kind': kind, 'currency': currency,
+                              'sketches': decode_slices(merged)})
+
+    @counted
+    def update_cube(self, cube: dict[str, dict]) -> None:
+        """
+        Adds cells returned by `analyse_jobs` to the cube collection. Each
+        cell is written once, with increments, without being read.
+
+        Args:
+            cube (dict[str, dict]): Cells by document id
+        """
+        batch = self.db.batch()
+        for count, (doc_id, cell) in enumerate(cube.items(), start=1):
+            data = {'site': cell['site'], 'month': cell['month']}
+            for field, value in cell.items():
+                if isinstance(value, dict):
+                    # ! an empty map would replace the map stored
+                    increments = {key: Increment(amount)
+                                  for key, amount in value.items() if amount}
+                    if increments:
+                        data[field] = increments
+                elif field not in data:
+                    data[field] = Increment(value)
+            batch.set(self.cube_collection_ref.document(doc_id), data, merge=True)
+            # ? a batch holds at most 500 writes
+            if count % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        batch.commit()
+
+    @counted
     def create_doc_if_missing(self, document_ref, initial_val={}) -> bool:
         """
         Checks if a document exists and creates it if not.
@@ -309,14 +742,16 @@ class Database:
             bool: True if document was missing. False otherwise.
         """
         if (not document_ref.get().exists):
-            print("Created a new document", document_ref)
+            logger.info(f"Created a new document {document_ref}")
             document_ref.set(initial_val)
             return True
         return False
 
+    @counted
     def get_doc(self, document_ref) -> dict:
         return document_ref.get().to_dict()
 
+    @counted
     def get_doc_as_df(self, document_ref, header) -> pd.DataFrame:
         """
         Returns data from a document in `statistics` collection.
@@ -329,12 +764,15 @@ class Database:
         Returns:
             pd.DataFrame: Data from document in a table with 2 columns.
         """
+        import pandas as pd
+
         dict = self.get_doc(document_ref)
         df = pd.DataFrame.from_dict(dict, orient='index')
         df = df.reset_index()
         df.columns = [header, 'Frequency']
         return df
 
+    @counted
     def add_doc(self, collection_ref, doc_id,  doc_data: dict) -> None:
         """
         Adds a new document to an existing collection.
@@ -349,6 +787,7 @@ class Database:
         doc_ref = collection_ref.document(doc_id)
         doc_ref.set(doc_data)
 
+    @counted
     def export_collection(self, collection_ref):
         """
         Exports a collection. Use this function together with
@@ -363,6 +802,7 @@ class Database:
         """
         return collection_ref.stream()
 
+    @counted
     def import_collection(self, collection_ref, collection_stream) -> None:
         """
         Imports a collection to database. Use this function
@@ -1,5 +1,4 @@
 from datetime import datetime
-from firebase_admin import firestore
 from typing import Optional
 
 
@@ -20,7 +19,9 @@ class Job:
         self.closing_date: Optional[datetime] = None
 
         # Store time when the server receives the Job.
-        self.timestamp = firestore.SERVER_TIMESTAMP  # type: ignore
+        # ? imported here so that importing a scraper does not load Firestore
+        from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+        self.timestamp = SERVER_TIMESTAMP
 
 
 if __name__ == "__main__":
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import copy
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Iterator, Optional
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath, render_field_path
+
+
+class MemoryFirestore:
+    """
+    In-memory stand-in for `firestore.Client`, used to run the pipeline
+    offline, for example in benchmarks. Implements the part of the
+    Firestore API used by `Database`: documents, field paths, sentinels
+    (`SERVER_TIMESTAMP`, `Increment`, `DELETE_FIELD`, array transforms),
+    queries with filters, ordering, limits and cursors, count
+    aggregations and write batches.
+
+    Transactions are not supported.
+    """
+
+    def __init__(self) -> None:
+        # collection name -> document id -> document data
+        self.collections: dict[str, dict[str, dict]] = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def field_path(*field_names: str) -> str:
+        return render_field_path(field_names)
+
+    def collection(self, name: str) -> MemoryCollection:
+        with self.lock:
+            self.collections.setdefault(name, {})
+        return MemoryCollection(self, name)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch()
+
+    def transaction(self, **kwargs):
+        raise NotImplementedError("MemoryFirestore does not support transactions")
+
+
+class MemorySnapshot:
+    def __init__(self, reference: MemoryDocument, data: Optional[dict]) -> None:
+        self.reference: MemoryDocument = reference
+        self.id: str = reference.id
+        self.exists: bool = data is not None
+        self._data: Optional[dict] = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path: str) -> Any:
+        return get_field(self._data or {}, field_path)
+
+
+class MemoryDocument:
+    def __init__(self, client: MemoryFirestore, collection: str, doc_id: str) -> None:
+        self.client: MemoryFirestore = client
+        self.collection: str = collection
+        self.id: str = doc_id
+
+    @property
+    def path(self) -> str:
+        return f'{self.collection}/{self.id}'
+
+    def __repr__(self) -> str:
+        return f'<MemoryDocument {self.path}>'
+
+    def documents(self) -> dict[str, dict]:
+        return self.client.collections[self.collection]
+
+    def get(self, field_paths=None, transaction=None) -> MemorySnapshot:
+        with self.client.lock:
+            data = self.documents().get(self.id)
+            return MemorySnapshot(self, copy.deepcopy(data))
+
+    def create(self, document_data: dict) -> None:
+        with self.client.lock:
+            if self.id in self.documents():
+                raise AlreadyExists(f'Document already exists: {self.path}')
+            self.set(document_data)
+
+    def set(self, document_data: dict, merge: bool = False) -> None:
+        with self.client.lock:
+            current = self.documents().get(self.id) if merge else None
+            data = copy.deepcopy(current) if current is not None else {}
+            for key, value in document_data.items():
+                if merge and isinstance(value, dict) and isinstance(data.get(key), dict):
+                    merge_into(data[key], value)
+                else:
+                    apply_value(data, [key], value)
+            self.documents()[self.id] = data
+
+    def update(self, field_updates: dict) -> None:
+        with self.client.lock:
+            current = self.documents().get(self.id)
+            if current is None:
+                raise NotFound(f'No document to update: {self.path}')
+            data = copy.deepcopy(current)
+            for path, value in field_updates.items():
+                apply_value(data, split_path(path), value)
+            self.documents()[self.id] = data
+
+    def delete(self) -> None:
+        with self.client.lock:
+            self.documents().pop(self.id, None)
+
+
+class MemoryQuery:
+    def __init__(self, client: MemoryFirestore, collection: str) -> None:
+        self.client: MemoryFirestore = client
+        self.collection: str = collection
+        self.filters: list[tuple[str, str, Any]] = []
+        self.orders: list[tuple[str, str]] = []
+        self.limit_count: Optional[int] = None
+        self.limit_last: bool = False
+        self.offset_count: int = 0
+        self.cursor: Optional[tuple[Any, bool]] = None
+
+    def copy(self) -> MemoryQuery:
+        query = copy.copy(self)
+        query.filters = list(self.filters)
+        query.orders = list(self.orders)
+        return query
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, filter=None) -> MemoryQuery:
+        query = self.copy()
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query.filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> MemoryQuery:
+        query = self.copy()
+        query.orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> MemoryQuery:
+        query = self.copy()
+        query.limit_count, query.limit_last = count, False
+        return query
+
+    def limit_to_last(self, count: int) -> MemoryQuery:
+        query = self.copy()
+        query.limit_count, query.limit_last = count, True
+        return query
+
+    def offset(self, count: int) -> MemoryQuery:
+        query = self.copy()
+        query.offset_count = count
+        return query
+
+    def start_after(self, document_fields) -> MemoryQuery:
+        query = self.copy()
+        query.cursor = (document_fields, False)
+        return query
+
+    def start_at(self, document_fields) -> MemoryQuery:
+        query = self.copy()
+        query.cursor = (document_fields, True)
+        return query
+
+    def select(self, field_paths) -> MemoryQuery:
+        # every field is returned, which is a superset of the selection
+        return self.copy()
+
+    def count(self, alias: Optional[str] = None) -> MemoryCountQuery:
+        return MemoryCountQuery(self, alias or 'count')
+
+    def matching(self) -> list[MemorySnapshot]:
+        # only matching documents are copied
+        with self.client.lock:
+            documents = [(doc_id, copy.deepcopy(data)) for doc_id, data in
+                         self.client.collections[self.collection].items()
+                         if all(matches(data, path, op, value)
+                                for path, op, value in self.filters)]
+
+        snapshots = [MemorySnapshot(MemoryDocument(self.client, self.collection, doc_id), data)
+                     for doc_id, data in documents]
+
+        # ties are ordered by document id. Documents missing an ordered
+        # field are left out, as in Firestore.
+        snapshots.sort(key=lambda s: s.id)
+        for path, direction in reversed(self.orders):
+            if path == '__name__':
+                # ordered by document id, which every document has
+                snapshots.sort(key=lambda s: s.id, reverse=direction == 'DESCENDING')
+                continue
+            snapshots = [s for s in snapshots if has_field(s._data, path)]
+            snapshots.sort(key=lambda s: sort_key(get_field(s._data, path)),
+                           reverse=direction == 'DESCENDING')
+
+        if self.cursor is not None:
+            snapshots = self.apply_cursor(snapshots)
+        snapshots = snapshots[self.offset_count:]
+        if self.limit_count is not None:
+            if self.limit_last:
+                snapshots = snapshots[-self.limit_count:] if self.limit_count else []
+            else:
+                snapshots = snapshots[:self.limit_count]
+        return snapshots
+
+    def apply_cursor(self, snapshots: list[MemorySnapshot]) -> list[MemorySnapshot]:
+        document_fields, inclusive = self.cursor
+        paths = [path for path, _ in self.orders]
+        if isinstance(document_fields, MemorySnapshot):
+            values = [get_field(document_fields._data, path) for path in paths]
+            values.append(document_fields.id)
+            paths.append('__name__')
+        else:
+            values = [get_field(document_fields, path) for path in paths]
+
+        def position(snapshot):
+            return [sort_key(snapshot.id if path == '__name__' else
+                             get_field(snapshot._data, path)) for path in paths]
+
+        directions = [direction for _, direction in self.orders] + ['ASCENDING']
+        cursor = [sort_key(value) for value in values]
+
+        def after(snapshot) -> bool:
+            for current, bound, direction in zip(position(snapshot), cursor, directions):
+                if current != bound:
+                    return (current > bound) == (direction != 'DESCENDING')
+            return inclusive
+
+        return [snapshot for snapshot in snapshots if after(snapshot)]
+
+    def stream(self, transaction=None) -> Iterator[MemorySnapshot]:
+        return iter(self.matching())
+
+    def get(self, transaction=None) -> list[MemorySnapshot]:
+        return self.matching()
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, client: MemoryFirestore, name: str) -> None:
+        super().__init__(client, name)
+        self.id: str = name
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocument:
+        return MemoryDocument(self.client, self.collection,
+                              document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return datetime.now(timezone.utc), reference
+
+    def list_documents(self) -> list[MemoryDocument]:
+        with self.client.lock:
+            ids = list(self.client.collections[self.collection])
+        return [self.document(doc_id) for doc_id in ids]
+
+
+class MemoryAggregationResult:
+    def __init__(self, alias: str, value: int) -> None:
+        self.alias: str = alias
+        self.value: int = value
+
+
+class MemoryCountQuery:
+    def __init__(self, query: MemoryQuery, alias: str) -> None:
+        self.query: MemoryQuery = query
+        self.alias: str = alias
+
+    def get(self, transaction=None) -> list[list[MemoryAggregationResult]]:
+        return [[MemoryAggregationResult(self.alias, len(self.query.matching()))]]
+
+
+class MemoryWriteBatch:
+    def __init__(self) -> None:
+        self.writes: list = []
+
+    def set(self, reference: MemoryDocument, document_data: dict, merge: bool = False) -> None:
+        self.writes.append(lambda: reference.set(document_data, merge))
+
+    def update(self, reference: MemoryDocument, field_updates: dict) -> None:
+        self.writes.append(lambda: reference.update(field_updates))
+
+    def create(self, reference: MemoryDocument, document_data: dict) -> None:
+        self.writes.append(lambda: reference.create(document_data))
+
+    def delete(self, reference: MemoryDocument) -> None:
+        self.writes.append(reference.delete)
+
+    def commit(self) -> list:
+        """
+        Applies the writes in order.
+
+        Returns:
+            list: one result per write, for compatibility with Firestore
+        """
+        writes, self.writes = self.writes, []
+        for write in writes:
+            write()
+        return [None] * len(writes)
+
+
+def split_path(path: str) -> list[str]:
+    """
+    Splits a field path such as `a.b` or `` `C++`.x `` into field names.
+    """
+    return list(FieldPath.from_string(path).parts)
+
+
+def get_field(data: Optional[dict], path: str) -> Any:
+    value: Any = data
+    for name in split_path(path):
+        if not isinstance(value, dict) or name not in value:
+            return None
+        value = value[name]
+    return value
+
+
+def has_field(data: Optional[dict], path: str) -> bool:
+    value: Any = data
+    for name in split_path(path):
+        if not isinstance(value, dict) or name not in value:
+            return False
+        value = value[name]
+    return True
+
+
+def apply_value(data: dict, names: list[str], value: Any) -> None:
+    """
+    Writes `value` at the nested field `names` of `data`, resolving
+    Firestore sentinels and transforms.
+    """
+    parent = data
+    for name in names[:-1]:
+        if not isinstance(parent.get(name), dict):
+            parent[name] = {}
+        parent = parent[name]
+    name = names[-1]
+
+    if value is transforms.DELETE_FIELD:
+        parent.pop(name, None)
+    elif value is transforms.SERVER_TIMESTAMP:
+        parent[name] = datetime.now(timezone.utc)
+    elif isinstance(value, transforms.Increment):
+        current = parent.get(name)
+        parent[name] = (current if isinstance(current, (int, float)) else 0) + value.value
+    elif isinstance(value, transforms.ArrayUnion):
+        current = list(parent.get(name) or [])
+        parent[name] = current + [v for v in value.values if v not in current]
+    elif isinstance(value, transforms.ArrayRemove):
+        parent[name] = [v for v in parent.get(name) or [] if v not in value.values]
+    elif isinstance(value, dict):
+        parent[name] = {}
+        for key, item in value.items():
+            apply_value(parent[name], [key], item)
+    else:
+        parent[name] = copy.deepcopy(value)
+
+
+def merge_into(data: dict, value: dict) -> None:
+    for key, item in value.items():
+        if isinstance(item, dict) and isinstance(data.get(key), dict):
+            merge_into(data[key], item)
+        else:
+            apply_value(data, [key], item)
+
+
+def as_utc(value: Any) -> Any:
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# Firestore orders values of different types by type first
+TYPE_ORDER = [(type(None), 0), (bool, 1), (int, 2), (float, 2), (datetime, 3),
+              (str, 4), (bytes, 5), (list, 6), (dict, 7)]
+
+
+def sort_key(value: Any) -> tuple:
+    for value_type, rank in TYPE_ORDER:
+        if isinstance(value, value_type):
+            if rank in (6, 7):
+                return (rank, str(value))
+            return (rank, as_utc(value))
+    return (8, str(value))
+
+
+def matches(data: dict, path: str, op: str, value: Any) -> bool:
+    if not has_field(data, path):
+        return False
+    field = as_utc(get_field(data, path))
+    if op == 'in':
+        return field in value
+    if op == 'not-in':
+        return field not in value
+    if op == 'array_contains':
+        return isinstance(field, list) and value in field
+    if op == 'array_contains_any':
+        return isinstance(field, list) and any(v in field for v in value)
+
+    left, right = sort_key(field), sort_key(as_utc(value))
+    if op == '!=':
+        return left != right
+    if op == '==':
+        return left == right
+    # range filters only match values of the same type
+    if left[0] != right[0]:
+        return False
+    return {'<': left < right, '<=': left <= right,
+            '>': left > right, '>=': left >= right}[op]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Optional
+
+from src.metrics import write_atomically
+
+# default location of the checkpoint, next to the spool of scrapes
+DEFAULT_REBASE_CHECKPOINT_PATH = os.path.join('.spool', 'rebase.json')
+
+# jobs read per query by default
+DEFAULT_CHUNK_SIZE = 500
+
+
+class RebaseCheckpoint:
+    """
+    Progress of a rebase of statistics, saved in a JSON file after each page
+    of jobs so that an interrupted rebase resumes where it stopped.
+
+    The checkpoint holds the id of the last job analysed (the cursor of the
+    next page), the number of jobs analysed and the statistics accumulated
+    so far, which only depend on the vocabularies analysed and not on the
+    number of jobs. Once every job is analysed, the statistics documents
+    already saved are recorded too, so that none is incremented twice.
+    """
+
+    def __init__(self, path: str = DEFAULT_REBASE_CHECKPOINT_PATH) -> None:
+        self.path: str = path
+        self.cursor: Optional[str] = None
+        self.jobs: int = 0
+        self.increments: dict[str, dict[str, int]] = {}
+        self.analysed: bool = False
+        self.saved: list[str] = []
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_REBASE_CHECKPOINT_PATH) -> RebaseCheckpoint:
+        """
+        Returns the checkpoint saved in `path`, or an empty checkpoint if
+        there is none.
+        """
+        checkpoint = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            checkpoint.cursor = data.get('cursor')
+            checkpoint.jobs = data.get('jobs', 0)
+            checkpoint.increments = data.get('increments', {})
+            checkpoint.analysed = data.get('analysed', False)
+            checkpoint.saved = data.get('saved', [])
+        return checkpoint
+
+    def is_empty(self) -> bool:
+        return self.cursor is None and not self.analysed
+
+    def to_dict(self) -> dict:
+        return {'cursor': self.cursor, 'jobs': self.jobs,
+                'increments': self.increments, 'analysed': self.analysed,
+                'saved': self.saved}
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        write_atomically(self.path, json.dumps(self.to_dict(), ensure_ascii=False))
+
+    def clear(self) -> None:
+        """
+        Ends the rebase: the next one starts from the first job.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+# default location of spool, relative to the working directory
+DEFAULT_SPOOL_PATH = os.path.join('.spool', 'scrape.sqlite3')
+
+
+def encode_job(job: dict) -> str:
+    """
+    Serializes a job dictionary to JSON. Datetimes are tagged so that
+    they can be restored by `decode_job`.
+
+    The `timestamp` field is dropped: it holds a Firestore sentinel which is
+    set again when the job is uploaded.
+    """
+    def default(value):
+        if isinstance(value, datetime):
+            return {'__datetime__': value.isoformat()}
+        raise TypeError(f"Cannot serialize {type(value)}")
+
+    job = {k: v for k, v in job.items() if k != 'timestamp'}
+    return json.dumps(job, default=default, ensure_ascii=False)
+
+
+def decode_job(payload: str) -> dict:
+    def object_hook(value):
+        if '__datetime__' in value:
+            return datetime.fromisoformat(value['__datetime__'])
+        return value
+
+    return json.loads(payload, object_hook=object_hook)
+
+
+def job_key(job: dict) -> str:
+    """
+    Returns the value identifying a job on its website: the ad id when
+    available, the url otherwise.
+    """
+    return str(job.get('ad_id') or job.get('url'))
+
+
+class Spool:
+    """
+    Durable local store for the progress of scrape runs.
+
+    Each job is written to the spool as soon as it is scraped, and the last
+    completed page of each website is checkpointed. A run which crashes can
+    therefore resume where it stopped, and jobs already scraped are uploaded
+    and analysed from the spool instead of being scraped again.
+
+    The spool also holds the detail queue: jobs recorded from a listing
+    page only (skeleton jobs) wait there, newest first, until their details
+    are fetched. Skeleton jobs are uploaded straight away and updated in
+    the database once enriched, but they are only analysed once enriched.
+    """
+
+    def __init__(self, path: str = DEFAULT_SPOOL_PATH) -> None:
+        """
+        Opens the spool, creating it if missing.
+
+        Args:
+            path (str): Path of SQLite file. Use `:memory:` for a
+            temporary spool.
+        """
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path: str = path
+
+        # scrapers may write from several threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                site TEXT NOT NULL,
+                job_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                uploaded INTEGER NOT NULL DEFAULT 0,
+                analysed INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                enriched INTEGER NOT NULL DEFAULT 1,
+                stale INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (site, job_key))''')
+            # spools created by older versions lack the detail queue columns
+            columns = [row[1] for row in
+                       self.conn.execute('PRAGMA table_info(jobs)')]
+            for column in ('enriched', 'stale'):
+                if column not in columns:
+                    default = 1 if column == 'enriched' else 0
+                    self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} '
+                                      f'INTEGER NOT NULL DEFAULT {default}')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS checkpoints (
+                site TEXT PRIMARY KEY,
+                page INTEGER NOT NULL,
+                finished INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS details (
+                site TEXT NOT NULL,
+                job_key TEXT NOT NULL,
+                date_posted TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (site, job_key))''')
+
+    def add_job(self, site: str, job: dict, enriched: bool = True) -> None:
+        """
+        Saves a scraped job. A job already in the spool is left unchanged.
+
+        Args:
+            site (str): Website name
+            job (dict): Job dictionary
+            enriched (bool): False for a skeleton job, which is added to the
+            detail queue.
+        """
+        with self.lock, self.conn:
+            inserted = self.conn.execute(
+                'INSERT OR IGNORE INTO jobs (site, job_key, payload, '
+                'created_at, enriched) VALUES (?, ?, ?, ?, ?)',
+                (site, job_key(job), encode_job(job), time.time(),
+                 int(enriched))).rowcount
+            if inserted and not enriched:
+                date_posted = job.get('date_posted')
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO details (site, job_key, date_posted) '
+                    'VALUES (?, ?, ?)',
+                    (site, job_key(job),
+                     date_posted.isoformat() if date_posted else ''))
+
+    def job_keys(self, site: str) -> list[str]:
+        """
+        Returns the keys of all jobs of `site` in the spool.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT job_key FROM jobs WHERE site = ?', (site,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_jobs(self, site: str, uploaded: Optional[bool] = None,
+                 analysed: Optional[bool] = None,
+                 enriched: Optional[bool] = None,
+                 stale: Optional[bool] = None) -> list[dict]:
+        """
+        Returns the jobs of `site` in the order they were scraped, filtered
+        by upload, analysis and enrichment state. Stale jobs were enriched
+        after being uploaded and must be updated in the database.
+        """
+        query = 'SELECT payload FROM jobs WHERE site = ?'
+        params: list = [site]
+        for column, value in (('uploaded', uploaded), ('analysed', analysed),
+                              ('enriched', enriched), ('stale', stale)):
+            if value is not None:
+                query += f' AND {column} = ?'
+                params.append(int(value))
+        query += ' ORDER BY created_at, rowid'
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [decode_job(row[0]) for row in rows]
+
+    def pending_upload(self, site: str) -> list[dict]:
+        return self.get_jobs(site, uploaded=False)
+
+    def pending_analysis(self, site: str) -> list[dict]:
+        return self.get_jobs(site, uploaded=True, analysed=False,
+                             enriched=True)
+
+    def pending_update(self, site: str) -> list[dict]:
+        return self.get_jobs(site, uploaded=True, stale=True)
+
+    def mark_uploaded(self, site: str, keys: list[str]) -> None:
+        self.set_flag(site, keys, 'uploaded')
+
+    def mark_analysed(self, site: str, keys: list[str]) -> None:
+        self.set_flag(site, keys, 'analysed')
+
+    def mark_updated(self, site: str, keys: list[str]) -> None:
+        self.set_flag(site, keys, 'stale', False)
+
+    def set_flag(self, site: str, keys: list[str], column: str,
+                 value: bool = True) -> None:
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f'UPDATE jobs SET {column} = ? WHERE site = ? AND job_key = ?',
+                [(int(value), site, key) for key in keys])
+
+    def queued_details(self, site: str, limit: Optional[int] = None) -> list[dict]:
+        """
+        Returns the skeleton jobs of `site` waiting for their details,
+        newest first. Jobs which already failed are tried last.
+        """
+        query = ('SELECT jobs.payload FROM details JOIN jobs USING '
+                 '(site, job_key) WHERE details.site = ? '
+                 'ORDER BY details.date_posted DESC, details.attempts, '
+                 'jobs.rowid')
+        params: list = [site]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [decode_job(row[0]) for row in rows]
+
+    def complete_detail(self, site: str, job: dict) -> None:
+        """
+        Replaces a skeleton job by its enriched version and removes it from
+        the detail queue. A job which was already uploaded becomes stale.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE jobs SET payload = ?, enriched = 1, stale = uploaded '
+                'WHERE site = ? AND job_key = ?',
+                (encode_job(job), site, job_key(job)))
+            self.conn.execute(
+                'DELETE FROM details WHERE site = ? AND job_key = ?',
+                (site, job_key(job)))
+
+    def fail_detail(self, site: str, key: str) -> int:
+        """
+        Records a failed attempt at fetching the details of a job.
+
+        Returns:
+            int: number of failed attempts so far
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE details SET attempts = attempts + 1 '
+                'WHERE site = ? AND job_key = ?', (site, key))
+            row = self.conn.execute(
+                'SELECT attempts FROM details WHERE site = ? AND job_key = ?',
+                (site, key)).fetchone()
+        return row[0] if row else 0
+
+    def save_checkpoint(self, site: str, page: int,
+                        finished: bool = False) -> None:
+        """
+        Records that every job up to and including `page` was scraped.
+
+        Args:
+            site (str): Website name
+            page (int): Last completed page
+            finished (bool): True once the scraper has stopped. The next
+            run then skips scraping and only uploads the spooled jobs.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO checkpoints (site, page, finished, '
+                'updated_at) VALUES (?, ?, ?, ?)',
+                (site, page, int(finished), time.time()))
+
+    def get_checkpoint(self, site: str) -> Optional[dict]:
+        """
+        Returns the checkpoint of `site` as a dictionary with keys `page`
+        and `finished`, or None if no run is in progress.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT page, finished FROM checkpoints WHERE site = ?',
+                (site,)).fetchone()
+        if row is None:
+            return None
+        return {'page': row[0], 'finished': bool(row[1])}
+
+    def clear(self, site: str) -> None:
+        """
+        Ends the run of `site`: removes its checkpoints, including those of
+        backfill partitions stored as `<site>/...`, and the jobs which were
+        both uploaded and analysed.
+        """
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM checkpoints WHERE site = ? OR '
+                              "site LIKE ? || '/%'", (site, site))
+            self.conn.execute('DELETE FROM jobs WHERE site = ? AND '
+                              'uploaded = 1 AND analysed = 1 AND stale = 0',
+                              (site,))
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+class Watermark:
+    """
+    Newest posting date and job id seen on a website.
+
+    Results pages are sorted from newest to oldest, so once every job on a
+    page was posted before the watermark, all following pages were already
+    scraped. Jobs posted during the `overlap_days` before the watermark are
+    still checked, to catch jobs which were indexed late by the website.
+    """
+
+    def __init__(self, newest_date: Optional[datetime] = None,
+                 newest_id: Optional[str] = None,
+                 overlap_days: int = 2) -> None:
+        self.newest_date: Optional[datetime] = newest_date
+        self.newest_id: Optional[str] = newest_id
+        self.overlap_days: int = overlap_days
+
+    @classmethod
+    def from_dict(cls, data: dict, overlap_days: int = 2) -> Watermark:
+        """
+        Creates a watermark from a dictionary returned by `to_dict`.
+        An empty dictionary gives an empty watermark.
+        """
+        newest_date = None
+        if data.get('newest_date'):
+            newest_date = datetime.fromisoformat(data['newest_date'])
+        return cls(newest_date, data.get('newest_id'), overlap_days)
+
+    def to_dict(self) -> dict:
+        return {'newest_date': (self.newest_date.isoformat()
+                                if self.newest_date else None),
+                'newest_id': self.newest_id}
+
+    def cutoff(self) -> Optional[datetime]:
+        """
+        Returns the date before which jobs are considered already scraped,
+        or None if the watermark is empty.
+        """
+        if self.newest_date is None:
+            return None
+        return self.newest_date - timedelta(days=self.overlap_days)
+
+    def is_older(self, date_posted: Optional[datetime]) -> bool:
+        """
+        Returns True if a job posted on `date_posted` was already scraped.
+        Jobs with an unknown date are never considered older.
+        """
+        cutoff = self.cutoff()
+        if cutoff is None or date_posted is None:
+            return False
+        return date_posted < cutoff
+
+    def page_is_older(self, dates: list[Optional[datetime]]) -> bool:
+        """
+        Returns True if every job of a results page is older than the
+        watermark, meaning that scraping can stop.
+        """
+        return len(dates) > 0 and all(self.is_older(d) for d in dates)
+
+    def dates_known(self, dates: list[Optional[datetime]]) -> bool:
+        """
+        Returns True if the watermark and the date of every job of a
+        results page are known, so that `page_is_older` can tell whether
+        scraping can stop.
+        """
+        return self.newest_date is not None and all(d is not None for d in dates)
+
+    def advance(self, date_posted: Optional[datetime],
+                job_id: Optional[str]) -> None:
+        """
+        Moves the watermark forward if `date_posted` is newer.
+        """
+        if date_posted is None:
+            return
+        if self.newest_date is None or date_posted > self.newest_date:
+            self.newest_date = date_posted
+            self.newest_id = job_id
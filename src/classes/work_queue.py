@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import FieldFilter, Query, transactional
+
+# states of a task
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Task:
+    """
+    Unit of work leased from a work queue, such as a results page range to
+    list or a job whose details must be fetched.
+    """
+
+    def __init__(self, task_id: str, kind: str, payload: dict, token: str,
+                 attempts: int, lease_expires: float) -> None:
+        self.task_id: str = task_id
+        self.kind: str = kind
+        self.payload: dict = payload
+
+        # identifies the current lease. Only its holder can complete the task.
+        self.token: str = token
+        self.attempts: int = attempts
+        self.lease_expires: float = lease_expires
+
+
+def is_available(state: str, lease_expires: float, now: float) -> bool:
+    """
+    Returns True if a task can be leased: it is queued, or the lease of its
+    previous worker expired without a heartbeat.
+    """
+    return state == QUEUED or (state == LEASED and lease_expires <= now)
+
+
+class SQLiteWorkQueue:
+    """
+    Work queue shared by the worker processes of a single machine, stored
+    in a SQLite file. Also used as a stand-in for `FirestoreWorkQueue` in
+    tests.
+
+    A worker leases tasks for `visibility_timeout` seconds and must renew
+    its lease with `heartbeat` while working on them. Tasks whose lease
+    expires are handed to another worker. `complete` only succeeds for the
+    current lease holder, so the result of a task is saved at most once.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300,
+                 max_attempts: int = 3,
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            path (str): Path of SQLite file. Use `:memory:` for a
+            temporary queue.
+            visibility_timeout (float): Seconds a leased task stays hidden
+            from other workers without a heartbeat.
+            max_attempts (int): Number of leases after which a task which
+            keeps failing is marked as failed.
+            clock (callable): Returns the current time in seconds.
+        """
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.visibility_timeout: float = visibility_timeout
+        self.max_attempts: int = max_attempts
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        # ! transactions are opened explicitly with BEGIN IMMEDIATE, which
+        # ! locks the file against other processes leasing the same task
+        self.conn = sqlite3.connect(path, check_same_thread=False,
+                                    isolation_level=None, timeout=30)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority REAL NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                token TEXT,
+                lease_owner TEXT,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL)''')
+
+    def put(self, kind: str, task_id: str, payload: dict,
+            priority: float = 0) -> bool:
+        """
+        Adds a task, unless a task with the same id was ever added.
+
+        Args:
+            kind (str): Type of task, used by workers to pick a handler
+            task_id (str): Unique id of task, for example
+            `detail:kariyernet:123`
+            payload (dict): JSON-serializable arguments of task
+            priority (float): Tasks with the highest priority are leased first
+
+        Returns:
+            bool: True if the task was added
+        """
+        with self.lock:
+            return self.conn.execute(
+                'INSERT OR IGNORE INTO tasks (task_id, kind, payload, priority, '
+                'state, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (task_id, kind, json.dumps(payload), priority, QUEUED,
+                 self.clock())).rowcount == 1
+
+    def lease(self, worker_id: str, count: int = 1,
+              kinds: Optional[list[str]] = None) -> list[Task]:
+        """
+        Leases up to `count` available tasks, highest priority first.
+
+        Args:
+            worker_id (str): Name of worker, for debugging
+            count (int): Maximum number of tasks
+            kinds (list, optional): Only lease tasks of these kinds
+
+        Returns:
+            list[Task]: Leased tasks. Empty when no task is available.
+        """
+        now = self.clock()
+        query = ('SELECT task_id, kind, payload, attempts FROM tasks WHERE '
+                 '(state = ? OR (state = ? AND lease_expires <= ?))')
+        params: list = [QUEUED, LEASED, now]
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            params.extend(kinds)
+        query += ' ORDER BY priority DESC, created_at, rowid LIMIT ?'
+        params.append(count)
+
+        tasks = []
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                for task_id, kind, payload, attempts in \
+                        self.conn.execute(query, params).fetchall():
+                    task = Task(task_id, kind, json.loads(payload),
+                                uuid.uuid4().hex, attempts + 1,
+                                now + self.visibility_timeout)
+                    self.conn.execute(
+                        'UPDATE tasks SET state = ?, token = ?, lease_owner = ?, '
+                        'lease_expires = ?, attempts = ? WHERE task_id = ?',
+                        (LEASED, task.token, worker_id, task.lease_expires,
+                         task.attempts, task_id))
+                    tasks.append(task)
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return tasks
+
+    def update_lease(self, task: Task, state: str,
+                     lease_expires: float = 0) -> bool:
+        """
+        Changes the state of a task if `task` still holds its lease.
+        """
+        with self.lock:
+            return self.conn.execute(
+                'UPDATE tasks SET state = ?, lease_expires = ? '
+                'WHERE task_id = ? AND token = ? AND state = ?',
+                (state, lease_expires, task.task_id, task.token,
+                 LEASED)).rowcount == 1
+
+    def heartbeat(self, task: Task) -> bool:
+        """
+        Extends the lease of a task by `visibility_timeout`.
+
+        Returns:
+            bool: False if the lease was lost to another worker. The
+            caller must then abandon the task.
+        """
+        lease_expires = self.clock() + self.visibility_timeout
+        if self.update_lease(task, LEASED, lease_expires):
+            task.lease_expires = lease_expires
+            return True
+        return False
+
+    def complete(self, task: Task) -> bool:
+        """
+        Marks a task as done.
+
+        Returns:
+            bool: False if the lease was lost to another worker, in which
+            case the result of the task must be discarded.
+        """
+        return self.update_lease(task, DONE)
+
+    def release(self, task: Task) -> bool:
+        """
+        Gives back a task which failed, so that it can be retried. A task
+        which failed `max_attempts` times is not leased again.
+        """
+        state = FAILED if task.attempts >= self.max_attempts else QUEUED
+        return self.update_lease(task, state)
+
+    def counts(self) -> dict[str, int]:
+        """
+        Returns the number of tasks in each state.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class FirestoreWorkQueue:
+    """
+    Work queue stored in a Firestore collection, shared by workers running
+    on any number of machines. Same interface as `SQLiteWorkQueue`.
+
+    Every change of lease is made in a transaction which checks the state
+    and token of the task, so two workers can never hold the same lease.
+
+    - Leasing queries `state` together with `priority` and `lease_expires`,
+    which requires composite indexes on these fields.
+    """
+
+    def __init__(self, client, collection: str = 'work_queue',
+                 visibility_timeout: float = 300, max_attempts: int = 3,
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            client (firestore.Client): Firestore client, for example
+            `Database.db`
+            collection (str): Name of collection holding the tasks
+            visibility_timeout (float): Seconds a leased task stays hidden
+            from other workers without a heartbeat.
+            max_attempts (int): Number of leases after which a task which
+            keeps failing is marked as failed.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.client = client
+        self.collection_ref = client.collection(collection)
+        self.visibility_timeout: float = visibility_timeout
+        self.max_attempts: int = max_attempts
+        self.clock = clock
+
+    def put(self, kind: str, task_id: str, payload: dict,
+            priority: float = 0) -> bool:
+        try:
+            self.collection_ref.document(task_id).create({
+                'kind': kind, 'payload': json.dumps(payload),
+                'priority': priority, 'state': QUEUED, 'token': None,
+                'lease_owner': None, 'lease_expires': 0, 'attempts': 0,
+                'created_at': self.clock()})
+            return True
+        except AlreadyExists:
+            return False
+
+    def lease(self, worker_id: str, count: int = 1,
+              kinds: Optional[list[str]] = None) -> list[Task]:
+        now = self.clock()
+        queued = (self.collection_ref
+                  .where(filter=FieldFilter('state', '==', QUEUED))
+                  .order_by('priority', direction=Query.DESCENDING)
+                  .limit(count * 2)
+                  .stream())
+        expired = (self.collection_ref
+                   .where(filter=FieldFilter('state', '==', LEASED))
+                   .where(filter=FieldFilter('lease_expires', '<=', now))
+                   .limit(count)
+                   .stream())
+
+        tasks: list[Task] = []
+        for snapshot in list(queued) + list(expired):
+            if len(tasks) == count:
+                break
+            if kinds and snapshot.to_dict()['kind'] not in kinds:
+                continue
+            # another worker may lease the task between the query and
+            # the transaction
+            task = self.try_lease(snapshot.reference, worker_id, now)
+            if task is not None:
+                tasks.append(task)
+        return tasks
+
+    def try_lease(self, task_ref, worker_id: str, now: float) -> Optional[Task]:
+        @transactional
+        def claim(transaction):
+            data = task_ref.get(transaction=transaction).to_dict()
+            if data is None or not is_available(data['state'],
+                                                data['lease_expires'], now):
+                return None
+            task = Task(task_ref.id, data['kind'], json.loads(data['payload']),
+                        uuid.uuid4().hex, data['attempts'] + 1,
+                        now + self.visibility_timeout)
+            transaction.update(task_ref, {
+                'state': LEASED, 'token': task.token, 'lease_owner': worker_id,
+                'lease_expires': task.lease_expires, 'attempts': task.attempts})
+            return task
+
+        return claim(self.client.transaction())
+
+    def update_lease(self, task: Task, state: str,
+                     lease_expires: float = 0) -> bool:
+        task_ref = self.collection_ref.document(task.task_id)
+
+        @transactional
+        def update(transaction):
+            data = task_ref.get(transaction=transaction).to_dict()
+            if data is None or data['token'] != task.token or data['state'] != LEASED:
+                return False
+            transaction.update(task_ref, {'state': state,
+                                          'lease_expires': lease_expires})
+            return True
+
+        return update(self.client.transaction())
+
+    def heartbeat(self, task: Task) -> bool:
+        lease_expires = self.clock() + self.visibility_timeout
+        if self.update_lease(task, LEASED, lease_expires):
+            task.lease_expires = lease_expires
+            return True
+        return False
+
+    def complete(self, task: Task) -> bool:
+        return self.update_lease(task, DONE)
+
+    def release(self, task: Task) -> bool:
+        state = FAILED if task.attempts >= self.max_attempts else QUEUED
+        return self.update_lease(task, state)
+
+    def counts(self) -> dict[str, int]:
+        counts = {}
+        for state in (QUEUED, LEASED, DONE, FAILED):
+            query = self.collection_ref.where(filter=FieldFilter('state', '==', state))
+            result = query.count().get()
+            counts[state] = int(result[0][0].value)
+        return counts
@@ -0,0 +1,4 @@
+# one module per command of `src.main`. A module is only imported when its
+# command runs, so that each command imports the dependencies it needs
+# (pandas, Firestore, selenium) and nothing else. Each module defines
+# `run(args)`.
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from src.classes.database import open_database
+from src.quota import check_plan, estimate_full_read
+
+
+def backup_to_drive(output: str = 'sample_jobs.json', dry_run: bool = False):
+    """
+    Saves all jobs in main database to google drive in json format.
+
+    Args:
+        output (str): File where jobs are saved
+        dry_run (bool): Print the estimated cost instead
+    """
+    # TODO: complete function
+    main_db = open_database(forMainDB=True)
+    if not check_plan(main_db, lambda: estimate_full_read(main_db, 'backup'), dry_run):
+        return
+    try:
+        df = main_db.get_dataframe()
+        df.to_json(output, orient='records')
+    finally:
+        main_db.save_quota_usage()
+
+
+def run(args) -> None:
+    backup_to_drive(args.output, args.dry_run)
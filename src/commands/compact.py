@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+
+from src.classes.database import open_database
+from src.quota import Estimate, check_plan
+from src.stats_events import compact_events
+from src.stats_snapshots import compact_snapshots, get_current_pointer
+
+
+def run(args) -> None:
+    """
+    Rebases the statistics snapshots of the frontend database and deletes
+    versions older than `--retain` versions, then deletes the statistics
+    events of the main database older than `--events_retain` runs.
+
+    ! Do not run at the same time as a command publishing statistics.
+    """
+    frontend_db = open_database()
+    main_db = open_database(forMainDB=True)
+
+    def estimate() -> Estimate:
+        pointer = get_current_pointer(frontend_db) or {'version': 0}
+        versions = pointer['version']
+        return (Estimate('compact')
+                .add('get_current_pointer', 1)
+                .add('get_snapshots', max(1, versions))
+                .add('compact_snapshots', writes=max(0, versions - args.retain) + 3))
+
+    def estimate_events() -> Estimate:
+        events = main_db.count_stats_events()
+        return (Estimate('compact')
+                .add('get_stats_events', max(1, events))
+                .add('delete_stats_events', writes=max(0, events - args.events_retain)))
+
+    # ? each database is checked against its own budget
+    plans = [check_plan(frontend_db, estimate, args.dry_run),
+             check_plan(main_db, estimate_events, args.dry_run)]
+    if not all(plans):
+        return
+    try:
+        print(json.dumps({'snapshots': compact_snapshots(frontend_db, args.retain),
+                          'events': compact_events(main_db, args.events_retain)}))
+    finally:
+        frontend_db.save_quota_usage()
+        main_db.save_quota_usage()
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from src.classes.database import open_database
+from src.quota import check_plan, estimate_full_read
+
+
+def run(args) -> None:
+    """
+    Prints the jobs of the main database which share a url.
+
+    ! WARNING: Every job is read.
+    """
+    main_db = open_database(forMainDB=True)
+    if not check_plan(main_db, lambda: estimate_full_read(main_db, 'duplicates_exist'),
+                      args.dry_run):
+        return
+    try:
+        main_db.duplicates_exist()
+    finally:
+        main_db.save_quota_usage()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+
+from src.classes.database import open_database
+from src.commands.sync import bundle_path_for, sync_stats
+from src.quota import Estimate, check_plan
+from src.stats_events import replay_run, revert_run
+
+
+def run(args) -> None:
+    """
+    Lists the statistics events of runs, or reverts or replays the
+    statistics of one run (`--run_id`), then publishes the statistics.
+
+    ! Do not run at the same time as the scrape command.
+    """
+    if args.action != 'list' and not args.run_id:
+        raise ValueError(f"--run_id is required to {args.action} a run")
+    main_db = open_database(forMainDB=True)
+
+    def estimate() -> Estimate:
+        estimate = Estimate('events')
+        if args.action == 'list':
+            return estimate.add('get_stats_events', max(1, main_db.count_stats_events()))
+        stats_docs = main_db.count_stats_docs()
+        return (estimate.add('get_stats_event', 1)
+                .add('save_analytics', stats_docs, stats_docs)
+                .add('set_stats_event_status', writes=1)
+                .add('sync_stats', stats_docs + 2 * main_db.count_cube_docs() + 1))
+
+    if not check_plan(main_db, estimate, args.dry_run):
+        return
+    try:
+        if args.action == 'list':
+            for event in main_db.get_stats_events(['run_id', 'status', 'created_at',
+                                                   'documents']):
+                print(json.dumps(event, default=str))
+            return
+        if args.action == 'revert':
+            revert_run(main_db, args.run_id, args.keep_salaries)
+        else:
+            replay_run(main_db, args.run_id)
+        sync_stats(main_db, bundle_path_for(args), args.top_n)
+    finally:
+        main_db.save_quota_usage()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from src.analyser.cube import job_site, posting_month
+from src.analyser.runner import analyse_jobs, merge_increments, save_increment
+from src.badge_generator import update_job_count_badge
+from src.classes.database import Database, is_offline, open_database
+from src.classes.rebase_checkpoint import (DEFAULT_CHUNK_SIZE, DEFAULT_REBASE_CHECKPOINT_PATH,
+                                           RebaseCheckpoint)
+from src.commands.sync import bundle_path_for, sync_stats
+from src.logger import Progress, setup_logger
+from src.metrics import metrics
+from src.quota import check_plan, estimate_rebase_stats
+from src.stats_bundle import DEFAULT_TOP_N
+from src.stats_events import clear_events
+
+logger = setup_logger()
+
+# fields of jobs used by statistics. Other fields are not read.
+ANALYSED_FIELDS = ['job_title', 'job_details', 'location', 'salary',
+                   'site', 'url', 'date_posted', 'company']
+
+
+def rebase_stats(dry_run: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 checkpoint_path: str = DEFAULT_REBASE_CHECKPOINT_PATH,
+                 restart: bool = False, bundle_path: str | None = None,
+                 top_n: int = DEFAULT_TOP_N) -> None:
+    """
+    After DELETING the `statistics`, `stats_cube`, `stats_sketches` and
+    `salary_quantiles` collections in main database and frontend database
+    manually, call this function to recalculate all statistics and sync
+    with `frontend-db`.
+
+    No scraping takes place when this function is called. Statistics are
+    calculated from existing scraped jobs.
+
+    Args:
+        dry_run (bool): only print the estimated cost
+        chunk_size (int): jobs read at a time
+        checkpoint_path (str): file where progress is saved. An interrupted
+        rebase resumes from there.
+        restart (bool): ignore the saved progress
+        bundle_path (str, optional): see `sync_stats`
+        top_n (int): see `sync_stats`
+
+    ! DO NOT CALL THIS FUNCTION AT THE SAME TIME AS the scrape command
+    ! WARNING: This function heavily impacts read and write quotas.
+    """
+    # load main database.
+    main_db = open_database(forMainDB=True)
+
+    if not check_plan(main_db, lambda: estimate_rebase_stats(main_db), dry_run):
+        return
+
+    checkpoint = (RebaseCheckpoint(checkpoint_path) if restart
+                  else RebaseCheckpoint.load(checkpoint_path))
+    try:
+        rebuild_stats(main_db, chunk_size, checkpoint, bundle_path, top_n)
+    finally:
+        main_db.save_quota_usage()
+
+
+def analyse_all_jobs(main_db: Database, chunk_size: int,
+                     checkpoint: RebaseCheckpoint) -> None:
+    """
+    Reads every job after the cursor of `checkpoint`, one page at a time,
+    and adds its statistics to the checkpoint, which is saved after each
+    page. Only one page of jobs is held in memory.
+    """
+    remaining = max(0, main_db.count_jobs() - checkpoint.jobs)
+    with Progress('Rebasing statistics', remaining) as progress:
+        while True:
+            page = main_db.get_jobs_page(chunk_size, checkpoint.cursor, ANALYSED_FIELDS)
+            if not page:
+                break
+            jobs = [snapshot.to_dict() for snapshot in page]
+
+            with metrics.time('analyse'):
+                increments = analyse_jobs(
+                    [job.get('job_title') or '' for job in jobs],
+                    [job.get('job_details') or '' for job in jobs],
+                    [job.get('location') or '' for job in jobs],
+                    [job.get('salary') or '' for job in jobs],
+                    [job_site(job) for job in jobs],
+                    [posting_month(job.get('date_posted')) for job in jobs],
+                    [job.get('company') or '' for job in jobs])
+
+            checkpoint.increments = merge_increments(checkpoint.increments, increments)
+            checkpoint.cursor = page[-1].id
+            checkpoint.jobs += len(page)
+            checkpoint.save()
+            progress.update(len(page))
+
+            if len(page) < chunk_size:
+                break
+
+    checkpoint.analysed = True
+    checkpoint.save()
+
+
+def rebuild_stats(main_db: Database, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  checkpoint: RebaseCheckpoint | None = None,
+                  bundle_path: str | None = None, top_n: int = DEFAULT_TOP_N) -> None:
+    """
+    Recalculates all statistics from the jobs of `main_db` and syncs them
+    with `frontend-db`. See `rebase_stats`.
+    """
+    checkpoint = checkpoint or RebaseCheckpoint()
+    if not checkpoint.is_empty():
+        logger.info(f"Resuming rebase after {checkpoint.jobs} jobs")
+
+    if not checkpoint.analysed:
+        analyse_all_jobs(main_db, chunk_size, checkpoint)
+
+    # update general stats
+    main_db.update_metadata(checkpoint.jobs)
+
+    # ? each document is recorded once saved, so that a rebase
+    # ? interrupted while saving does not increment it twice
+    with metrics.time('stats'):
+        for name, increment in checkpoint.increments.items():
+            if name in checkpoint.saved:
+                continue
+            save_increment(main_db, name, increment)
+            checkpoint.saved.append(name)
+            checkpoint.save()
+
+        if checkpoint.jobs > 0:
+            main_db.update_job_count_trend()
+
+    # ? increments of earlier runs are now part of the rebased statistics
+    clear_events(main_db)
+
+    # serve stats to frontend
+    sync_stats(main_db, bundle_path, top_n)
+    checkpoint.clear()
+
+    # update job count in readme
+    if checkpoint.jobs > 0 and not is_offline():
+        update_job_count_badge(checkpoint.jobs)
+
+
+def run(args) -> None:
+    rebase_stats(args.dry_run, args.chunk_size, args.checkpoint, args.restart,
+                 bundle_path_for(args), args.top_n)
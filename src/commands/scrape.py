@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from src.base_scrapper import get_scraper_class
+from src.badge_generator import update_job_count_badge
+from src.classes.archive import Archive
+from src.classes.database import Database, is_offline, open_database
+from src.classes.spool import Spool
+from src.classes.work_queue import FirestoreWorkQueue, SQLiteWorkQueue
+from src.commands.sync import bundle_path_for, sync_stats
+from src.logger import setup_logger
+from src.metrics import metrics
+from src.orchestrator import run_pipeline, run_queue_worker
+from src.quota import check_plan, estimate_scrape
+
+logger = setup_logger()
+
+
+def run(args) -> None:
+    """
+    All selected websites are scraped at the same time. Scraped jobs are
+    saved to a local spool before being uploaded. If a previous run was
+    interrupted, scraping resumes from its checkpoint and the jobs it
+    already scraped are uploaded.
+
+    ! Do not run this command together with rebase.
+    """
+    logger.info(f"Scraping jobs from {', '.join(args.website)}")
+    scrape(args, args.website)
+
+
+def scrape(args, websites: list[str]) -> None:
+    """
+    Scrapes `websites`, then uploads, analyses and publishes the new jobs.
+
+    Args:
+        args (argparse.Namespace): command line arguments
+        websites (list[str]): names of websites
+    """
+    # setup database and spool shared by all scrapers
+    main_db = open_database(forMainDB=True)
+
+    def estimate():
+        return estimate_scrape(
+            main_db, websites,
+            {website: get_scraper_class(website).id_field for website in websites},
+            args.max_jobs)
+
+    # abort before scraping if the budget cannot cover the run
+    if not check_plan(main_db, estimate, args.dry_run):
+        return
+
+    try:
+        scrape_and_publish(args, websites, main_db)
+    finally:
+        main_db.save_quota_usage()
+
+
+def scrape_and_publish(args, websites: list[str], main_db: Database) -> None:
+    """
+    Scrapes, uploads, analyses and publishes new jobs.
+    """
+    spool = Spool(args.spool)
+    archive = Archive(args.archive) if args.archive else None
+
+    if args.queue:
+        queue = (FirestoreWorkQueue(main_db.client) if args.queue == 'firestore'
+                 else SQLiteWorkQueue(args.queue))
+        analysed_count = run_queue_worker(main_db, spool, queue, websites,
+                                          seed=args.seed_queue,
+                                          archive=archive)
+    else:
+        analysed_count = run_pipeline(main_db, spool, websites, args.max_jobs,
+                                      args.overlap_days,
+                                      args.workers if args.backfill else None,
+                                      args.defer_details, args.detail_workers,
+                                      archive)
+    metrics.jobs = analysed_count
+
+    # if no new jobs found exit
+    if analysed_count == 0:
+        return
+
+    logger.info(f"{analysed_count} new jobs found!")
+
+    with metrics.time('stats'):
+        main_db.update_job_count_trend()
+
+    # send updated statistics to frontend db
+    sync_stats(main_db, bundle_path_for(args), args.top_n)
+
+    # update job count in readme, unless the counts come from an
+    # offline database
+    if not is_offline():
+        update_job_count_badge(main_db.get_size())
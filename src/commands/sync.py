@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from src.classes.database import Database, is_offline, open_database
+from src.logger import setup_logger
+from src.metrics import timed
+from src.quota import SALARY_DOCS, Estimate, check_plan
+from src.stats_bundle import DEFAULT_BUNDLE_PATH, DEFAULT_TOP_N, publish_bundle
+from src.stats_snapshots import SnapshotConflictError, publish_snapshot
+
+logger = setup_logger()
+
+
+def bundle_path_for(args) -> Optional[str]:
+    """
+    Returns where the gzip JSON bundle is written: `--bundle`, or by default
+    `DEFAULT_BUNDLE_PATH` unless the databases are offline.
+    """
+    if args.bundle:
+        return args.bundle
+    return None if is_offline() else DEFAULT_BUNDLE_PATH
+
+
+@timed('sync')
+def sync_stats(main_db: Database, bundle_path: Optional[str] = None,
+               top_n: int = DEFAULT_TOP_N):
+    """
+    Clones the statistics found in `main_db` to `frontend_db`, with the
+    cells of the cube and of the sketches and the salary quantiles, then
+    publishes the statistics as a bundle (see `stats_bundle`) and as a new
+    snapshot version (see `stats_snapshots`).
+
+    Args:
+        main_db (Database): database containing scraped data
+        bundle_path (str, optional): file where the bundle is also written
+        as gzip JSON
+        top_n (int): entries kept per category in the bundle
+    """
+    frontend_db = open_database()
+    # ? the few statistics documents are kept to build the bundle
+    # ? without reading them again
+    docs = list(main_db.export_collection(main_db.stats_collection_ref))
+    try:
+        frontend_db.import_collection(frontend_db.stats_collection_ref, docs)
+        frontend_db.import_collection(frontend_db.cube_collection_ref,
+                                      main_db.export_collection(main_db.cube_collection_ref))
+        frontend_db.import_collection(frontend_db.sketches_collection_ref,
+                                      main_db.export_collection(main_db.sketches_collection_ref))
+        frontend_db.import_collection(
+            frontend_db.salary_quantiles_collection_ref,
+            main_db.export_collection(main_db.salary_quantiles_collection_ref))
+        stats = {doc.id: doc.to_dict() for doc in docs}
+        publish_bundle(frontend_db, stats, bundle_path, top_n)
+        try:
+            publish_snapshot(frontend_db, stats)
+        except SnapshotConflictError as error:
+            # the other process published statistics at least as recent
+            logger.warning(str(error))
+    finally:
+        frontend_db.save_quota_usage()
+
+
+def run(args) -> None:
+    """
+    Copies the statistics of the main database to the frontend database,
+    without scraping.
+    """
+    main_db = open_database(forMainDB=True)
+
+    def estimate() -> Estimate:
+        # ? the sketches have a cell per cell of the cube
+        return Estimate('sync').add('sync_stats', main_db.count_stats_docs()
+                                    + 2 * main_db.count_cube_docs() + SALARY_DOCS + 1)
+
+    if not check_plan(main_db, estimate, args.dry_run):
+        return
+    try:
+        sync_stats(main_db, bundle_path_for(args), args.top_n)
+    finally:
+        main_db.save_quota_usage()
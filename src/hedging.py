@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import threading
+
+
+class HedgeBudget:
+    """
+    Caps the number of hedged requests to a fraction of all requests.
+
+    Every request adds `ratio` tokens to the budget and every hedge spends
+    a whole token. With the default ratio of 0.05, at most 5% of requests
+    are duplicated, even when the host is slow across the board.
+    """
+
+    def __init__(self, ratio: float = 0.05, max_tokens: float = 5.0) -> None:
+        """
+        Args:
+            ratio (float): Maximum fraction of requests which are hedged.
+            max_tokens (float): Maximum number of hedges which can be saved
+            up during a quiet period and spent in a burst.
+        """
+        self.ratio: float = ratio
+        self.max_tokens: float = max_tokens
+        self.tokens: float = 0.0
+        self.requests: int = 0
+        self.hedges: int = 0
+        self.lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self.lock:
+            self.requests += 1
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Returns True if a hedge may be sent, and accounts for it.
+        """
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.hedges += 1
+            return True
@@ -1,4 +1,30 @@
+import atexit
+import contextvars
+import json
 import logging
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator, Optional
+
+# fields added to every record by `ContextFilter`, from `log_context`
+CONTEXT_FIELDS = ('run_id', 'site', 'stage')
+
+# values of CONTEXT_FIELDS for the current thread, and for every thread
+_context: contextvars.ContextVar = contextvars.ContextVar('log_context', default={})
+_defaults: dict = {}
+
+# records are formatted and written by the thread of `_listener`, so that
+# logging never waits for the console or a file on a scraping thread
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener: Optional[QueueListener] = None
+_handlers: list[logging.Handler] = []
+_lock = threading.Lock()
+
 
 class CustomFormatter(logging.Formatter):
     """Custom logging Formatter with color codes."""
@@ -11,26 +37,212 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: "\033[95mCRITICAL - %(asctime)s - %(message)s\033[0m"
     }
 
+    def __init__(self):
+        super().__init__()
+        # one formatter per level, built once
+        self.formatters = {level: logging.Formatter(fmt, "%Y-%m-%d %H:%M:%S")
+                           for level, fmt in self.FORMATS.items()}
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt, "%Y-%m-%d %H:%M:%S")
+        formatter = self.formatters.get(record.levelno, self.formatters[logging.DEBUG])
         return formatter.format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a JSON object on a single line, with the run id,
+    site, stage and latency of the record when they are known.
+    """
+
+    def format(self, record):
+        entry = {'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+                 'level': record.levelname,
+                 'message': record.getMessage(),
+                 'thread': record.threadName}
+        for field in (*CONTEXT_FIELDS, 'latency'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the fields of `log_context` to records which do not set them with
+    `extra`.
+    """
+
+    def filter(self, record):
+        for field, value in {**_defaults, **_context.get()}.items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, value)
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Puts records in the queue of the listener thread.
+    """
+
+    def prepare(self, record):
+        # ? the listener runs in the same process, so the record is neither
+        # ? copied nor pickled: only the message is merged with its
+        # ? arguments, which could change before the record is written.
+        # ? Formatting is left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """
+    Adds `fields`, such as `site` or `stage`, to the records logged by the
+    current thread inside the block.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def start_listener(handlers: list[logging.Handler]) -> None:
+    global _listener, _handlers
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        _handlers = handlers
+        _listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def stop_listener() -> None:
+    """
+    Writes the records still queued and stops the listener thread.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in _handlers:
+            handler.flush()
+
+
+def configure_logging(json_path: Optional[str] = None, run_id: Optional[str] = None) -> None:
+    """
+    Configures the output of the logger, at the start of a run.
+
+    Args:
+        json_path (str, optional): File where records are also written as
+        JSON lines
+        run_id (str, optional): Id of run, added to every record
+    """
+    handlers = [console_handler()]
+    if json_path:
+        file_handler = logging.FileHandler(json_path, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    start_listener(handlers)
+    if run_id is not None:
+        # ? threads do not inherit context variables, so the run id is
+        # ? shared by every thread instead
+        _defaults['run_id'] = run_id
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Writes to the current `sys.stderr`, which test runners replace after the
+    handler is created.
+    """
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def console_handler() -> logging.Handler:
+    handler = ConsoleHandler()
+    handler.setFormatter(CustomFormatter())
+    return handler
+
+
 def setup_logger(name=__name__, level=logging.DEBUG):
     # Check if the logger has handlers already configured
     logger = logging.getLogger(name)
     if not logger.handlers:
         logger.setLevel(level)
 
-        # Create handlers
-        c_handler = logging.StreamHandler()
-
-        # Create formatters and add it to handlers
-        c_handler.setFormatter(CustomFormatter())
+        # records are handed to the listener thread
+        handler = AsyncQueueHandler(_queue)
+        handler.addFilter(ContextFilter())
+        logger.addHandler(handler)
 
-        # Add handlers to the logger
-        logger.addHandler(c_handler)
+        if _listener is None:
+            start_listener([console_handler()])
+            atexit.register(stop_listener)
 
     return logger
 
+
+class Progress:
+    """
+    Reports the progress of a loop with a summary line at most every
+    `interval` seconds, instead of a line or a bar per item. Safe to update
+    from several threads.
+    """
+
+    def __init__(self, description: str, total: Optional[int] = None,
+                 interval: float = 10.0, logger: Optional[logging.Logger] = None,
+                 clock=time.monotonic) -> None:
+        self.description: str = description
+        self.total: Optional[int] = total
+        self.interval: float = interval
+        self.logger: logging.Logger = logger or setup_logger()
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.count: int = 0
+        self.start: float = clock()
+        self.last_report: float = self.start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, amount: int = 1) -> None:
+        with self.lock:
+            self.count += amount
+            now = self.clock()
+            if now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            line = self.summary(now)
+        self.logger.info(line)
+
+    def summary(self, now: float) -> str:
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        line = f"{self.description}: {self.count}"
+        if self.total:
+            line += f"/{self.total} ({100 * self.count / self.total:.0f}%)"
+        line += f", {rate:.1f}/s"
+        if self.total and rate > 0 and self.count < self.total:
+            line += f", eta {(self.total - self.count) / rate:.0f}s"
+        return line
+
+    def close(self) -> None:
+        """
+        Logs the final summary.
+        """
+        with self.lock:
+            line = self.summary(self.clock()) + " done"
+        self.logger.info(line)
@@ -1,165 +1,185 @@
-from src.classes.database import Database
-from src.scrappers.kariyernet import KariyerNetJobScraper
-from src.scrappers.myjobmu import MyJobMuJobScraper
-from src.analyser.runner import update_analytics
-from src.utils.service_key import get_service_account_key
-from src.badge_generator import update_job_count_badge
+from __future__ import annotations
+
 import argparse
+import importlib
+import sys
+from typing import Callable, Optional
+
+from src.classes.archive import DEFAULT_ARCHIVE_PATH
+from src.classes.rebase_checkpoint import DEFAULT_CHUNK_SIZE, DEFAULT_REBASE_CHECKPOINT_PATH
+from src.classes.spool import DEFAULT_SPOOL_PATH
+from src.metrics import DEFAULT_METRICS_PATH, metrics, write_report
+from src.stats_bundle import DEFAULT_BUNDLE_PATH, DEFAULT_TOP_N
+from src.stats_events import DEFAULT_EVENTS_RETAIN
+from src.stats_snapshots import DEFAULT_RETAIN
+from src.logger import configure_logging, setup_logger
+
+# ! Heavy dependencies (pandas, Firestore, selenium) must not be imported
+# ! here: each command imports them from its module in `src.commands`, so
+# ! that a command only pays for what it uses. See `benchmarks.startup`.
+
+logger = setup_logger()
 
 # enum of websites
 WEBSITE_NAMES = [
     'kariyernet'
 ]
 
-def get_args():
-    """
-    Returns command line arguments.
+# commands, each implemented by `run` in the module of the same name in
+# `src.commands`
+COMMANDS = ('scrape', 'rebase', 'sync', 'backup', 'dedupe', 'compact', 'events')
 
-    :returns
-        args (argparse.Namespace): command line arguments
-    """
-    parser = argparse.ArgumentParser(description='Scrape IT jobs from different job portals')
-    parser.add_argument('--website', type=str,
-                        help='website to scrape jobs from')
-    parser.add_argument('--max_jobs', type=int,
-                        help='maximum number of jobs to scrape')
-    args = parser.parse_args()
-    return args
+# command run when none is given, so that `python -m src.main [options]`
+# keeps scraping
+DEFAULT_COMMAND = 'scrape'
 
 
-def rebase_stats() -> None:
+def get_args(argv: Optional[list[str]] = None):
     """
-    After DELETING the `statistics` collection in main database and frontend
-    database manually, call this function to recalculate all statistics
-    and sync with `frontend-db`.
+    Returns command line arguments.
 
-    No scraping takes place when this function is called. Statistics are
-    calculated from existing scraped jobs.
+    Args:
+        argv (list[str], optional): Arguments to parse. Defaults to those
+        of the program.
 
-    ! DO NOT CALL THIS FUNCTION AT THE SAME TIME AS main()
-    ! WARNING: This function heavily impacts read and write quotas.
+    :returns
+        args (argparse.Namespace): command line arguments. `command` is the
+        name of the command to run.
     """
-    # load main database.
-    main_db = Database(get_service_account_key(forMainDB=True))
-
-    # get all jobs stored in database
-    all_jobs = main_db.get_dataframe().to_dict('records')
-
-    # update general stats
-    main_db.update_metadata(len(all_jobs))
-
-    if (len(all_jobs) == 0):
-        sync_stats(main_db)
-        return
-
-    # get data to be analysed in a list
-    job_details_list = [job['job_details'] for job in all_jobs]
-    salary_list = [job['salary'] for job in all_jobs]
-    location_list = [job['location'] for job in all_jobs]
-    job_title_list = [job['job_title'] for job in all_jobs]
-
-    # process data and updates statistics
-    update_analytics(main_db, job_title_list,
-                     job_details_list, location_list, salary_list)
-    main_db.update_job_count_trend()
-
-    # serve stats to frontend
-    sync_stats(main_db)
-
-    # update job count in readme
-    update_job_count_badge(len(all_jobs))
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in (*COMMANDS, '-h', '--help'):
+        argv = [DEFAULT_COMMAND, *argv]
+
+    # options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--metrics', type=str, nargs='?', const=DEFAULT_METRICS_PATH,
+                        help='directory where a JSON report and a Prometheus '
+                        'textfile of Firestore operations and stage durations '
+                        f'are written (default: {DEFAULT_METRICS_PATH})')
+    common.add_argument('--dry_run', action='store_true',
+                        help='print the estimated Firestore reads and writes '
+                        'of the command and exit')
+    common.add_argument('--log_json', type=str,
+                        help='file where log records are also written as JSON '
+                        'lines, with the run id, site, stage and latency')
+
+    # options of commands publishing statistics
+    publishing = argparse.ArgumentParser(add_help=False)
+    publishing.add_argument('--bundle', type=str,
+                            help='file where the statistics bundle is written as '
+                            f'gzip JSON (default: {DEFAULT_BUNDLE_PATH}, none '
+                            'with offline databases)')
+    publishing.add_argument('--top_n', type=int, default=DEFAULT_TOP_N,
+                            help='entries kept per category in the statistics bundle')
 
+    parser = argparse.ArgumentParser(description='Scrape IT jobs from different job portals')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    scrape = commands.add_parser('scrape', parents=[common, publishing],
+                                 help='scrape websites, then update and publish '
+                                 'statistics (default)')
+    scrape.add_argument('--website', type=str, nargs='+', default=WEBSITE_NAMES,
+                        help='websites to scrape jobs from')
+    scrape.add_argument('--max_jobs', type=int,
+                        help='maximum number of jobs to scrape')
+    scrape.add_argument('--spool', type=str, default=DEFAULT_SPOOL_PATH,
+                        help='file where progress of scrape is saved')
+    scrape.add_argument('--overlap_days', type=int, default=2,
+                        help='number of days before the newest job of the '
+                        'previous run which are scraped again')
+    scrape.add_argument('--backfill', action='store_true',
+                        help='crawl every page of the websites in parallel, '
+                        'for example to seed a new database')
+    scrape.add_argument('--workers', type=int, default=4,
+                        help='number of parallel workers used by --backfill')
+    scrape.add_argument('--defer_details', action='store_true',
+                        help='record jobs from listing pages first and fetch '
+                        'their details afterwards')
+    scrape.add_argument('--detail_workers', type=int, default=4,
+                        help='number of job details fetched at the same time')
+    scrape.add_argument('--queue', type=str,
+                        help='pull tasks from a shared work queue: `firestore`, '
+                        'or the path of a SQLite file shared by local processes')
+    scrape.add_argument('--seed_queue', action='store_true',
+                        help='add the partitions of the websites to the '
+                        'work queue before pulling tasks')
+    scrape.add_argument('--archive', type=str, nargs='?', const=DEFAULT_ARCHIVE_PATH,
+                        help='directory where raw responses are archived '
+                        f'(default: {DEFAULT_ARCHIVE_PATH})')
+
+    rebase = commands.add_parser('rebase', parents=[common, publishing],
+                                 help='recalculate every statistic from the jobs '
+                                 'in the database and publish them')
+    rebase.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='number of jobs read and analysed at a time')
+    rebase.add_argument('--checkpoint', type=str, default=DEFAULT_REBASE_CHECKPOINT_PATH,
+                        help='file where progress of the rebase is saved')
+    rebase.add_argument('--restart', action='store_true',
+                        help='ignore the progress of an interrupted rebase')
+    commands.add_parser('sync', parents=[common, publishing],
+                        help='copy statistics to the frontend database')
+    backup = commands.add_parser('backup', parents=[common],
+                                 help='save every job to a JSON file')
+    backup.add_argument('--output', type=str, default='sample_jobs.json',
+                        help='file where jobs are saved')
+    commands.add_parser('dedupe', parents=[common],
+                        help='print jobs saved more than once')
+    compact = commands.add_parser('compact', parents=[common],
+                                  help='rebase the statistics snapshots and delete '
+                                  'old versions')
+    compact.add_argument('--retain', type=int, default=DEFAULT_RETAIN,
+                         help='number of most recent versions kept')
+    compact.add_argument('--events_retain', type=int, default=DEFAULT_EVENTS_RETAIN,
+                         help='number of most recent statistics events kept')
+    events = commands.add_parser('events', parents=[common, publishing],
+                                 help='list the statistics of each run, or revert '
+                                 'or replay those of one run')
+    events.add_argument('action', choices=('list', 'revert', 'replay'))
+    events.add_argument('--run_id', type=str,
+                        help='run whose statistics are reverted or replayed')
+    events.add_argument('--keep_salaries', action='store_true',
+                        help='revert a run which added salaries, keeping them in the '
+                        'salary quantiles, which cannot be subtracted; distinct counts '
+                        'of the sketches are always kept')
+
+    args = parser.parse_args(argv)
+    return args
 
-def sync_stats(main_db: Database):
-    """
-    Clones statistics found in `main_db` to `frontend_db`
 
-    Args:
-        main_db (Database): database containing scraped data
+def load_command(name: str) -> Callable:
     """
-    frontend_db = Database(get_service_account_key(), "frontend_db")
-    x = main_db.export_collection(main_db.stats_collection_ref)
-    frontend_db.import_collection(frontend_db.stats_collection_ref, x)
-
+    Imports the module of a command, and the dependencies of this command
+    only.
 
-def backup_to_drive():
-    """
-    Saves all jobs in main database to google drive in json format.
+    Returns:
+        Callable: `run` function of the command, taking the arguments
+        returned by `get_args`
     """
-    # TODO: complete function
-    main_db = Database(get_service_account_key(forMainDB=True))
-    df = main_db.get_dataframe()
-    df.to_json('sample_jobs.json', orient='records')
-
+    if name not in COMMANDS:
+        raise ValueError(f"Unknown command {name}. Available: {', '.join(COMMANDS)}")
+    return importlib.import_module(f'src.commands.{name}').run
 
 
 def main():
     """
-    Driver code.
+    Driver code. Runs the command given on the command line, `scrape` by
+    default.
 
-    ! Do not call this function together with rebase_stats in
-    ! the same program.
+    ! Do not run `scrape` and `rebase` at the same time.
     """
     # get command line arguments
     args = get_args()
-    website = args.website
-    max_jobs = args.max_jobs
-
-    websites = WEBSITE_NAMES
-
-    if website:
-        websites = [website]
-
-    for website in websites:
-        print('Scraping jobs from', website)
-
-        # setup database and scraper.
-        main_db = Database(get_service_account_key(forMainDB=True))
-
-        my_scraper = None
-
-        if website == 'myjobmu':
-            my_scraper = MyJobMuJobScraper(main_db.get_recent_urls(), limit=max_jobs)
-        elif website == 'kariyernet':
-            my_scraper = KariyerNetJobScraper(main_db.get_recent_urls(), limit=max_jobs)
-
-
-        # fetch new jobs from specified website
-        new_jobs = my_scraper.scrape()
-
-        # if no new jobs found exit
-        if (len(new_jobs) == 0):
-            return
-
-        # get data to be analysed in a list
-        job_details_list = [job['job_details'] for job in new_jobs]
-        salary_list = [job['salary'] for job in new_jobs]
-        location_list = [job['location'] for job in new_jobs]
-        job_title_list = [job['job_title'] for job in new_jobs]
-
-        # print some info about new jobs found
-        print(len(new_jobs), ' new jobs found!')
-        print(job_title_list[:5])
-
-        # update database general stats such as size and last update dates
-        new_db_size = main_db.get_size() + len(new_jobs)
-        main_db.update_metadata(new_db_size)
-
-        # save new jobs to database
-        for job in new_jobs:
-            main_db.add_job(job)
-
-        # extract statistics from newly scraped data and update
-        # statistics collection
-        update_analytics(main_db, job_title_list,
-                         job_details_list, location_list, salary_list)
-        main_db.update_job_count_trend()
 
-        # send updated statistics to frontend db
-        sync_stats(main_db)
+    metrics.reset()
+    configure_logging(args.log_json, run_id=metrics.run_id)
 
-        # update job count in readme
-        update_job_count_badge(new_db_size)
+    run = load_command(args.command)
+    try:
+        run(args)
+    finally:
+        # the report of a failed run shows how far it went
+        if args.metrics:
+            write_report(args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+from src.logger import setup_logger
+
+logger = setup_logger()
+
+# upper bounds, in seconds, of the buckets of stage duration histograms
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0, 900.0)
+
+# Firestore operations counted for each `Database` method. `reads` and
+# `writes` are what Firestore bills; `stream_docs` is the number of
+# documents returned by queries and `commits` the number of write batches.
+FIRESTORE_OPERATIONS = ('reads', 'writes', 'stream_docs', 'commits')
+
+# default directory of metrics reports, relative to the working directory
+DEFAULT_METRICS_PATH = '.metrics'
+
+# files written by `write_report` in the metrics directory
+REPORT_FILE = 'report.json'
+PROMETHEUS_FILE = 'itjobmeter.prom'
+
+
+class Histogram:
+    """
+    Distribution of durations in fixed buckets, as in Prometheus.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        # counts[i] is the number of values in (buckets[i-1], buckets[i]],
+        # and the last count the values above every bucket
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound),
+                     len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the `q` quantile (0 to 1) by interpolating inside the
+        bucket which contains it, like `histogram_quantile` of Prometheus.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count > 0:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {'count': self.count,
+                'sum': round(self.sum, 6),
+                'max': round(self.max, 6),
+                'p50': round(self.quantile(0.5), 6),
+                'p90': round(self.quantile(0.9), 6),
+                'p99': round(self.quantile(0.99), 6),
+                'buckets': dict(zip([*map(str, self.buckets), '+Inf'], self.counts))}
+
+
+class Metrics:
+    """
+    Collects the metrics of a run: the Firestore operations issued by each
+    `Database` method, and the duration of each stage of the pipeline
+    (`page_fetch`, `detail_fetch`, `parse`, `upload`, `analyse`, `stats`,
+    `sync`). Safe to use from several threads.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # stack of the `Database` methods being executed by each thread
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self, run_id: Optional[str] = None) -> None:
+        """
+        Clears every metric, at the start of a run.
+        """
+        with self.lock:
+            self.run_id: str = run_id or uuid.uuid4().hex[:12]
+            self.started_at: datetime = datetime.now(timezone.utc)
+            # database -> method -> operation -> count
+            self.firestore: dict[str, dict[str, dict[str, int]]] = {}
+            self.stages: dict[str, Histogram] = {}
+            self.jobs: int = 0
+
+    @contextmanager
+    def method(self, name: str) -> Iterator[None]:
+        """
+        Attributes the Firestore operations issued by this thread inside
+        the block to method `name`.
+        """
+        stack = self.local.__dict__.setdefault('methods', [])
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def current_method(self) -> str:
+        stack = self.local.__dict__.get('methods')
+        return stack[-1] if stack else 'other'
+
+    def count(self, database: str, operation: str, amount: int = 1,
+              method: Optional[str] = None) -> None:
+        """
+        Counts Firestore operations.
+
+        Args:
+            database (str): Name of database
+            operation (str): One of `FIRESTORE_OPERATIONS`
+            amount (int, optional): Number of operations. Defaults to 1.
+            method (str, optional): `Database` method which issued them.
+            Defaults to the method being executed by this thread.
+        """
+        method = method or self.current_method()
+        with self.lock:
+            counts = (self.firestore.setdefault(database, {})
+                      .setdefault(method, dict.fromkeys(FIRESTORE_OPERATIONS, 0)))
+            counts[operation] += amount
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Records the duration of the block in the histogram of `stage`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def totals(self, database: Optional[str] = None) -> dict[str, int]:
+        """
+        Returns the number of each Firestore operation, in every database
+        or only in `database`.
+        """
+        totals = dict.fromkeys(FIRESTORE_OPERATIONS, 0)
+        with self.lock:
+            for name, methods in self.firestore.items():
+                if database is not None and name != database:
+                    continue
+                for counts in methods.values():
+                    for operation, count in counts.items():
+                        totals[operation] += count
+        return totals
+
+    def report(self) -> dict:
+        """
+        Returns the metrics of the run as a JSON-serializable dictionary.
+        """
+        totals = self.totals()
+        with self.lock:
+            return {'run_id': self.run_id,
+                    'started_at': self.started_at.isoformat(),
+                    'finished_at': datetime.now(timezone.utc).isoformat(),
+                    'jobs': self.jobs,
+                    'firestore': {database: {method: dict(counts)
+                                             for method, counts in methods.items()}
+                                  for database, methods in self.firestore.items()},
+                    'firestore_totals': totals,
+                    'stages': {stage: histogram.to_dict()
+                               for stage, histogram in self.stages.items()}}
+
+
+# metrics of the current run, shared by every module
+metrics = Metrics()
+
+
+def counted(function: Callable) -> Callable:
+    """
+    Decorator attributing the Firestore operations issued by a `Database`
+    method to that method.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with metrics.method(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator recording the duration of each call of a function in the
+    histogram of `stage`.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics.time(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def find_regressions(current: dict, previous: dict, threshold: float = 0.25,
+                     min_operations: int = 20, min_seconds: float = 0.05) -> list[dict]:
+    """
+    Compares two reports of `Metrics.report`. Firestore operations are
+    compared per job when both runs processed jobs, and stages on their
+    mean duration.
+
+    Args:
+        current (dict): Report of this run
+        previous (dict): Report of the previous run
+        threshold (float, optional): Relative increase flagged as a
+        regression. Defaults to 25%.
+        min_operations (int, optional): Smallest increase in the number of
+        operations of a method which is flagged, to ignore noise.
+        min_seconds (float, optional): Smallest increase of the mean
+        duration of a stage which is flagged.
+
+    Returns:
+        list[dict]: One entry per regression, with the `metric`, its
+        `previous` and `current` values
+    """
+    regressions = []
+
+    def compare(metric: str, now: float, before: float, min_delta: float) -> None:
+        if now - before >= min_delta and now > before * (1 + threshold):
+            regressions.append({'metric': metric, 'previous': round(before, 6),
+                                'current': round(now, 6)})
+
+    # ? a run with twice as many jobs reads twice as much, so operations are
+    # ? compared per job when possible
+    per_job = current.get('jobs', 0) > 0 and previous.get('jobs', 0) > 0
+    for database, methods in current.get('firestore', {}).items():
+        for method, counts in methods.items():
+            before_counts = previous.get('firestore', {}).get(database, {}).get(method, {})
+            for operation in ('reads', 'writes'):
+                now = counts.get(operation, 0)
+                before = before_counts.get(operation, 0)
+                if now - before < min_operations:
+                    continue
+                if per_job:
+                    now, before = now / current['jobs'], before / previous['jobs']
+                compare(f'firestore.{database}.{method}.{operation}'
+                        + ('_per_job' if per_job else ''), now, before, 0)
+
+    for stage, histogram in current.get('stages', {}).items():
+        before = previous.get('stages', {}).get(stage)
+        if not before or not before['count'] or not histogram['count']:
+            continue
+        compare(f'stages.{stage}.mean_seconds', histogram['sum'] / histogram['count'],
+                before['sum'] / before['count'], min_seconds)
+    return regressions
+
+
+def prometheus_text(report: dict) -> str:
+    """
+    Formats a report in the Prometheus text format, for the textfile
+    collector of node_exporter.
+    """
+    lines = ['# HELP itjobmeter_firestore_operations_total Firestore operations '
+             'issued by each Database method during the last run.',
+             '# TYPE itjobmeter_firestore_operations_total counter']
+    for database, methods in sorted(report['firestore'].items()):
+        for method, counts in sorted(methods.items()):
+            for operation in FIRESTORE_OPERATIONS:
+                lines.append('itjobmeter_firestore_operations_total{'
+                             f'database="{database}",method="{method}",'
+                             f'operation="{operation}"}} {counts.get(operation, 0)}')
+
+    lines += ['# HELP itjobmeter_stage_duration_seconds Duration of each stage '
+              'of the pipeline during the last run.',
+              '# TYPE itjobmeter_stage_duration_seconds histogram']
+    for stage, histogram in sorted(report['stages'].items()):
+        cumulative = 0
+        for bound, count in histogram['buckets'].items():
+            cumulative += count
+            lines.append(f'itjobmeter_stage_duration_seconds_bucket{{stage="{stage}",'
+                         f'le="{bound}"}} {cumulative}')
+        lines.append(f'itjobmeter_stage_duration_seconds_sum{{stage="{stage}"}} '
+                     f'{histogram["sum"]}')
+        lines.append(f'itjobmeter_stage_duration_seconds_count{{stage="{stage}"}} '
+                     f'{histogram["count"]}')
+
+    finished_at = datetime.fromisoformat(report['finished_at']).timestamp()
+    lines += ['# HELP itjobmeter_jobs Jobs analysed during the last run.',
+              '# TYPE itjobmeter_jobs gauge',
+              f'itjobmeter_jobs {report["jobs"]}',
+              '# HELP itjobmeter_regressions Metrics flagged as regressions '
+              'against the previous run.',
+              '# TYPE itjobmeter_regressions gauge',
+              f'itjobmeter_regressions {len(report.get("regressions", []))}',
+              '# HELP itjobmeter_last_run_timestamp_seconds End of the last run.',
+              '# TYPE itjobmeter_last_run_timestamp_seconds gauge',
+              f'itjobmeter_last_run_timestamp_seconds {finished_at}']
+    return '\n'.join(lines) + '\n'
+
+
+def write_atomically(path: str, text: str) -> None:
+    """
+    Writes a file so that readers never see it half written.
+    """
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary_path, path)
+
+
+def write_report(directory: str, run_metrics: Metrics = metrics) -> dict:
+    """
+    Writes the report of the run as JSON and as a Prometheus textfile in
+    `directory`, and flags regressions against the report of the previous
+    run found there, which is replaced.
+
+    Returns:
+        dict: Report, with its `regressions`
+    """
+    os.makedirs(directory, exist_ok=True)
+    report = run_metrics.report()
+
+    report_path = os.path.join(directory, REPORT_FILE)
+    if os.path.exists(report_path):
+        try:
+            with open(report_path, encoding='utf-8') as file:
+                previous = json.load(file)
+        except (OSError, ValueError):
+            logger.warning(f'Ignoring unreadable metrics report {report_path}')
+        else:
+            report['previous_run_id'] = previous.get('run_id')
+            report['regressions'] = find_regressions(report, previous)
+    for regression in report.get('regressions', []):
+        logger.warning(f"Regression of {regression['metric']}: "
+                       f"{regression['previous']} -> {regression['current']}")
+
+    write_atomically(report_path, json.dumps(report, indent=2) + '\n')
+    write_atomically(os.path.join(directory, PROMETHEUS_FILE), prometheus_text(report))
+    return report
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
+
+from src.analyser.cube import posting_month
+from src.analyser.runner import analyse_jobs
+from src.base_scrapper import get_scraper_class
+from src.classes.archive import Archive
+from src.classes.database import Database
+from src.classes.spool import Spool, job_key
+from src.classes.watermark import Watermark
+from src.logger import Progress, log_context, setup_logger
+from src.metrics import metrics, timed
+from src.stats_events import apply_run
+from src.worker import Worker, seed_partitions
+
+logger = setup_logger()
+
+
+def run_scraper(website: str, scraped_ids: list, spool: Spool,
+                max_jobs: Optional[int] = None,
+                watermark: Optional[Watermark] = None,
+                backfill_workers: Optional[int] = None,
+                defer_details: bool = False,
+                archive: Optional[Archive] = None) -> list[dict]:
+    """
+    Scrapes new jobs from a single website. Jobs are saved in the spool as
+    they are scraped.
+
+    When `backfill_workers` is set, the whole website is crawled with
+    that many workers instead of stopping at the first known page.
+    When `defer_details` is set, only skeleton jobs are scraped and their
+    details are queued for `enrich_spooled_jobs`.
+    When `archive` is set, the raw responses of the website are archived.
+
+    Returns:
+        list[dict]: new jobs found during this run
+    """
+    with log_context(site=website, stage='scrape'):
+        scraper_class = get_scraper_class(website)
+        scraper = scraper_class(scraped_ids, limit=max_jobs or -1, spool=spool,
+                                watermark=watermark)
+        scraper.defer_details = defer_details
+        scraper.archive = archive
+        if backfill_workers:
+            new_jobs = scraper.backfill(backfill_workers)
+        else:
+            new_jobs = scraper.scrape()
+        logger.info(f"{len(new_jobs)} new jobs found on {website}")
+    return new_jobs
+
+
+def scrape_websites(main_db: Database, spool: Spool, websites: list[str],
+                    max_jobs: Optional[int] = None,
+                    overlap_days: int = 2,
+                    backfill_workers: Optional[int] = None,
+                    defer_details: bool = False,
+                    archive: Optional[Archive] = None) -> dict[str, bool]:
+    """
+    Scrapes all `websites` at the same time, each in its own thread.
+    Each scraper stops once it reaches the watermark of its website, minus
+    an overlap of `overlap_days`.
+
+    A website which fails does not stop the others. Jobs it scraped
+    before failing stay in the spool.
+
+    Returns:
+        dict[str, bool]: True for each website which was fully scraped
+    """
+    # read recently scraped jobs once per id field, before starting threads
+    recent_ids = {}
+    for website in websites:
+        field = get_scraper_class(website).id_field
+        if field not in recent_ids:
+            recent_ids[field] = main_db.get_recent_values(field)
+
+    with ThreadPoolExecutor(max_workers=len(websites),
+                            thread_name_prefix='scraper') as executor:
+        futures = {}
+        for website in websites:
+            field = get_scraper_class(website).id_field
+            watermark = Watermark.from_dict(main_db.get_watermark(website),
+                                            overlap_days)
+            futures[website] = executor.submit(
+                run_scraper, website, list(recent_ids[field]), spool,
+                max_jobs, watermark, backfill_workers, defer_details, archive)
+
+        finished = {}
+        for website, future in futures.items():
+            try:
+                future.result()
+                finished[website] = True
+            except Exception:
+                logger.exception(f"Scraping {website} failed")
+                finished[website] = False
+    return finished
+
+
+@timed('upload')
+def upload_spooled_jobs(main_db: Database, spool: Spool, websites: list[str]) -> int:
+    """
+    Saves the jobs of `websites` which are in the spool but not in the
+    database yet, and updates the jobs which were enriched after being
+    uploaded. Can be called again after a failure without creating
+    duplicates: the size in the metadata only counts the jobs saved.
+
+    Returns:
+        int: number of jobs uploaded
+    """
+    update_enriched_jobs(main_db, spool, websites)
+
+    jobs_by_site = {website: spool.pending_upload(website)
+                    for website in websites}
+    job_count = sum(len(jobs) for jobs in jobs_by_site.values())
+    if job_count == 0:
+        return 0
+
+    # save new jobs to database
+    uploaded = 0
+    try:
+        for website, jobs in jobs_by_site.items():
+            for job in jobs:
+                # ? the site is saved so that a rebase can fill the cube
+                main_db.add_job({**job, 'site': website})
+                spool.mark_uploaded(website, [job_key(job)])
+                uploaded += 1
+            advance_watermark(main_db, website, jobs)
+    finally:
+        # ! only the jobs actually saved are counted, so that the size is
+        # ! right after a failure and its retry. Dates are read from the
+        # ! saved jobs, hence after the upload.
+        if uploaded:
+            main_db.update_metadata(main_db.get_size() + uploaded)
+    return job_count
+
+
+def update_enriched_jobs(main_db: Database, spool: Spool, websites: list[str]) -> int:
+    """
+    Writes the details of skeleton jobs which were uploaded before being
+    enriched.
+
+    Returns:
+        int: number of jobs updated
+    """
+    count = 0
+    for website in websites:
+        field = get_scraper_class(website).id_field
+        for job in spool.pending_update(website):
+            main_db.update_job(field, job[field], job)
+            spool.mark_updated(website, [job_key(job)])
+            count += 1
+    return count
+
+
+def enrich_spooled_jobs(spool: Spool, websites: list[str], workers: int = 4,
+                        max_attempts: int = 3,
+                        archive: Optional[Archive] = None) -> int:
+    """
+    Drains the detail queue: fetches the details of skeleton jobs, newest
+    first, with `workers` requests in flight per website.
+
+    A job which cannot be fetched stays in the queue for the next run. After
+    `max_attempts` failed runs it is kept with the fields of its listing.
+
+    Returns:
+        int: number of jobs enriched
+    """
+    enriched = 0
+    for website in websites:
+        jobs = spool.queued_details(website)
+        if len(jobs) == 0:
+            continue
+        logger.info(f"Fetching details of {len(jobs)} {website} jobs")
+        scraper = get_scraper_class(website)([], spool=spool)
+        scraper.archive = archive
+
+        progress = Progress(f"{website} details", len(jobs))
+        with log_context(site=website, stage='detail_fetch'), \
+                ThreadPoolExecutor(max_workers=workers,
+                                   thread_name_prefix=f'{website}-details') as executor:
+            # jobs are submitted, and therefore started, newest first. Each
+            # runs in a copy of the log context of this thread.
+            futures = {executor.submit(contextvars.copy_context().run, scraper.enrich, job): job
+                       for job in jobs}
+            for future in as_completed(futures):
+                progress.update()
+                job = futures[future]
+                try:
+                    spool.complete_detail(website, future.result())
+                    enriched += 1
+                except Exception as e:
+                    logger.error(f"Could not fetch details of {website} "
+                                 f"job {job_key(job)}: {e}")
+                    if spool.fail_detail(website, job_key(job)) >= max_attempts:
+                        spool.complete_detail(website, job)
+        progress.close()
+    return enriched
+
+
+def advance_watermark(main_db: Database, website: str, jobs: list[dict]) -> None:
+    """
+    Moves the watermark of `website` to the newest of the uploaded `jobs`.
+    """
+    if len(jobs) == 0:
+        return
+    watermark = Watermark.from_dict(main_db.get_watermark(website))
+    before = watermark.to_dict()
+    for job in jobs:
+        watermark.advance(job.get('date_posted'), job_key(job))
+    if watermark.to_dict() != before:
+        main_db.set_watermark(website, watermark.to_dict())
+
+
+@timed('analyse')
+def analyse_spooled_jobs(main_db: Database, spool: Spool, websites: list[str]) -> int:
+    """
+    Updates statistics, in a single pass, with the uploaded jobs of
+    `websites` which have not been analysed yet.
+
+    Returns:
+        int: number of jobs analysed
+    """
+    jobs_by_site = {website: spool.pending_analysis(website)
+                    for website in websites}
+    jobs = [job for site_jobs in jobs_by_site.values() for job in site_jobs]
+    if len(jobs) == 0:
+        return 0
+
+    # get data to be analysed in a list
+    job_details_list = [job['job_details'] for job in jobs]
+    salary_list = [job['salary'] for job in jobs]
+    location_list = [job['location'] for job in jobs]
+    job_title_list = [job['job_title'] for job in jobs]
+    site_list = [website for website, site_jobs in jobs_by_site.items()
+                 for _ in site_jobs]
+    month_list = [posting_month(job.get('date_posted')) for job in jobs]
+
+    # extract statistics from newly scraped data and update
+    # statistics collection, and the cube, recording the increments of
+    # this run so that they can be reverted
+    company_list = [job.get('company') or '' for job in jobs]
+    increments = analyse_jobs(job_title_list, job_details_list, location_list,
+                              salary_list, site_list, month_list, company_list)
+    apply_run(main_db, metrics.run_id, increments)
+    for website, site_jobs in jobs_by_site.items():
+        spool.mark_analysed(website, [job_key(job) for job in site_jobs])
+    return len(jobs)
+
+
+def run_pipeline(main_db: Database, spool: Spool, websites: list[str],
+                 max_jobs: Optional[int] = None, overlap_days: int = 2,
+                 backfill_workers: Optional[int] = None,
+                 defer_details: bool = False, detail_workers: int = 4,
+                 archive: Optional[Archive] = None) -> int:
+    """
+    Scrapes `websites` concurrently, then uploads and analyses every new
+    job, including jobs left in the spool by an interrupted run.
+
+    Jobs are uploaded, and the job count published, before the detail
+    queue is drained. Only enriched jobs are analysed.
+
+    Returns:
+        int: number of jobs analysed
+    """
+    finished = scrape_websites(main_db, spool, websites, max_jobs,
+                               overlap_days, backfill_workers, defer_details,
+                               archive)
+
+    upload_spooled_jobs(main_db, spool, websites)
+    if enrich_spooled_jobs(spool, websites, detail_workers,
+                           archive=archive) > 0:
+        update_enriched_jobs(main_db, spool, websites)
+    analysed_count = analyse_spooled_jobs(main_db, spool, websites)
+
+    # websites which failed keep their checkpoint so that the next
+    # run resumes them
+    for website in websites:
+        if finished[website]:
+            spool.clear(website)
+    return analysed_count
+
+
+def run_queue_worker(main_db: Database, spool: Spool, queue, websites: list[str],
+                     seed: bool = False, pages_per_partition: int = 10,
+                     archive: Optional[Archive] = None) -> int:
+    """
+    Drains a shared work queue, then uploads and analyses the jobs this
+    worker fetched. Several machines can run this function at the same
+    time on the same queue.
+
+    Args:
+        queue (SQLiteWorkQueue | FirestoreWorkQueue): Shared work queue
+        seed (bool): Add the partitions of `websites` to the queue first.
+        Only one worker needs to seed the queue.
+
+    Returns:
+        int: number of jobs analysed
+    """
+    if seed:
+        for website in websites:
+            seed_partitions(queue, website, pages_per_partition)
+
+    scraped_ids = {website: main_db.get_recent_values(get_scraper_class(website).id_field)
+                   for website in websites}
+    Worker(queue, spool, scraped_ids=scraped_ids, archive=archive).run()
+
+    upload_spooled_jobs(main_db, spool, websites)
+    analysed_count = analyse_spooled_jobs(main_db, spool, websites)
+    for website in websites:
+        spool.clear(website)
+    return analysed_count
@@ -1,39 +1,182 @@
 import random
+import threading
 import requests
 import time
 from os import environ as env
+from typing import Optional
 from dotenv import load_dotenv
 import logging
 
+WEBSHARE_LIST_URL = "https://proxy.webshare.io/api/v2/proxy/list/"
+
+
+class ProxyStats:
+    """
+    Health of a single proxy, built from the outcome of requests sent
+    through it.
+    """
+
+    def __init__(self):
+        self.successes: int = 0
+        self.failures: int = 0
+        self.consecutive_failures: int = 0
+
+        # exponentially weighted moving average of response times
+        self.avg_latency: Optional[float] = None
+
+        # the proxy is not used before this time
+        self.quarantined_until: float = 0
+        self.quarantine_count: int = 0
+
+    def success_rate(self) -> float:
+        # Laplace smoothing: a new proxy starts at 50% instead of 0% or 100%
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def score(self, default_latency: float) -> float:
+        """
+        Selection weight of proxy. Fast proxies which rarely fail get the
+        highest score.
+        """
+        latency = self.avg_latency if self.avg_latency is not None else default_latency
+        return self.success_rate() / max(latency, 0.01)
+
 
 class ProxyManager:
-    def __init__(self, max_proxies=25, refresh_interval=300):
+    def __init__(self, max_proxies=25, refresh_interval=300, list_url=None,
+                 quarantine_after=3, cooldown=60, min_healthy_ratio=0.5,
+                 min_refresh_interval=30, latency_alpha=0.3):
+        """
+        Args:
+            max_proxies (int): Number of proxies requested from the provider.
+            refresh_interval (int): Seconds after which the proxy list is
+            refreshed.
+            list_url (str, optional): Endpoint returning the proxy list in
+            the Webshare format. Defaults to `PROXY_LIST_URL` environment
+            variable or to the Webshare API.
+            quarantine_after (int): Number of consecutive failures after
+            which a proxy is put in quarantine.
+            cooldown (int): Seconds spent in quarantine the first time.
+            Doubled each time the same proxy is quarantined again.
+            min_healthy_ratio (float): The proxy list is refreshed early
+            when the share of proxies not in quarantine drops below this
+            value.
+            min_refresh_interval (int): Minimum number of seconds between
+            two early refreshes.
+            latency_alpha (float): Weight of the most recent response time
+            in the latency average.
+        """
         self.api_key = env.get('PROXY_PROVIDER_API_KEY')
+        self.list_url = list_url or env.get('PROXY_LIST_URL', WEBSHARE_LIST_URL)
         self.proxies = []
+        self.stats: dict[str, ProxyStats] = {}
         self.last_refresh_time = 0
         self.max_proxies = max_proxies
         self.refresh_interval = refresh_interval
+        self.quarantine_after = quarantine_after
+        self.cooldown = cooldown
+        self.min_healthy_ratio = min_healthy_ratio
+        self.min_refresh_interval = min_refresh_interval
+        self.latency_alpha = latency_alpha
+        self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
 
-    def fetch_new_proxies(self):
-        if time.time() - self.last_refresh_time < self.refresh_interval:
+    def fetch_new_proxies(self, force=False):
+        if not force and time.time() - self.last_refresh_time < self.refresh_interval:
             return
 
         try:
             response = requests.get(
-                f"https://proxy.webshare.io/api/v2/proxy/list/?mode=direct&page=1&page_size={self.max_proxies}",
-                headers={"Authorization": f"Token {self.api_key}"}
+                f"{self.list_url}?mode=direct&page=1&page_size={self.max_proxies}",
+                headers={"Authorization": f"Token {self.api_key}"},
+                timeout=10
             )
             response.raise_for_status()
-            self.proxies = [self.create_proxy_url(p) for p in response.json()['results'] if p['valid']]
-            self.last_refresh_time = time.time()
+            proxies = [self.create_proxy_url(p) for p in response.json()['results'] if p['valid']]
+            with self.lock:
+                self.proxies = proxies
+                # keep the history of proxies which are still listed
+                self.stats = {p: self.stats.get(p, ProxyStats()) for p in proxies}
+                self.last_refresh_time = time.time()
         except requests.RequestException as e:
             self.logger.error(f"Error fetching proxies: {e}")
 
-    def get_proxy(self):
+    def healthy_proxies(self) -> list:
+        """
+        Returns the proxies which are not in quarantine.
+        """
+        now = time.time()
+        with self.lock:
+            return [p for p in self.proxies if self.stats[p].quarantined_until <= now]
+
+    def get_proxy(self, exclude=None):
+        """
+        Returns a proxy url, or None if no proxy is available.
+
+        Proxies are picked at random with a probability proportional to
+        their score, so fast and reliable proxies are used most. Proxies
+        in quarantine are skipped. Proxies in `exclude` (for example
+        proxies which already failed for the current request) are only
+        returned if no other proxy is left.
+        """
         if not self.proxies or time.time() - self.last_refresh_time > self.refresh_interval:
             self.fetch_new_proxies()
-        return random.choice(self.proxies) if self.proxies else None
+        elif (len(self.healthy_proxies()) < self.min_healthy_ratio * len(self.proxies) and
+              time.time() - self.last_refresh_time > self.min_refresh_interval):
+            self.logger.warning("Too many proxies in quarantine. Refreshing proxy list.")
+            self.fetch_new_proxies(force=True)
+
+        with self.lock:
+            if not self.proxies:
+                return None
+
+            healthy = self.healthy_proxies()
+            if not healthy:
+                # every proxy is in quarantine: use the one released first
+                return min(self.proxies, key=lambda p: self.stats[p].quarantined_until)
+
+            candidates = [p for p in healthy if p not in (exclude or [])] or healthy
+
+            latencies = [self.stats[p].avg_latency for p in self.proxies
+                         if self.stats[p].avg_latency is not None]
+            # unknown proxies are scored as if they had the median latency
+            default_latency = sorted(latencies)[len(latencies) // 2] if latencies else 1.0
+            weights = [self.stats[p].score(default_latency) for p in candidates]
+            return random.choices(candidates, weights=weights)[0]
+
+    def report_success(self, proxy, latency):
+        """
+        Records a request which went through `proxy` in `latency` seconds.
+        """
+        with self.lock:
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.quarantine_count = 0
+            if stats.avg_latency is None:
+                stats.avg_latency = latency
+            else:
+                stats.avg_latency = (self.latency_alpha * latency +
+                                     (1 - self.latency_alpha) * stats.avg_latency)
+
+    def report_failure(self, proxy):
+        """
+        Records a request which failed because of `proxy`. The proxy is put
+        in quarantine after too many consecutive failures.
+        """
+        with self.lock:
+            stats = self.stats.get(proxy)
+            if stats is None:
+                return
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.quarantine_after:
+                duration = self.cooldown * 2 ** stats.quarantine_count
+                stats.quarantined_until = time.time() + duration
+                stats.quarantine_count += 1
+                stats.consecutive_failures = 0
+                self.logger.warning(f"Proxy {proxy} in quarantine for {duration}s")
 
     def create_proxy_url(self, proxy_data):
         username = proxy_data.get('username')
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from src.logger import setup_logger
+
+logger = setup_logger()
+
+# daily operations included in the free tier of Firestore
+FREE_TIER = {'reads': 50000, 'writes': 20000}
+
+# Firestore quotas are reset at midnight, Pacific time
+QUOTA_TIMEZONE = 'America/Los_Angeles'
+
+# what a budget does when an operation would exceed it
+THROTTLE = 'throttle'
+ABORT = 'abort'
+
+# documents of salary quantiles: by location and technology, in the
+# currency of each website
+SALARY_DOCS = 4
+
+
+class QuotaExceededError(Exception):
+    """
+    An operation, or a planned command, does not fit in the quota budget.
+    """
+
+
+def quota_timezone(name: str = QUOTA_TIMEZONE):
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        # ? without timezone data, Pacific standard time is close enough
+        return timezone(timedelta(hours=-8))
+
+
+class QuotaBudget:
+    """
+    Daily budget of Firestore reads and writes of one database, enforced by
+    `Database` before each operation.
+
+    When an operation would exceed the budget, the budget either raises
+    `QuotaExceededError` (`abort`), or waits until the quota is reset at
+    midnight Pacific time (`throttle`), so that the remaining writes are
+    spent from the next day's quota.
+    """
+
+    def __init__(self, reads: Optional[int] = None, writes: Optional[int] = None,
+                 mode: str = ABORT, max_wait: Optional[float] = None,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Args:
+            reads (int, optional): Reads allowed per day. No limit if None.
+            writes (int, optional): Writes allowed per day. No limit if None.
+            mode (str): `abort` or `throttle`
+            max_wait (float, optional): In `throttle` mode, longest wait in
+            seconds for the next window. Operations which would wait longer
+            raise `QuotaExceededError`. No limit if None.
+            clock (Callable, optional): Returns the current Unix time
+            sleep (Callable, optional): Waits for a number of seconds
+        """
+        if mode not in (THROTTLE, ABORT):
+            raise ValueError(f"Unknown quota budget mode: {mode}")
+        self.limits: dict[str, Optional[int]] = {'reads': reads, 'writes': writes}
+        self.mode: str = mode
+        self.max_wait: Optional[float] = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.timezone = quota_timezone()
+        self.lock = threading.Lock()
+        self.window: str = self.current_window()
+        self.used: dict[str, int] = {'reads': 0, 'writes': 0}
+
+    @classmethod
+    def from_env(cls) -> Optional[QuotaBudget]:
+        """
+        Returns the budget set by the `FIRESTORE_READ_BUDGET`,
+        `FIRESTORE_WRITE_BUDGET` and `FIRESTORE_BUDGET_MODE` environment
+        variables, or None if no budget is set. A budget of `free` is the
+        free tier.
+        """
+        limits = {}
+        for operation in ('reads', 'writes'):
+            value = os.environ.get(f'FIRESTORE_{operation[:-1].upper()}_BUDGET', '')
+            if value:
+                limits[operation] = (FREE_TIER[operation] if value.lower() == 'free'
+                                     else int(value))
+        if not limits:
+            return None
+        return cls(**limits, mode=os.environ.get('FIRESTORE_BUDGET_MODE', ABORT))
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), self.timezone)
+
+    def current_window(self) -> str:
+        """
+        Returns the day, in Pacific time, whose quota is being spent.
+        """
+        return self.now().strftime('%Y-%m-%d')
+
+    def seconds_until_reset(self) -> float:
+        now = self.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1),
+                                    datetime.min.time(), tzinfo=self.timezone)
+        return max(0.0, midnight.timestamp() - now.timestamp())
+
+    def roll_window(self) -> None:
+        window = self.current_window()
+        if window != self.window:
+            self.window = window
+            self.used = {'reads': 0, 'writes': 0}
+
+    def remaining(self) -> dict[str, Optional[int]]:
+        """
+        Returns the operations left in the current window. None means
+        unlimited.
+        """
+        with self.lock:
+            self.roll_window()
+            return {operation: None if limit is None else max(0, limit - self.used[operation])
+                    for operation, limit in self.limits.items()}
+
+    def acquire(self, operation: str, amount: int = 1) -> None:
+        """
+        Records `amount` operations before they are sent.
+
+        Raises:
+            QuotaExceededError: The operations do not fit in the budget,
+            and the budget aborts or would wait longer than `max_wait`
+        """
+        limit = self.limits.get(operation)
+        if limit is None:
+            return
+        with self.lock:
+            self.roll_window()
+            while self.used[operation] + amount > limit:
+                wait = self.seconds_until_reset()
+                if self.mode == ABORT or amount > limit or (
+                        self.max_wait is not None and wait > self.max_wait):
+                    raise QuotaExceededError(
+                        f"Firestore {operation} budget of {limit} exceeded "
+                        f"for {self.window} ({self.used[operation]} used)")
+                logger.warning(f"Firestore {operation} budget exhausted, "
+                               f"waiting {wait / 3600:.1f}h for the quota reset")
+                # ? other threads wait on the lock, and therefore for the
+                # ? reset too
+                self.sleep(wait + 1)
+                self.roll_window()
+            self.used[operation] += amount
+
+    def check(self, estimate: Estimate) -> None:
+        """
+        Compares the estimated cost of a command with the remaining budget,
+        before anything is done.
+
+        Raises:
+            QuotaExceededError: The command does not fit, and the budget
+            aborts
+        """
+        remaining = self.remaining()
+        for operation, planned in estimate.totals().items():
+            left = remaining.get(operation)
+            if left is None or planned <= left:
+                continue
+            message = (f"{estimate.command} needs about {planned} {operation} "
+                       f"but {left} remain in the budget of {self.window}")
+            if self.mode == ABORT:
+                raise QuotaExceededError(message)
+            logger.warning(message + '; writes will wait for the next window')
+
+    def usage(self) -> dict:
+        with self.lock:
+            self.roll_window()
+            return {'window': self.window, **self.used}
+
+    def restore(self, usage: dict) -> None:
+        """
+        Resumes counting from the usage saved by a previous run, if it is
+        from the current window.
+        """
+        with self.lock:
+            self.roll_window()
+            if usage.get('window') == self.window:
+                self.used = {operation: int(usage.get(operation, 0))
+                             for operation in ('reads', 'writes')}
+
+
+class Estimate:
+    """
+    Estimated Firestore reads and writes of a command in the main database,
+    step by step. The count queries used to estimate are not included.
+    """
+
+    def __init__(self, command: str) -> None:
+        self.command: str = command
+        self.steps: dict[str, dict[str, int]] = {}
+
+    def add(self, step: str, reads: int = 0, writes: int = 0) -> Estimate:
+        current = self.steps.setdefault(step, {'reads': 0, 'writes': 0})
+        current['reads'] += reads
+        current['writes'] += writes
+        return self
+
+    def totals(self) -> dict[str, int]:
+        return {operation: sum(step[operation] for step in self.steps.values())
+                for operation in ('reads', 'writes')}
+
+    def to_dict(self) -> dict:
+        return {'command': self.command, 'totals': self.totals(), 'steps': self.steps}
+
+
+def check_plan(main_db, estimate: Callable[[], Estimate], dry_run: bool = False) -> bool:
+    """
+    Plans a command before it runs. With `dry_run`, the estimate of the
+    command is printed and the command must not run. Otherwise the estimate
+    is checked against the budget of `main_db`, if it has one.
+
+    Args:
+        main_db (Database): Main database
+        estimate (Callable): Returns the estimate of the command. Only
+        called when needed, since estimating costs count queries.
+        dry_run (bool): Print the estimate instead of running
+
+    Returns:
+        bool: True if the command should run
+
+    Raises:
+        QuotaExceededError: The command does not fit, and the budget aborts
+    """
+    if not dry_run and main_db.budget is None:
+        return True
+    planned = estimate()
+    if dry_run:
+        print(json.dumps(planned.to_dict(), indent=2))
+        return False
+    main_db.budget.check(planned)
+    return True
+
+
+def count_reads(documents: int) -> int:
+    """
+    Returns the reads billed for a count aggregation over `documents`.
+    """
+    return max(1, math.ceil(documents / 1000))
+
+
+def estimate_full_read(main_db, command: str) -> Estimate:
+    """
+    Estimates a command reading every job, such as `get_dataframe`,
+    `duplicates_exist` or `recalculate_size_counter`.
+    """
+    size = main_db.count_jobs()
+    estimate = Estimate(command).add('get_dataframe', max(1, size))
+    if command == 'recalculate_size_counter':
+        estimate.add('update_metadata', writes=1)
+    return estimate
+
+
+def estimate_stats_updates(main_db, estimate: Estimate) -> Estimate:
+    """
+    Adds the cost of updating and publishing statistics: metadata, the
+    statistics documents, the monthly trend and the export to the frontend
+    database, whose own writes are not included.
+    """
+    now = datetime.now()
+    this_month = main_db.count_jobs(datetime(now.year, now.month, 1))
+    stats_docs = main_db.count_stats_docs()
+
+    # last update date, then count of jobs this month
+    estimate.add('update_metadata', 1 + count_reads(this_month), 1)
+    # statistics documents are read, then updated when they change
+    estimate.add('update_analytics', stats_docs, stats_docs)
+    # cells of the cube are incremented without being read: about one
+    # per site and month
+    cube_docs = main_db.count_cube_docs()
+    estimate.add('update_cube', writes=1)
+    estimate.add('update_sketches', 1, 1)
+    # salary quantiles are read, then written: a document by kind of
+    # slice (location, technology) and currency
+    estimate.add('update_salary_quantiles', SALARY_DOCS, SALARY_DOCS)
+    # the event of the run is created, then marked applied
+    estimate.add('add_stats_event', writes=1)
+    estimate.add('set_stats_event_status', writes=1)
+    # one count per month of the trend
+    estimate.add('update_job_count_trend', 6, 1)
+    # the sketches have a cell per cell of the cube
+    estimate.add('sync_stats', stats_docs + 2 * cube_docs + SALARY_DOCS + 1)
+    return estimate
+
+
+def estimate_rebase_stats(main_db) -> Estimate:
+    """
+    Estimates a rebase, which reads every job page by page, and at most one
+    empty page.
+    """
+    size = main_db.count_jobs()
+    estimate = Estimate('rebase_stats').add('get_jobs_page', size + 1)
+    return estimate_stats_updates(main_db, estimate)
+
+
+def estimate_scrape(main_db, websites: list[str], id_fields: dict[str, str],
+                    max_jobs: Optional[int] = None, recent_limit: int = 500) -> Estimate:
+    """
+    Estimates a scrape of `websites`. The number of new jobs is `max_jobs`,
+    or the number of jobs added during the last day.
+
+    Args:
+        id_fields (dict[str, str]): Id field of each website
+        recent_limit (int): Jobs read to skip already scraped jobs
+    """
+    size = main_db.count_jobs()
+    new_jobs = max_jobs or main_db.count_jobs(datetime.now() - timedelta(days=1))
+
+    estimate = Estimate('scrape')
+    # recent jobs are read once per id field
+    estimate.add('get_recent_values',
+                 len(set(id_fields[website] for website in websites)) * max(1, min(size, recent_limit)))
+    estimate.add('get_watermark', 2 * len(websites))
+    estimate.add('set_watermark', writes=len(websites))
+    estimate.add('get_size', 1)
+    estimate.add('add_job', writes=new_jobs)
+    return estimate_stats_updates(main_db, estimate)
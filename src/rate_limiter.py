@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from src.logger import setup_logger
+
+logger = setup_logger()
+
+# status codes which mean the server wants us to slow down
+CONGESTION_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second and holding at most
+    `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.clock = clock
+        self.last_refill: float = clock()
+
+    def refill(self) -> None:
+        """
+        Adds the tokens generated since the last refill.
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Changes the refill rate. Tokens generated at the old rate are kept.
+        """
+        self.refill()
+        self.rate = rate
+
+    def reserve(self) -> float:
+        """
+        Takes a token from the bucket.
+
+        The bucket is allowed to go into debt so that concurrent callers
+        queue up behind each other instead of racing for the same token.
+
+        Returns:
+            float: Number of seconds the caller must wait before using
+            the token.
+        """
+        self.refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class HostLimiter:
+    """
+    Rate and concurrency limiter for a single host.
+
+    Requests are paced by a token bucket. Both the refill rate and the
+    number of requests allowed in flight are tuned with AIMD (additive
+    increase, multiplicative decrease): every fast and successful response
+    raises them a little, while a 429, a 5xx or a timeout cuts them sharply.
+    """
+
+    def __init__(self, host: str,
+                 initial_rate: float = 1.0,
+                 min_rate: float = 0.2,
+                 max_rate: float = 10.0,
+                 increase_step: float = 0.1,
+                 decrease_factor: float = 0.5,
+                 max_concurrency: int = 8,
+                 latency_tolerance: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Args:
+            host (str): Host name, only used for logging.
+            initial_rate (float): Requests per second at start.
+            min_rate (float): Rate is never decreased below this value.
+            max_rate (float): Rate is never increased above this value.
+            increase_step (float): Requests per second added after each
+            healthy response.
+            decrease_factor (float): Multiplier applied to rate and
+            concurrency when the host shows signs of congestion.
+            max_concurrency (int): Upper bound for requests in flight.
+            latency_tolerance (float): A response slower than
+            `latency_tolerance` times the average latency does not raise
+            the rate.
+        """
+        self.host: str = host
+        self.min_rate: float = min_rate
+        self.max_rate: float = max_rate
+        self.increase_step: float = increase_step
+        self.decrease_factor: float = decrease_factor
+        self.max_concurrency: int = max_concurrency
+        self.latency_tolerance: float = latency_tolerance
+        self.clock = clock
+        self.sleep = sleep
+
+        self.bucket = TokenBucket(initial_rate, clock=clock)
+        self.concurrency: float = 1.0
+        self.in_flight: int = 0
+
+        # exponentially weighted moving average of response times
+        self.avg_latency: Optional[float] = None
+
+        # latest response times, used to compute percentiles
+        self.recent_latencies: deque = deque(maxlen=200)
+
+        # every request gets a ticket number. Failures of requests sent
+        # before the last decrease belong to the same congestion episode
+        # and are ignored.
+        self.next_ticket: int = 0
+        self.last_decrease_ticket: int = -1
+
+        # no requests are sent before this time (set by Retry-After)
+        self.paused_until: float = 0.0
+
+        self.condition = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self, ignore_concurrency: bool = False) -> int:
+        """
+        Blocks until a request to this host is allowed.
+
+        Every call must be followed by a call to `release`.
+
+        Args:
+            ignore_concurrency (bool): If True, only wait for the rate
+            limit. Used by hedged requests, which would otherwise wait
+            for the slow request they are meant to overtake.
+
+        Returns:
+            int: Ticket which must be passed to `release`.
+        """
+        with self.condition:
+            while (not ignore_concurrency and
+                   self.in_flight >= int(self.concurrency)):
+                self.condition.wait()
+            self.in_flight += 1
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            delay = max(self.bucket.reserve(),
+                        self.paused_until - self.clock())
+        if delay > 0:
+            self.sleep(delay)
+        return ticket
+
+    def release(self, ticket: int, latency: float,
+                status_code: Optional[int] = None,
+                error: bool = False,
+                retry_after: Optional[float] = None) -> None:
+        """
+        Records the outcome of a request and adjusts rate and concurrency.
+
+        Args:
+            ticket (int): Value returned by `acquire`.
+            latency (float): Duration of request in seconds.
+            status_code (int, optional): HTTP status code. None if no
+            response was received.
+            error (bool): True if the request timed out or the connection
+            failed.
+            retry_after (float, optional): Value of the Retry-After header
+            in seconds.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            now = self.clock()
+
+            if error or status_code in CONGESTION_STATUS_CODES:
+                if retry_after:
+                    self.paused_until = max(self.paused_until,
+                                            now + retry_after)
+                self.decrease(ticket)
+            elif status_code is not None and status_code < 400:
+                if (self.avg_latency is None or
+                        latency <= self.latency_tolerance * self.avg_latency):
+                    self.increase()
+                self.update_latency(latency)
+
+            self.condition.notify_all()
+
+    def increase(self) -> None:
+        """
+        Additive increase of rate and concurrency.
+        """
+        self.bucket.set_rate(min(self.max_rate,
+                                 self.rate + self.increase_step))
+        # grows by about one slot for each window of `concurrency` requests
+        self.concurrency = min(self.max_concurrency,
+                               self.concurrency + 1 / self.concurrency)
+
+    def decrease(self, ticket: int) -> None:
+        """
+        Multiplicative decrease of rate and concurrency.
+        """
+        # ignore failures of requests which were already in flight when
+        # we last backed off
+        if ticket <= self.last_decrease_ticket:
+            return
+        self.last_decrease_ticket = self.next_ticket - 1
+
+        self.bucket.set_rate(max(self.min_rate,
+                                 self.rate * self.decrease_factor))
+        self.concurrency = max(1.0, self.concurrency * self.decrease_factor)
+        logger.warning(f"Backing off {self.host}: "
+                       f"{self.rate:.2f} req/s, "
+                       f"{int(self.concurrency)} concurrent requests")
+
+    def update_latency(self, latency: float, alpha: float = 0.2) -> None:
+        self.recent_latencies.append(latency)
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = alpha * latency + \
+                (1 - alpha) * self.avg_latency
+
+    def latency_percentile(self, q: float,
+                           min_samples: int = 20) -> Optional[float]:
+        """
+        Returns the `q`-th percentile (0 < q < 1) of recent response times,
+        or None if fewer than `min_samples` responses were recorded.
+        """
+        with self.condition:
+            latencies = sorted(self.recent_latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+def host_options_from_env() -> dict:
+    """
+    Returns `HostLimiter` options set by environment variables:
+
+    - `RATE_LIMIT_MAX_RATE`: requests per second sent to each host from the
+    start, and never exceeded.
+    - `RATE_LIMIT_MAX_CONCURRENCY`: maximum number of requests in flight.
+
+    Used to lift the limits when scraping a local stand-in server.
+    """
+    options: dict = {}
+    max_rate = os.environ.get('RATE_LIMIT_MAX_RATE')
+    if max_rate:
+        options['initial_rate'] = options['max_rate'] = float(max_rate)
+    max_concurrency = os.environ.get('RATE_LIMIT_MAX_CONCURRENCY')
+    if max_concurrency:
+        options['max_concurrency'] = int(max_concurrency)
+    return options
+
+
+class RateLimiter:
+    """
+    Keeps one `HostLimiter` per host. Keyword arguments passed to the
+    constructor are used to create each `HostLimiter`.
+    """
+
+    def __init__(self, **host_options) -> None:
+        self.host_options = host_options
+        self.hosts: dict[str, HostLimiter] = {}
+        self.lock = threading.Lock()
+
+    def for_host(self, url: str) -> HostLimiter:
+        """
+        Returns the limiter of the host of `url`, creating it if missing.
+        """
+        host = urlparse(url).netloc or url
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimiter(host, **self.host_options)
+            return self.hosts[host]
+
+    def acquire(self, url: str, ignore_concurrency: bool = False) -> int:
+        return self.for_host(url).acquire(ignore_concurrency)
+
+    def release(self, url: str, ticket: int, latency: float,
+                status_code: Optional[int] = None, error: bool = False,
+                retry_after: Optional[float] = None) -> None:
+        self.for_host(url).release(ticket, latency, status_code, error,
+                                   retry_after)
+
+    def current_rate(self, url: str) -> float:
+        """
+        Returns the number of requests per second currently allowed
+        for the host of `url`.
+        """
+        return self.for_host(url).rate
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Returns the state of every host, for logging.
+        """
+        with self.lock:
+            return {host: {'rate': limiter.rate,
+                           'concurrency': int(limiter.concurrency),
+                           'avg_latency': limiter.avg_latency}
+                    for host, limiter in self.hosts.items()}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Returns the number of seconds in a Retry-After header, or None if the
+    header is missing or is not a number of seconds.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
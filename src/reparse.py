@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime
+from typing import Optional
+
+from src.base_scrapper import get_scraper_class
+from src.classes.archive import DEFAULT_ARCHIVE_PATH, Archive
+from src.classes.spool import encode_job
+
+
+def reparse(archive: Archive, website: str, since: Optional[datetime] = None,
+            until: Optional[datetime] = None) -> list[dict]:
+    """
+    Rebuilds the jobs of `website` from its archived responses, using the
+    current parsers of its scraper. No request is sent.
+
+    Returns:
+        list[dict]: Jobs, newest first
+    """
+    jobs = get_scraper_class(website).jobs_from_archive(archive, since, until)
+    return [job.__dict__ for job in jobs]
+
+
+def get_args():
+    """
+    Returns command line arguments.
+
+    :returns
+        args (argparse.Namespace): command line arguments
+    """
+    parser = argparse.ArgumentParser(
+        description='Rebuild jobs from archived responses, without network access')
+    parser.add_argument('--website', type=str, nargs='+', required=True,
+                        help='websites whose responses are parsed')
+    parser.add_argument('--archive', type=str, default=DEFAULT_ARCHIVE_PATH,
+                        help='directory of archive')
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                        help='only parse responses fetched on or after this '
+                        'date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        help='only parse responses fetched before this date')
+    parser.add_argument('--output', type=str,
+                        help='JSON lines file where jobs are written '
+                        '(default: standard output)')
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+    archive = Archive(args.archive)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for website in args.website:
+            for job in reparse(archive, website, args.since, args.until):
+                output.write(encode_job({'site': website, **job}) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
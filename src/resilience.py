@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, Optional, Union
+from urllib.parse import urlparse
+
+# status codes worth retrying: the same request may succeed later
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RequestFailedError(Exception):
+    """
+    Raised when a request could not be completed, even after retrying.
+    Scrapers catch this error to skip the job or page concerned.
+    """
+
+    def __init__(self, url: str, reason: str,
+                 status_code: Optional[int] = None) -> None:
+        super().__init__(f"{url}: {reason}")
+        self.url: str = url
+        self.reason: str = reason
+        self.status_code: Optional[int] = status_code
+
+
+class CircuitOpenError(RequestFailedError):
+    """
+    Raised without sending anything when the circuit breaker of a host
+    is open.
+    """
+
+
+class RetryPolicy:
+    """
+    Timeouts and exponential backoff used by `BaseScraper` requests.
+    """
+
+    def __init__(self, max_attempts: int = 4,
+                 timeout: Union[float, tuple[float, float]] = (5, 20),
+                 base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Args:
+            max_attempts (int): Number of attempts before giving up,
+            including the first one.
+            timeout (float | tuple): Timeout passed to `requests`, either
+            a single value or a (connect, read) pair in seconds.
+            base_delay (float): Delay before the first retry, in seconds.
+            Doubled after each attempt.
+            max_delay (float): Upper bound for the delay between attempts.
+        """
+        self.max_attempts: int = max_attempts
+        self.timeout = timeout
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the delay before retrying after the given attempt (starting
+        from 0). Uses "full jitter" so that concurrent workers do not retry
+        in lockstep.
+        """
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after too many consecutive failures.
+
+    The circuit is closed while the host is healthy. It opens after
+    `failure_threshold` consecutive failures and rejects all requests for
+    `reset_timeout` seconds. Afterwards a single trial request is let
+    through (half-open state): the circuit closes if it succeeds and opens
+    again if it fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.clock = clock
+
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Returns True if a request may be sent now.
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN and
+                    self.clock() - self.opened_at >= self.reset_timeout):
+                # let a single trial request through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class CircuitBreakers:
+    """
+    Keeps one `CircuitBreaker` per host. Keyword arguments passed to the
+    constructor are used to create each `CircuitBreaker`.
+    """
+
+    def __init__(self, **breaker_options) -> None:
+        self.breaker_options = breaker_options
+        self.hosts: dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def for_host(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc or url
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = CircuitBreaker(**self.breaker_options)
+            return self.hosts[host]
@@ -0,0 +1,7 @@
+# module of the scraper of each website, imported by `get_scraper_class` when
+# the website is first used. Importing a module registers its scraper in
+# `SCRAPERS`.
+SCRAPER_MODULES = {
+    'kariyernet': 'src.scrappers.kariyernet',
+    'myjobmu': 'src.scrappers.myjobmu',
+}
@@ -1,23 +1,45 @@
 from __future__ import annotations
 
+import contextvars
+import json
 import math
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from requests import Session
 import time
-from tqdm import tqdm
 from datetime import datetime
+from typing import Optional
 
 from src.base_scrapper import BaseScraper
+from src.classes.archive import Archive
 from src.classes.job import Job
+from src.classes.spool import Spool
+from src.classes.watermark import Watermark
+from src.logger import Progress, setup_logger
+from src.metrics import metrics
 from src.proxy_manager import ProxyManager
+from src.resilience import RequestFailedError
+
+logger = setup_logger()
+
 
 class KariyerNetJobScraper(BaseScraper):
     """
     Scrapes IT jobs from kariyer.net website
     """
 
+    site = 'kariyernet'
+    id_field = 'ad_id'
+
+    # ids of the IT departments used to filter search results
+    departments = ["55", "78"]
+
+    # number of jobs per results page
+    page_size = 50
+
     turkish_months = {
         'Ocak': 'January',
         'Şubat': 'February',
@@ -33,7 +55,9 @@ class KariyerNetJobScraper(BaseScraper):
         'Aralık': 'December'
     }
 
-    def __init__(self, scraped_ids: list[str], limit: int = -1) -> None:
+    def __init__(self, scraped_ids: list[str], limit: int = -1,
+                 spool: Spool | None = None,
+                 watermark: Watermark | None = None) -> None:
         """
         Creates an instance of a scraper.
 
@@ -44,14 +68,30 @@ class KariyerNetJobScraper(BaseScraper):
 
             limit (int): Maximum number of jobs that must be scraped. Default
             value of -1 means there's no limit.
+
+            spool (Spool, optional): Durable store where each scraped job
+            and the last completed page are saved. A scrape interrupted
+            half-way resumes from the spool checkpoint.
+
+            watermark (Watermark, optional): Newest job seen by previous
+            runs. Scraping stops at the first page where every job is
+            older than the watermark.
         """
 
-        self.scraped_job_ids: list[str] = scraped_ids
+        self.scraped_job_ids: set[str] = {str(x) for x in scraped_ids}
+
+        # guards `scraped_job_ids` when pages are scraped in parallel
+        self.lock = threading.Lock()
 
         self.limit: int = limit
 
+        # base url of api. Can be changed to point at a local stand-in
+        # server, for example in benchmarks.
+        self.api_url: str = os.environ.get('KARIYERNET_API_URL',
+                                           'https://api-web.kariyer.net')
+
         # default url for IT jobs sorted by most recent
-        self.default_url: str = 'https://api-web.kariyer.net/search'
+        self.default_url: str = f'{self.api_url}/search'
 
         # duration of loading page animation
         self.load_duration: int = 5  # ! Avoid decreasing this value
@@ -59,107 +99,304 @@ class KariyerNetJobScraper(BaseScraper):
         # setup scraper
         proxy_manager = ProxyManager()
         super().__init__(proxy_manager)
-        self.proxied: bool = os.environ.get('KARIYERNET_PROXIED', False)
-        self.session: Session = requests.Session()
+        self.proxied: bool = os.environ.get('KARIYERNET_PROXIED', '').lower() in ('1', 'true', 'yes')
+        self.session: Session = self.new_session()
+
+        # duplicate the slowest detail requests through another proxy
+        if os.environ.get('KARIYERNET_HEDGED', '').lower() in ('1', 'true'):
+            self.enable_hedging()
 
         # store new jobs found
         self.new_jobs: list[Job] = []
+        self.spool: Spool | None = spool
+        self.watermark: Watermark | None = watermark
 
-    def get_jobs_on_page(self, pageNumber: int) -> int:
+        # set when every job on the last page scraped is older than
+        # the watermark
+        self.reached_watermark: bool = False
+
+        # set when the watermark and the date of every job on the last
+        # page scraped are known
+        self.page_dated: bool = False
+
+    def new_session(self) -> Session:
         """
-        Extracts all job data on a page and saves this
-        data to `new_jobs`.
+        Returns a new HTTP session. Each backfill worker uses its own.
+        """
+        return requests.Session()
+
+    def search(self, pageNumber: int, departments: list[str] | None = None,
+               session: Session | None = None) -> dict:
+        """
+        Fetches a page of search results, sorted from newest to oldest.
 
         Args:
-            pageNumber(int): Page number
+            pageNumber (int): Page number
+            departments (list, optional): Department ids used to filter
+            jobs. Defaults to all IT departments.
+            session (Session, optional): Session used to send the request.
+            Defaults to the session of the scraper.
 
         Returns:
-            int: number of new jobs scraped on current page
+            dict: `data` field of the response
         """
         body: dict = {
             "memberId": 0,
             "currentPage": pageNumber,
-            "size": 50,
-            "departments": [
-                "55",
-                "78"
-            ],
+            "size": self.page_size,
+            "departments": departments or self.departments,
             "sortType": "SortByDate",
             "sortDirection": "Descending"
         }
         headers = {
             "Content-Type": "application/json",
         }
-        response = self.http_post(session=self.session, url=self.default_url, body=body, headers=headers, proxied=self.proxied)
-        jobs = response.json()['data']['jobs']['items']
+        with metrics.time('page_fetch'):
+            response = self.http_post(session=session or self.session, url=self.default_url,
+                                      body=body, headers=headers, proxied=self.proxied,
+                                      idempotent=True)
+        self.archive_response('search', f"{','.join(body['departments'])}:{pageNumber}",
+                              response.content)
+        return response.json()['data']
+
+    def get_job(self, ad_id, session: Session | None = None) -> Job:
+        """
+        Fetches the details of a job.
+
+        Args:
+            ad_id: Id of job
+            session (Session, optional): Session used to send the request.
+            Defaults to the session of the scraper.
+
+        Raises:
+            RequestFailedError: Job could not be fetched
+
+        Returns:
+            Job: Job with all fields set
+        """
+        # get job from api
+        with metrics.time('detail_fetch'):
+            response = self.http_get(
+                session=session or self.session,
+                url='{api}/job?jobId={jobId}'.format(api=self.api_url, jobId=ad_id),
+                proxied=self.proxied)
+        self.archive_response('job', str(ad_id), response.content)
+        with metrics.time('parse'):
+            return self.parse_job(ad_id, response.json()['data'])
+
+    @classmethod
+    def parse_job(cls, ad_id, jobDetails: dict) -> Job:
+        """
+        Creates a job from the `data` field of a job api response.
+
+        Args:
+            ad_id: Id of job
+            jobDetails (dict): Job details returned by the api
+
+        Returns:
+            Job: Job with all fields set
+        """
+        jobObj = Job()
+        jobObj.ad_id = ad_id
+
+        # extract job title
+        jobObj.job_title = jobDetails['jobGeneralInformation']['title']
+
+        # extract company name
+        # * Some job posts have `Hidden Company` as their company name
+        # * and in this case, the required element is missing.
+        if jobDetails['jobGeneralInformation']['confidential'] is True:
+            jobObj.company = "Unknown"
+        else:
+            jobObj.company = jobDetails['jobCompanyInformation']['companyName'].strip()
+
+        # extract date posted and closing date
+        date_posted = jobDetails['jobGeneralInformation']['postingDate']
+
+        closing_date = jobDetails['jobGeneralInformation']['closingDate']
+
+        # convert string dates to correct datetime data type
+        jobObj.date_posted =  datetime.strptime(date_posted, '%Y-%m-%d')
+        for tr_month, en_month in cls.turkish_months.items():
+            closing_date = closing_date.replace(tr_month, en_month)
+
+        jobObj.closing_date = datetime.strptime(closing_date, '%d %B %Y')
+
+        # extract job location
+        jobObj.location = jobDetails['jobGeneralInformation']['locationText']
+
+        # extract salary
+        jobObj.salary = "Unknown"
+
+        # job details
+        jobObj.job_details = jobDetails['jobGeneralInformation']['qualifications']
+
+        # job ad language
+        jobObj.job_ad_language = jobDetails['jobGeneralInformation']['language']
+
+        return jobObj
+
+    def claim_job(self, ad_id) -> bool:
+        """
+        Marks a job as scraped, unless it already is.
+
+        Returns:
+            bool: True if the job was not scraped yet and must be
+            processed by the caller.
+        """
+        with self.lock:
+            if str(ad_id) in self.scraped_job_ids:
+                return False
+            self.scraped_job_ids.add(str(ad_id))
+            return True
+
+    def unclaim_job(self, ad_id) -> None:
+        """
+        Undoes `claim_job` for a job which could not be fetched, so that
+        it is picked up again by the next run.
+        """
+        with self.lock:
+            self.scraped_job_ids.discard(str(ad_id))
+
+    def limit_reached(self) -> bool:
+        return self.limit != -1 and len(self.new_jobs) >= self.limit
+
+    def save_job(self, jobObj: Job, enriched: bool = True) -> None:
+        """
+        Adds a job to `new_jobs` and to the spool. Skeleton jobs, saved
+        with `enriched=False`, are added to the detail queue of the spool.
+        """
+        with self.lock:
+            self.new_jobs.append(jobObj)
+        if self.spool is not None:
+            self.spool.add_job(self.site, jobObj.__dict__, enriched)
+
+    def job_from_listing(self, job_module: dict) -> Job:
+        """
+        Creates a skeleton job from the fields available on a results page.
+        Its details are fetched later by `enrich`.
+        """
+        jobObj = Job()
+        jobObj.ad_id = job_module['id']
+        jobObj.job_title = job_module.get('title', '')
+        jobObj.company = job_module.get('companyName') or "Unknown"
+        jobObj.location = job_module.get('locationText', '')
+        jobObj.date_posted = self.get_listing_date(job_module)
+        jobObj.salary = "Unknown"
+        return jobObj
+
+    def enrich(self, job: dict) -> dict:
+        """
+        Fetches the details of a skeleton job.
+
+        Raises:
+            RequestFailedError: Job could not be fetched
+        """
+        details = self.get_job(job['ad_id']).__dict__
+        return {**job, **details}
+
+    def scrape_page(self, pageNumber: int, departments: list[str] | None = None,
+                    session: Session | None = None) -> tuple[int, bool]:
+        """
+        Extracts all job data on a page and saves this
+        data to `new_jobs`.
+
+        Args:
+            pageNumber (int): Page number
+            departments (list, optional): Department ids used to filter
+            jobs. Defaults to all IT departments.
+            session (Session, optional): Session used to send requests
+
+        Returns:
+            tuple[int, bool]: number of new jobs scraped on current page, and
+            whether every job of the page is older than the watermark
+        """
+        jobs = self.search(pageNumber, departments, session)['jobs']['items']
+
+        # jobs older than the watermark were scraped by a previous run
+        listing_dates = [self.get_listing_date(job_module) for job_module in jobs]
+        reached_watermark = (self.watermark is not None and
+                             self.watermark.page_is_older(listing_dates))
+        # ? only read by `scrape`, which scrapes one page at a time
+        self.page_dated = (self.watermark is not None and
+                           self.watermark.dates_known(listing_dates))
 
         # initialise counter for the number of new
         # jobs found on current page
         jobs_added_count = 0
 
-        for job_module in tqdm(jobs):
-            jobObj = Job()
+        for job_module, listing_date in zip(jobs, listing_dates):
+            # get id of current job module
+            ad_id = job_module['id']
 
-            # get url and id of current job module
-            jobObj.ad_id = job_module['id']
+            if self.watermark is not None and self.watermark.is_older(listing_date):
+                continue
 
             # ignore already scraped jobs
-            if jobObj.ad_id in self.scraped_job_ids:
+            if not self.claim_job(ad_id):
                 continue
 
             # else new job found
             jobs_added_count += 1
-            self.scraped_job_ids.append(jobObj.ad_id)
-
-            # get job from api
-            response = self.http_get(
-                session=self.session,
-                url='https://api-web.kariyer.net/job?jobId={jobId}'.format(jobId=jobObj.ad_id),
-                proxied=self.proxied)
-            jobDetails = response.json()['data']
 
-            # extract job title
-            jobObj.job_title = jobDetails['jobGeneralInformation']['title']
-
-            # extract company name
-            # * Some job posts have `Hidden Company` as their company name
-            # * and in this case, the required element is missing.
-            if jobDetails['jobGeneralInformation']['confidential'] is True:
-                jobObj.company = "Unknown"
-            else:
-                jobObj.company = jobDetails['jobCompanyInformation']['companyName'].strip()
-
-            # extract date posted and closing date
-            date_posted = jobDetails['jobGeneralInformation']['postingDate']
+            # details are fetched later, in priority order
+            if self.defer_details:
+                self.save_job(self.job_from_listing(job_module), enriched=False)
+                if self.limit_reached():
+                    return jobs_added_count, reached_watermark
+                continue
 
-            closing_date = jobDetails['jobGeneralInformation']['closingDate']
+            # * A job which cannot be fetched is skipped and is not marked
+            # * as scraped so that it is picked up again by the next run.
+            try:
+                jobObj = self.get_job(ad_id, session)
+            except RequestFailedError as e:
+                logger.error(f"Skipping job {ad_id}: {e}")
+                self.unclaim_job(ad_id)
+                continue
 
-            # convert string dates to correct datetime data type
-            jobObj.date_posted =  datetime.strptime(date_posted, '%Y-%m-%d')
-            for tr_month, en_month in self.turkish_months.items():
-                closing_date = closing_date.replace(tr_month, en_month)
+            # save job to list of scraped jobs
+            self.save_job(jobObj)
 
-            jobObj.closing_date = datetime.strptime(closing_date, '%d %B %Y')
+            if self.limit_reached():
+                return jobs_added_count, reached_watermark
 
-            # extract job location
-            jobObj.location = jobDetails['jobGeneralInformation']['locationText']
+        return jobs_added_count, reached_watermark
 
-            # extract salary
-            jobObj.salary = "Unknown"
+    def get_jobs_on_page(self, pageNumber: int) -> int:
+        """
+        Extracts all job data on a page and saves this
+        data to `new_jobs`.
 
-            # job details
-            jobObj.job_details = jobDetails['jobGeneralInformation']['qualifications']
+        Args:
+            pageNumber(int): Page number
 
-            # job ad language
-            jobObj.job_ad_language = jobDetails['jobGeneralInformation']['language']
+        Returns:
+            int: number of new jobs scraped on current page
+        """
+        jobs_added_count, self.reached_watermark = self.scrape_page(pageNumber)
+        return jobs_added_count
 
-            # save job to list of scraped jobs
-            self.new_jobs.append(jobObj)
+    @staticmethod
+    def get_listing_date(job_module: dict) -> Optional[datetime]:
+        """
+        Returns the posting date of a job found in the search results, or
+        None if the search results do not include it.
 
-            if len(self.new_jobs) == self.limit:
-                return jobs_added_count
+        Args:
+            job_module (dict): Item of search results
 
-        return jobs_added_count
+        Returns:
+            datetime: Date posted
+        """
+        # * search items use the same date format as the job api
+        date_posted = job_module.get('postingDate')
+        if not date_posted:
+            return None
+        try:
+            return datetime.strptime(date_posted[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
 
     def wait(self) -> None:
         """
@@ -167,48 +404,215 @@ class KariyerNetJobScraper(BaseScraper):
         """
         time.sleep(self.load_duration)
 
+    def get_page_count(self, departments: list[str] | None = None) -> int:
+        """
+        Returns the number of pages of search results.
+
+        Args:
+            departments (list, optional): Department ids used to filter
+            jobs. Defaults to all IT departments.
+        """
+        totalJobs = self.search(1, departments)['totalJobCount']
+        return math.ceil(totalJobs/self.page_size)
+
     def scrape(self) -> list[dict]:
         """
-        Start scraping from first page.
+        Start scraping from first page, or from the page after the spool
+        checkpoint if a previous run was interrupted.
 
         Raises:
             Exception: Unable to find number of pages
 
         Returns:
-            list[dict]: New jobs found.
+            list[dict]: New jobs found during this run. Jobs spooled by an
+            interrupted run are not included.
         """
+        first_page = 1
+        if self.spool is not None:
+            checkpoint = self.spool.get_checkpoint(self.site)
+            if checkpoint is not None:
+                if checkpoint['finished']:
+                    # previous run only has to be uploaded
+                    return []
+                first_page = checkpoint['page'] + 1
+                logger.info(f"Resuming {self.site} scrape from page {first_page}")
+            self.scraped_job_ids.update(self.spool.job_keys(self.site))
 
         # fetch page count
-        body: dict = {
-            "memberId": 0,
-            "currentPage": 1,
-            "size": 50,
-            "departments": [
-                "55",
-                "78"
-            ],
-            "sortType": "SortByDate",
-            "sortDirection": "Descending"
-        }
-        headers = {
-            "Content-Type": "application/json",
-        }
-        response = self.http_post(session=self.session, url=self.default_url, body=body, headers=headers, proxied=self.proxied)
-        data = response.json()
-        totalJobs = data['data']['totalJobCount']
-        last_page = math.ceil(totalJobs/50)
+        last_page = self.get_page_count()
 
         # scrape each page
-        for pageNumber in tqdm(range(1, last_page+1)):
+        pageNumber = first_page
+        progress = Progress(f"{self.site} pages", last_page - first_page + 1)
+        for pageNumber in range(first_page, last_page+1):
+            progress.update()
             # extract job data
-            jobs_added_count = self.get_jobs_on_page(pageNumber)
+            try:
+                jobs_added_count = self.get_jobs_on_page(pageNumber)
+            except RequestFailedError as e:
+                # jobs on this page will be picked up by the next run
+                logger.error(f"Skipping page {pageNumber}: {e}")
+                continue
+
+            if self.spool is not None:
+                self.spool.save_checkpoint(self.site, pageNumber)
 
             # since jobs are sorted by recent, as soon as
             # we encounter a page which has already been visited we can stop
             # scraping. (all pages after current page are also already visited)
-            if jobs_added_count == 0 or jobs_added_count == self.limit:
+            if jobs_added_count == self.limit or self.reached_watermark:
+                break
+            # without a watermark, or when the dates of the page are
+            # unknown, a page is considered visited when none of its jobs
+            # is new
+            if not self.page_dated and jobs_added_count == 0:
+                break
+        progress.close()
+
+        if self.spool is not None:
+            self.spool.save_checkpoint(self.site, pageNumber, finished=True)
+
+        return [x.__dict__ for x in self.new_jobs]
+
+    @classmethod
+    def jobs_from_archive(cls, archive: Archive, since: datetime | None = None,
+                          until: datetime | None = None) -> list[Job]:
+        """
+        Parses again the job api responses saved in `archive`, without
+        sending any request. When a job was fetched several times, its
+        most recent response is used.
+
+        Args:
+            archive (Archive): Archive of raw responses
+            since (datetime, optional): Only parse responses fetched at or
+            after this time
+            until (datetime, optional): Only parse responses fetched before
+            this time
+
+        Returns:
+            list[Job]: Jobs, newest first
+        """
+        jobs: dict[str, Job] = {}
+        for record, content in archive.records(cls.site, 'job', since, until):
+            data = json.loads(content)['data']
+            try:
+                jobs[record['key']] = cls.parse_job(int(record['key']), data)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Could not parse job {record['key']}: {e}")
+        return sorted(jobs.values(), key=lambda job: job.date_posted, reverse=True)
+
+    def get_partitions(self, pages_per_partition: int) -> list[tuple[str, int, int]]:
+        """
+        Splits the search space into independent partitions: one set of
+        page ranges for each department.
+
+        Returns:
+            list[tuple[str, int, int]]: department id, first page and last
+            page of each partition
+        """
+        partitions = []
+        for department in self.departments:
+            last_page = self.get_page_count([department])
+            for first_page in range(1, last_page + 1, pages_per_partition):
+                partitions.append((department, first_page,
+                                   min(first_page + pages_per_partition - 1, last_page)))
+        return partitions
+
+    def crawl_partition(self, department: str, first_page: int, last_page: int) -> int:
+        """
+        Scrapes the pages `first_page` to `last_page` of `department` with
+        a dedicated session. Progress is checkpointed in the spool under a
+        key specific to the partition.
+
+        The page after `last_page` is also scraped: jobs posted during the
+        crawl push older jobs to the next page, and would otherwise fall
+        between two partitions. Jobs seen twice are dropped by `claim_job`.
+
+        Returns:
+            int: number of new jobs scraped in partition
+        """
+        key = f'{self.site}/backfill/{department}/{first_page}'
+        start_page = first_page
+        if self.spool is not None:
+            checkpoint = self.spool.get_checkpoint(key)
+            if checkpoint is not None:
+                if checkpoint['finished']:
+                    return 0
+                start_page = checkpoint['page'] + 1
+
+        session = self.new_session()
+        jobs_added_count = 0
+        pageNumber = start_page
+        for pageNumber in range(start_page, last_page + 2):
+            try:
+                added, reached_watermark = self.scrape_page(pageNumber, [department], session)
+            except RequestFailedError as e:
+                # jobs on this page will be picked up by the next run
+                logger.error(f"Skipping page {pageNumber} of department {department}: {e}")
+                continue
+            jobs_added_count += added
+
+            if self.spool is not None:
+                self.spool.save_checkpoint(key, pageNumber)
+
+            # following pages of the department are older still
+            if reached_watermark or self.limit_reached():
                 break
 
+        if self.spool is not None:
+            self.spool.save_checkpoint(key, pageNumber, finished=True)
+        return jobs_added_count
+
+    def backfill(self, workers: int = 4, pages_per_partition: int = 10) -> list[dict]:
+        """
+        Crawls all pages of every department, splitting them into
+        partitions which are scraped in parallel by `workers` threads.
+        Jobs listed in several departments are only scraped once.
+
+        Unlike `scrape`, a backfill does not stop at the first page without
+        new jobs, so it can be used to seed a new database or to catch up
+        after an outage. It still stops at the watermark, if any.
+
+        Args:
+            workers (int): Number of partitions scraped at the same time
+            pages_per_partition (int): Number of results pages in a partition
+
+        Returns:
+            list[dict]: New jobs found during this run. Jobs spooled by an
+            interrupted run are not included.
+        """
+        if self.spool is not None:
+            checkpoint = self.spool.get_checkpoint(self.site)
+            if checkpoint is not None and checkpoint['finished']:
+                # previous run only has to be uploaded
+                return []
+            self.scraped_job_ids.update(self.spool.job_keys(self.site))
+
+        partitions = self.get_partitions(pages_per_partition)
+        logger.info(f"Backfilling {self.site} in {len(partitions)} partitions "
+                    f"with {workers} workers")
+
+        progress = Progress(f"{self.site} partitions", len(partitions))
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix=f'{self.site}-backfill') as executor:
+            # each partition runs in a copy of the log context of this thread
+            futures = [executor.submit(contextvars.copy_context().run,
+                                       self.crawl_partition, *partition)
+                       for partition in partitions]
+            # ! wait for every partition before raising, so that their
+            # ! checkpoints are saved
+            errors = []
+            for future in as_completed(futures):
+                progress.update()
+                if future.exception() is not None:
+                    errors.append(future.exception())
+        progress.close()
+        if errors:
+            raise errors[0]
+
+        if self.spool is not None:
+            self.spool.save_checkpoint(self.site, 0, finished=True)
+
         return [x.__dict__ for x in self.new_jobs]
 
 
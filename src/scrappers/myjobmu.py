@@ -3,20 +3,89 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
+import os
 import time
-from tqdm import tqdm
 from datetime import datetime
+from urllib.parse import urljoin
 
 
+from src.base_scrapper import BaseScraper
+from src.classes.archive import Archive
 from src.classes.job import Job
+from src.classes.spool import Spool
+from src.classes.watermark import Watermark
+from src.logger import Progress, setup_logger
+from src.metrics import metrics
+from src.utils.html import Element, parse_html
 
+logger = setup_logger()
 
-class MyJobMuJobScraper:
+BASE_URL = 'https://www.myjob.mu/'
+
+
+def element_text(parent: Element, *args, **kwargs) -> str | None:
+    element = parent.find(*args, **kwargs)
+    return element.text() if element is not None else None
+
+
+def parse_results_page(html: str) -> list[Job]:
+    """
+    Creates a job for each job module of the HTML of a results page. Uses
+    the same selectors as `MyJobMuJobScraper.get_jobs_on_page`.
+
+    Returns:
+        list[Job]: Jobs without their description and employment type
+    """
+    jobs = []
+    for job_module in parse_html(html).find_all('div', ('module', 'job-result')):
+        link = job_module.find('a', ('show-more',))
+        title = job_module.find('div', ('job-result-title',))
+        if link is None or title is None:
+            continue
+
+        jobObj = Job()
+        jobObj.url = urljoin(BASE_URL, link.attrs.get('href', ''))
+        jobObj.job_title = element_text(title, 'h2') or ''
+        jobObj.company = (element_text(job_module, 'a', itemprop='hiringOrganization')
+                          or "Unknown")
+
+        date_posted = element_text(job_module, 'li', ('updated-time',)) or ''
+        closing_date = element_text(job_module, 'li', ('closed-time',)) or ''
+        try:
+            jobObj.date_posted = datetime.strptime(
+                date_posted.replace('Added ', ''), '%d/%m/%Y')
+            jobObj.closing_date = datetime.strptime(
+                closing_date.replace('Closing ', ''), '%d/%m/%Y')
+        except ValueError:
+            logger.error(f"Could not parse dates of {jobObj.url}")
+
+        jobObj.location = element_text(job_module, 'li', itemprop='jobLocation') or ''
+        jobObj.salary = element_text(job_module, 'li', itemprop='baseSalary') or ''
+        jobs.append(jobObj)
+    return jobs
+
+
+def parse_job_page(html: str, jobObj: Job) -> None:
+    """
+    Sets the description and employment type of a job from the HTML of its
+    page. Uses the same selectors as `MyJobMuJobScraper.get_job_details`.
+    """
+    document = parse_html(html)
+    jobObj.job_details = element_text(document, 'div', ('job-details',)) or ''
+    jobObj.employment_type = element_text(document, 'li', ('employment-type',)) or ''
+
+
+class MyJobMuJobScraper(BaseScraper):
     """
     Scrapes IT jobs from myjob.mu website
     """
 
-    def __init__(self, scraped_urls: list[str], limit: int = -1) -> None:
+    site = 'myjobmu'
+    id_field = 'url'
+
+    def __init__(self, scraped_urls: list[str], limit: int = -1,
+                 spool: Spool | None = None,
+                 watermark: Watermark | None = None) -> None:
         """
         Creates an instance of a scraper.
 
@@ -27,14 +96,24 @@ class MyJobMuJobScraper:
 
             limit (int): Maximum number of jobs that must be scraped. Default
             value of -1 means there's no limit.
+
+            spool (Spool, optional): Durable store where each scraped job
+            and the last completed page are saved. A scrape interrupted
+            half-way resumes from the spool checkpoint.
+
+            watermark (Watermark, optional): Newest job seen by previous
+            runs. Scraping stops at the first page where every job is
+            older than the watermark.
         """
 
         self.scraped_urls: list[str] = scraped_urls
 
         self.limit: int = limit
 
-        # default url for IT jobs sorted by most recent
-        self.default_url: str = ('https://www.myjob.mu/ShowResults.aspx?'
+        # default url for IT jobs sorted by most recent. The website can be
+        # replaced by a local stand-in server with `MYJOBMU_URL`.
+        base_url = os.environ.get('MYJOBMU_URL', BASE_URL).rstrip('/') + '/'
+        self.default_url: str = (f'{base_url}ShowResults.aspx?'
                                  'Keywords=&Location='
                                  '&Category=39&Recruiter=Company&'
                                  'SortBy=MostRecent&Page=')
@@ -43,6 +122,8 @@ class MyJobMuJobScraper:
         self.load_duration: int = 5  # ! Avoid decreasing this value
 
         # setup scraper
+        # * pages are loaded by selenium, not through http_get
+        super().__init__(proxy_manager=None)
         chrome_options = Options()
         chrome_options.add_argument('--no-sandbox')
         chrome_options.add_argument('--disable-dev-shm-usage')
@@ -52,6 +133,16 @@ class MyJobMuJobScraper:
 
         # store new jobs found
         self.new_jobs: list[Job] = []
+        self.spool: Spool | None = spool
+        self.watermark: Watermark | None = watermark
+
+        # set when every job on the last page scraped is older than
+        # the watermark
+        self.reached_watermark: bool = False
+
+        # set when the watermark and the date of every job on the last
+        # page scraped are known
+        self.page_dated: bool = False
 
     def get_jobs_on_page(self, pageNumber: int) -> int:
         """
@@ -66,8 +157,11 @@ class MyJobMuJobScraper:
         """
 
         # go to page
-        self.driver.get(self.default_url+str(pageNumber))
-        self.wait()
+        with metrics.time('page_fetch'):
+            self.driver.get(self.default_url+str(pageNumber))
+            self.wait()
+        self.archive_response('search', str(pageNumber),
+                              self.driver.page_source.encode())
 
         # get all job modules on current page
         job_modules = self.driver.find_elements(
@@ -77,7 +171,15 @@ class MyJobMuJobScraper:
         # jobs found on current page
         jobs_added_count = 0
 
-        for job_module in tqdm(job_modules):
+        # jobs older than the watermark were scraped by a previous run
+        listing_dates = [self.get_listing_date(job_module)
+                         for job_module in job_modules]
+        if self.watermark is not None:
+            self.reached_watermark = self.watermark.page_is_older(
+                listing_dates)
+            self.page_dated = self.watermark.dates_known(listing_dates)
+
+        for job_module, listing_date in zip(job_modules, listing_dates):
             jobObj = Job()
 
             # get url of current job module
@@ -87,6 +189,9 @@ class MyJobMuJobScraper:
             # ignore already scraped jobs
             if jobObj.url in self.scraped_urls:
                 continue
+            if (self.watermark is not None and
+                    self.watermark.is_older(listing_date)):
+                continue
 
             # else new job found
             jobs_added_count += 1
@@ -105,24 +210,19 @@ class MyJobMuJobScraper:
                     By.CSS_SELECTOR,
                     'a[itemprop="hiringOrganization"]')
             except NoSuchElementException:
-                print(f'\nCould not find hiring organization '
-                      f'for {jobObj.url} on page {pageNumber}')
+                logger.warning(f'Could not find hiring organization '
+                               f'for {jobObj.url} on page {pageNumber}')
                 jobObj.company = "Unknown"
             else:
                 jobObj.company = element.text.strip()
 
             # extract date posted and closing date
-            date_posted = job_module.find_element(
-                By.CSS_SELECTOR,
-                'li.updated-time').text.replace('Added ', '')
-
             closing_date = job_module.find_element(
                 By.CSS_SELECTOR,
                 'li.closed-time').text.replace('Closing ', '')
 
             # convert string dates to correct datetime data type
-            jobObj.date_posted = datetime.strptime(
-                date_posted, '%d/%m/%Y')
+            jobObj.date_posted = listing_date
             jobObj.closing_date = datetime.strptime(
                 closing_date, '%d/%m/%Y')
 
@@ -145,6 +245,22 @@ class MyJobMuJobScraper:
 
         return jobs_added_count
 
+    @staticmethod
+    def get_listing_date(job_module) -> datetime:
+        """
+        Returns the date a job module on a results page was posted.
+
+        Args:
+            job_module (WebElement): Job module on results page
+
+        Returns:
+            datetime: Date posted
+        """
+        date_posted = job_module.find_element(
+            By.CSS_SELECTOR,
+            'li.updated-time').text.replace('Added ', '')
+        return datetime.strptime(date_posted, '%d/%m/%Y')
+
     def wait(self) -> None:
         """
         Wait for page to stop loading.
@@ -171,52 +287,128 @@ class MyJobMuJobScraper:
         last_page = int(pageButtons[-2].text)
         return last_page
 
+    def get_job_details(self, jobObj: Job) -> None:
+        """
+        Visits the page of a job to extract its description and
+        employment type.
+
+        Args:
+            jobObj (Job): Job found on a results page
+        """
+        # go to specific job module page
+        with metrics.time('detail_fetch'):
+            self.driver.get(jobObj.url)
+            self.wait()  # wait for page to load
+        self.archive_response('job', jobObj.url,
+                              self.driver.page_source.encode())
+
+        # Extract job description from Show More option
+        element = self.driver.find_element(By.CSS_SELECTOR,
+                                           'div.job-details')
+        jobObj.job_details = element.text.strip()
+
+        # extract employment type
+        element = self.driver.find_element(
+            By.CSS_SELECTOR, 'li.employment-type')
+        jobObj.employment_type = element.text.strip()
+
+    @classmethod
+    def jobs_from_archive(cls, archive: Archive, since: datetime | None = None,
+                          until: datetime | None = None) -> list[Job]:
+        """
+        Parses again the results pages and job pages saved in `archive`,
+        without opening a browser. When a page was fetched several times,
+        its most recent version is used.
+
+        Args:
+            archive (Archive): Archive of raw responses
+            since (datetime, optional): Only parse pages fetched at or after
+            this time
+            until (datetime, optional): Only parse pages fetched before this
+            time
+
+        Returns:
+            list[Job]: Jobs listed on the results pages, newest first. The
+            description of jobs whose page was not archived is empty.
+        """
+        jobs: dict[str, Job] = {}
+        for record, content in archive.records(cls.site, 'search', since, until):
+            for jobObj in parse_results_page(content.decode()):
+                jobs[jobObj.url] = jobObj
+
+        for record, content in archive.records(cls.site, 'job', since, until):
+            if record['key'] in jobs:
+                parse_job_page(content.decode(), jobs[record['key']])
+
+        return sorted(jobs.values(), key=lambda job: job.date_posted or datetime.min,
+                      reverse=True)
+
     def scrape(self) -> list[dict]:
         """
-        Start scraping from first page.
+        Start scraping from first page, or from the page after the spool
+        checkpoint if a previous run was interrupted.
 
 
         Raises:
             Exception: Unable to find number of pages
 
         Returns:
-            list[dict]: New jobs found.
+            list[dict]: New jobs found during this run. Jobs spooled by an
+            interrupted run are not included.
         """
+        first_page = 1
+        if self.spool is not None:
+            checkpoint = self.spool.get_checkpoint(self.site)
+            if checkpoint is not None:
+                if checkpoint['finished']:
+                    # previous run only has to be uploaded
+                    self.driver.quit()
+                    return []
+                first_page = checkpoint['page'] + 1
+            self.scraped_urls.extend(self.spool.job_keys(self.site))
+
         last_page = self.get_page_count()
         if (last_page is None):
             raise Exception("Unable to obtain number of pages")
 
         # scrape each page
-        for pageNumber in tqdm(range(1, last_page+1)):
+        pageNumber = first_page
+        progress = Progress(f"{self.site} pages", last_page - first_page + 1)
+        for pageNumber in range(first_page, last_page+1):
+            progress.update()
             # extract job data
+            jobs_on_previous_pages = len(self.new_jobs)
             jobs_added_count = self.get_jobs_on_page(pageNumber)
 
+            # fetch extra information about each new job of this page
+            # TODO: Fetch this information asynchronously
+            # ! This information cannot be fetched directly inside the loop from
+            # ! get_jobs_on_page function. Navigating between pages causes stale
+            # ! element reference. Details are fetched once every job module
+            # ! of the page has been read.
+            # ! https://stackoverflow.com/q/45002008/17627866
+            for jobObj in self.new_jobs[jobs_on_previous_pages:]:
+                self.get_job_details(jobObj)
+                if self.spool is not None:
+                    self.spool.add_job(self.site, jobObj.__dict__)
+
+            if self.spool is not None:
+                self.spool.save_checkpoint(self.site, pageNumber)
+
             # since jobs are sorted by recent, as soon as
             # we encounter a page which has already been visited we can stop
             # scraping. (all pages after current page are also already visited)
-            if (jobs_added_count == 0 or jobs_added_count == self.limit):
+            if (jobs_added_count == self.limit or self.reached_watermark):
                 break
+            # without a watermark, or when the dates of the page are
+            # unknown, a page is considered visited when none of its jobs
+            # is new
+            if not self.page_dated and jobs_added_count == 0:
+                break
+        progress.close()
 
-        # fetch extra information about each job
-        # TODO: Fetch this information asynchronously
-        # ! This information cannot be fetched directly inside the loop from
-        # ! get_jobs_on_page function. Navigating between pages causes stale
-        # ! element reference.
-        # ! https://stackoverflow.com/q/45002008/17627866
-        for jobObj in tqdm(self.new_jobs):
-            # go to specific job module page
-            self.driver.get(jobObj.url)
-            self.wait()  # wait for page to load
-
-            # Extract job description from Show More option
-            element = self.driver.find_element(By.CSS_SELECTOR,
-                                               'div.job-details')
-            jobObj.job_details = element.text.strip()
-
-            # extract employment type
-            element = self.driver.find_element(
-                By.CSS_SELECTOR, 'li.employment-type')
-            jobObj.employment_type = element.text.strip()
+        if self.spool is not None:
+            self.spool.save_checkpoint(self.site, pageNumber, finished=True)
 
         self.driver.quit()
 
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from src.analyser.cooccurrence import top_pairs
+from src.logger import setup_logger
+
+logger = setup_logger()
+
+# version of the layout of the bundle, changed when clients must be updated
+BUNDLE_SCHEMA = 1
+
+# id of the bundle in the `statistics` collection of the frontend database
+BUNDLE_DOC_ID = 'bundle'
+
+# default location of the gzip JSON artifact, relative to the working
+# directory
+DEFAULT_BUNDLE_PATH = os.path.join('stats', 'bundle.json.gz')
+
+# entries kept per category, the others being summed in `other`
+DEFAULT_TOP_N = 25
+
+# statistics documents counting occurrences, shown as ranked categories
+BUNDLE_CATEGORIES = ('cloud_data', 'db_data', 'lang_data', 'lib_data',
+                     'loc_data', 'os_data', 'salary_data', 'tools_data',
+                     'web_data', 'job_title_data')
+
+
+def top_n(counts: dict[str, int], n: int = DEFAULT_TOP_N) -> dict:
+    """
+    Ranks the entries of a category.
+
+    Args:
+        counts (dict[str, int]): Occurrences of each entry
+        n (int): Entries kept
+
+    Returns:
+        dict: `labels` and `counts` of the `n` most frequent entries, most
+        frequent first, `other` (sum of the remaining entries) and `total`.
+        Entries which never occur are left out.
+    """
+    # ? ties are ordered by name so that the same counts always give the
+    # ? same bundle, and the same hash
+    ranked = sorted(((label, count) for label, count in counts.items() if count),
+                    key=lambda entry: (-entry[1], entry[0]))
+    kept = ranked[:n]
+    return {'labels': [label for label, _ in kept],
+            'counts': [count for _, count in kept],
+            'other': sum(count for _, count in ranked[n:]),
+            'total': sum(count for _, count in ranked)}
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    Converts the values of Firestore documents, such as timestamps, to
+    JSON values.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    return value
+
+
+def content_hash(content: dict) -> str:
+    text = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def build_bundle(stats_docs: dict[str, dict], n: int = DEFAULT_TOP_N,
+                 previous: Optional[dict] = None) -> dict:
+    """
+    Builds the bundle of everything the dashboard shows from the documents
+    of the `statistics` collection.
+
+    Args:
+        stats_docs (dict[str, dict]): Documents by id
+        n (int): Entries kept per category
+        previous (dict, optional): Bundle published before. Its version is
+        kept if nothing changed, and incremented otherwise.
+
+    Returns:
+        dict: Bundle, with the `version` and `hash` of its content
+    """
+    content = {
+        'schema': BUNDLE_SCHEMA,
+        'top_n': n,
+        'metadata': to_json_value(stats_docs.get('metadata') or {}),
+        'job_trend_by_month': dict(sorted(
+            (stats_docs.get('job_trend_by_month') or {}).items())),
+        'categories': {name: top_n(stats_docs.get(name) or {}, n)
+                       for name in BUNDLE_CATEGORIES},
+        # ? Firestore arrays cannot hold arrays, so each pair is a map
+        'cooccurrence': [{'pair': [first, second], 'count': count}
+                         for first, second, count
+                         in top_pairs(stats_docs.get('cooccurrence_data') or {}, n)],
+        # ? the choropleth maps show every region, so regions are not truncated
+        'regions': dict(sorted((region, count) for region, count
+                               in (stats_docs.get('loc_region_data') or {}).items() if count)),
+    }
+    digest = content_hash(content)
+
+    version = 1
+    if previous:
+        version = previous.get('version', 0)
+        if previous.get('hash') != digest:
+            version += 1
+    return {'version': version, 'hash': digest, **content}
+
+
+def encode_bundle(bundle: dict) -> bytes:
+    """
+    Returns the bundle as gzip compressed JSON. The same bundle always gives
+    the same bytes.
+    """
+    text = json.dumps(bundle, ensure_ascii=False, separators=(',', ':'))
+    return gzip.compress(text.encode('utf-8'), mtime=0)
+
+
+def decode_bundle(data: bytes) -> dict:
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+def write_bundle(bundle: dict, path: str = DEFAULT_BUNDLE_PATH) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(encode_bundle(bundle))
+    os.replace(temporary_path, path)
+
+
+def publish_bundle(frontend_db, stats_docs: dict[str, dict],
+                   path: Optional[str] = None, n: int = DEFAULT_TOP_N) -> dict:
+    """
+    Publishes the bundle of `stats_docs` as the `bundle` document of the
+    frontend database, which the dashboard reads instead of each statistics
+    document, and as a gzip JSON file at `path` if given.
+
+    Nothing is written when the bundle did not change since the previous
+    one.
+
+    Returns:
+        dict: Published bundle
+    """
+    previous = frontend_db.get_doc(frontend_db.bundle_ref)
+    bundle = build_bundle(stats_docs, n, previous)
+    changed = not previous or previous.get('hash') != bundle['hash']
+
+    if changed:
+        frontend_db.add_doc(frontend_db.stats_collection_ref, BUNDLE_DOC_ID, bundle)
+        logger.info(f"Published statistics bundle version {bundle['version']} "
+                    f"({bundle['hash']})")
+    if path and (changed or not os.path.exists(path)):
+        write_bundle(bundle, path)
+    return bundle
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+
+from src.logger import setup_logger
+from src.utils.dictionary import filter_dict
+
+# ? the analyser, and Firestore, are imported by the functions using them,
+# ? so that `src.main` can import the defaults below cheaply
+logger = setup_logger()
+
+# status of an event: its increments are being added to the statistics,
+# were added, or were subtracted again
+PENDING = 'pending'
+APPLIED = 'applied'
+REVERTED = 'reverted'
+
+# most recent events kept by `compact_events`
+DEFAULT_EVENTS_RETAIN = 60
+
+# increments larger than this are split into chunk documents: Firestore
+# documents hold at most 1 MiB, and the sketches of a large run exceed it
+EVENT_CHUNK_BYTES = 512 * 1024
+
+# recorded in `kept` when a revert leaves the distinct counts of the
+# sketches unchanged
+KEPT_DISTINCT = 'sketches.distinct'
+
+
+class StatsEventError(Exception):
+    """
+    An event cannot be reverted or replayed in its current status.
+    """
+
+
+def encode_increments(increments: dict[str, dict]) -> str:
+    """
+    Serializes increments returned by `analyse_jobs` to JSON, without the
+    attributes which did not occur. Text keeps the event small and
+    unindexed, whatever the keys of the statistics.
+    """
+    from src.analyser.runner import COOCCURRENCE, CUBE, SALARIES, SKETCHES
+
+    stored = {}
+    for name, increment in increments.items():
+        if name not in (CUBE, COOCCURRENCE, SKETCHES, SALARIES):
+            increment = filter_dict(increment)
+        if increment:
+            stored[name] = increment
+    return json.dumps(stored, ensure_ascii=False, sort_keys=True)
+
+
+def decode_increments(text: str) -> dict[str, dict]:
+    return json.loads(text)
+
+
+def split_payload(text: str) -> list[bytes]:
+    """
+    Splits encoded increments into chunks of at most `EVENT_CHUNK_BYTES`.
+    """
+    data = text.encode('utf-8')
+    return [data[start:start + EVENT_CHUNK_BYTES]
+            for start in range(0, len(data), EVENT_CHUNK_BYTES)]
+
+
+def event_increments(main_db, event: dict) -> dict[str, dict]:
+    """
+    Returns the increments of an event, read from its chunks if it has
+    any.
+    """
+    if event.get('chunks'):
+        chunks = main_db.get_stats_event_chunks(event['run_id'], event['chunks'])
+        return decode_increments(b''.join(chunks).decode('utf-8'))
+    return decode_increments(event['increments'])
+
+
+def apply_run(main_db, run_id: str, increments: dict[str, dict]) -> None:
+    """
+    Records the increments of a run as an immutable event, then adds them
+    to the statistics documents, which are the materialised view of the
+    events.
+
+    The event is `pending` until every document is updated, so that a run
+    which failed half way is never reverted as a whole. Increments larger
+    than `EVENT_CHUNK_BYTES` are saved in chunks. The event is saved before
+    any statistics document changes, so that a run whose event cannot be
+    saved changes nothing.
+
+    Args:
+        main_db (Database): Main database
+        run_id (str): Id of the run (see `metrics.run_id`). One event per run.
+        increments (dict[str, dict]): Increments returned by `analyse_jobs`
+    """
+    from src.analyser.runner import save_analytics
+
+    text = encode_increments(increments)
+    event = {'run_id': run_id, 'status': PENDING,
+             'created_at': datetime.now(timezone.utc),
+             'documents': sorted(increments)}
+    chunks: list[bytes] = []
+    if len(text.encode('utf-8')) > EVENT_CHUNK_BYTES:
+        chunks = split_payload(text)
+        event['chunks'] = len(chunks)
+    else:
+        event['increments'] = text
+    main_db.add_stats_event(run_id, event, chunks)
+    save_analytics(main_db, increments)
+    main_db.set_stats_event_status(run_id, APPLIED)
+
+
+def get_event(main_db, run_id: str, status: str) -> dict:
+    event = main_db.get_stats_event(run_id)
+    if event is None:
+        raise StatsEventError(f"No statistics event for run {run_id}")
+    if event['status'] != status:
+        raise StatsEventError(f"Run {run_id} is {event['status']}, not {status}")
+    return event
+
+
+def revert_run(main_db, run_id: str, keep_salaries: bool = False) -> dict:
+    """
+    Subtracts the increments of a run from the statistics documents, for
+    example after jobs were analysed twice. Only the documents the run
+    changed are read and written.
+
+    ! Salary quantiles cannot be subtracted. A run which added salaries is
+    ! only reverted with `keep_salaries`: its salaries stay in the
+    ! quantiles, which is recorded in the event as `kept`, and replaying
+    ! the run does not add them again. Rebase statistics to remove them.
+    ! Likewise the distinct counts of the sketches cannot forget values:
+    ! only their frequencies are subtracted, and `sketches.distinct` is
+    ! recorded in `kept` whenever the run added sketches.
+
+    Args:
+        keep_salaries (bool): Revert the other increments of a run which
+        added salaries
+
+    Returns:
+        dict: The event, now `reverted`
+
+    Raises:
+        StatsEventError: The run has no event, it is not `applied`, or it
+        added salaries and `keep_salaries` is False
+    """
+    from src.analyser.runner import (SALARIES, SKETCHES, negate_increments,
+                                     save_analytics)
+
+    event = get_event(main_db, run_id, APPLIED)
+    increments = event_increments(main_db, event)
+    kept = []
+    if SALARIES in increments:
+        if not keep_salaries:
+            raise StatsEventError(f"Run {run_id} added salary quantiles, which cannot "
+                                  "be subtracted. Revert with keep_salaries to keep them.")
+        del increments[SALARIES]
+        kept.append(SALARIES)
+    if SKETCHES in increments:
+        kept.append(KEPT_DISTINCT)
+    save_analytics(main_db, negate_increments(increments))
+    main_db.set_stats_event_status(run_id, REVERTED, {'kept': kept})
+    logger.info(f"Reverted statistics of run {run_id}")
+    return {**event, 'status': REVERTED, 'kept': kept}
+
+
+def replay_run(main_db, run_id: str) -> dict:
+    """
+    Adds the increments of a reverted run to the statistics documents
+    again, except those `kept` when it was reverted (see `revert_run`).
+
+    Returns:
+        dict: The event, now `applied`
+
+    Raises:
+        StatsEventError: The run has no event, or it is not `reverted`
+    """
+    from src.analyser.runner import save_analytics
+
+    event = get_event(main_db, run_id, REVERTED)
+    increments = event_increments(main_db, event)
+    save_analytics(main_db, {name: increment for name, increment in increments.items()
+                             if name not in event.get('kept', [])})
+    main_db.set_stats_event_status(run_id, APPLIED, {'kept': []})
+    logger.info(f"Replayed statistics of run {run_id}")
+    return {**event, 'status': APPLIED, 'kept': []}
+
+
+def compact_events(main_db, retain: int = DEFAULT_EVENTS_RETAIN) -> dict:
+    """
+    Deletes the events older than the `retain` most recent ones. Their
+    increments stay in the statistics documents, but their runs can no
+    longer be reverted. Pending events are kept, since the statistics of
+    their run may be incomplete.
+
+    Returns:
+        dict: `kept` and `deleted` events, and the runs left `pending`
+    """
+    events = main_db.get_stats_events(['run_id', 'status', 'created_at', 'chunks'])
+    old = events[:max(0, len(events) - retain)]
+    pending = [event['run_id'] for event in old if event['status'] == PENDING]
+    deleted = [event['run_id'] for event in old if event['status'] != PENDING]
+    main_db.delete_stats_events(deleted, chunk_counts(events))
+    if pending:
+        logger.warning(f"Statistics of runs {', '.join(pending)} may be incomplete. "
+                       "Revert their increments by hand or rebase statistics.")
+    logger.info(f"Compacted statistics events: {len(deleted)} deleted")
+    return {'kept': len(events) - len(deleted), 'deleted': len(deleted),
+            'pending': pending}
+
+
+def clear_events(main_db) -> int:
+    """
+    Deletes every event, once statistics were rebased from the jobs: the
+    increments of earlier runs can no longer be subtracted from them.
+
+    Returns:
+        int: Events deleted
+    """
+    events = main_db.get_stats_events(['run_id', 'chunks'])
+    main_db.delete_stats_events([event['run_id'] for event in events], chunk_counts(events))
+    return len(events)
+
+
+def chunk_counts(events: list[dict]) -> dict[str, int]:
+    return {event['run_id']: event['chunks'] for event in events if event.get('chunks')}
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import copy
+from datetime import datetime, timezone
+from numbers import Number
+from typing import Any, Optional
+
+from src.logger import setup_logger
+from src.metrics import counted
+from src.stats_bundle import content_hash, to_json_value
+
+# ? Firestore is imported by the functions using it, so that `src.main`
+# ? can import the defaults below cheaply
+logger = setup_logger()
+
+# deltas stored after a full snapshot before the next full snapshot, which
+# bounds the documents read to rebuild a version
+DEFAULT_MAX_CHAIN = 10
+
+# versions kept by `compact_snapshots`
+DEFAULT_RETAIN = 90
+
+FULL = 'full'
+DELTA = 'delta'
+
+# Firestore documents hold at most 1 MiB, and 40,000 index entries (two
+# per value). Full snapshots larger than a chunk are split into chunk
+# documents, and deltas larger than a chunk are published in full.
+SNAPSHOT_CHUNK_BYTES = 512 * 1024
+SNAPSHOT_CHUNK_VALUES = 10000
+
+# a batch of writes is sent as one request of at most 10 MiB
+MAX_SNAPSHOT_BYTES = 8 * 1024 * 1024
+
+
+class SnapshotConflictError(Exception):
+    """
+    Another process published the same version first.
+    """
+
+
+class SnapshotTooLargeError(Exception):
+    """
+    Statistics cannot be stored in snapshot documents: a single value
+    exceeds a chunk, or the snapshot exceeds a batch of writes.
+    """
+
+
+def snapshot_id(version: int) -> str:
+    # ? zero padded so that document ids sort like versions
+    return f'v{version:08d}'
+
+
+def encoded_size(value: Any) -> int:
+    """
+    Returns the storage size of a Firestore value in bytes
+    (https://cloud.google.com/firestore/docs/storage-size).
+    """
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(encoded_size(key) + encoded_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(encoded_size(item) for item in value)
+    if value is None or isinstance(value, bool):
+        return 1
+    # numbers and timestamps
+    return 8
+
+
+def count_values(value: Any) -> int:
+    """
+    Returns the number of values indexed by Firestore in `value`: each map,
+    array and item.
+    """
+    if isinstance(value, dict):
+        return 1 + sum(count_values(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return 1 + sum(count_values(item) for item in value)
+    return 1
+
+
+def chunk_id(version: int, index: int) -> str:
+    return f'{snapshot_id(version)}_{index:04d}'
+
+
+def split_stats(stats: dict[str, dict]) -> list[dict[str, dict]]:
+    """
+    Splits statistics documents into chunks of at most
+    `SNAPSHOT_CHUNK_BYTES` and `SNAPSHOT_CHUNK_VALUES`, key by key.
+
+    Raises:
+        SnapshotTooLargeError: A single key exceeds a chunk
+    """
+    chunks: list[dict[str, dict]] = [{}]
+    size = values = 0
+    for doc_id, data in stats.items():
+        chunks[-1].setdefault(doc_id, {})
+        for key, value in data.items():
+            entry_size = encoded_size(doc_id) + encoded_size(key) + encoded_size(value)
+            entry_values = 1 + count_values(value)
+            if entry_size > SNAPSHOT_CHUNK_BYTES or entry_values > SNAPSHOT_CHUNK_VALUES:
+                raise SnapshotTooLargeError(f"{doc_id}.{key} is too large for a "
+                                            f"snapshot ({entry_size} bytes)")
+            if (size + entry_size > SNAPSHOT_CHUNK_BYTES
+                    or values + entry_values > SNAPSHOT_CHUNK_VALUES):
+                chunks.append({})
+                size = values = 0
+            chunks[-1].setdefault(doc_id, {})[key] = value
+            size += entry_size
+            values += entry_values
+    return chunks
+
+
+def snapshot_documents(db, snapshot: dict) -> list[tuple[Any, dict]]:
+    """
+    Returns the documents storing a snapshot, and their references. A full
+    snapshot too large for one document is stored without its `stats`,
+    which are split into `chunks` documents (see `split_stats`).
+
+    Raises:
+        SnapshotTooLargeError: The snapshot cannot be stored
+    """
+    reference = db.snapshots_collection_ref.document(snapshot_id(snapshot['version']))
+    size = encoded_size(snapshot)
+    if snapshot['kind'] != FULL or (size <= SNAPSHOT_CHUNK_BYTES
+                                    and count_values(snapshot) <= SNAPSHOT_CHUNK_VALUES):
+        return [(reference, snapshot)]
+    if size > MAX_SNAPSHOT_BYTES:
+        raise SnapshotTooLargeError(f"Statistics version {snapshot['version']} is too "
+                                    f"large for a snapshot ({size} bytes)")
+
+    chunks = split_stats(snapshot['stats'])
+    header = {key: value for key, value in snapshot.items() if key != 'stats'}
+    documents = [(reference, {**header, 'chunks': len(chunks)})]
+    for index, chunk in enumerate(chunks):
+        documents.append((db.snapshot_chunks_collection_ref.document(
+            chunk_id(snapshot['version'], index)),
+            {'snapshot': snapshot['version'], 'index': index, 'stats': chunk}))
+    return documents
+
+
+def read_chunks(db, snapshot: dict) -> dict:
+    """
+    Returns a snapshot with its `stats`, read from its chunks if it has
+    any.
+    """
+    if not snapshot.get('chunks'):
+        return snapshot
+    stats: dict[str, dict] = {}
+    for index in range(snapshot['chunks']):
+        chunk = db.snapshot_chunks_collection_ref.document(
+            chunk_id(snapshot['version'], index)).get().to_dict()
+        for doc_id, data in chunk['stats'].items():
+            stats.setdefault(doc_id, {}).update(data)
+    return {**snapshot, 'stats': stats}
+
+
+def is_count(value: Any) -> bool:
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def diff_stats(old: dict[str, dict], new: dict[str, dict]) -> dict:
+    """
+    Returns the delta turning the statistics documents `old` into `new`.
+
+    Returns:
+        dict: `add` (differences of counts), `set` (other values, and
+        documents which are new), `remove` (keys removed from documents)
+        and `drop` (documents removed), each by document id
+    """
+    delta: dict = {'add': {}, 'set': {}, 'remove': {}, 'drop': []}
+    for doc_id, data in new.items():
+        before = old.get(doc_id)
+        if before is None:
+            delta['set'][doc_id] = {}
+            before = {}
+        for key, value in data.items():
+            if key in before and before[key] == value:
+                continue
+            if is_count(value) and is_count(before.get(key, 0)):
+                delta['add'].setdefault(doc_id, {})[key] = value - before.get(key, 0)
+            else:
+                delta['set'].setdefault(doc_id, {})[key] = value
+        removed = sorted(key for key in before if key not in data)
+        if removed:
+            delta['remove'][doc_id] = removed
+    delta['drop'] = sorted(doc_id for doc_id in old if doc_id not in new)
+    return delta
+
+
+def apply_delta(stats: dict[str, dict], delta: dict) -> dict[str, dict]:
+    """
+    Returns the statistics documents `stats` changed by a delta returned by
+    `diff_stats`. `stats` is not modified.
+    """
+    stats = copy.deepcopy(stats)
+    for doc_id in delta.get('drop', []):
+        stats.pop(doc_id, None)
+    for doc_id, values in delta.get('set', {}).items():
+        stats.setdefault(doc_id, {}).update(values)
+    for doc_id, values in delta.get('add', {}).items():
+        data = stats.setdefault(doc_id, {})
+        for key, amount in values.items():
+            data[key] = data.get(key, 0) + amount
+    for doc_id, keys in delta.get('remove', {}).items():
+        for key in keys:
+            stats.get(doc_id, {}).pop(key, None)
+    return stats
+
+
+def stats_hash(stats: dict[str, dict]) -> str:
+    return content_hash(to_json_value(stats))
+
+
+def apply_snapshot(stats: dict[str, dict], snapshot: dict) -> dict[str, dict]:
+    """
+    Returns the statistics of the version of `snapshot`, given those of the
+    previous version.
+    """
+    if snapshot['kind'] == FULL:
+        return copy.deepcopy(snapshot['stats'])
+    return apply_delta(stats, snapshot['delta'])
+
+
+def replay(snapshots: list[dict]) -> dict[str, dict]:
+    """
+    Rebuilds the statistics of the last of `snapshots`, given in version
+    order from a full snapshot.
+    """
+    stats: dict[str, dict] = {}
+    for snapshot in snapshots:
+        stats = apply_snapshot(stats, snapshot)
+    return stats
+
+
+@counted
+def get_current_pointer(db) -> Optional[dict]:
+    """
+    Returns the `current` pointer of the snapshots of `db`: the published
+    `version`, its `hash`, and `full`, the version of the full snapshot its
+    deltas start from. None if nothing was published.
+    """
+    pointer = db.current_snapshot_ref.get()
+    return pointer.to_dict() if pointer.exists else None
+
+
+@counted
+def get_snapshots(db, first: int = 0, last: Optional[int] = None) -> list[dict]:
+    """
+    Returns the stored snapshots of versions `first` to `last` (inclusive),
+    in version order.
+    """
+    from google.cloud.firestore_v1 import FieldFilter
+
+    query = db.snapshots_collection_ref.where(filter=FieldFilter('version', '>=', first))
+    if last is not None:
+        query = query.where(filter=FieldFilter('version', '<=', last))
+    return [read_chunks(db, snapshot.to_dict())
+            for snapshot in query.order_by('version').stream()]
+
+
+def load_snapshot(db, pointer: Optional[dict] = None) -> tuple[dict[str, dict], int]:
+    """
+    Reads the published statistics of `db`. Only the pointer, then
+    immutable snapshots, are read, so that a publication happening at the
+    same time is either fully seen or not at all.
+
+    Returns:
+        tuple[dict[str, dict], int]: Statistics documents by id, and their
+        version (0 if nothing was published)
+    """
+    pointer = pointer or get_current_pointer(db)
+    if pointer is None:
+        return {}, 0
+    return replay(get_snapshots(db, pointer['full'], pointer['version'])), pointer['version']
+
+
+@counted
+def publish_snapshot(db, stats: dict[str, dict],
+                     max_chain: int = DEFAULT_MAX_CHAIN) -> int:
+    """
+    Publishes `stats` as a new immutable version, stored as a delta from
+    the current version, or in full every `max_chain` versions. The
+    snapshot and the `current` pointer are written in one batch, which
+    fails if another process published the same version first. Large
+    snapshots are split into chunks (see `snapshot_documents`).
+
+    Args:
+        db (Database): Database receiving the snapshots (frontend)
+        stats (dict[str, dict]): Statistics documents by id
+        max_chain (int): Deltas between full snapshots
+
+    Returns:
+        int: Version published, or the current version if `stats` did not
+        change
+
+    Raises:
+        SnapshotConflictError: Another process published the same version
+        SnapshotTooLargeError: The statistics cannot be stored. Nothing is
+        written.
+    """
+    from google.api_core.exceptions import AlreadyExists
+
+    pointer = get_current_pointer(db)
+    digest = stats_hash(stats)
+    if pointer is not None and pointer['hash'] == digest:
+        return pointer['version']
+
+    version = 1 if pointer is None else pointer['version'] + 1
+    snapshot = {'version': version, 'hash': digest,
+                'created_at': datetime.now(timezone.utc)}
+    if pointer is None or version - pointer['full'] > max_chain:
+        snapshot.update(kind=FULL, base=None, stats=stats)
+        full = version
+    else:
+        previous, _ = load_snapshot(db, pointer)
+        snapshot.update(kind=DELTA, base=pointer['version'],
+                        delta=diff_stats(previous, stats))
+        full = pointer['full']
+        if (encoded_size(snapshot) > SNAPSHOT_CHUNK_BYTES
+                or count_values(snapshot) > SNAPSHOT_CHUNK_VALUES):
+            # ? a large delta is not smaller to read than the statistics
+            snapshot = {**{key: value for key, value in snapshot.items() if key != 'delta'},
+                        'kind': FULL, 'base': None, 'stats': stats}
+            full = version
+
+    # ? sizes are checked before anything is written
+    documents = snapshot_documents(db, snapshot)
+    batch = db.db.batch()
+    # ? the snapshot is created first: if it exists, nothing is written
+    for reference, data in documents:
+        batch.create(reference, data)
+    batch.set(db.current_snapshot_ref,
+              {'version': version, 'hash': digest, 'full': full,
+               'updated_at': snapshot['created_at']})
+    try:
+        batch.commit()
+    except AlreadyExists as error:
+        raise SnapshotConflictError(f"Statistics version {version} was "
+                                    "published by another process") from error
+    logger.info(f"Published statistics version {version} ({snapshot['kind']})")
+    return version
+
+
+@counted
+def compact_snapshots(db, retain: int = DEFAULT_RETAIN) -> dict:
+    """
+    Rebases the snapshots of `db`: the current version is stored in full,
+    so that reading it costs two reads, and versions older than the
+    `retain` most recent ones are deleted, the oldest version kept being
+    stored in full.
+
+    ! Do not run at the same time as a command publishing statistics.
+
+    Returns:
+        dict: `version` current version, `kept` and `deleted` versions
+    """
+    pointer = get_current_pointer(db)
+    if pointer is None:
+        return {'version': 0, 'kept': 0, 'deleted': 0}
+    current = pointer['version']
+    oldest_kept = max(1, current - retain + 1)
+
+    snapshots = get_snapshots(db, 0, current)
+    rewritten: dict[int, dict] = {}
+    stats: dict[str, dict] = {}
+    for snapshot in snapshots:
+        stats = apply_snapshot(stats, snapshot)
+        if snapshot['version'] in (oldest_kept, current) and snapshot['kind'] == DELTA:
+            rewritten[snapshot['version']] = {
+                **{key: value for key, value in snapshot.items() if key != 'delta'},
+                'kind': FULL, 'base': None, 'stats': stats}
+
+    # ? rewritten snapshots hold the same statistics in full, so readers
+    # ? replaying from the previous full snapshot get the same result
+    batch = db.db.batch()
+    for snapshot in rewritten.values():
+        for reference, data in snapshot_documents(db, snapshot):
+            batch.set(reference, data)
+    batch.set(db.current_snapshot_ref, {**pointer, 'full': current})
+    batch.commit()
+
+    deleted = writes = 0
+    batch = db.db.batch()
+    for snapshot in snapshots:
+        if snapshot['version'] < oldest_kept:
+            references = [db.snapshot_chunks_collection_ref.document(
+                chunk_id(snapshot['version'], index))
+                for index in range(snapshot.get('chunks', 0))]
+            references.append(db.snapshots_collection_ref.document(
+                snapshot_id(snapshot['version'])))
+            for reference in references:
+                batch.delete(reference)
+                writes += 1
+                if writes % 500 == 0:
+                    batch.commit()
+                    batch = db.db.batch()
+            deleted += 1
+    batch.commit()
+
+    logger.info(f"Compacted statistics snapshots: version {current}, "
+                f"{deleted} old versions deleted")
+    return {'version': current, 'kept': len(snapshots) - deleted, 'deleted': deleted}
+
+
+def stats_history(db, doc_id: str, key: str) -> list[tuple[int, datetime, Any]]:
+    """
+    Returns the value of `key` in statistics document `doc_id` at each
+    stored version, for example the number of jobs mentioning a language
+    over time.
+
+    Returns:
+        list[tuple[int, datetime, Any]]: Version, publication time and
+        value (None when missing)
+    """
+    history = []
+    stats: dict[str, dict] = {}
+    for snapshot in get_snapshots(db):
+        stats = apply_snapshot(stats, snapshot)
+        history.append((snapshot['version'], snapshot['created_at'],
+                        stats.get(doc_id, {}).get(key)))
+    return history
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from html.parser import HTMLParser
+from typing import Optional, Union
+
+# elements which never have children or an end tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'source', 'track', 'wbr'}
+
+# elements whose text is separated from the text around them
+BLOCK_ELEMENTS = {'address', 'article', 'br', 'dd', 'div', 'dl', 'dt', 'footer',
+                  'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li',
+                  'ol', 'p', 'section', 'table', 'td', 'th', 'tr', 'ul'}
+
+
+class Element:
+    """
+    Minimal HTML element, used to parse archived pages without a browser.
+    """
+
+    def __init__(self, tag: str, attrs: dict[str, str],
+                 parent: Optional[Element] = None) -> None:
+        self.tag: str = tag
+        self.attrs: dict[str, str] = attrs
+        self.parent: Optional[Element] = parent
+        self.children: list[Union[Element, str]] = []
+
+    def classes(self) -> list[str]:
+        return self.attrs.get('class', '').split()
+
+    def text(self) -> str:
+        """
+        Returns the text of element and its descendants, with whitespace
+        collapsed.
+        """
+        parts: list[str] = []
+        stack: list[Union[Element, str]] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+                continue
+            if node.tag in BLOCK_ELEMENTS:
+                parts.append(' ')
+                stack.append(' ')
+            stack.extend(reversed(node.children))
+        return ' '.join(''.join(parts).split())
+
+    def matches(self, tag: Optional[str], classes: tuple[str, ...],
+                attrs: dict[str, str]) -> bool:
+        if tag is not None and self.tag != tag:
+            return False
+        if any(cls not in self.classes() for cls in classes):
+            return False
+        return all(self.attrs.get(name) == value for name, value in attrs.items())
+
+    def find_all(self, tag: Optional[str] = None, classes: tuple[str, ...] = (),
+                 **attrs: str) -> list[Element]:
+        """
+        Returns the descendants with the given tag, classes and attributes,
+        in document order. For example, `div.module.job-result` is
+        `find_all('div', ('module', 'job-result'))`.
+        """
+        found = []
+        stack = [child for child in reversed(self.children)
+                 if isinstance(child, Element)]
+        while stack:
+            node = stack.pop()
+            if node.matches(tag, classes, attrs):
+                found.append(node)
+            stack.extend(child for child in reversed(node.children)
+                         if isinstance(child, Element))
+        return found
+
+    def find(self, tag: Optional[str] = None, classes: tuple[str, ...] = (),
+             **attrs: str) -> Optional[Element]:
+        """
+        Returns the first descendant matching `find_all`, or None.
+        """
+        found = self.find_all(tag, classes, **attrs)
+        return found[0] if found else None
+
+
+class TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Element('document', {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value or '' for name, value in attrs},
+                          self.current)
+        self.current.children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(
+            Element(tag, {name: value or '' for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # * unclosed elements are closed by the end tag of their parent
+        node: Optional[Element] = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        if self.current.tag not in ('script', 'style'):
+            self.current.children.append(data)
+
+
+def parse_html(html: str) -> Element:
+    """
+    Parses an HTML document.
+
+    Returns:
+        Element: Root of document
+    """
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
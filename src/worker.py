@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import socket
+import threading
+import uuid
+from typing import Optional
+
+from src.base_scrapper import BaseScraper, get_scraper_class
+from src.classes.archive import Archive
+from src.classes.spool import Spool, decode_job, encode_job, job_key
+from src.classes.work_queue import Task
+from src.logger import setup_logger
+
+logger = setup_logger()
+
+# kinds of task
+PARTITION = 'partition'
+DETAIL = 'detail'
+
+
+def new_worker_id() -> str:
+    return f'{socket.gethostname()}-{uuid.uuid4().hex[:8]}'
+
+
+def seed_partitions(queue, website: str, pages_per_partition: int = 10,
+                    scraper: Optional[BaseScraper] = None) -> int:
+    """
+    Adds a task for each partition of the results pages of `website`.
+    Partitions already in the queue are not added again.
+
+    Args:
+        queue (SQLiteWorkQueue | FirestoreWorkQueue): Shared work queue
+        website (str): Website name
+        pages_per_partition (int): Number of results pages in a partition
+        scraper (BaseScraper, optional): Scraper used to count pages
+
+    Returns:
+        int: number of tasks added
+    """
+    scraper = scraper or get_scraper_class(website)([])
+    added = 0
+    for department, first_page, last_page in scraper.get_partitions(pages_per_partition):
+        task_id = f'{PARTITION}:{website}:{department}:{first_page}'
+        payload = {'site': website, 'department': department,
+                   'first_page': first_page, 'last_page': last_page}
+        # first pages hold the newest jobs
+        added += queue.put(PARTITION, task_id, payload, priority=-first_page)
+    logger.info(f"{added} partitions of {website} added to queue")
+    return added
+
+
+class Heartbeat:
+    """
+    Renews the lease of a task in a background thread while the task is
+    being processed. `lost` is set once the lease is taken by another
+    worker.
+    """
+
+    def __init__(self, queue, task: Task) -> None:
+        self.queue = queue
+        self.task: Task = task
+        self.lost: bool = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self) -> Heartbeat:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        # renew three times per visibility timeout
+        while not self.stopped.wait(self.queue.visibility_timeout / 3):
+            if not self.queue.heartbeat(self.task):
+                logger.warning(f"Lease of task {self.task.task_id} was lost")
+                self.lost = True
+                return
+
+
+class Worker:
+    """
+    Pulls tasks from a shared work queue until it is empty. Any number of
+    workers, on any number of machines, can drain the same queue.
+
+    - Partition tasks list a range of results pages and add a detail task
+    for each new job. Task ids are derived from the job id, so a job listed
+    in two partitions is only queued once.
+    - Detail tasks fetch the details of one job and save it to the local
+    spool, from which it is uploaded and analysed as usual.
+
+    A task is saved only if its lease is still held when it completes, so
+    each job is processed at most once.
+    """
+
+    def __init__(self, queue, spool: Spool, worker_id: Optional[str] = None,
+                 scraped_ids: Optional[dict[str, list]] = None,
+                 archive: Optional[Archive] = None) -> None:
+        """
+        Args:
+            queue (SQLiteWorkQueue | FirestoreWorkQueue): Shared work queue
+            spool (Spool): Local spool where enriched jobs are saved
+            worker_id (str, optional): Name of worker. Defaults to the host
+            name followed by a random suffix.
+            scraped_ids (dict, optional): Ids of jobs already in the
+            database for each website. These jobs are skipped.
+            archive (Archive, optional): Archive of raw responses
+        """
+        self.queue = queue
+        self.spool: Spool = spool
+        self.worker_id: str = worker_id or new_worker_id()
+        self.scraped_ids: dict[str, list] = scraped_ids or {}
+        self.archive: Optional[Archive] = archive
+
+        # one scraper per website, created on first use
+        self.scrapers: dict[str, BaseScraper] = {}
+
+    def get_scraper(self, website: str) -> BaseScraper:
+        if website not in self.scrapers:
+            scraper = get_scraper_class(website)(self.scraped_ids.get(website, []))
+            scraper.defer_details = True
+            scraper.archive = self.archive
+            self.scrapers[website] = scraper
+        return self.scrapers[website]
+
+    def run(self, max_tasks: Optional[int] = None) -> int:
+        """
+        Processes tasks until the queue has no available task left.
+
+        Args:
+            max_tasks (int, optional): Stop after this number of tasks
+
+        Returns:
+            int: number of tasks completed by this worker
+        """
+        completed = 0
+        while max_tasks is None or completed < max_tasks:
+            tasks = self.queue.lease(self.worker_id)
+            if len(tasks) == 0:
+                break
+            completed += self.process(tasks[0])
+        logger.info(f"Worker {self.worker_id} completed {completed} tasks")
+        return completed
+
+    def process(self, task: Task) -> bool:
+        """
+        Runs a task and reports its outcome to the queue.
+
+        Returns:
+            bool: True if the task was completed by this worker
+        """
+        try:
+            with Heartbeat(self.queue, task) as heartbeat:
+                if task.kind == PARTITION:
+                    result = self.list_partition(task.payload)
+                elif task.kind == DETAIL:
+                    result = self.fetch_details(task.payload)
+                else:
+                    raise ValueError(f"Unknown task kind: {task.kind}")
+        except Exception as e:
+            logger.error(f"Task {task.task_id} failed: {e}")
+            self.queue.release(task)
+            return False
+
+        # ! another worker owns the task once the lease is lost: its
+        # ! result must be dropped
+        if heartbeat.lost or not self.queue.complete(task):
+            logger.warning(f"Dropping result of task {task.task_id}")
+            return False
+        self.save(task, result)
+        return True
+
+    def list_partition(self, payload: dict) -> list[dict]:
+        """
+        Returns the skeleton jobs listed in a partition.
+        """
+        scraper = self.get_scraper(payload['site'])
+        first_job = len(scraper.new_jobs)
+        try:
+            scraper.crawl_partition(payload['department'], payload['first_page'],
+                                    payload['last_page'])
+        except Exception:
+            # jobs of a failed partition are listed again when it is retried
+            for job in scraper.new_jobs[first_job:]:
+                scraper.unclaim_job(job.ad_id)
+            del scraper.new_jobs[first_job:]
+            raise
+        return [job.__dict__ for job in scraper.new_jobs[first_job:]]
+
+    def fetch_details(self, payload: dict) -> dict:
+        scraper = self.get_scraper(payload['site'])
+        return scraper.enrich(decode_job(payload['job']))
+
+    def save(self, task: Task, result) -> None:
+        website = task.payload['site']
+        if task.kind == PARTITION:
+            for job in result:
+                date_posted = job.get('date_posted')
+                self.queue.put(DETAIL, f'{DETAIL}:{website}:{job_key(job)}',
+                               {'site': website, 'job': encode_job(job)},
+                               priority=date_posted.timestamp() if date_posted else 0)
+        else:
+            self.spool.add_job(website, result)
@@ -0,0 +1,70 @@
+import os
+import unittest
+from unittest import mock
+
+import requests
+
+from benchmarks.job_board import Corpus, JobBoardServer, LatencyModel
+from benchmarks.pipeline import benchmark
+from src.scrappers.kariyernet import KariyerNetJobScraper
+from src.scrappers.myjobmu import parse_job_page, parse_results_page
+
+
+class TestJobBoard(unittest.TestCase):
+
+    def setUp(self):
+        self.server = JobBoardServer(Corpus(130), seed=1).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_kariyernet_scraper(self):
+        with mock.patch.dict(os.environ, {'KARIYERNET_API_URL': self.server.url,
+                                          'RATE_LIMIT_MAX_RATE': '1000'}):
+            scraper = KariyerNetJobScraper([])
+        scraper.proxied = False
+        jobs = scraper.scrape()
+
+        self.assertEqual(len(jobs), 130)
+        self.assertEqual(len({job['ad_id'] for job in jobs}), 130)
+        stats = self.server.stats()
+        self.assertEqual(stats['kariyernet/search']['requests'], 4)
+        self.assertEqual(stats['kariyernet/job']['requests'], 130)
+
+    def test_myjobmu_pages(self):
+        response = requests.get(self.server.url + '/ShowResults.aspx?Keywords=&Page=4')
+        jobs = parse_results_page(response.text)
+        self.assertEqual(len(jobs), 10)
+        self.assertTrue(jobs[0].url.endswith('.aspx'))
+
+        path = jobs[0].url.split('myjob.mu', 1)[-1]
+        response = requests.get(self.server.url + path)
+        parse_job_page(response.text, jobs[0])
+        self.assertIn('experience in', jobs[0].job_details)
+
+    def test_errors_and_latency(self):
+        self.server.error_rate = 1.0
+        self.server.latency = LatencyModel('fixed:0.01')
+        response = requests.get(self.server.url + '/job?jobId=100001')
+        self.assertEqual(response.status_code, 503)
+        stats = self.server.stats()['kariyernet/job']
+        self.assertEqual(stats['errors'], 1)
+        self.assertGreaterEqual(stats['latency_ms']['p50'], 10)
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_benchmark_run(self):
+        server = JobBoardServer(Corpus(60)).start()
+        try:
+            result = benchmark(server, ['kariyernet'], workers=2, backfill=True)
+        finally:
+            server.stop()
+        self.assertEqual(result['jobs'], 60)
+        self.assertGreater(result['jobs_per_minute'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertEqual(result['endpoints']['kariyernet/job']['requests'], 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import subprocess
+import sys
+import unittest
+
+from benchmarks.startup import ROOT, find_regressions, parse_importtime
+from src.main import get_args
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |        900 |   src.logger
+import time:      1500 |       2400 | src.main
+"""
+
+
+def loaded_modules(code: str) -> set:
+    """
+    Returns the modules imported by `code` in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', f'import sys; {code}; print(*sys.modules)'],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_entry_point_imports_no_heavy_module(self):
+        modules = loaded_modules('import src.main')
+        for heavy in ('pandas', 'selenium', 'firebase_admin', 'google.cloud.firestore_v1'):
+            self.assertNotIn(heavy, modules)
+
+    def test_commands_import_their_dependencies_only(self):
+        modules = loaded_modules("from src.main import load_command; load_command('scrape')")
+        self.assertIn('src.orchestrator', modules)
+        for heavy in ('pandas', 'selenium', 'firebase_admin'):
+            self.assertNotIn(heavy, modules)
+
+        modules = loaded_modules("from src.main import load_command; load_command('sync')")
+        self.assertNotIn('src.orchestrator', modules)
+        self.assertNotIn('pandas', modules)
+
+    def test_scrapers_are_loaded_by_name(self):
+        modules = loaded_modules(
+            "from src.base_scrapper import get_scraper_class; get_scraper_class('kariyernet')")
+        self.assertIn('src.scrappers.kariyernet', modules)
+        self.assertNotIn('src.scrappers.myjobmu', modules)
+        self.assertNotIn('selenium', modules)
+
+    def test_scrape_is_default_command(self):
+        args = get_args(['--website', 'kariyernet', 'myjobmu', '--backfill'])
+        self.assertEqual(args.command, 'scrape')
+        self.assertEqual(args.website, ['kariyernet', 'myjobmu'])
+        self.assertTrue(args.backfill)
+
+        args = get_args([])
+        self.assertEqual(args.command, 'scrape')
+        self.assertEqual(args.website, ['kariyernet'])
+
+        args = get_args(['backup', '--output', 'jobs.json', '--dry_run'])
+        self.assertEqual(args.command, 'backup')
+        self.assertEqual(args.output, 'jobs.json')
+        self.assertTrue(args.dry_run)
+
+    def test_parse_importtime(self):
+        modules = parse_importtime(IMPORTTIME)
+        self.assertEqual([module['module'] for module in modules],
+                         ['_io', 'src.logger', 'src.main'])
+        self.assertEqual([module['depth'] for module in modules], [2, 1, 0])
+        self.assertAlmostEqual(modules[2]['cumulative'], 0.0024)
+
+    def test_find_regressions(self):
+        baseline = {'targets': {'sync': {'seconds': 0.4, 'heavy_modules': []},
+                                'main': {'seconds': 0.05, 'heavy_modules': []}}}
+        current = {'targets': {'sync': {'seconds': 0.6, 'heavy_modules': []},
+                               'main': {'seconds': 0.06, 'heavy_modules': ['pandas']},
+                               'dedupe': {'seconds': 1.0, 'heavy_modules': []}}}
+        regressions = {regression['target']: regression
+                       for regression in find_regressions(current, baseline)}
+        self.assertEqual(set(regressions), {'sync', 'main'})
+        self.assertEqual(regressions['main']['new_heavy_modules'], ['pandas'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from src.analyser.cooccurrence import (ATTRIBUTES, count_cooccurrences, decode_matrix,
+                                       encode_matrix, merge_cooccurrences, top_pairs)
+from src.analyser.runner import COOCCURRENCE, analyse_jobs
+
+NAMES = ('Docker', 'Kubernetes', 'Python', 'React', 'Typescript')
+JOBS = [['React', 'Typescript', 'Docker'], ['React', 'Typescript'],
+        ['Docker', 'Kubernetes'], ['Docker', 'Kubernetes', 'React'], ['Python']]
+
+
+class TestCooccurrence(unittest.TestCase):
+
+    def test_counts(self):
+        encoded = count_cooccurrences(JOBS, NAMES)
+        matrix = decode_matrix(encoded, tuple(encoded['attributes']))
+        self.assertTrue((matrix == matrix.T).all())
+        # the diagonal counts jobs, other cells pairs of attributes
+        self.assertEqual(matrix.diagonal().tolist(), [3, 2, 1, 3, 2])
+        self.assertEqual(matrix[3, 4], 2)
+        self.assertEqual(matrix[0, 1], 2)
+        # only the upper triangle is stored
+        self.assertTrue(all(row <= col for row, col in zip(encoded['rows'], encoded['cols'])))
+        self.assertEqual(len(encoded['counts']), 10)
+
+    def test_merge_and_top_pairs(self):
+        first = count_cooccurrences(JOBS[:2], NAMES)
+        # a batch counted with other attributes, e.g. after a new constant
+        second = count_cooccurrences(JOBS[2:], ('React', 'Python', 'Kubernetes', 'Docker'))
+        merged = merge_cooccurrences(first, second)
+        self.assertEqual(merged, count_cooccurrences(JOBS, NAMES))
+        self.assertEqual(merge_cooccurrences({}, merged), merged)
+
+        # ties are ordered by name, attributes with themselves are left out
+        self.assertEqual(top_pairs(merged, 3), [('Docker', 'Kubernetes', 2),
+                                                ('Docker', 'React', 2),
+                                                ('React', 'Typescript', 2)])
+        self.assertEqual(top_pairs({}), [])
+
+    def test_analyse_jobs(self):
+        details = ['React and TypeScript', 'Docker with Kubernetes', 'React, Docker']
+        increments = analyse_jobs([''] * 3, details, [''] * 3, [''] * 3)
+        encoded = increments[COOCCURRENCE]
+        self.assertEqual(encoded['attributes'], list(ATTRIBUTES))
+        matrix = decode_matrix(encoded, ATTRIBUTES)
+        react = ATTRIBUTES.index('React')
+        self.assertEqual(matrix[react, react], increments['web_data_ref']['React'])
+        self.assertEqual(matrix[react, ATTRIBUTES.index('Typescript')], 1)
+        self.assertEqual(encode_matrix(matrix, ATTRIBUTES), encoded)
+        self.assertIsInstance(matrix, np.ndarray)
+
+
+if __name__ == '__main__':
+    unittest.main()
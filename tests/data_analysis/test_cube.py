@@ -0,0 +1,60 @@
+import unittest
+from datetime import datetime
+
+from src.analyser.cube import UNKNOWN, job_site, posting_month, rollup, trend
+from src.analyser.runner import CUBE, analyse_jobs
+from src.classes.database import Database
+from src.classes.memory_firestore import MemoryFirestore
+
+DETAILS = ['Python and Docker on AWS', 'Java and Python', 'Go on Linux', 'Python']
+LOCATIONS = ['Port Louis', 'Moka', 'Plaine Wilhems', 'Port Louis']
+SITES = ['kariyernet', 'kariyernet', 'myjobmu', 'kariyernet']
+MONTHS = ['2024-01', '2024-02', '2024-02', '2024-02']
+
+
+def analyse() -> dict:
+    return analyse_jobs(['developer'] * 4, DETAILS, LOCATIONS, [''] * 4, SITES, MONTHS)
+
+
+class TestCube(unittest.TestCase):
+
+    def test_dimensions(self):
+        self.assertEqual(posting_month(datetime(2024, 3, 9)), '2024-03')
+        self.assertEqual(posting_month('2024-03-09T00:00:00'), '2024-03')
+        self.assertEqual(posting_month(None), UNKNOWN)
+        self.assertEqual(job_site({'site': 'kariyernet', 'url': ''}), 'kariyernet')
+        self.assertEqual(job_site({'url': 'https://www.myjob.mu/Jobs/1.aspx'}), 'myjobmu')
+        self.assertEqual(job_site({'ad_id': 1}), UNKNOWN)
+
+    def test_cells_sum_to_totals(self):
+        increments = analyse()
+        cells = list(increments[CUBE].values())
+        self.assertEqual(len(cells), 3)
+
+        (totals,) = rollup(cells).values()
+        self.assertEqual(totals['jobs'], 4)
+        for category in ('lang_data', 'cloud_data', 'os_data', 'loc_data'):
+            expected = {key: value for key, value in increments[f'{category}_ref'].items()
+                        if value}
+            self.assertEqual(totals[category], expected, category)
+
+        by_site = rollup(cells, ('site',))
+        self.assertEqual(by_site[('myjobmu',)]['loc_data'], {'Plaines Wilhems': 1})
+        self.assertEqual(trend(cells, 'lang_data', 'Python', 'kariyernet'),
+                         {'2024-01': 1, '2024-02': 2})
+        with self.assertRaises(ValueError):
+            rollup(cells, ('company',))
+
+    def test_update_cube(self):
+        db = Database(None, 'main', client=MemoryFirestore())
+        db.update_cube(analyse()[CUBE])
+        db.update_cube(analyse()[CUBE])
+
+        cells = [snapshot.to_dict() for snapshot in db.cube_collection_ref.stream()]
+        self.assertEqual(trend(cells, 'lang_data', 'Python'), {'2024-01': 2, '2024-02': 4})
+        cell = db.get_doc(db.cube_collection_ref.document('kariyernet_2024-02'))
+        self.assertEqual((cell['site'], cell['month'], cell['jobs']), ('kariyernet', '2024-02', 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
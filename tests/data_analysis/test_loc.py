@@ -1,6 +1,7 @@
 import unittest
 from src.utils.dictionary import (filter_dict)
-from src.analyser.location import location_count
+from src.analyser.gazetteer import canonical_places, normalise
+from src.analyser.location import location_count, region_count
 from src.utils.constants import MU_DISTRICTS
 
 
@@ -25,3 +26,33 @@ class TestLocations(unittest.TestCase):
                                             'Savanne': 1
                                             }
         )
+
+    def test_normalise(self):
+        self.assertEqual(normalise('İstanbul(Avr.)'), ('istanbul', 'avr'))
+        self.assertEqual(normalise('Şişli'), normalise('sisli'))
+        self.assertEqual(normalise('Rivière du Rempart'), ('riviere', 'du', 'rempart'))
+
+    def test_canonical_places(self):
+        self.assertEqual(canonical_places('İstanbul(Avr.)'), (('TR', 'İstanbul', 'İstanbul'),))
+        # a province is left out when one of its districts is named
+        self.assertEqual(canonical_places('Kadıköy, İstanbul(Asya), Ankara'),
+                         (('TR', 'İstanbul', 'Kadıköy'), ('TR', 'Ankara', 'Ankara')))
+        self.assertEqual(canonical_places('Rose Hill'),
+                         (('MU', 'Plaines Wilhems', 'Beau Bassin-Rose Hill'),))
+        self.assertEqual(canonical_places('Overseas'), ())
+
+    def test_canonical_places_memoised(self):
+        canonical_places.cache_clear()
+        for _ in range(3):
+            canonical_places('İzmir(Tümü)')
+        self.assertEqual(canonical_places.cache_info().hits, 2)
+
+    def test_kariyernet_locations(self):
+        self.assertEqual(location_count(['İstanbul(Avr.)', 'İstanbul(Asya)', 'ISTANBUL',
+                                         'Ankara, İzmir', 'Overseas']),
+                         {'İstanbul': 3, 'Ankara': 1, 'İzmir': 1, 'Overseas': 1})
+
+    def test_regions(self):
+        self.assertEqual(region_count(['Kadıköy, İstanbul(Asya)', 'Beşiktaş, Şişli',
+                                       'Quatre Bornes', 'Plaine Wilhems', 'Overseas']),
+                         {'İstanbul': 2, 'Plaines Wilhems': 2})
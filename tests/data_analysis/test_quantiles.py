@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from src.analyser.quantiles import (KLLSketch, merge_slices, pack_slices, summarise,
+                                    unpack_slices)
+from src.analyser.runner import SALARIES, analyse_jobs, merge_increments, negate_increments
+from src.classes.database import Database
+from src.classes.memory_firestore import MemoryFirestore
+
+
+def rank(items: list[float], item: float) -> float:
+    return sum(1 for other in items if other <= item) / len(items)
+
+
+class TestQuantiles(unittest.TestCase):
+
+    def setUp(self):
+        generator = random.Random(7)
+        self.items = [generator.lognormvariate(10, 0.5) for _ in range(20000)]
+
+    def test_quantiles(self):
+        sketch = KLLSketch()
+        for item in self.items:
+            sketch.add(item)
+        self.assertEqual(sketch.count(), len(self.items))
+        # memory does not grow with the number of items
+        self.assertLess(sketch.size, 1000)
+        for q in (0.25, 0.5, 0.75):
+            self.assertAlmostEqual(rank(self.items, sketch.quantile(q)), q, delta=0.03)
+        self.assertIsNone(KLLSketch().quantile(0.5))
+
+    def test_merge(self):
+        first, second = KLLSketch(), KLLSketch()
+        for item in self.items[:5000]:
+            first.add(item)
+        for item in self.items[5000:]:
+            second.add(item)
+        merged = first.merge(second)
+        self.assertEqual(merged.count(), len(self.items))
+        self.assertAlmostEqual(rank(self.items, merged.quantile(0.5)), 0.5, delta=0.03)
+
+    def test_pack_and_merge_slices(self):
+        sketch = KLLSketch()
+        for item in (10, 20, 30):
+            sketch.add(item)
+        packed = pack_slices({'Python': sketch})
+        self.assertEqual(summarise(unpack_slices(packed)['Python']),
+                         {'p25': 10, 'p50': 20, 'p75': 30, 'count': 3})
+        total = merge_slices({}, {'technology_MUR': packed})
+        total = merge_slices(total, {'technology_MUR': packed})
+        self.assertEqual(unpack_slices(total['technology_MUR'])['Python'].count(), 6)
+
+    def test_increments(self):
+        increments = analyse_jobs(['Developer'] * 2, ['Python', 'Python and Java'],
+                                  ['Moka', 'Moka'], ['10,000 - 20,000', '21,000 - 30,000'],
+                                  ['myjobmu'] * 2, ['2024-05'] * 2)
+        total = merge_increments(merge_increments({}, increments), increments)
+        slices = unpack_slices(total[SALARIES]['location_MUR'])
+        self.assertEqual(slices['Moka'].count(), 4)
+        # quantiles cannot be subtracted
+        with self.assertRaises(ValueError):
+            negate_increments(increments)
+
+        db = Database(None, 'main', client=MemoryFirestore())
+        db.update_salary_quantiles(increments[SALARIES])
+        db.update_salary_quantiles(increments[SALARIES])
+        doc = db.salary_quantiles_collection_ref.document('technology_MUR').get().to_dict()
+        self.assertEqual((doc['kind'], doc['currency']), ('technology', 'MUR'))
+        self.assertEqual(summarise(unpack_slices(doc['sketches'])['Java']),
+                         {'p25': 25500, 'p50': 25500, 'p75': 25500, 'count': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from src.analyser.salary import salary_count
+from src.analyser.salary import (parse_salary, salary_count, salary_quantiles,
+                                 salary_slices, salary_value)
 from src.utils.constants import PUBLIC_SALARY_RANGES
 
 
@@ -16,3 +17,43 @@ class TestSalary(unittest.TestCase):
                           '76,000 - 100,000': 1,
                           'More Than 100,000': 1
                           })
+
+    def test_parse_salary(self):
+        self.assertEqual(parse_salary('10,000 - 20,000', 'MUR'), (10000, 20000, 'MUR'))
+        self.assertEqual(parse_salary('Less Than 10,000', 'MUR'), (None, 10000, 'MUR'))
+        self.assertEqual(parse_salary('More Than 100,000', 'MUR'), (100000, None, 'MUR'))
+        self.assertEqual(parse_salary('15.000 TL - 20.000 TL'), (15000, 20000, 'TRY'))
+        self.assertEqual(parse_salary('Rs 25k', 'TRY'), (25000, 25000, 'MUR'))
+        self.assertEqual(parse_salary('30000TL'), (30000, 30000, 'TRY'))
+        self.assertIsNone(parse_salary('Negotiable', 'MUR'))
+        self.assertIsNone(parse_salary('Unknown', 'TRY'))
+        # no currency
+        self.assertIsNone(parse_salary('10,000 - 20,000'))
+
+    def test_parse_salary_memoised(self):
+        parse_salary.cache_clear()
+        for _ in range(3):
+            parse_salary('21,000 - 30,000', 'MUR')
+        self.assertEqual(parse_salary.cache_info().hits, 2)
+        self.assertEqual(parse_salary.cache_info().misses, 1)
+
+    def test_salary_value(self):
+        self.assertEqual(salary_value((10000, 20000, 'MUR')), 15000)
+        self.assertEqual(salary_value((None, 10000, 'MUR')), 10000)
+        self.assertEqual(salary_value((100000, None, 'MUR')), 100000)
+
+    def test_salary_slices(self):
+        slices = salary_slices(
+            ['10,000 - 20,000', '21,000 - 30,000', 'Negotiable', '15.000 TL'],
+            ['myjobmu', 'myjobmu', 'myjobmu', 'kariyernet'],
+            ['Plaine Wilhems', 'Port Louis', 'Port Louis', 'Istanbul'],
+            [['Python'], ['Python', 'Docker'], ['Python'], ['Python']])
+        self.assertEqual(sorted(slices),
+                         ['location_MUR', 'location_TRY', 'technology_MUR', 'technology_TRY'])
+        locations = salary_quantiles(slices['location_MUR'])
+        self.assertEqual(locations['Plaines Wilhems'],
+                         {'p25': 15000, 'p50': 15000, 'p75': 15000, 'count': 1})
+        technologies = salary_quantiles(slices['technology_MUR'])
+        self.assertEqual(technologies['Python']['count'], 2)
+        self.assertEqual(technologies['Docker']['p50'], 25500)
+        self.assertEqual(salary_quantiles(slices['technology_TRY'])['Python']['p50'], 15000)
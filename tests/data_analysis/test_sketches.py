@@ -0,0 +1,82 @@
+import unittest
+
+from src.analyser.runner import SKETCHES, analyse_jobs, negate_increments
+from src.analyser.sketches import (CountMinSketch, HyperLogLog, decode_cell, distinct_count,
+                                   frequency, merge_sketches, sketch_jobs)
+from src.classes.database import Database
+from src.classes.memory_firestore import MemoryFirestore
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(6000):
+            first.add(f'company {i}')
+            # values added twice are counted once
+            first.add(f'company {i}')
+        for i in range(4000, 10000):
+            second.add(f'company {i}')
+        self.assertAlmostEqual(first.count(), 6000, delta=6000 * 0.05)
+        self.assertAlmostEqual(first.merge(second).count(), 10000, delta=10000 * 0.05)
+        self.assertEqual(len(first.to_dict()['registers']), 2048)
+        self.assertEqual(HyperLogLog().count(), 0)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_count_min(self):
+        sketch = CountMinSketch()
+        for i in range(3000):
+            sketch.add(f'title {i % 500}')
+        sketch.add('Python developer', 40)
+        # estimates are never below the true count
+        self.assertGreaterEqual(sketch.estimate('Python developer'), 40)
+        self.assertLessEqual(sketch.estimate('Python developer'), 40 + 0.01 * 3040 * 3)
+        self.assertGreaterEqual(sketch.estimate('title 7'), 6)
+
+        merged = CountMinSketch().merge(sketch).merge(sketch)
+        self.assertEqual(merged.merge(sketch.negate()).counters, sketch.counters)
+
+    def test_cells(self):
+        companies = [f'Company {i % 120}' for i in range(1000)] + ['Unknown', '']
+        count = len(companies)
+        sites = ['kariyernet'] * 600 + ['myjobmu'] * (count - 600)
+        months = ['2024-01' if i % 2 else '2024-02' for i in range(count)]
+        cells = sketch_jobs(sites, months, {'company': companies,
+                                            'location': ['Moka'] * count})
+        self.assertEqual(len(cells), 4)
+        packed = [decode_cell(text) for text in cells.values()]
+        # a few kilobytes per cell, whatever the number of jobs
+        self.assertLess(max(len(data) for data in packed), 8 * 1024)
+
+        self.assertAlmostEqual(distinct_count(packed, 'company'), 120, delta=6)
+        self.assertAlmostEqual(distinct_count(packed, 'company', month='2024-01'), 60, delta=3)
+        self.assertEqual(frequency(packed, 'location', ' MOKA ', site='myjobmu'), count - 600)
+        # placeholders are not companies
+        self.assertEqual(frequency(packed, 'company', 'unknown'), 0)
+
+        # merging the cells of two batches gives those of both at once
+        merged = merge_sketches(dict(cells), cells)
+        self.assertEqual(frequency([decode_cell(text) for text in merged.values()],
+                                   'location', 'Moka'), 2 * count)
+
+    def test_analysed_and_saved(self):
+        db = Database(None, 'main', client=MemoryFirestore())
+        increments = analyse_jobs(['Developer', 'Developer', 'Tester'], [''] * 3,
+                                  ['Moka'] * 3, [''] * 3, ['kariyernet'] * 3,
+                                  ['2024-05'] * 3, ['A Ltd', 'B Ltd', 'A Ltd'])
+        db.update_sketches(increments[SKETCHES])
+        db.update_sketches(increments[SKETCHES])
+        cells = [doc.get('sketches') for doc in db.sketches_collection_ref.stream()]
+        self.assertEqual(distinct_count(cells, 'company', 'kariyernet', '2024-05'), 2)
+        self.assertEqual(frequency(cells, 'job_title', 'developer'), 4)
+
+        # a reverted run no longer counts, but values stay seen
+        db.update_sketches(negate_increments({SKETCHES: increments[SKETCHES]})[SKETCHES])
+        cells = [doc.get('sketches') for doc in db.sketches_collection_ref.stream()]
+        self.assertEqual(frequency(cells, 'job_title', 'developer'), 2)
+        self.assertEqual(distinct_count(cells, 'job_title'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from src.analyser.cooccurrence import merge_cooccurrences
+from src.analyser.cube import merge_cubes
+from src.analyser.quantiles import merge_slices
+from src.analyser.sketches import merge_sketches
+
+
+class FakeDatabase:
+    """
+    In-memory stand-in for `Database`, recording the calls made by
+    the pipeline.
+    """
+
+    def __init__(self, recent=()):
+        self.recent = list(recent)
+        self.jobs = []
+        self.stats = {}
+        self.cube = {}
+        self.cooccurrence = {}
+        self.events = {}
+        self.sketches = {}
+        self.salaries = {}
+        self.size = 0
+        self.watermarks = {}
+
+    def __getattr__(self, name):
+        # document references such as `cloud_data_ref` are replaced by
+        # their name
+        if name.endswith('_ref'):
+            return name[:-len('_ref')]
+        raise AttributeError(name)
+
+    def get_recent_values(self, field, LIMIT=500):
+        return list(self.recent)
+
+    def get_watermark(self, website):
+        return dict(self.watermarks.get(website, {}))
+
+    def set_watermark(self, website, watermark):
+        self.watermarks[website] = dict(watermark)
+
+    def get_size(self):
+        return self.size
+
+    def update_metadata(self, new_db_size):
+        self.size = new_db_size
+
+    def add_job(self, job):
+        self.jobs.append(job)
+
+    def update_job(self, field, value, job):
+        for saved in self.jobs:
+            if saved.get(field) == value:
+                saved.update(job)
+                return
+
+    def update_stats(self, increment, document_ref):
+        doc = self.stats.setdefault(document_ref, {})
+        for key, value in increment.items():
+            doc[key] = doc.get(key, 0) + value
+
+    def update_cube(self, cube):
+        merge_cubes(self.cube, cube)
+
+    def update_cooccurrence(self, increment):
+        self.cooccurrence = merge_cooccurrences(self.cooccurrence, increment)
+
+    def add_stats_event(self, run_id, event, chunks=()):
+        self.events[run_id] = {**event, 'chunk_data': list(chunks)}
+
+    def set_stats_event_status(self, run_id, status, fields=None):
+        self.events[run_id].update(fields or {}, status=status)
+
+    def update_sketches(self, sketches):
+        merge_sketches(self.sketches, sketches)
+
+    def update_salary_quantiles(self, slices):
+        merge_slices(self.salaries, slices)
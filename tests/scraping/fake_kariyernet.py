@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = {}
+
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode()
+
+    def json(self):
+        return self.payload
+
+    def close(self):
+        pass
+
+
+class FakeKariyerNetSession:
+    """
+    Stand-in for `requests.Session` serving a corpus of kariyer.net jobs
+    sorted by date, newest first. Job ids decrease with age.
+
+    Jobs are spread over departments 55 and 78, and every third job is
+    listed in both.
+    """
+
+    def __init__(self, job_count, newest=datetime(2024, 3, 1), failing_ids=(),
+                 undated_listings=False):
+        self.jobs = [{'id': 1000 + job_count - i,
+                      'title': f'developer {i}',
+                      'postingDate': (newest - timedelta(days=i // 10)).strftime('%Y-%m-%d'),
+                      'locationText': 'İstanbul(Avr.)',
+                      'departments': [['55', '78'], ['55'], ['78']][i % 3]}
+                     for i in range(job_count)]
+        self.failing_ids = set(failing_ids)
+        # search results without `postingDate`, which only job details have
+        self.undated_listings = undated_listings
+        self.requests = []
+
+    def request(self, method, url, data=None, **kwargs):
+        self.requests.append((method, url))
+        if method == 'POST':
+            body = json.loads(data)
+            size = body['size']
+            start = (body['currentPage'] - 1) * size
+            listed = [job for job in self.jobs
+                      if set(job['departments']) & set(body['departments'])]
+            items = listed[start:start + size]
+            if self.undated_listings:
+                items = [{key: value for key, value in job.items() if key != 'postingDate'}
+                         for job in items]
+            return FakeResponse({'data': {'totalJobCount': len(listed),
+                                          'jobs': {'items': items}}})
+
+        job_id = int(parse_qs(urlparse(url).query)['jobId'][0])
+        if job_id in self.failing_ids:
+            return FakeResponse(None, status_code=404)
+        item = next(job for job in self.jobs if job['id'] == job_id)
+        return FakeResponse({'data': {
+            'jobGeneralInformation': {
+                'title': item['title'],
+                'confidential': False,
+                'postingDate': item['postingDate'],
+                'closingDate': '5 Şubat 2025',
+                'locationText': item['locationText'],
+                'qualifications': 'python django docker',
+                'language': 'tr'},
+            'jobCompanyInformation': {'companyName': ' ACME '}}})
+
+    def detail_requests(self):
+        return [url for method, url in self.requests if method == 'GET']
@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+from src.base_scrapper import BaseScraper
+from src.hedging import HedgeBudget
+from src.rate_limiter import RateLimiter
+from src.resilience import RetryPolicy
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = text
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class SlowFirstSession:
+    """
+    The first request takes `delay` seconds, the following ones are fast.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.responses = []
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+        if call == 1:
+            time.sleep(self.delay)
+        response = FakeResponse('slow' if call == 1 else 'fast')
+        self.responses.append(response)
+        return response
+
+
+class ScriptedSession:
+    """
+    Answers the n-th request after `delay` seconds with `status`, as
+    given by `script[n]`.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            delay, status = self.script[self.calls]
+            self.calls += 1
+        time.sleep(delay)
+        return FakeResponse(f'{status}', status)
+
+
+class FakeProxyManager:
+    def get_proxy(self, exclude=None):
+        return 'http://p2' if exclude else 'http://p1'
+
+    def report_success(self, proxy, latency):
+        pass
+
+    def report_failure(self, proxy):
+        pass
+
+
+class DummyScraper(BaseScraper):
+    def scrape(self):
+        return []
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        self.scraper = DummyScraper(FakeProxyManager(),
+                                    RateLimiter(max_rate=1000, sleep=lambda s: None))
+        self.scraper.retry_policy = RetryPolicy(sleep=lambda s: None)
+        self.scraper.enable_hedging(ratio=1.0)
+        host = self.scraper.rate_limiter.for_host('https://a.com/')
+        for _ in range(20):
+            host.update_latency(0.01)
+
+    def test_slow_request_is_hedged(self):
+        session = SlowFirstSession(delay=0.5)
+        start = time.monotonic()
+        response = self.scraper.http_get(session, 'https://a.com/job', proxied=True)
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(response.text, 'fast')
+        self.assertEqual(session.calls, 2)
+        # losing response is closed once it arrives
+        time.sleep(0.6)
+        self.assertTrue(session.responses[-1].closed)
+
+    def test_fast_request_is_not_hedged(self):
+        session = SlowFirstSession(delay=0)
+        response = self.scraper.http_get(session, 'https://a.com/job')
+        self.assertEqual(response.text, 'slow')
+        self.assertEqual(session.calls, 1)
+
+    def test_error_does_not_win(self):
+        # the hedge fails fast, the slower primary succeeds
+        session = ScriptedSession([(0.3, 200), (0, 503)])
+        response = self.scraper.send_hedged(session, 'GET', 'https://a.com/job', None, [])[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 2)
+
+    def test_primary_does_not_queue_behind_hedges(self):
+        self.scraper.enable_hedging(ratio=1.0, max_workers=1)
+        release = threading.Event()
+        # the only hedge worker is busy for a while
+        self.scraper.hedge_executor.submit(release.wait)
+        threading.Timer(0.5, release.set).start()
+        session = ScriptedSession([(0, 200), (0, 200)])
+        response = self.scraper.http_get(session, 'https://a.com/job')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.calls, 1)
+
+    def test_post_is_not_hedged(self):
+        session = SlowFirstSession(delay=0.1)
+        response = self.scraper.http_post(session, 'https://a.com/job', {}, {})
+        self.assertEqual(response.text, 'slow')
+        self.assertEqual(session.calls, 1)
+
+
+class TestHedgeBudget(unittest.TestCase):
+
+    def test_budget_caps_hedges(self):
+        budget = HedgeBudget(ratio=0.05)
+        hedges = 0
+        for _ in range(100):
+            budget.record_request()
+            hedges += budget.try_spend()
+        self.assertEqual(hedges, 5)
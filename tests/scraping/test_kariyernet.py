@@ -0,0 +1,184 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+from src.classes.archive import Archive
+from src.classes.spool import Spool
+from src.classes.watermark import Watermark
+from src.rate_limiter import RateLimiter
+from src.scrappers.kariyernet import KariyerNetJobScraper
+from tests.scraping.fake_kariyernet import FakeKariyerNetSession
+
+
+def make_scraper(session, scraped_ids=(), **kwargs):
+    scraper = KariyerNetJobScraper(list(scraped_ids), **kwargs)
+    scraper.session = session
+    scraper.proxied = False
+    scraper.rate_limiter = RateLimiter(max_rate=1e6, sleep=lambda s: None)
+    return scraper
+
+
+class TestKariyerNetScraper(unittest.TestCase):
+
+    def test_scrape_until_known_page(self):
+        session = FakeKariyerNetSession(200)
+        known = [job['id'] for job in session.jobs[60:]]
+        jobs = make_scraper(session, known).scrape()
+        self.assertEqual(len(jobs), 60)
+        self.assertEqual(jobs[0]['company'], 'ACME')
+        self.assertEqual(jobs[0]['date_posted'], datetime(2024, 3, 1))
+        self.assertEqual(jobs[0]['closing_date'], datetime(2025, 2, 5))
+
+    def test_proxied_from_environment(self):
+        for value, proxied in [('false', False), ('0', False), ('', False),
+                               ('true', True), ('1', True), ('Yes', True)]:
+            with mock.patch.dict(os.environ, {'KARIYERNET_PROXIED': value}):
+                self.assertIs(KariyerNetJobScraper([]).proxied, proxied)
+
+    def test_failed_job_is_skipped(self):
+        session = FakeKariyerNetSession(30, failing_ids=[1029])
+        jobs = make_scraper(session).scrape()
+        self.assertEqual(len(jobs), 29)
+
+    def test_resume_from_checkpoint(self):
+        spool = Spool(':memory:')
+        session = FakeKariyerNetSession(200)
+        spool.save_checkpoint('kariyernet', 2)
+        for job in session.jobs[:100]:
+            spool.add_job('kariyernet', {'ad_id': job['id']})
+
+        jobs = make_scraper(session, spool=spool).scrape()
+        self.assertEqual(len(jobs), 100)
+        self.assertEqual(len(session.detail_requests()), 100)
+        self.assertEqual(len(spool.pending_upload('kariyernet')), 200)
+        self.assertEqual(spool.get_checkpoint('kariyernet'),
+                         {'page': 4, 'finished': True})
+
+    def test_finished_run_is_not_scraped_again(self):
+        spool = Spool(':memory:')
+        spool.save_checkpoint('kariyernet', 1, finished=True)
+        session = FakeKariyerNetSession(50)
+        self.assertEqual(make_scraper(session, spool=spool).scrape(), [])
+        self.assertEqual(session.requests, [])
+
+
+class TestWatermark(unittest.TestCase):
+
+    def test_stop_at_watermark(self):
+        # 10 jobs per day, newest on 2024-03-01
+        session = FakeKariyerNetSession(500)
+        watermark = Watermark(datetime(2024, 2, 25), overlap_days=1)
+        # recent ids do not cover all jobs after the watermark
+        jobs = make_scraper(session, watermark=watermark).scrape()
+        # jobs posted from 2024-02-24 onwards are checked
+        self.assertEqual(len(jobs), 70)
+        self.assertEqual(min(job['date_posted'] for job in jobs),
+                         datetime(2024, 2, 24))
+        # page count, then pages 1 to 3. Page 3 only holds older jobs.
+        searches = [r for r in session.requests if r[0] == 'POST']
+        self.assertEqual(len(searches), 4)
+
+    def test_known_page_does_not_stop_before_watermark(self):
+        session = FakeKariyerNetSession(200)
+        known = [job['id'] for job in session.jobs[:50]]
+        watermark = Watermark(datetime(2024, 2, 25), overlap_days=0)
+        jobs = make_scraper(session, known, watermark=watermark).scrape()
+        self.assertEqual(len(jobs), 10)
+
+    def test_undated_listings_stop_at_known_page(self):
+        session = FakeKariyerNetSession(500, undated_listings=True)
+        known = [job['id'] for job in session.jobs[20:]]
+        watermark = Watermark(datetime(2024, 2, 25), overlap_days=0)
+        jobs = make_scraper(session, known, watermark=watermark).scrape()
+        self.assertEqual(len(jobs), 20)
+        # the watermark cannot tell pages apart without dates: scraping
+        # stops at the first page without new jobs
+        searches = [r for r in session.requests if r[0] == 'POST']
+        self.assertEqual(len(searches), 3)
+
+
+class TestBackfill(unittest.TestCase):
+
+    def make_backfill_scraper(self, session, **kwargs):
+        scraper = make_scraper(session, **kwargs)
+        scraper.new_session = lambda: session
+        return scraper
+
+    def test_backfill_deduplicates_departments(self):
+        session = FakeKariyerNetSession(600)
+        # known jobs do not stop a backfill
+        known = [job['id'] for job in session.jobs[:50]]
+        scraper = self.make_backfill_scraper(session, scraped_ids=known)
+        jobs = scraper.backfill(workers=4, pages_per_partition=2)
+        self.assertEqual(len(jobs), 550)
+        self.assertEqual(len({job['ad_id'] for job in jobs}), 550)
+        self.assertEqual(len(session.detail_requests()), 550)
+
+    def test_backfill_stops_at_watermark(self):
+        session = FakeKariyerNetSession(600)
+        watermark = Watermark(datetime(2024, 2, 25), overlap_days=0)
+        scraper = self.make_backfill_scraper(session, watermark=watermark)
+        jobs = scraper.backfill(workers=2, pages_per_partition=1)
+        self.assertEqual(len(jobs), 60)
+
+    def test_resume_backfill(self):
+        spool = Spool(':memory:')
+        session = FakeKariyerNetSession(400)
+        # first partition of department 55 was completed by a previous run
+        spool.save_checkpoint('kariyernet/backfill/55/1', 2, finished=True)
+        scraper = self.make_backfill_scraper(session, spool=spool)
+        jobs = scraper.backfill(workers=3, pages_per_partition=2)
+
+        # jobs only listed on the first two pages of department 55 are skipped
+        listed_55 = [job for job in session.jobs if '55' in job['departments']]
+        skipped = [job for job in listed_55[:100] if job['departments'] == ['55']]
+        self.assertEqual(len(jobs), 400 - len(skipped))
+        self.assertEqual(spool.get_checkpoint('kariyernet'),
+                         {'page': 0, 'finished': True})
+
+        spool.clear('kariyernet')
+        self.assertIsNone(spool.get_checkpoint('kariyernet/backfill/78/1'))
+
+
+class TestDeferredDetails(unittest.TestCase):
+
+    def test_listing_pass_then_enrichment(self):
+        spool = Spool(':memory:')
+        session = FakeKariyerNetSession(120)
+        known = [job['id'] for job in session.jobs[100:]]
+        scraper = make_scraper(session, known, spool=spool)
+        scraper.defer_details = True
+        jobs = scraper.scrape()
+
+        self.assertEqual(len(jobs), 100)
+        self.assertEqual(session.detail_requests(), [])
+        self.assertEqual(jobs[0]['location'], 'İstanbul(Avr.)')
+
+        queued = spool.queued_details('kariyernet')
+        self.assertEqual(queued[0]['ad_id'], session.jobs[0]['id'])
+        job = scraper.enrich(queued[0])
+        self.assertEqual(job['job_details'], 'python django docker')
+        self.assertEqual(job['company'], 'ACME')
+
+
+class TestArchive(unittest.TestCase):
+
+    def test_reparse_archived_jobs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = Archive(directory)
+            session = FakeKariyerNetSession(60)
+            scraper = make_scraper(session)
+            scraper.archive = archive
+            jobs = scraper.scrape()
+
+            reparsed = [job.__dict__ for job in
+                        KariyerNetJobScraper.jobs_from_archive(archive)]
+            self.assertEqual(len(reparsed), 60)
+            fields = ['ad_id', 'job_title', 'company', 'date_posted',
+                      'closing_date', 'location', 'job_details']
+            by_id = {job['ad_id']: job for job in reparsed}
+            for job in jobs:
+                self.assertEqual({k: job[k] for k in fields},
+                                 {k: by_id[job['ad_id']][k] for k in fields})
+            archive.close()
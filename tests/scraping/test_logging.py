@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+
+from src.logger import (CustomFormatter, Progress, configure_logging, log_context,
+                        setup_logger, stop_listener)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestAsyncLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'log.jsonl')
+        self.logger = setup_logger()
+
+    def tearDown(self):
+        configure_logging()
+        self.directory.cleanup()
+
+    def read_records(self):
+        stop_listener()
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_json_lines(self):
+        configure_logging(self.path, run_id='run1')
+        with log_context(site='kariyernet', stage='detail_fetch'):
+            self.logger.debug('GET %s', '/job', extra={'latency': 0.25})
+        self.logger.info('done')
+
+        first, second = self.read_records()
+        self.assertEqual(first['message'], 'GET /job')
+        self.assertEqual(first['site'], 'kariyernet')
+        self.assertEqual(first['stage'], 'detail_fetch')
+        self.assertEqual(first['latency'], 0.25)
+        self.assertEqual(first['run_id'], 'run1')
+        self.assertEqual(second['run_id'], 'run1')
+        self.assertNotIn('site', second)
+
+    def test_records_of_concurrent_threads(self):
+        configure_logging(self.path)
+
+        def log(site):
+            with log_context(site=site):
+                for i in range(50):
+                    self.logger.debug(f'{site} {i}')
+
+        threads = [threading.Thread(target=log, args=(f'site{n}',)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        records = self.read_records()
+        self.assertEqual(len(records), 200)
+        self.assertTrue(all(r['message'].startswith(r['site']) for r in records))
+
+    def test_formatters_are_built_once(self):
+        formatter = CustomFormatter()
+        record = logging.makeLogRecord({'levelno': logging.INFO, 'msg': 'hello'})
+        before = dict(formatter.formatters)
+        self.assertIn('hello', formatter.format(record))
+        self.assertEqual(formatter.formatters, before)
+
+
+class TestProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = ListHandler()
+        self.logger = logging.getLogger('tests.progress')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.now = 0.0
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_summary_lines_are_rate_limited(self):
+        progress = Progress('kariyernet pages', 100, interval=10,
+                            logger=self.logger, clock=lambda: self.now)
+        for _ in range(100):
+            self.now += 0.5
+            progress.update()
+        progress.close()
+
+        # one line every 10 seconds, and a final one
+        self.assertEqual(len(self.handler.messages), 6)
+        self.assertEqual(self.handler.messages[0],
+                         'kariyernet pages: 20/100 (20%), 2.0/s, eta 40s')
+        self.assertEqual(self.handler.messages[-1],
+                         'kariyernet pages: 100/100 (100%), 2.0/s done')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from datetime import datetime
+from src.classes.archive import Archive
+from src.scrappers.myjobmu import MyJobMuJobScraper, parse_results_page
+
+RESULTS_PAGE = '''
+<html><body>
+<div class="module job-result">
+  <div class="job-result-title"><h2> Python Developer </h2></div>
+  <a itemprop="hiringOrganization" href="/c/1">ACME Ltd</a>
+  <ul>
+    <li class="updated-time">Added 05/03/2024</li>
+    <li class="closed-time">Closing 05/04/2024</li>
+    <li itemprop='jobLocation'>Port Louis</li>
+    <li itemprop='baseSalary'>30,000 - 40,000</li>
+  </ul>
+  <a class="show-more" href="/Jobs/Python-Developer-1.aspx">Show more</a>
+</div>
+<div class="module job-result">
+  <div class="job-result-title"><h2>Data Engineer</h2></div>
+  <ul>
+    <li class="updated-time">Added 06/03/2024</li>
+    <li class="closed-time">Closing 06/04/2024</li>
+    <li itemprop='jobLocation'>Ebene</li>
+    <li itemprop='baseSalary'>Negotiable</li>
+  </ul>
+  <a class="show-more" href="/Jobs/Data-Engineer-2.aspx">Show more</a>
+</div>
+</body></html>
+'''
+
+JOB_PAGE = '''
+<html><body>
+<script>var x = "ignored";</script>
+<ul><li class="employment-type">Permanent</li></ul>
+<div class="job-details"><p>Build APIs with <b>Django</b>.</p><p>Use Docker.</p></div>
+</body></html>
+'''
+
+
+class TestMyJobMuParser(unittest.TestCase):
+
+    def test_results_page(self):
+        jobs = parse_results_page(RESULTS_PAGE)
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[0].url, 'https://www.myjob.mu/Jobs/Python-Developer-1.aspx')
+        self.assertEqual(jobs[0].job_title, 'Python Developer')
+        self.assertEqual(jobs[0].company, 'ACME Ltd')
+        self.assertEqual(jobs[0].date_posted, datetime(2024, 3, 5))
+        self.assertEqual(jobs[0].closing_date, datetime(2024, 4, 5))
+        self.assertEqual(jobs[0].location, 'Port Louis')
+        self.assertEqual(jobs[0].salary, '30,000 - 40,000')
+        # hidden company
+        self.assertEqual(jobs[1].company, 'Unknown')
+
+    def test_jobs_from_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = Archive(directory)
+            archive.put('myjobmu', 'search', '1', RESULTS_PAGE.encode())
+            archive.put('myjobmu', 'job',
+                        'https://www.myjob.mu/Jobs/Python-Developer-1.aspx',
+                        JOB_PAGE.encode())
+            jobs = MyJobMuJobScraper.jobs_from_archive(archive)
+            archive.close()
+
+        self.assertEqual([job.job_title for job in jobs],
+                         ['Data Engineer', 'Python Developer'])
+        self.assertEqual(jobs[1].job_details, 'Build APIs with Django. Use Docker.')
+        self.assertEqual(jobs[1].employment_type, 'Permanent')
+        self.assertEqual(jobs[0].job_details, '')
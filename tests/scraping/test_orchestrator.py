@@ -0,0 +1,159 @@
+import time
+from datetime import datetime
+import unittest
+from src.base_scrapper import BaseScraper, get_scraper_class
+from src.classes.spool import Spool
+from src.orchestrator import run_pipeline, upload_spooled_jobs
+from tests.scraping.fake_database import FakeDatabase
+
+
+def fake_job(site, i):
+    return {'url': f'https://{site}/{i}', 'job_title': 'python developer',
+            'job_details': 'python docker', 'location': 'Moka',
+            'salary': '10,000 - 20,000'}
+
+
+class SlowScraper(BaseScraper):
+    site = 'test-slow-a'
+    delay = 0.3
+    fail = False
+
+    def __init__(self, scraped_ids, limit=-1, spool=None, watermark=None):
+        super().__init__(proxy_manager=None)
+        self.spool = spool
+
+    def scrape(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError('site is down')
+        jobs = [fake_job(self.site, i) for i in range(3)]
+        for job in jobs:
+            self.spool.add_job(self.site, job)
+        self.spool.save_checkpoint(self.site, 1, finished=True)
+        return jobs
+
+
+class OtherSlowScraper(SlowScraper):
+    site = 'test-slow-b'
+
+
+class FailingScraper(SlowScraper):
+    site = 'test-failing'
+    delay = 0
+    fail = True
+
+
+class DeferredScraper(SlowScraper):
+    site = 'test-deferred'
+    delay = 0
+    job_count = 4
+    failing_urls = ()
+
+    def scrape(self):
+        jobs = []
+        for i in range(self.job_count):
+            job = {**fake_job(self.site, i), 'job_details': '',
+                   'date_posted': datetime(2024, 1, i + 1)}
+            self.spool.add_job(self.site, job, enriched=False)
+            jobs.append(job)
+        self.spool.save_checkpoint(self.site, 1, finished=True)
+        return jobs
+
+    def enrich(self, job):
+        if job['url'] in self.failing_urls:
+            raise RuntimeError('details unavailable')
+        return {**job, 'job_details': 'python docker'}
+
+
+class FlakyDatabase(FakeDatabase):
+    """
+    Database which fails after saving `fail_after` jobs.
+    """
+    fail_after = None
+
+    def add_job(self, job):
+        if self.fail_after is not None and len(self.jobs) >= self.fail_after:
+            raise RuntimeError('quota exceeded')
+        super().add_job(job)
+
+
+class TestOrchestrator(unittest.TestCase):
+
+    def test_registry(self):
+        self.assertIs(get_scraper_class('test-slow-a'), SlowScraper)
+        self.assertEqual(get_scraper_class('kariyernet').id_field, 'ad_id')
+        with self.assertRaises(ValueError):
+            get_scraper_class('unknown')
+
+    def test_sites_run_concurrently(self):
+        db = FakeDatabase()
+        spool = Spool(':memory:')
+        start = time.monotonic()
+        analysed = run_pipeline(db, spool, ['test-slow-a', 'test-slow-b'])
+        self.assertLess(time.monotonic() - start, 0.55)
+        self.assertEqual(analysed, 6)
+        self.assertEqual(len(db.jobs), 6)
+        self.assertEqual(db.size, 6)
+        # analytics of both sites are written in a single pass
+        self.assertEqual(db.stats['lang_data']['Python'], 6)
+        # and the cube has a cell per site, jobs having no posting date
+        self.assertEqual(sorted(db.cube), ['test-slow-a_unknown', 'test-slow-b_unknown'])
+        self.assertEqual(db.cube['test-slow-b_unknown']['lang_data'], {'Python': 3})
+        self.assertEqual({job['site'] for job in db.jobs}, {'test-slow-a', 'test-slow-b'})
+        self.assertIsNone(spool.get_checkpoint('test-slow-a'))
+
+    def test_failing_site_does_not_stop_others(self):
+        db = FakeDatabase()
+        spool = Spool(':memory:')
+        spool.save_checkpoint('test-failing', 2)
+        analysed = run_pipeline(db, spool, ['test-failing', 'test-slow-a'])
+        self.assertEqual(analysed, 3)
+        # failed site resumes from its checkpoint next time
+        self.assertEqual(spool.get_checkpoint('test-failing')['page'], 2)
+
+    def test_deferred_details(self):
+        db = FakeDatabase()
+        spool = Spool(':memory:')
+        DeferredScraper.failing_urls = ('https://test-deferred/0',)
+        try:
+            analysed = run_pipeline(db, spool, ['test-deferred'],
+                                    defer_details=True, detail_workers=2)
+        finally:
+            DeferredScraper.failing_urls = ()
+
+        # every job is counted, only enriched jobs are analysed
+        self.assertEqual(db.size, 4)
+        self.assertEqual(analysed, 3)
+        self.assertEqual(db.stats['lang_data']['Python'], 3)
+        details = sorted(job['job_details'] for job in db.jobs)
+        self.assertEqual(details, ['', 'python docker', 'python docker',
+                                   'python docker'])
+
+        # failed job is retried by the next run
+        queued = spool.queued_details('test-deferred')
+        self.assertEqual([job['url'] for job in queued], ['https://test-deferred/0'])
+        DeferredScraper.job_count = 0
+        try:
+            analysed = run_pipeline(db, spool, ['test-deferred'], defer_details=True)
+        finally:
+            DeferredScraper.job_count = 4
+        self.assertEqual(analysed, 1)
+        self.assertEqual(db.size, 4)
+        self.assertEqual(db.stats['lang_data']['Python'], 4)
+
+    def test_upload_retry_after_failure(self):
+        db = FlakyDatabase()
+        db.fail_after = 2
+        spool = Spool(':memory:')
+        for i in range(5):
+            spool.add_job('test-slow-a', fake_job('test-slow-a', i))
+
+        with self.assertRaises(RuntimeError):
+            upload_spooled_jobs(db, spool, ['test-slow-a'])
+        # only the jobs saved before the failure are counted
+        self.assertEqual(db.size, 2)
+
+        db.fail_after = None
+        self.assertEqual(upload_spooled_jobs(db, spool, ['test-slow-a']), 3)
+        self.assertEqual(len(db.jobs), 5)
+        self.assertEqual(db.size, 5)
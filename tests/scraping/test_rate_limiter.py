@@ -0,0 +1,102 @@
+import unittest
+from src.rate_limiter import TokenBucket, HostLimiter, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reserve_waits_for_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, clock=clock)
+        self.assertEqual(bucket.reserve(), 0.0)
+        # bucket is empty so next token arrives in 1/rate seconds
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+
+    def test_refill_is_capped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, capacity=1.0, clock=clock)
+        clock.now = 100
+        bucket.refill()
+        self.assertEqual(bucket.tokens, 1.0)
+
+
+class TestHostLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = HostLimiter('example.com', initial_rate=1.0,
+                                   increase_step=0.5, max_rate=3.0,
+                                   clock=self.clock, sleep=self.clock.sleep)
+
+    def request(self, latency=0.1, **kwargs):
+        ticket = self.limiter.acquire()
+        self.clock.now += latency
+        self.limiter.release(ticket, latency, **kwargs)
+
+    def test_additive_increase(self):
+        self.request(status_code=200)
+        self.request(status_code=200)
+        self.assertAlmostEqual(self.limiter.rate, 2.0)
+        for _ in range(10):
+            self.request(status_code=200)
+        self.assertEqual(self.limiter.rate, 3.0)
+        self.assertGreater(self.limiter.concurrency, 1)
+
+    def test_slow_response_does_not_increase(self):
+        self.request(latency=0.1, status_code=200)
+        rate = self.limiter.rate
+        self.request(latency=5.0, status_code=200)
+        self.assertEqual(self.limiter.rate, rate)
+
+    def test_multiplicative_decrease(self):
+        for _ in range(4):
+            self.request(status_code=200)
+        self.assertAlmostEqual(self.limiter.rate, 3.0)
+        concurrency = self.limiter.concurrency
+        self.request(status_code=429)
+        self.assertAlmostEqual(self.limiter.rate, 1.5)
+        self.assertAlmostEqual(self.limiter.concurrency, concurrency / 2)
+
+    def test_burst_of_failures_backs_off_once(self):
+        self.request(status_code=200)
+        # both requests are in flight when the host starts failing
+        first = self.limiter.acquire()
+        second = self.limiter.acquire()
+        self.limiter.release(first, 0.1, status_code=503)
+        self.limiter.release(second, 0.1, error=True)
+        self.assertAlmostEqual(self.limiter.rate, 0.75)
+        # a request sent after the back-off can trigger a new one
+        self.request(status_code=503)
+        self.assertAlmostEqual(self.limiter.rate, 0.375)
+
+    def test_not_found_is_neutral(self):
+        self.request(status_code=404)
+        self.assertEqual(self.limiter.rate, 1.0)
+
+    def test_retry_after_pauses_host(self):
+        self.request(status_code=429, retry_after=30)
+        start = self.clock.now
+        self.limiter.acquire()
+        self.assertGreaterEqual(self.clock.now - start, 30)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_hosts_are_independent(self):
+        limiter = RateLimiter(initial_rate=1.0, sleep=lambda s: None)
+        ticket = limiter.acquire('https://a.com/x')
+        limiter.release('https://a.com/x', ticket, 0.1, status_code=200)
+        self.assertGreater(limiter.current_rate('https://a.com/y'), 1.0)
+        self.assertEqual(limiter.current_rate('https://b.com/'), 1.0)
+        self.assertEqual(set(limiter.snapshot()), {'a.com', 'b.com'})
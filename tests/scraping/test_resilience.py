@@ -0,0 +1,136 @@
+import unittest
+import requests
+from src.base_scrapper import BaseScraper
+from src.rate_limiter import RateLimiter
+from src.resilience import (CircuitBreaker, CircuitOpenError,
+                            RequestFailedError, RetryPolicy)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """
+    Returns the given outcomes in order. An outcome is either a status
+    code or an exception to raise.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs.get('proxies')))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+class FakeProxyManager:
+    def __init__(self, proxies):
+        self.proxies = proxies
+
+    def get_proxy(self, exclude=None):
+        candidates = [p for p in self.proxies if p not in (exclude or [])]
+        return (candidates or self.proxies)[0]
+
+    def report_success(self, proxy, latency):
+        pass
+
+    def report_failure(self, proxy):
+        pass
+
+
+class DummyScraper(BaseScraper):
+    def scrape(self):
+        return []
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.delays = []
+        self.scraper = DummyScraper(FakeProxyManager(['http://p1', 'http://p2']),
+                                    RateLimiter(sleep=lambda s: None))
+        self.scraper.retry_policy = RetryPolicy(max_attempts=3,
+                                                sleep=self.delays.append)
+
+    def test_retry_on_server_error(self):
+        session = FakeSession([502, 200])
+        response = self.scraper.http_get(session, 'https://a.com/job')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(session.calls), 2)
+        self.assertEqual(len(self.delays), 1)
+
+    def test_retry_rotates_proxy(self):
+        session = FakeSession([requests.exceptions.ProxyError('down'), 200])
+        self.scraper.http_get(session, 'https://a.com/job', proxied=True)
+        used = [proxies['https'] for _, _, proxies in session.calls]
+        self.assertEqual(used, ['http://p1', 'http://p2'])
+
+    def test_gives_up_with_typed_error(self):
+        session = FakeSession([requests.Timeout('slow')] * 3)
+        with self.assertRaises(RequestFailedError):
+            self.scraper.http_get(session, 'https://a.com/job')
+        self.assertEqual(len(session.calls), 3)
+
+    def test_client_error_is_not_retried(self):
+        session = FakeSession([404])
+        with self.assertRaises(RequestFailedError) as ctx:
+            self.scraper.http_get(session, 'https://a.com/job')
+        self.assertEqual(ctx.exception.status_code, 404)
+        self.assertEqual(len(session.calls), 1)
+
+    def test_post_is_not_retried_unless_idempotent(self):
+        session = FakeSession([503, 200])
+        with self.assertRaises(RequestFailedError):
+            self.scraper.http_post(session, 'https://a.com/search', {}, {})
+        session = FakeSession([503, 200])
+        response = self.scraper.http_post(session, 'https://a.com/search',
+                                          {}, {}, idempotent=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_open_circuit_rejects_requests(self):
+        for _ in range(2):
+            with self.assertRaises(RequestFailedError):
+                self.scraper.http_get(FakeSession([500] * 3), 'https://a.com/')
+        session = FakeSession([200])
+        with self.assertRaises(CircuitOpenError):
+            self.scraper.http_get(session, 'https://a.com/')
+        self.assertEqual(session.calls, [])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_half_open_after_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10,
+                                 clock=clock)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        # only one trial request is allowed
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
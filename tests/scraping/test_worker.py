@@ -0,0 +1,40 @@
+import unittest
+from src.classes.spool import Spool
+from src.classes.work_queue import SQLiteWorkQueue
+from src.worker import Worker, seed_partitions
+from tests.scraping.fake_kariyernet import FakeKariyerNetSession
+from tests.scraping.test_kariyernet import make_scraper
+
+
+def make_worker(queue, session, worker_id):
+    worker = Worker(queue, Spool(':memory:'), worker_id=worker_id)
+    scraper = make_scraper(session)
+    scraper.defer_details = True
+    scraper.new_session = lambda: session
+    worker.scrapers['kariyernet'] = scraper
+    return worker
+
+
+class TestWorker(unittest.TestCase):
+
+    def test_workers_share_queue(self):
+        session = FakeKariyerNetSession(300, failing_ids=[1150])
+        queue = SQLiteWorkQueue(':memory:', max_attempts=1)
+        seed_partitions(queue, 'kariyernet', pages_per_partition=2,
+                        scraper=make_scraper(session))
+        # seeding twice does not add tasks
+        self.assertEqual(seed_partitions(queue, 'kariyernet', 2,
+                                         scraper=make_scraper(session)), 0)
+
+        workers = [make_worker(queue, session, f'w{i}') for i in range(2)]
+        for _ in range(40):
+            for worker in workers:
+                worker.run(max_tasks=5)
+
+        # jobs listed in two departments are fetched by a single worker
+        keys = [key for worker in workers
+                for key in worker.spool.job_keys('kariyernet')]
+        self.assertEqual(len(keys), 299)
+        self.assertEqual(len(set(keys)), 299)
+        self.assertEqual(len(session.detail_requests()), 300)
+        self.assertEqual(queue.counts(), {'done': 4 + 299, 'failed': 1})
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from src.classes.archive import Archive
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = Archive(self.directory.name)
+
+    def tearDown(self):
+        self.archive.close()
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        content = b'{"data": "' + b'x' * 5000 + b'"}'
+        digest = self.archive.put('kariyernet', 'job', '12', content,
+                                  datetime(2024, 3, 1, 10, tzinfo=timezone.utc))
+        self.assertEqual(self.archive.get(digest), content)
+
+        path = os.path.join(self.directory.name, 'kariyernet', '2024', '03', '01.zst')
+        # blobs are compressed
+        self.assertLess(os.path.getsize(path), 1000)
+
+    def test_content_is_stored_once(self):
+        first = self.archive.put('kariyernet', 'job', '12', b'same')
+        second = self.archive.put('kariyernet', 'job', '12', b'same')
+        self.assertEqual(first, second)
+        self.assertEqual(len(list(self.archive.records('kariyernet'))), 1)
+        with self.assertRaises(KeyError):
+            self.archive.get('0' * 64)
+
+    def test_records_by_date_and_kind(self):
+        for day in (1, 2, 3):
+            fetched_at = datetime(2024, 3, day, tzinfo=timezone.utc)
+            self.archive.put('myjobmu', 'search', '1', f'page {day}'.encode(), fetched_at)
+            self.archive.put('myjobmu', 'job', 'url', f'job {day}'.encode(), fetched_at)
+
+        records = list(self.archive.records('myjobmu', 'job',
+                                            since=datetime(2024, 3, 2),
+                                            until=datetime(2024, 3, 3)))
+        self.assertEqual(len(records), 1)
+        record, content = records[0]
+        self.assertEqual(content, b'job 2')
+        self.assertEqual(record['key'], 'url')
+        self.assertEqual(len(list(self.archive.records('myjobmu'))), 6)
+        self.assertEqual(list(self.archive.records('kariyernet')), [])
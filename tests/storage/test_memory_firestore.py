@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud import firestore
+from google.cloud.firestore_v1 import FieldFilter
+
+from src.classes.memory_firestore import MemoryFirestore
+
+
+class TestMemoryFirestore(unittest.TestCase):
+
+    def setUp(self):
+        self.db = MemoryFirestore()
+        self.jobs = self.db.collection('jobs')
+        for i in range(5):
+            self.jobs.document(f'job{i}').set({
+                'title': f'Job {i}', 'site': 'kariyernet' if i % 2 else 'myjobmu',
+                'date_posted': datetime(2024, 3, i + 1, tzinfo=timezone.utc)})
+
+    def test_documents(self):
+        doc = self.jobs.document('job0')
+        self.assertEqual(doc.get().to_dict()['title'], 'Job 0')
+        self.assertFalse(self.jobs.document('missing').get().exists)
+
+        with self.assertRaises(AlreadyExists):
+            doc.create({'title': 'again'})
+        with self.assertRaises(NotFound):
+            self.jobs.document('missing').update({'title': 'x'})
+
+        doc.delete()
+        self.assertFalse(doc.get().exists)
+
+    def test_sentinels(self):
+        doc = self.db.collection('statistics').document('lang_data')
+        doc.set({'Python': 1, 'nested': {'C++': 2}})
+        doc.update({'Python': firestore.Increment(2),
+                    self.db.field_path('nested', 'C++'): firestore.Increment(1),
+                    'Java': firestore.Increment(5)})
+        doc.set({'tags': firestore.ArrayUnion(['a', 'b'])}, merge=True)
+        doc.update({'tags': firestore.ArrayRemove(['a']),
+                    'updated': firestore.SERVER_TIMESTAMP})
+        data = doc.get().to_dict()
+        self.assertEqual(data['Python'], 3)
+        self.assertEqual(data['nested'], {'C++': 3})
+        self.assertEqual(data['Java'], 5)
+        self.assertEqual(data['tags'], ['b'])
+        self.assertIsInstance(data['updated'], datetime)
+
+        doc.update({'Java': firestore.DELETE_FIELD})
+        self.assertNotIn('Java', doc.get().to_dict())
+
+    def test_queries(self):
+        query = (self.jobs.where(filter=FieldFilter('site', '==', 'kariyernet'))
+                 .order_by('date_posted', direction=firestore.Query.DESCENDING))
+        self.assertEqual([s.id for s in query.stream()], ['job3', 'job1'])
+
+        newest = self.jobs.order_by('date_posted', direction='DESCENDING').limit(2)
+        self.assertEqual([s.id for s in newest.get()], ['job4', 'job3'])
+
+        count = self.jobs.where('site', '==', 'myjobmu').count().get()
+        self.assertEqual(count[0][0].value, 3)
+
+    def test_cursor(self):
+        ordered = self.jobs.order_by('date_posted')
+        first_page = list(ordered.limit(2).stream())
+        second_page = list(ordered.start_after(first_page[-1]).limit(2).stream())
+        self.assertEqual([s.id for s in second_page], ['job2', 'job3'])
+
+    def test_batch(self):
+        batch = self.db.batch()
+        batch.set(self.jobs.document('job9'), {'title': 'Job 9'})
+        batch.delete(self.jobs.document('job0'))
+        # nothing is written before the commit
+        self.assertTrue(self.jobs.document('job0').get().exists)
+        batch.commit()
+        self.assertFalse(self.jobs.document('job0').get().exists)
+        self.assertEqual(len(list(self.jobs.stream())), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.classes.database import Database
+from src.classes.memory_firestore import MemoryFirestore
+from src.metrics import (PROMETHEUS_FILE, REPORT_FILE, Histogram, Metrics,
+                         find_regressions, metrics, write_report)
+
+
+class TestFirestoreCounters(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.db = Database(None, client=MemoryFirestore())
+
+    def test_counts_by_method(self):
+        metrics.reset()
+        for i in range(3):
+            self.db.add_job({'url': f'url{i}', 'timestamp': i})
+        self.db.get_recent_urls(LIMIT=2)
+        self.db.update_job('url', 'url0', {'salary': '10'})
+        self.db.update_job('url', 'missing', {'salary': '10'})
+
+        counts = metrics.report()['firestore']['main']
+        self.assertEqual(counts['add_job']['writes'], 3)
+        # get_recent_urls reads through get_recent_values
+        self.assertEqual(counts['get_recent_values']['reads'], 2)
+        self.assertEqual(counts['get_recent_values']['stream_docs'], 2)
+        # an empty query is billed one read
+        self.assertEqual(counts['update_job'],
+                         {'reads': 2, 'writes': 1, 'stream_docs': 1, 'commits': 0})
+
+    def test_streamed_documents_counted_by_issuing_method(self):
+        for i in range(4):
+            self.db.add_job({'url': f'url{i}'})
+        metrics.reset()
+        stream = self.db.export_collection(self.db.job_collection_ref)
+        self.assertEqual(len(list(stream)), 4)
+        counts = metrics.report()['firestore']['main']
+        self.assertEqual(counts['export_collection']['reads'], 4)
+
+    def test_batch_and_count(self):
+        metrics.reset()
+        batch = self.db.db.batch()
+        for i in range(5):
+            batch.set(self.db.job_collection_ref.document(f'job{i}'), {'i': i})
+        batch.commit()
+        self.db.job_collection_ref.count().get()
+        totals = metrics.totals('main')
+        self.assertEqual(totals['writes'], 5)
+        self.assertEqual(totals['commits'], 1)
+        self.assertEqual(totals['reads'], 1)
+
+
+class TestStages(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+        for value in (0.5, 1.5, 1.5, 3.0, 10.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.max, 10.0)
+        self.assertTrue(1.0 <= histogram.quantile(0.5) <= 2.0)
+        self.assertEqual(histogram.quantile(1.0), 10.0)
+
+    def test_time(self):
+        run_metrics = Metrics()
+        for _ in range(3):
+            with run_metrics.time('page_fetch'):
+                pass
+        with self.assertRaises(ValueError):
+            with run_metrics.time('parse'):
+                raise ValueError()
+        stages = run_metrics.report()['stages']
+        self.assertEqual(stages['page_fetch']['count'], 3)
+        self.assertEqual(stages['parse']['count'], 1)
+
+
+class TestReport(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_metrics(self, reads, jobs=10):
+        run_metrics = Metrics()
+        run_metrics.jobs = jobs
+        run_metrics.count('main', 'reads', reads, method='get_size')
+        run_metrics.observe('upload', 1.0)
+        return run_metrics
+
+    def test_report_files(self):
+        report = write_report(self.directory.name, self.run_metrics(30))
+        with open(os.path.join(self.directory.name, REPORT_FILE)) as file:
+            self.assertEqual(json.load(file)['run_id'], report['run_id'])
+        with open(os.path.join(self.directory.name, PROMETHEUS_FILE)) as file:
+            text = file.read()
+        self.assertIn('itjobmeter_firestore_operations_total{database="main",'
+                      'method="get_size",operation="reads"} 30', text)
+        self.assertIn('itjobmeter_stage_duration_seconds_bucket{stage="upload",'
+                      'le="+Inf"} 1', text)
+        self.assertIn('itjobmeter_stage_duration_seconds_count{stage="upload"} 1', text)
+        self.assertNotIn('regressions', report)
+
+    def test_regressions_against_previous_report(self):
+        write_report(self.directory.name, self.run_metrics(30))
+        report = write_report(self.directory.name, self.run_metrics(100))
+        self.assertEqual([r['metric'] for r in report['regressions']],
+                         ['firestore.main.get_size.reads_per_job'])
+
+        # twice the reads for twice the jobs is not a regression
+        report = write_report(self.directory.name, self.run_metrics(200, jobs=20))
+        self.assertEqual(report['regressions'], [])
+
+    def test_small_changes_are_ignored(self):
+        previous = self.run_metrics(10).report()
+        current = self.run_metrics(25).report()
+        self.assertEqual(find_regressions(current, previous), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
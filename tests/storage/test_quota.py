@@ -0,0 +1,128 @@
+import os
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from src.classes.database import Database
+from src.classes.memory_firestore import MemoryFirestore
+from src.quota import (ABORT, FREE_TIER, THROTTLE, QuotaBudget, QuotaExceededError,
+                       estimate_rebase_stats, estimate_scrape, quota_timezone)
+
+
+class FakeClock:
+    def __init__(self, date):
+        self.now = date.timestamp()
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_budget(mode=ABORT, **limits):
+    # 22:00 in Pacific time, 2 hours before the quota reset
+    clock = FakeClock(datetime(2024, 3, 1, 22, tzinfo=quota_timezone()))
+    return QuotaBudget(**limits, mode=mode, clock=clock, sleep=clock.sleep), clock
+
+
+class TestQuotaBudget(unittest.TestCase):
+
+    def test_abort(self):
+        budget, _ = make_budget(writes=3)
+        for _ in range(3):
+            budget.acquire('writes')
+        with self.assertRaises(QuotaExceededError):
+            budget.acquire('writes')
+        # reads are not limited
+        budget.acquire('reads', 10**6)
+        self.assertEqual(budget.remaining(), {'reads': None, 'writes': 0})
+
+    def test_throttle_until_next_window(self):
+        budget, clock = make_budget(THROTTLE, writes=2)
+        budget.acquire('writes', 2)
+        budget.acquire('writes')
+        self.assertEqual(len(clock.sleeps), 1)
+        self.assertAlmostEqual(clock.sleeps[0], 2 * 3600 + 1)
+        self.assertEqual(budget.usage(), {'window': '2024-03-02', 'reads': 0, 'writes': 1})
+
+    def test_throttle_max_wait(self):
+        budget, _ = make_budget(THROTTLE, writes=1)
+        budget.max_wait = 60
+        budget.acquire('writes')
+        with self.assertRaises(QuotaExceededError):
+            budget.acquire('writes')
+
+    def test_restore_only_same_window(self):
+        budget, _ = make_budget(reads=10)
+        budget.restore({'window': '2024-02-29', 'reads': 9})
+        self.assertEqual(budget.remaining()['reads'], 10)
+        budget.restore({'window': '2024-03-01', 'reads': 9})
+        self.assertEqual(budget.remaining()['reads'], 1)
+
+    def test_from_env(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(QuotaBudget.from_env())
+        with mock.patch.dict(os.environ, {'FIRESTORE_READ_BUDGET': 'free',
+                                          'FIRESTORE_WRITE_BUDGET': '100',
+                                          'FIRESTORE_BUDGET_MODE': 'throttle'}):
+            budget = QuotaBudget.from_env()
+        self.assertEqual(budget.limits, {'reads': FREE_TIER['reads'], 'writes': 100})
+        self.assertEqual(budget.mode, THROTTLE)
+
+
+class TestDatabaseBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MemoryFirestore()
+        db = Database(None, client=self.client)
+        for i in range(40):
+            db.add_job({'url': f'url{i}', 'job_title': 'Developer', 'job_details': '',
+                        'location': 'Ebene', 'salary': '10,000 - 20,000'})
+
+    def test_database_enforces_budget(self):
+        budget, _ = make_budget(writes=30)
+        db = Database(None, client=self.client, budget=budget)
+        # documents of statistics already exist, so opening only reads
+        self.assertEqual(budget.usage()['writes'], 0)
+        with self.assertRaises(QuotaExceededError):
+            for i in range(31):
+                db.add_job({'url': f'new{i}'})
+        self.assertEqual(len(list(self.client.collection('jobs_collection').stream())), 70)
+
+    def test_usage_is_shared_by_runs_of_same_day(self):
+        budget, _ = make_budget(writes=30)
+        db = Database(None, client=self.client, budget=budget)
+        db.add_job({'url': 'new'})
+        db.save_quota_usage()
+
+        budget, _ = make_budget(writes=30)
+        Database(None, client=self.client, budget=budget)
+        self.assertEqual(budget.remaining()['writes'], 29)
+
+    def test_full_read_aborted_before_reading(self):
+        budget, _ = make_budget(reads=30)
+        db = Database(None, client=self.client, budget=budget)
+        used = budget.usage()['reads']
+        with self.assertRaises(QuotaExceededError):
+            db.get_dataframe()
+        # only the count aggregation was read
+        self.assertEqual(budget.usage()['reads'], used + 1)
+
+    def test_estimates(self):
+        db = Database(None, client=self.client)
+        rebase = estimate_rebase_stats(db)
+        self.assertEqual(rebase.steps['get_jobs_page']['reads'], 41)
+        self.assertGreater(rebase.totals()['writes'], 0)
+
+        scrape = estimate_scrape(db, ['kariyernet', 'myjobmu'],
+                                 {'kariyernet': 'ad_id', 'myjobmu': 'url'}, max_jobs=25)
+        self.assertEqual(scrape.steps['add_job']['writes'], 25)
+        self.assertEqual(scrape.steps['get_recent_values']['reads'], 80)
+        self.assertEqual(scrape.to_dict()['command'], 'scrape')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.analyser.runner import analyse_jobs
+from src.classes import database
+from src.classes.database import open_database
+from src.classes.rebase_checkpoint import RebaseCheckpoint
+from src.commands.rebase import rebuild_stats
+
+JOBS = [{'job_title': f'Python developer {i}' if i % 2 else 'Java engineer',
+         'job_details': 'We use Python, Django and PostgreSQL on AWS' if i % 3
+         else 'Java, Spring, MySQL and Docker on Azure',
+         'location': 'Port Louis' if i % 2 else 'Plaine Wilhems',
+         'salary': '30,000 - 40,000' if i % 4 else 'Negotiable',
+         'url': f'url{i}'} for i in range(23)]
+
+
+def nonzero(counts: dict) -> dict:
+    return {key: value for key, value in counts.items() if value}
+
+
+class TestStreamingRebase(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint_path = os.path.join(directory.name, 'rebase.json')
+
+        patcher = mock.patch.dict(os.environ, {'FIRESTORE_OFFLINE': '1'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(database.OFFLINE_CLIENTS.clear)
+        database.OFFLINE_CLIENTS.clear()
+
+        self.db = open_database(forMainDB=True)
+        for job in JOBS:
+            self.db.add_job(job)
+
+    def saved_stats(self) -> dict:
+        names = analyse_jobs([], [], [], []).keys()
+        return {name: self.db.get_doc(getattr(self.db, name)) for name in names}
+
+    def expected_stats(self) -> dict:
+        # statistics of every job analysed at once
+        return analyse_jobs([job['job_title'] for job in JOBS],
+                            [job['job_details'] for job in JOBS],
+                            [job['location'] for job in JOBS],
+                            [job['salary'] for job in JOBS])
+
+    def test_pages_give_same_statistics(self):
+        rebuild_stats(self.db, 5, RebaseCheckpoint(self.checkpoint_path))
+
+        stats = self.saved_stats()
+        for name, expected in self.expected_stats().items():
+            self.assertEqual(nonzero(stats[name]), nonzero(expected), name)
+        self.assertEqual(stats['loc_data_ref']['Plaines Wilhems'], 12)
+        self.assertEqual(self.db.get_doc(self.db.metadata_ref)['size'], len(JOBS))
+        # the frontend receives the statistics and the checkpoint is removed
+        frontend = open_database()
+        self.assertEqual(frontend.get_doc(frontend.loc_data_ref), stats['loc_data_ref'])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        # jobs without site or posting date are in the same cell of the cube
+        cell = frontend.get_doc(frontend.cube_collection_ref.document('unknown_unknown'))
+        self.assertEqual(cell['jobs'], len(JOBS))
+        self.assertEqual(cell['lang_data'], nonzero(stats['lang_data_ref']))
+
+    def test_interrupted_rebase_resumes_from_cursor(self):
+        get_jobs_page = self.db.get_jobs_page
+        pages = []
+
+        def failing_page(limit, start_after=None, fields=None):
+            if len(pages) == 2:
+                raise ConnectionError('interrupted')
+            pages.append(start_after)
+            return get_jobs_page(limit, start_after, fields)
+
+        with mock.patch.object(self.db, 'get_jobs_page', side_effect=failing_page):
+            with self.assertRaises(ConnectionError):
+                rebuild_stats(self.db, 5, RebaseCheckpoint(self.checkpoint_path))
+
+        checkpoint = RebaseCheckpoint.load(self.checkpoint_path)
+        self.assertEqual(checkpoint.jobs, 10)
+        self.assertFalse(checkpoint.analysed)
+        cursor = checkpoint.cursor
+
+        with mock.patch.object(self.db, 'get_jobs_page', side_effect=get_jobs_page) as resumed:
+            rebuild_stats(self.db, 5, checkpoint)
+        # the resumed rebase starts after the last job analysed
+        self.assertEqual(resumed.call_args_list[0].args[1], cursor)
+        self.assertEqual(resumed.call_count, 3)
+
+        stats = self.saved_stats()
+        self.assertEqual(sum(stats['loc_data_ref'].values()), len(JOBS))
+        self.assertEqual(nonzero(stats['lang_data_ref']),
+                         nonzero(self.expected_stats()['lang_data_ref']))
+
+    def test_saved_documents_are_not_incremented_twice(self):
+        checkpoint = RebaseCheckpoint(self.checkpoint_path)
+        update_stats = self.db.update_stats
+
+        def failing_update(increment, document_ref):
+            if len(checkpoint.saved) == 3:
+                raise ConnectionError('interrupted')
+            update_stats(increment, document_ref)
+
+        with mock.patch.object(self.db, 'update_stats', side_effect=failing_update):
+            with self.assertRaises(ConnectionError):
+                rebuild_stats(self.db, 5, checkpoint)
+
+        checkpoint = RebaseCheckpoint.load(self.checkpoint_path)
+        self.assertTrue(checkpoint.analysed)
+        self.assertEqual(len(checkpoint.saved), 3)
+        rebuild_stats(self.db, 5, checkpoint)
+        self.assertEqual(sum(self.saved_stats()['loc_data_ref'].values()), len(JOBS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from src.classes.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = Spool(':memory:')
+        self.job = {'ad_id': 12, 'url': '', 'job_title': 'developer',
+                    'date_posted': datetime(2024, 1, 5),
+                    'timestamp': object()}
+
+    def test_round_trip(self):
+        self.spool.add_job('kariyernet', self.job)
+        jobs = self.spool.pending_upload('kariyernet')
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0]['date_posted'], datetime(2024, 1, 5))
+        # firestore sentinel is not persisted
+        self.assertNotIn('timestamp', jobs[0])
+        self.assertEqual(self.spool.job_keys('kariyernet'), ['12'])
+
+    def test_duplicates_are_ignored(self):
+        self.spool.add_job('kariyernet', self.job)
+        self.spool.add_job('kariyernet', self.job)
+        self.assertEqual(len(self.spool.pending_upload('kariyernet')), 1)
+
+    def test_upload_then_analysis(self):
+        self.spool.add_job('kariyernet', self.job)
+        self.assertEqual(self.spool.pending_analysis('kariyernet'), [])
+        self.spool.mark_uploaded('kariyernet', ['12'])
+        self.assertEqual(self.spool.pending_upload('kariyernet'), [])
+        self.assertEqual(len(self.spool.pending_analysis('kariyernet')), 1)
+        self.spool.mark_analysed('kariyernet', ['12'])
+        self.spool.clear('kariyernet')
+        self.assertEqual(self.spool.job_keys('kariyernet'), [])
+
+    def test_unfinished_jobs_survive_clear(self):
+        self.spool.add_job('kariyernet', self.job)
+        self.spool.save_checkpoint('kariyernet', 3)
+        self.spool.clear('kariyernet')
+        self.assertIsNone(self.spool.get_checkpoint('kariyernet'))
+        self.assertEqual(self.spool.job_keys('kariyernet'), ['12'])
+
+    def test_checkpoint(self):
+        self.assertIsNone(self.spool.get_checkpoint('myjobmu'))
+        self.spool.save_checkpoint('myjobmu', 4)
+        self.spool.save_checkpoint('myjobmu', 5, finished=True)
+        self.assertEqual(self.spool.get_checkpoint('myjobmu'),
+                         {'page': 5, 'finished': True})
+
+
+class TestDetailQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.spool = Spool(':memory:')
+        for day in (3, 9, 5):
+            self.spool.add_job('kariyernet', {'ad_id': day, 'job_title': 'dev',
+                                              'date_posted': datetime(2024, 1, day)},
+                               enriched=False)
+
+    def test_newest_first(self):
+        jobs = self.spool.queued_details('kariyernet')
+        self.assertEqual([job['ad_id'] for job in jobs], [9, 5, 3])
+        self.spool.fail_detail('kariyernet', '9')
+        self.assertEqual(self.spool.queued_details('kariyernet', limit=1)[0]['ad_id'], 9)
+
+    def test_skeletons_are_uploaded_but_not_analysed(self):
+        self.spool.mark_uploaded('kariyernet', ['3', '5', '9'])
+        self.assertEqual(self.spool.pending_analysis('kariyernet'), [])
+
+        self.spool.complete_detail('kariyernet', {'ad_id': 9, 'job_title': 'dev',
+                                                  'job_details': 'python'})
+        self.assertEqual(len(self.spool.queued_details('kariyernet')), 2)
+        stale = self.spool.pending_update('kariyernet')
+        self.assertEqual([job['job_details'] for job in stale], ['python'])
+        self.spool.mark_updated('kariyernet', ['9'])
+        self.assertEqual(self.spool.pending_update('kariyernet'), [])
+        self.assertEqual(len(self.spool.pending_analysis('kariyernet')), 1)
+
+    def test_old_spool_is_migrated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'spool.sqlite3')
+            conn = sqlite3.connect(path)
+            conn.execute('''CREATE TABLE jobs (site TEXT, job_key TEXT,
+                payload TEXT, uploaded INTEGER NOT NULL DEFAULT 0,
+                analysed INTEGER NOT NULL DEFAULT 0, created_at REAL,
+                PRIMARY KEY (site, job_key))''')
+            conn.execute("INSERT INTO jobs VALUES ('myjobmu', 'a', '{\"url\": \"a\"}', 1, 0, 0)")
+            conn.commit()
+            conn.close()
+
+            spool = Spool(path)
+            self.assertEqual(len(spool.pending_analysis('myjobmu')), 1)
+            spool.close()
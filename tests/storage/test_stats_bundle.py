@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from src.analyser.cooccurrence import count_cooccurrences
+from src.classes import database
+from src.classes.database import Database, open_database
+from src.classes.memory_firestore import MemoryFirestore
+from src.commands.sync import sync_stats
+from src.stats_bundle import (BUNDLE_CATEGORIES, build_bundle, decode_bundle,
+                              encode_bundle, publish_bundle, top_n)
+
+STATS = {'lang_data': {'Python': 10, 'Java': 7, 'Go': 7, 'Rust': 2, 'COBOL': 0},
+         'loc_data': {'Port Louis': 4},
+         'metadata': {'size': 21, 'job_count_this_month': 3,
+                      'last_update': datetime(2024, 3, 1, tzinfo=timezone.utc)},
+         'job_trend_by_month': {'2024-03-x': 3, '2024-02-x': 18}}
+
+
+class TestStatsBundle(unittest.TestCase):
+
+    def test_top_n(self):
+        ranked = top_n(STATS['lang_data'], 2)
+        # ties are ordered by name, entries which never occur are left out
+        self.assertEqual(ranked['labels'], ['Python', 'Go'])
+        self.assertEqual(ranked['counts'], [10, 7])
+        self.assertEqual(ranked['other'], 9)
+        self.assertEqual(ranked['total'], 26)
+
+    def test_version_changes_with_content_only(self):
+        first = build_bundle(STATS, 2)
+        self.assertEqual(first['version'], 1)
+        self.assertEqual(set(first['categories']), set(BUNDLE_CATEGORIES))
+        self.assertEqual(first['metadata']['last_update'], '2024-03-01T00:00:00+00:00')
+        self.assertEqual(list(first['job_trend_by_month']), ['2024-02-x', '2024-03-x'])
+
+        same = build_bundle({key: STATS[key] for key in reversed(STATS)}, 2, first)
+        self.assertEqual((same['version'], same['hash']), (1, first['hash']))
+        self.assertEqual(encode_bundle(same), encode_bundle(first))
+
+        changed = build_bundle({**STATS, 'loc_data': {'Port Louis': 5}}, 2, first)
+        self.assertEqual(changed['version'], 2)
+        self.assertNotEqual(changed['hash'], first['hash'])
+
+    def test_cooccurrence_pairs(self):
+        cooccurrence = count_cooccurrences([['Docker', 'Kubernetes'], ['Docker', 'Kubernetes'],
+                                            ['Docker', 'Git']])
+        bundle = build_bundle({**STATS, 'cooccurrence_data': cooccurrence}, 1)
+        self.assertEqual(bundle['cooccurrence'], [{'pair': ['Docker', 'Kubernetes'], 'count': 2}])
+        self.assertEqual(build_bundle(STATS)['cooccurrence'], [])
+
+    def test_regions(self):
+        # every region is kept, whatever `n`
+        bundle = build_bundle({**STATS, 'loc_region_data': {
+            'İstanbul': 3, 'Ankara': 1, 'Moka': 2, 'Flacq': 0}}, 1)
+        self.assertEqual(bundle['regions'], {'Ankara': 1, 'Moka': 2, 'İstanbul': 3})
+        self.assertEqual(build_bundle(STATS)['regions'], {})
+
+    def test_publish(self):
+        frontend_db = Database(None, 'frontend_db', client=MemoryFirestore())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stats', 'bundle.json.gz')
+            bundle = publish_bundle(frontend_db, STATS, path, 2)
+            self.assertEqual(frontend_db.get_doc(frontend_db.bundle_ref), bundle)
+            with open(path, 'rb') as file:
+                self.assertEqual(decode_bundle(file.read()), bundle)
+
+            # an unchanged bundle is not written again
+            with mock.patch.object(frontend_db, 'add_doc') as add_doc:
+                self.assertEqual(publish_bundle(frontend_db, STATS, path, 2), bundle)
+            add_doc.assert_not_called()
+
+    def test_sync_publishes_bundle(self):
+        with mock.patch.dict(os.environ, {'FIRESTORE_OFFLINE': '1'}):
+            self.addCleanup(database.OFFLINE_CLIENTS.clear)
+            main_db = open_database(forMainDB=True)
+            main_db.update_stats({'Python': 3}, main_db.lang_data_ref)
+            sync_stats(main_db)
+
+            frontend_db = open_database()
+            bundle = frontend_db.get_doc(frontend_db.bundle_ref)
+        self.assertEqual(bundle['categories']['lang_data']['labels'], ['Python'])
+        self.assertEqual(bundle['version'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import unittest
+from unittest import mock
+
+from src.analyser.runner import (COOCCURRENCE, CUBE, SALARIES, SKETCHES, analyse_jobs,
+                                 save_analytics)
+from src.analyser.sketches import distinct_count, sketch_jobs
+from src.classes import database
+from src.classes.database import Database, open_database
+from src.classes.memory_firestore import MemoryFirestore
+from src.commands.rebase import rebuild_stats
+from src.stats_events import (APPLIED, KEPT_DISTINCT, PENDING, REVERTED, StatsEventError,
+                              apply_run, compact_events, event_increments, replay_run,
+                              revert_run)
+
+
+def analyse(details: list[str], salary: str = 'Unknown') -> dict:
+    count = len(details)
+    return analyse_jobs(['Python developer'] * count, details, ['Moka'] * count,
+                        [salary] * count, ['kariyernet'] * count,
+                        ['2024-05'] * count)
+
+
+class TestStatsEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(None, 'main', client=MemoryFirestore())
+        for name in analyse([]):
+            if name not in (CUBE, COOCCURRENCE, SKETCHES, SALARIES):
+                self.db.create_doc_if_missing(getattr(self.db, name))
+
+    def view(self) -> dict:
+        cells = [cell.to_dict() for cell in self.db.cube_collection_ref.stream()]
+        return {'lang': self.db.get_doc(self.db.lang_data_ref).get('Python'),
+                'loc': self.db.get_doc(self.db.loc_data_ref).get('Moka'),
+                'cube': cells[0]['jobs'] if cells else 0,
+                'pairs': sum(self.db.get_doc(self.db.cooccurrence_data_ref)['counts'])}
+
+    def test_revert_and_replay(self):
+        apply_run(self.db, 'run1', analyse(['Python and Docker', 'Python']))
+        before = self.view()
+        apply_run(self.db, 'run2', analyse(['Python and Docker on AWS']))
+        self.assertEqual(self.view()['lang'], 3)
+        self.assertEqual(self.db.get_stats_event('run2')['status'], APPLIED)
+
+        revert_run(self.db, 'run2')
+        self.assertEqual(self.view(), before)
+        self.assertEqual(self.db.get_stats_event('run2')['status'], REVERTED)
+        with self.assertRaises(StatsEventError):
+            revert_run(self.db, 'run2')
+
+        replay_run(self.db, 'run2')
+        self.assertEqual(self.view(), {'lang': 3, 'loc': 3, 'cube': 3, 'pairs': 10})
+        with self.assertRaises(StatsEventError):
+            replay_run(self.db, 'unknown')
+
+    def test_revert_reads_only_changed_documents(self):
+        apply_run(self.db, 'run1', analyse(['Python']))
+        with mock.patch('src.analyser.runner.save_analytics',
+                        side_effect=save_analytics) as saved:
+            revert_run(self.db, 'run1')
+        # documents and attributes which did not change are not stored in
+        # the event, nor read again
+        self.assertNotIn('os_data_ref', saved.call_args.args[1])
+        self.assertEqual(saved.call_args.args[1]['lang_data_ref'], {'Python': -1})
+
+    def salary_count(self) -> int:
+        from src.analyser.quantiles import unpack_slices
+        doc = self.db.salary_quantiles_collection_ref.document('location_TRY').get()
+        return unpack_slices(doc.get('sketches'))['Moka'].count() if doc.exists else 0
+
+    def test_salaries_are_kept_on_revert(self):
+        apply_run(self.db, 'run1', analyse(['Python'], '15.000 TL'))
+        self.assertEqual(self.salary_count(), 1)
+        # quantiles cannot be subtracted
+        with self.assertRaises(StatsEventError):
+            revert_run(self.db, 'run1')
+        self.assertEqual(self.view()['lang'], 1)
+
+        revert_run(self.db, 'run1', keep_salaries=True)
+        self.assertEqual((self.view()['lang'], self.salary_count()), (0, 1))
+        self.assertEqual(self.db.get_stats_event('run1')['kept'], [SALARIES, KEPT_DISTINCT])
+        # salaries kept are not added twice
+        replay_run(self.db, 'run1')
+        self.assertEqual((self.view()['lang'], self.salary_count()), (1, 1))
+
+    def distinct_titles(self) -> int:
+        cells = [cell.get('sketches') for cell in self.db.sketches_collection_ref.stream()]
+        return distinct_count(cells, 'job_title')
+
+    def test_distinct_counts_are_kept_on_revert(self):
+        apply_run(self.db, 'run1', analyse(['Python']))
+        increments = analyse(['Python'])
+        increments[SKETCHES] = sketch_jobs(['kariyernet'], ['2024-05'],
+                                           {'job_title': ['Go developer']})
+        apply_run(self.db, 'run2', increments)
+        self.assertEqual(self.distinct_titles(), 2)
+
+        # sketches cannot forget values
+        revert_run(self.db, 'run2')
+        self.assertEqual(self.distinct_titles(), 2)
+        self.assertEqual(self.db.get_stats_event('run2')['kept'], [KEPT_DISTINCT])
+        replay_run(self.db, 'run2')
+        self.assertEqual(self.distinct_titles(), 2)
+
+    def test_large_increments_are_chunked(self):
+        increments = analyse(['Python and Docker'] * 3, '15.000 TL')
+        with mock.patch('src.stats_events.EVENT_CHUNK_BYTES', 1000):
+            apply_run(self.db, 'run1', increments)
+        event = self.db.get_stats_event('run1')
+        self.assertNotIn('increments', event)
+        self.assertGreater(event['chunks'], 1)
+        self.assertEqual(event_increments(self.db, event)[SKETCHES], increments[SKETCHES])
+
+        revert_run(self.db, 'run1', keep_salaries=True)
+        self.assertEqual(self.view()['lang'], 0)
+        compact_events(self.db, retain=0)
+        self.assertEqual(list(self.db.stats_event_chunks_ref.stream()), [])
+
+    def test_compact(self):
+        for i in range(5):
+            apply_run(self.db, f'run{i}', analyse(['Python']))
+        # a run which failed before its statistics were all saved
+        self.db.set_stats_event_status('run0', PENDING)
+
+        result = compact_events(self.db, retain=2)
+        self.assertEqual(result, {'kept': 3, 'deleted': 3 - 1, 'pending': ['run0']})
+        runs = [event['run_id'] for event in self.db.get_stats_events()]
+        self.assertEqual(runs, ['run0', 'run3', 'run4'])
+        # the view keeps the increments of deleted events
+        self.assertEqual(self.view()['lang'], 5)
+
+    def test_rebase_clears_events(self):
+        with mock.patch.dict(os.environ, {'FIRESTORE_OFFLINE': '1'}):
+            self.addCleanup(database.OFFLINE_CLIENTS.clear)
+            main_db = open_database(forMainDB=True)
+            apply_run(main_db, 'run1', analyse(['Python']))
+            rebuild_stats(main_db)
+            self.assertEqual(main_db.get_stats_events(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
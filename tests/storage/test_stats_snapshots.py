@@ -0,0 +1,133 @@
+import os
+import unittest
+from unittest import mock
+
+from src.classes import database
+from src.classes.database import Database, open_database
+from src.classes.memory_firestore import MemoryFirestore
+from src.commands.sync import sync_stats
+from src.stats_snapshots import (DELTA, FULL, SnapshotConflictError, SnapshotTooLargeError,
+                                 apply_delta, compact_snapshots, diff_stats,
+                                 encoded_size, get_current_pointer, get_snapshots,
+                                 load_snapshot, publish_snapshot, snapshot_id,
+                                 stats_history)
+
+
+def stats_at(day: int) -> dict:
+    return {'lang_data': {'Python': 10 + day, 'Go': day % 3},
+            'metadata': {'size': 20 + day, 'source': f'run {day}'}}
+
+
+class TestStatsSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database(None, 'frontend_db', client=MemoryFirestore())
+
+    def test_diff_and_apply(self):
+        old = {'lang_data': {'Python': 3, 'Go': 1}, 'loc_data': {'Port Louis': 2},
+               'metadata': {'source': 'a', 'size': 4}}
+        new = {'lang_data': {'Python': 5, 'Rust': 1}, 'tools_data': {'Git': 1},
+               'metadata': {'source': 'b', 'size': 4}}
+        delta = diff_stats(old, new)
+        self.assertEqual(delta['add']['lang_data'], {'Python': 2, 'Rust': 1})
+        self.assertEqual(delta['set']['metadata'], {'source': 'b'})
+        self.assertEqual(delta['remove'], {'lang_data': ['Go']})
+        self.assertEqual(delta['drop'], ['loc_data'])
+        self.assertEqual(apply_delta(old, delta), new)
+        # the previous statistics are not modified
+        self.assertEqual(old['lang_data'], {'Python': 3, 'Go': 1})
+
+    def test_publish_delta_chain(self):
+        for day in range(1, 8):
+            self.assertEqual(publish_snapshot(self.db, stats_at(day), max_chain=3), day)
+            self.assertEqual(load_snapshot(self.db), (stats_at(day), day))
+
+        kinds = [snapshot['kind'] for snapshot in get_snapshots(self.db)]
+        self.assertEqual(kinds, [FULL, DELTA, DELTA, DELTA, FULL, DELTA, DELTA])
+        self.assertEqual(get_current_pointer(self.db)['full'], 5)
+
+    def test_unchanged_stats_are_not_published(self):
+        publish_snapshot(self.db, stats_at(1))
+        self.assertEqual(publish_snapshot(self.db, stats_at(1)), 1)
+        self.assertEqual(len(get_snapshots(self.db)), 1)
+
+    def test_conflict(self):
+        publish_snapshot(self.db, stats_at(1))
+        # another process publishes version 2 after this one read the pointer
+        pointer = get_current_pointer(self.db)
+        self.db.snapshots_collection_ref.document(snapshot_id(2)).set(
+            {'version': 2, 'kind': FULL, 'stats': stats_at(9)})
+        with mock.patch('src.stats_snapshots.get_current_pointer', return_value=pointer):
+            with self.assertRaises(SnapshotConflictError):
+                publish_snapshot(self.db, stats_at(2))
+        # the pointer was not moved to a snapshot this process did not write
+        self.assertEqual(get_current_pointer(self.db)['version'], 1)
+
+    def test_compact(self):
+        for day in range(1, 13):
+            publish_snapshot(self.db, stats_at(day), max_chain=10)
+        history = stats_history(self.db, 'lang_data', 'Python')
+        self.assertEqual([value for _, _, value in history], list(range(11, 23)))
+
+        result = compact_snapshots(self.db, retain=4)
+        self.assertEqual(result, {'version': 12, 'kept': 4, 'deleted': 8})
+        self.assertEqual(load_snapshot(self.db), (stats_at(12), 12))
+        snapshots = get_snapshots(self.db)
+        self.assertEqual([snapshot['version'] for snapshot in snapshots], [9, 10, 11, 12])
+        self.assertEqual(snapshots[0]['kind'], FULL)
+        self.assertEqual(stats_history(self.db, 'lang_data', 'Python')[0][2], 19)
+
+        # the next version is a delta from the compacted one
+        publish_snapshot(self.db, stats_at(13), max_chain=10)
+        self.assertEqual(get_snapshots(self.db, 13)[0]['kind'], DELTA)
+        self.assertEqual(load_snapshot(self.db), (stats_at(13), 13))
+
+    def test_large_snapshots_are_chunked(self):
+        # 3 MB of statistics, and a delta changing most of them
+        big = {'job_title_data': {f'title {i}': i for i in range(60000)},
+               'lang_data': {'Python': 1}}
+        self.assertGreater(encoded_size(big), 1024 * 1024)
+        self.assertEqual(publish_snapshot(self.db, big), 1)
+        self.assertEqual(load_snapshot(self.db), (big, 1))
+        stored = self.db.snapshots_collection_ref.document(snapshot_id(1)).get().to_dict()
+        self.assertNotIn('stats', stored)
+        for chunk in self.db.snapshot_chunks_collection_ref.stream():
+            self.assertLess(encoded_size(chunk.to_dict()), 1024 * 1024)
+
+        bigger = {**big, 'job_title_data': {key: count + 1 for key, count
+                                            in big['job_title_data'].items()}}
+        publish_snapshot(self.db, bigger)
+        self.assertEqual(get_snapshots(self.db, 2)[0]['kind'], FULL)
+        self.assertEqual(load_snapshot(self.db), (bigger, 2))
+
+        # chunks of deleted versions are deleted too
+        compact_snapshots(self.db, retain=1)
+        chunks = [chunk.to_dict()['snapshot']
+                  for chunk in self.db.snapshot_chunks_collection_ref.stream()]
+        self.assertEqual(set(chunks), {2})
+
+    def test_too_large_value_is_not_published(self):
+        publish_snapshot(self.db, stats_at(1))
+        huge = {**stats_at(2), 'cooccurrence_data': {'counts': list(range(200000))}}
+        with self.assertRaises(SnapshotTooLargeError):
+            publish_snapshot(self.db, huge, max_chain=0)
+        # nothing was written
+        self.assertEqual(get_current_pointer(self.db)['version'], 1)
+        self.assertEqual(len(get_snapshots(self.db)), 1)
+
+    def test_sync_publishes_snapshot(self):
+        with mock.patch.dict(os.environ, {'FIRESTORE_OFFLINE': '1'}):
+            self.addCleanup(database.OFFLINE_CLIENTS.clear)
+            main_db = open_database(forMainDB=True)
+            main_db.update_stats({'Python': 3}, main_db.lang_data_ref)
+            sync_stats(main_db)
+            main_db.update_stats({'Python': 2}, main_db.lang_data_ref)
+            sync_stats(main_db)
+
+            stats, version = load_snapshot(open_database())
+        self.assertEqual(version, 2)
+        self.assertEqual(stats['lang_data']['Python'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
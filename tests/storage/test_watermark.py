@@ -0,0 +1,31 @@
+import unittest
+from datetime import datetime
+from src.classes.watermark import Watermark
+
+
+class TestWatermark(unittest.TestCase):
+
+    def test_empty_watermark(self):
+        watermark = Watermark.from_dict({})
+        self.assertFalse(watermark.is_older(datetime(2000, 1, 1)))
+        self.assertFalse(watermark.page_is_older([datetime(2000, 1, 1)]))
+
+    def test_overlap(self):
+        watermark = Watermark(datetime(2024, 3, 10), '1', overlap_days=2)
+        self.assertFalse(watermark.is_older(datetime(2024, 3, 8)))
+        self.assertTrue(watermark.is_older(datetime(2024, 3, 7)))
+        # unknown dates keep the scraper going
+        self.assertFalse(watermark.page_is_older([datetime(2024, 3, 1), None]))
+        self.assertFalse(watermark.page_is_older([]))
+        self.assertTrue(watermark.dates_known([datetime(2024, 3, 1)]))
+        self.assertFalse(watermark.dates_known([datetime(2024, 3, 1), None]))
+        self.assertFalse(Watermark().dates_known([datetime(2024, 3, 1)]))
+
+    def test_advance_and_round_trip(self):
+        watermark = Watermark()
+        watermark.advance(datetime(2024, 3, 1), '5')
+        watermark.advance(datetime(2024, 2, 1), '4')
+        watermark.advance(None, '6')
+        restored = Watermark.from_dict(watermark.to_dict())
+        self.assertEqual(restored.newest_date, datetime(2024, 3, 1))
+        self.assertEqual(restored.newest_id, '5')
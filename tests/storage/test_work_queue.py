@@ -0,0 +1,80 @@
+import threading
+import unittest
+from src.classes.work_queue import SQLiteWorkQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSQLiteWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.queue = SQLiteWorkQueue(':memory:', visibility_timeout=60,
+                                     max_attempts=2, clock=self.clock)
+
+    def test_put_is_idempotent(self):
+        self.assertTrue(self.queue.put('detail', 'detail:a:1', {'n': 1}))
+        self.assertFalse(self.queue.put('detail', 'detail:a:1', {'n': 2}))
+        self.assertEqual(self.queue.counts(), {'queued': 1})
+
+    def test_highest_priority_first(self):
+        self.queue.put('detail', 'old', {}, priority=1)
+        self.queue.put('detail', 'new', {}, priority=5)
+        self.queue.put('partition', 'page', {}, priority=9)
+        tasks = self.queue.lease('w1', count=2, kinds=['detail'])
+        self.assertEqual([task.task_id for task in tasks], ['new', 'old'])
+        self.assertEqual(self.queue.lease('w2', count=5)[0].task_id, 'page')
+        self.assertEqual(self.queue.lease('w2'), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        self.queue.put('detail', 'a', {'n': 1})
+        first = self.queue.lease('w1')[0]
+        self.clock.now += 30
+        self.assertTrue(self.queue.heartbeat(first))
+        self.clock.now += 59
+        self.assertEqual(self.queue.lease('w2'), [])
+
+        self.clock.now += 2
+        second = self.queue.lease('w2')[0]
+        self.assertEqual(second.payload, {'n': 1})
+        self.assertEqual(second.attempts, 2)
+
+        # first worker lost its lease: its result is rejected
+        self.assertFalse(self.queue.heartbeat(first))
+        self.assertFalse(self.queue.complete(first))
+        self.assertTrue(self.queue.complete(second))
+        self.assertEqual(self.queue.counts(), {'done': 1})
+
+    def test_failed_task_is_retried_then_given_up(self):
+        self.queue.put('detail', 'a', {})
+        self.assertTrue(self.queue.release(self.queue.lease('w1')[0]))
+        self.assertTrue(self.queue.release(self.queue.lease('w1')[0]))
+        self.assertEqual(self.queue.lease('w1'), [])
+        self.assertEqual(self.queue.counts(), {'failed': 1})
+
+    def test_each_task_is_leased_once(self):
+        for i in range(200):
+            self.queue.put('detail', f'task:{i}', {})
+        leased = []
+
+        def work():
+            while True:
+                tasks = self.queue.lease(threading.current_thread().name, count=3)
+                if not tasks:
+                    return
+                for task in tasks:
+                    if self.queue.complete(task):
+                        leased.append(task.task_id)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(leased), sorted(f'task:{i}' for i in range(200)))